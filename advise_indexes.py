@@ -0,0 +1,35 @@
+"""Command line entry point for the workload-driven index advisor."""
+
+import json
+import argparse
+
+from utils.database_connector import DatabaseConnector
+from utils.index_advisor import IndexAdvisor, WorkloadRecorder
+
+
+def main(args):
+    with DatabaseConnector() as connector:
+        advisor = IndexAdvisor(
+            connector.connection,
+            recorder=WorkloadRecorder(args.workload),
+            max_indexes=args.max_indexes,
+            min_improvement=args.min_improvement
+        )
+        recommendations = advisor.recommend()
+        if args.apply:
+            advisor.apply(recommendations)
+        for recommendation in recommendations:
+            print(json.dumps(recommendation.to_dict()))
+        if not recommendations:
+            print("No index recommended for the recorded workload")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recommend (and optionally create) indexes for the recorded SQL workload.")
+    parser.add_argument("workload", type=str, help="Workload log written by query_database (WORKLOAD_LOG).")
+    parser.add_argument("--max-indexes", type=int, default=5)
+    parser.add_argument("--min-improvement", type=float, default=0.05,
+                        help="Minimum relative reduction of the workload cost per index.")
+    parser.add_argument("--apply", action="store_true", help="Create the indexes and measure the speedup.")
+    args = parser.parse_args()
+    main(args)
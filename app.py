@@ -1,18 +1,31 @@
 """FastAPI endpoint for generating answers using Llama 2 model."""
 
 # Import dependencies
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 from langchain_community.llms import CTransformers
 import time
 import os
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+import asyncio
 from utils.llm import invoke_llm
-from utils.query import query_database
-from utils.logger import create_logger
+from utils.query import query_database, query_database_async
+from utils.async_database import close_database
+from utils.serialization import rows_response, dumps
+from utils.batch_questions import SQLCache, run_batch, summarize
+from utils.query_history import AnswerCache, QueryHistory, Prewarmer, PREWARM_TOP_N
+from utils.logger import create_logger, request_id_var, shutdown_logging
 from utils.vector_search import VectorQueryFromDirectory
+from utils.inference import load_seq2seq
+from utils.model_registry import ModelRegistry
+from utils.mongo_client import MongoQueryBuilder
+from utils.context_packing import packing_report
+from utils.profiling import install_profiling, profiled_in_thread
+from utils.fake_llm import LLM_MODE, DEFAULT_ANSWER, fake_llm_from_env
+from utils.intent import IntentClassifier, RouteStats, load_examples, timed_predict
 import textwrap
+import uuid
 
 # Ignore warnings
 import warnings
@@ -24,44 +37,226 @@ _logger = create_logger("api")
 # Define FastAPI application
 app = FastAPI(swagger_ui_parameters={"syntaxHighlight.theme": "obsidian"})
 
+
+# Requests being served; background prewarming waits while there are any
+inflight_requests = 0
+
+
+# Tag every log record of a request with its ID (taken from X-Request-ID when the client sends one)
+@app.middleware("http")
+async def request_id(request: Request, call_next):
+    global inflight_requests
+    value = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id_var.set(value)
+    inflight_requests += 1
+    try:
+        response = await call_next(request)
+    finally:
+        inflight_requests -= 1
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = value
+    return response
+
+# Admin-only profiling routes and per-request profiling, installed only when ADMIN_TOKEN is set
+install_profiling(app)
+
 # Define Pydantic models for input and output
 class InputText(BaseModel):
     text: str # Required - User input query (string)
-    
 
-# Initialize the language model for SQL queries.
-llmSQL = CTransformers(
-    model = "model/mistral-7b-instruct-v0.1.Q3_K_L.gguf",
-    model_type="llama",
-    config={
-        'max_new_tokens': 512,  # Set the maximum number of tokens here
-        'temperature': 0
-    }
-)
 
-# Initialize the language model for VectorDB queries.
-try:
-    tokenizer = AutoTokenizer.from_pretrained("vectorllm_tokentizer/")
-    model = AutoModelForSeq2SeqLM.from_pretrained("vectorllm_model/")
-    _logger.info("Successfully initialized model from local directory")
-except:
-    # Load model from hub and save model locally if not available
-    _logger.info("Unable to load model locally. Fetching from hugging face...")
-    tokenizer = AutoTokenizer.from_pretrained("google/flan-t5-large")
-    model = AutoModelForSeq2SeqLM.from_pretrained("google/flan-t5-large")
-    model.save_pretrained("./vectorllm_model/")
-    tokenizer.save_pretrained("./vectorllm_tokentizer/")
-    _logger.info("Successfully initialized model from Huggingface and saved in local directory")
+class AskInput(BaseModel):
+    text: str # Required - User input query (string)
+    route: Optional[str] = None # Optional - Expected route ("sql", "vector" or "both"), used for routing accuracy
+
+
+class BatchInput(BaseModel):
+    questions: List[str] # Required - User input queries
     
+
+# Models are loaded on first use and evicted when idle to stay within MODEL_MEMORY_BUDGET_MB.
+# MODEL_PINNED lists the models that are never evicted, e.g. "sql_llm,embeddings".
+modelRegistry = ModelRegistry()
+pinned = {name.strip() for name in os.getenv("MODEL_PINNED", "").split(",") if name.strip()}
+
+# The language model for SQL queries. It is shared by the SQL and MongoDB paths.
+# With LLM_MODE=fake, load tests replace the language models with FakeLLM.
+if LLM_MODE == "fake":
+    modelRegistry.register("sql_llm", fake_llm_from_env, pinned=True)
+else:
+    modelRegistry.register("sql_llm", lambda: CTransformers(
+        model = "model/mistral-7b-instruct-v0.1.Q3_K_L.gguf",
+        model_type="llama",
+        config={
+            'max_new_tokens': 512,  # Set the maximum number of tokens here
+            'temperature': 0
+        }
+    ), pinned="sql_llm" in pinned)
+
+# SQL of the questions answered by /sqlQuery and /sqlBatch, kept in SQL_CACHE_PATH when set (in memory otherwise)
+sqlCache = SQLCache(os.getenv("SQL_CACHE_PATH"))
+
+# Answers of /vectorQuery, cleared when documents are ingested (ANSWER_CACHE_SIZE, 0 disables it)
+vectorCache = AnswerCache()
+
+# History of the /sqlQuery and /vectorQuery questions (QUERY_HISTORY_DB), used to prewarm the caches
+queryHistory = QueryHistory()
+
+# Initialize the MongoDB query builder. It receives the SQL language model per request.
+mongoQuery = MongoQueryBuilder()
+
 # Initialize the VectorDB client
 vectorDB = VectorQueryFromDirectory(
     embedding_model_name='sentence-transformers/all-MiniLM-L6-v2',
     embedding_model_kwargs={"temperature":1, "max_length":1000},
     vectorDB_directory=os.getenv("VECTORDB"),
-    llm = model,
+    llm = None,
     query=None
 )
 
+# The language model for VectorDB queries with the configured backend (SEQ2SEQ_BACKEND), and the
+# embedding model shared by the vector path and the /ask classifier.
+if LLM_MODE == "fake":
+    # No tokenizer: the fake answer model skips context packing
+    modelRegistry.register("seq2seq", lambda: (None, fake_llm_from_env(default=DEFAULT_ANSWER)), pinned=True)
+else:
+    modelRegistry.register("seq2seq", load_seq2seq, pinned="seq2seq" in pinned)
+modelRegistry.register("embeddings", vectorDB.create_embedding, pinned="embeddings" in pinned)
+
+
+@profiled_in_thread
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    with modelRegistry.use("embeddings") as embeddings:
+        return embeddings.embed_documents(texts)
+
+
+# Initialize the intent classifier of /ask. It reuses the vector path's embedding model.
+intentClassifier = IntentClassifier(embed=embed_texts).fit(load_examples())
+routeStats = RouteStats()
+
+
+@profiled_in_thread
+def generate_sql(text: str, background: bool = False) -> str:
+    with modelRegistry.use("sql_llm", background=background) as llm:
+        return invoke_llm(text, llm)
+
+
+@profiled_in_thread
+def run_mongo_query(text: str) -> list:
+    with modelRegistry.use("sql_llm") as llm:
+        return mongoQuery.run(text, llm=llm)
+
+
+@profiled_in_thread
+def run_vector_chain(text: str, background: bool = False) -> dict:
+    with modelRegistry.use("seq2seq", background=background) as (tokenizer, model), \
+            modelRegistry.use("embeddings", background=background) as embeddings:
+        qa = vectorDB.query_vectorDB(llm=model, embeddings=embeddings, tokenizer=tokenizer)
+        return qa({"query": text}, return_only_outputs=True)
+
+
+async def answer_with_sql(text: str) -> Tuple[list, str, bool]:
+    """
+    Generate (or reuse the cached) SQL for a question and return the result rows.
+
+    Returns:
+        Tuple[list, str, bool]: The rows, the SQL and whether the SQL came from the cache.
+    """
+    query = sqlCache.get(text)
+    if query is not None:
+        try:
+            return await query_database_async(query), query, True
+        except Exception as e:
+            # A cached query that stopped working, e.g. after a schema change, is generated again
+            _logger.warning("Cached SQL failed, generating it again: %s", e)
+            sqlCache.discard(text)
+    # Generate response using the language model, off the event loop
+    query = await run_in_threadpool(generate_sql, text)
+    # Query database on the async connection pool
+    rows = await query_database_async(query)
+    sqlCache.put(text, query)
+    return rows, query, False
+
+
+async def sql_answer(text: str) -> list:
+    """
+    Generate SQL for a question and return the result rows.
+    """
+    rows, _, _ = await answer_with_sql(text)
+    return rows
+
+
+def vector_result(text: str, background: bool = False) -> Tuple[str, Optional[dict]]:
+    result = run_vector_chain(text, background=background)
+    return textwrap.fill(result['result'], width=500), packing_report(result.get('source_documents'))
+
+
+async def vector_answer(text: str) -> Tuple[str, Optional[dict]]:
+    """
+    Answer a question from the vector DB, or from the answer cache.
+
+    Returns:
+        Tuple[str, Optional[dict]]: The answer and the context packing report (tokens used, truncation).
+    """
+    cached = vectorCache.get(text)
+    if cached is not None:
+        return cached
+    answer = await run_in_threadpool(vector_result, text)
+    vectorCache.put(text, answer)
+    return answer
+
+
+def warm_sql(question: Dict) -> None:
+    """
+    Cache the SQL of a recorded question. The recorded SQL is replayed first; the model only
+    generates it again when that query fails.
+    """
+    text = question["question"]
+    if question["sql"]:
+        try:
+            query_database(question["sql"])
+            sqlCache.put(text, question["sql"])
+            return
+        except Exception as e:
+            _logger.warning("Recorded SQL failed, generating it again: %s", e)
+    # Cache the SQL only once it runs, as the endpoint does
+    query = generate_sql(text, background=True)
+    query_database(query)
+    sqlCache.put(text, query)
+
+
+def warm_vector(question: Dict) -> None:
+    vectorCache.put(question["question"], vector_result(question["question"], background=True))
+
+
+# Replays the most asked questions at startup and after every document ingestion, while the API is idle.
+# Its model calls yield to requests waiting for the same model.
+prewarmer = Prewarmer(
+    queryHistory,
+    warmers={
+        "sql": (lambda text: sqlCache.get(text) is not None, warm_sql),
+        "vector": (lambda text: text in vectorCache, warm_vector),
+    },
+    busy=lambda: inflight_requests > 0,
+    invalidate={"vectors": vectorCache.clear},
+)
+
+
+@app.on_event("startup")
+async def startup() -> None:
+    if PREWARM_TOP_N > 0:
+        prewarmer.start()
+
+
+# Stop prewarming, write the query history and the SQL cache, close the async connection pools and flush the log queue on shutdown
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    prewarmer.stop()
+    queryHistory.close()
+    sqlCache.save()
+    await close_database()
+    shutdown_logging()
+
 
 # Define api endpoint to test connection
 @app.get("/")
@@ -83,15 +278,19 @@ def test_connection() -> dict:
     
 # Define SQL Query API endpoint
 @app.post("/sqlQuery")
-async def get_answer(input_text: InputText) -> Dict:
+async def get_answer(input_text: InputText, request: Request) -> Response:
     """
     Endpoint to generate an answer using Llama 2 model.
 
+    The rows are encoded as row-wise JSON by default; the Accept header selects column-wise JSON,
+    Arrow IPC or Parquet, and Accept-Encoding selects zstd or gzip compression.
+
     Args:
         input_text (InputText): The input text provided in the request body.
+        request (Request): The request, used for content negotiation.
 
     Returns:
-        dict: A dictionary containing the generated answer.
+        Response: The encoded answer.
     """
     try:
         start_time = time.time()
@@ -100,19 +299,82 @@ async def get_answer(input_text: InputText) -> Dict:
         
         # Get text from request body
         text = input_text.text
-        _logger.info("Input text: %s" % text)
+        _logger.info("Input text: %s", text)
         
-        # Generate response using the language model
-        query = invoke_llm(text, llmSQL)
+        # Generate the query (or reuse the cached one) and run it
+        answer, query, cached = await answer_with_sql(text)
         
-        # Query database
-        answer = query_database(query)
+        # Calculate elapsed time
+        elapsed_time = time.time() - start_time
+        _logger.info("Time elapsed: %.3f seconds" % elapsed_time)
+        queryHistory.record("sql", text, elapsed_time, sql=query, cached=cached)
+        
+        # Return the answer in the negotiated format
+        return rows_response(answer, request.headers)
+    except Exception as e:
+        queryHistory.record("sql", input_text.text, time.time() - start_time, status="error")
+        # Raise an HTTPException if an error occurs
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Define SQL batch API endpoint
+@app.post("/sqlBatch")
+async def get_batch_answers(batch: BatchInput) -> Response:
+    """
+    Endpoint to answer a list of questions in one batch.
+
+    Repeated questions are answered once, cached SQL is reused and the queries run concurrently
+    while the model generates the next ones.
+
+    Args:
+        batch (BatchInput): The questions.
+
+    Returns:
+        Response: The result of every question (SQL, rows, status and timings) and a summary.
+    """
+    try:
+        start_time = time.time()
+        _logger.info("Answering a batch of %d questions.", len(batch.questions))
+        questions = [{"id": str(number), "question": question} for number, question in enumerate(batch.questions, 1)]
+        results = await run_batch(questions, generate_sql, query_database_async, cache=sqlCache)
+        sqlCache.save()
+
+        elapsed_time = time.time() - start_time
+        _logger.info("Time elapsed: %.3f seconds" % elapsed_time)
+        return Response(dumps({"results": results, "summary": summarize(results, elapsed_time)}),
+                        media_type="application/json")
+    except Exception as e:
+        # Raise an HTTPException if an error occurs
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Define MongoDB Query API endpoint
+@app.post("/mongoQuery")
+def get_mongo_answer(input_text: InputText) -> Dict:
+    """
+    Endpoint to answer a question with a generated MongoDB aggregation pipeline.
+
+    Args:
+        input_text (InputText): The input text provided in the request body.
+
+    Returns:
+        dict: A dictionary containing the query results.
+    """
+    try:
+        start_time = time.time()
+        _logger.info("Generating MongoDB pipeline.")
+        
+        # Get text from request body
+        text = input_text.text
+        _logger.info("Input text: %s", text)
+        
+        # Generate (or reuse) the pipeline and execute it
+        answer = run_mongo_query(text)
         
         # Calculate elapsed time
         elapsed_time = time.time() - start_time
         _logger.info("Time elapsed: %.3f seconds" % elapsed_time)
         
-        # Return the answer in a dictionary
         return {"answer": answer}
     except Exception as e:
         # Raise an HTTPException if an error occurs
@@ -138,25 +400,106 @@ async def get_answer(input_text: InputText) -> dict:
         
         # Get text from request body
         text = input_text.text
-        _logger.info("Input text: %s" % text)
-        
-        # Generate response using the language model
-        qa = vectorDB.query_vectorDB()
+        _logger.info("Input text: %s", text)
         
-        # Query database
-        result=qa(
-            {"query": text}, 
-            return_only_outputs=True
-        )
+        # Generate response using the language model (or reuse the cached answer)
+        cached = text in vectorCache
+        answer, context = await vector_answer(text)
         
         # Calculate elapsed time
         elapsed_time = time.time() - start_time
         _logger.info("Time elapsed: %.3f seconds" % elapsed_time)
+        queryHistory.record("vector", text, elapsed_time, cached=cached)
         
-        # Return the answer in a dictionary
-        return {"answer": textwrap.fill(result['result'], width=500)}
+        # Return the answer and the context token report in a dictionary
+        return {"answer": answer, "context": context}
     except Exception as e:
+        queryHistory.record("vector", input_text.text, time.time() - start_time, status="error")
         # Raise an HTTPException if an error occurs
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Define the routed question API endpoint
+@app.post("/ask")
+async def ask(input_text: AskInput) -> Dict:
+    """
+    Endpoint that routes a question to the SQL path, the vector path or both.
+
+    A local intent classifier picks the route. When both paths are needed they run concurrently and
+    a failure of one path is reported next to the answer of the other.
+
+    Args:
+        input_text (AskInput): The question and, optionally, its expected route.
+
+    Returns:
+        dict: The route, the route probabilities, the answers per path and the timings.
+    """
+    if input_text.route is not None and input_text.route not in ("sql", "vector", "both"):
+        raise HTTPException(status_code=422, detail="route must be 'sql', 'vector' or 'both'")
+    try:
+        start_time = time.time()
+        text = input_text.text
+        _logger.info("Input text: %s", text)
+
+        route, scores, classifier_seconds = await run_in_threadpool(timed_predict, intentClassifier, text)
+        routeStats.record(route, classifier_seconds, expected=input_text.route)
+        _logger.info("Routed to %s in %.1f ms" % (route, classifier_seconds * 1000))
+
+        paths = {"sql": sql_answer, "vector": vector_answer}
+        selected = list(paths) if route == "both" else [route]
+        results = await asyncio.gather(*(paths[name](text) for name in selected), return_exceptions=True)
+
+        answer, errors, context = {}, {}, None
+        for name, result in zip(selected, results):
+            if isinstance(result, Exception):
+                errors[name] = str(result)
+            elif name == "vector":
+                answer[name], context = result
+            else:
+                answer[name] = result
+        if not answer:
+            raise RuntimeError("; ".join(f"{name}: {error}" for name, error in errors.items()))
+
+        elapsed_time = time.time() - start_time
+        _logger.info("Time elapsed: %.3f seconds" % elapsed_time)
+        return {
+            "route": route,
+            "scores": scores,
+            "answer": answer,
+            "errors": errors,
+            "context": context,
+            "classifier_ms": round(classifier_seconds * 1000, 3),
+            "elapsed_ms": round(elapsed_time * 1000, 1),
+        }
+    except Exception as e:
+        # Raise an HTTPException if an error occurs
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Define the routing statistics API endpoint
+@app.get("/ask/stats")
+def ask_stats() -> Dict:
+    """
+    Endpoint returning the classifier latency, route counts, validation accuracy on the labeled
+    examples and accuracy on requests that carried their expected route.
+    """
+    return dict(routeStats.snapshot(), validation_accuracy=intentClassifier.validation_accuracy)
+
+
+# Define the model registry API endpoint
+@app.get("/models")
+def model_status() -> Dict:
+    """
+    Endpoint returning the loaded models, their memory and load time, the memory budget and the
+    recent load and evict events.
+    """
+    return modelRegistry.status()
+
+
+# Define the prewarm statistics API endpoint
+@app.get("/prewarm/stats")
+def prewarm_stats() -> Dict:
+    """
+    Return the last prewarm run (questions warmed, predicted coverage, cost) and its coverage since.
+    """
+    return prewarmer.status()
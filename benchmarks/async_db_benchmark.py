@@ -0,0 +1,78 @@
+"""Benchmark query_database in the threadpool against query_database_async at several concurrency levels.
+
+The sync mode offloads query_database with anyio.to_thread, the way FastAPI runs blocking work, so it
+is capped by the threadpool size (40 by default). The async mode awaits query_database_async on the
+shared asyncpg pool. Both modes run the same query against the database configured in .env.
+"""
+
+import json
+import time
+import asyncio
+import argparse
+
+import anyio
+import numpy as np
+
+from utils.query import query_database, query_database_async
+from utils.async_database import AsyncDatabase
+
+
+async def client(call, requests: int, latencies: list, errors: list) -> None:
+    for _ in range(requests):
+        start = time.perf_counter()
+        try:
+            await call()
+        except Exception as e:
+            errors.append(str(e))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def run(mode: str, concurrency: int, args) -> dict:
+    database = None
+    if mode == "sync":
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        limiter.total_tokens = args.threads
+
+        async def call():
+            return await anyio.to_thread.run_sync(query_database, args.query, False)
+    else:
+        database = AsyncDatabase(max_size=args.pool_size, min_size=min(args.pool_size, 2))
+        # Warm the pool so its creation is not part of the measurement
+        await query_database_async(args.query, use_rollups=False, database=database)
+
+        async def call():
+            return await query_database_async(args.query, use_rollups=False, database=database)
+
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(call, args.requests, latencies, errors) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    if database is not None:
+        await database.close()
+
+    latencies = np.array(latencies)
+    return {
+        "mode": mode,
+        "clients": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare sync-in-threadpool and native async query execution.")
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--modes", type=str, nargs="+", default=["sync", "async"])
+    parser.add_argument("--requests", type=int, default=20, help="Requests per client.")
+    parser.add_argument("--query", type=str, default="SELECT COUNT(*) AS invoices FROM invoice_info")
+    parser.add_argument("--threads", type=int, default=40, help="Threadpool size of the sync mode.")
+    parser.add_argument("--pool-size", type=int, default=10, help="Pool size of the async mode.")
+    args = parser.parse_args()
+
+    for concurrency in args.clients:
+        for mode in args.modes:
+            print(json.dumps(asyncio.run(run(mode, concurrency, args))))
@@ -0,0 +1,76 @@
+"""Benchmark load time, latency, throughput and memory of the inference backends.
+
+Each backend is measured in a fresh process so its RSS is not mixed with the other backends.
+"""
+
+import json
+import time
+import argparse
+import multiprocessing
+
+import numpy as np
+import psutil
+
+from utils.intent import SEED_EXAMPLES
+
+
+def rss_mb() -> float:
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def run(kind: str, backend: str, args, queue) -> None:
+    from utils.inference import create_embeddings, generate, load_seq2seq
+
+    texts = [text for text, _ in SEED_EXAMPLES]
+    before = rss_mb()
+    start = time.perf_counter()
+    if kind == "embeddings":
+        embeddings = create_embeddings(backend=backend)
+        single = lambda text: embeddings.embed_query(text)
+        batch = lambda batch_texts: embeddings.embed_documents(batch_texts)
+    else:
+        tokenizer, model = load_seq2seq(backend)
+        single = lambda text: generate(tokenizer, model, [text], max_new_tokens=args.max_new_tokens)
+        batch = lambda batch_texts: generate(tokenizer, model, batch_texts, max_new_tokens=args.max_new_tokens)
+    load_seconds = time.perf_counter() - start
+    single(texts[0])  # warm-up
+
+    latencies = []
+    for i in range(args.requests):
+        start = time.perf_counter()
+        single(texts[i % len(texts)])
+        latencies.append((time.perf_counter() - start) * 1000)
+    batch_texts = [texts[i % len(texts)] for i in range(args.batch_size)]
+    start = time.perf_counter()
+    batch(batch_texts)
+    throughput = args.batch_size / (time.perf_counter() - start)
+
+    queue.put({
+        "kind": kind,
+        "backend": backend,
+        "load_s": round(load_seconds, 2),
+        "rss_mb": round(rss_mb() - before, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "throughput_per_s": round(throughput, 1),
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the torch, torch-int8, onnx and onnx-int8 backends.")
+    parser.add_argument("--kinds", type=str, nargs="+", default=["embeddings", "seq2seq"])
+    parser.add_argument("--backends", type=str, nargs="+", default=["torch", "torch-int8", "onnx", "onnx-int8"])
+    parser.add_argument("--requests", type=int, default=50, help="Single-input calls per backend.")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    for kind in args.kinds:
+        for backend in args.backends:
+            queue = context.Queue()
+            process = context.Process(target=run, args=(kind, backend, args, queue))
+            process.start()
+            process.join()
+            print(json.dumps(queue.get() if process.exitcode == 0 else
+                             {"kind": kind, "backend": backend, "error": f"exit code {process.exitcode}"}))
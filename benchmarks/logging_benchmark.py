@@ -0,0 +1,87 @@
+"""Benchmark the per-request logging overhead of a /sqlQuery request, before and after the logging change.
+
+"before" replays what a request used to log: the input, the whole SQL PromptTemplate formatted
+eagerly with % at INFO between separator lines, the generated SQL and the elapsed time, through a
+synchronous StreamHandler. "after" logs the same calls through utils.logger: the prompt is at
+DEBUG (skipped without formatting), arguments are merged lazily and records are written by the
+background thread. "after, prompt at INFO" isolates the queue handler and truncation from the level
+change. Output goes to a file so the write cost is included. Only the time spent in the logging
+calls is counted; --think seconds of idle time per request stand in for the model and database work
+during which the background writer catches up.
+"""
+
+import time
+import logging
+import argparse
+import tempfile
+
+from utils.logger import configure_logging, create_logger, shutdown_logging
+
+PROMPT = "You are a PostgreSQL expert. " + "Table invoice_items(item_name varchar, quantity numeric, ...). " * 60
+SQL = "SELECT seller_name, SUM(sales) FROM invoices JOIN invoice_items USING (invoice_id, invoice_date) GROUP BY 1"
+
+
+def sync_logger(path: str) -> logging.Logger:
+    logger = logging.getLogger("benchmark_before")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logger.handlers = [handler]
+    return logger
+
+
+def request_before(logger: logging.Logger, text: str) -> None:
+    logger.info("Input text: %s" % text)
+    logger.info("================================")
+    logger.info("Created PromptTemplate: %s" % PROMPT)
+    logger.info("================================")
+    logger.info("Created LLMChain")
+    logger.info("Generated SQL query: %s" % SQL)
+    logger.info("Time elapsed: %.3f seconds" % 1.234)
+
+
+def request_after(logger: logging.Logger, text: str, prompt_level: int = logging.DEBUG) -> None:
+    logger.info("Input text: %s", text)
+    logger.log(prompt_level, "Created PromptTemplate: %s", PROMPT)
+    logger.info("Created LLMChain")
+    logger.info("Generated SQL query: %s", SQL)
+    logger.info("Time elapsed: %.3f seconds", 1.234)
+
+
+def measure(run, requests: int, think: float) -> float:
+    total = 0.0
+    for i in range(requests):
+        start = time.perf_counter()
+        run(f"What were the total sales of seller {i}?")
+        total += time.perf_counter() - start
+        time.sleep(think)
+    return total / requests * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the logging overhead per request.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--think", type=float, default=0.001, help="Idle seconds per request.")
+    parser.add_argument("--format", default="json", choices=["json", "text"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before = sync_logger(f"{tmp}/before.log")
+        before_us = measure(lambda text: request_before(before, text), args.requests, args.think)
+        before.handlers[0].close()
+
+        with open(f"{tmp}/after.log", "w") as stream:
+            configure_logging(stream=stream, log_format=args.format)
+            after = create_logger("benchmark_after")
+            after_us = measure(lambda text: request_after(after, text), args.requests, args.think)
+            info_us = measure(lambda text: request_after(after, text, logging.INFO), args.requests, args.think)
+            start = time.perf_counter()
+            shutdown_logging()
+            drain = time.perf_counter() - start
+
+    print(f"{'variant':<24} {'us/request':>12}")
+    print(f"{'before':<24} {before_us:>12.1f}")
+    print(f"{'after':<24} {after_us:>12.1f}")
+    print(f"{'after, prompt at INFO':<24} {info_us:>12.1f}")
+    print(f"Background writer drained the remaining queue in {drain:.2f} seconds")
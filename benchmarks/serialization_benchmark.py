@@ -0,0 +1,82 @@
+"""Benchmark encode time and bytes per row of the /sqlQuery response formats.
+
+The baseline is FastAPI's default path: jsonable_encoder followed by json.dumps. Every other format
+is encoded with utils.serialization, uncompressed and with each available content encoding.
+"""
+
+import json
+import time
+import random
+import argparse
+import datetime
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+
+from utils import serialization
+from utils.serialization import JSON, COLUMNAR_JSON, ARROW, PARQUET, encode_rows, compress
+
+
+def make_rows(count: int, seed: int = 0) -> list:
+    # Shaped like a SELECT * FROM invoice_items result
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        quantity = Decimal(rng.randint(1, 50))
+        price = Decimal(rng.randint(100, 100000)) / 100
+        rows.append({
+            "invoice_id": str(rng.randint(1, count // 5 + 1)),
+            "invoice_date": datetime.date(2020, 1, 1) + datetime.timedelta(days=rng.randint(0, 1500)),
+            "item_name": f"Item {rng.randint(1, 500)}",
+            "quantity": quantity,
+            "unit_measure": "each",
+            "net_price": price,
+            "net_worth": quantity * price,
+            "vat": Decimal("10"),
+            "sales": (quantity * price * Decimal("1.1")).quantize(Decimal("0.01")),
+        })
+    return rows
+
+
+def baseline(rows: list) -> bytes:
+    return json.dumps(jsonable_encoder({"answer": rows})).encode()
+
+
+def measure(encode, rows: list, repeat: int) -> tuple:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = encode(rows)
+        best = min(best, time.perf_counter() - start)
+    return best, body
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the encode time and size of the response formats.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement; the fastest is reported.")
+    args = parser.parse_args()
+
+    encodings = [None, "gzip"] + (["zstd"] if serialization.zstandard is not None else [])
+    formats = {
+        "default-json": baseline,
+        "orjson": lambda rows: encode_rows(rows, JSON),
+        "columnar": lambda rows: encode_rows(rows, COLUMNAR_JSON),
+        "arrow": lambda rows: encode_rows(rows, ARROW),
+        "parquet": lambda rows: encode_rows(rows, PARQUET),
+    }
+    for count in args.rows:
+        rows = make_rows(count)
+        for name, encode in formats.items():
+            seconds, body = measure(encode, rows, args.repeat)
+            for encoding in encodings if name != "parquet" else [None]:
+                start = time.perf_counter()
+                compressed = compress(body, encoding)
+                total = seconds + time.perf_counter() - start
+                print(json.dumps({
+                    "format": name,
+                    "encoding": encoding or "identity",
+                    "rows": count,
+                    "encode_ms": round(total * 1000, 2),
+                    "bytes_per_row": round(len(compressed) / count, 1),
+                }))
@@ -0,0 +1,211 @@
+"""Benchmark SQL generation speed, memory and execution accuracy of GGUF models and thread counts.
+
+Every golden question goes through invoke_llm and its SQL is run with query_database. The query is
+correct when its result set equals the result of the reference SQL on the same database (in order
+when the reference has an ORDER BY, as a multiset otherwise). Each (model, threads) pair runs in a
+fresh process so load time and peak RSS belong to that model alone. Time to first token and the
+decode rate come from the tokens CTransformers streams to the callbacks.
+
+The last table marks the Pareto-optimal configurations: no other configuration is at least as
+fast, as accurate and as small, and strictly better on one of them.
+
+Use --seed-invoices on an empty local database to insert deterministic synthetic invoices first.
+"""
+
+import re
+import glob
+import json
+import time
+import random
+import argparse
+import datetime
+import resource
+import multiprocessing
+from queue import Empty
+from decimal import Decimal
+
+import numpy as np
+import psutil
+from langchain_core.callbacks import BaseCallbackHandler
+
+from utils.data_pipeline import DBWriter, SQLQueryBuilder, INVOICE_INFO_COLUMNS, INVOICE_ITEMS_COLUMNS
+from utils.database_connector import DatabaseConnector
+from utils.query import query_database
+
+
+class TokenTimer(BaseCallbackHandler):
+    """Record when generation starts, when the first token arrives and how many tokens follow."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.start, self.first, self.tokens = None, None, 0
+
+    def on_llm_start(self, serialized, prompts, **kwargs) -> None:
+        self.start, self.first, self.tokens = time.perf_counter(), None, 0
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        if self.first is None:
+            self.first = time.perf_counter()
+        self.tokens += 1
+
+
+def seed_database(invoices: int, seed: int = 0) -> None:
+    # Deterministic invoices over a few sellers, clients and years; skipped when already seeded
+    if query_database("SELECT 1 FROM invoice_info WHERE invoice_id = 'GOLD-000000'", use_rollups=False):
+        return
+    rng = random.Random(seed)
+    sellers = ["ACME", "Globex", "Initech", "Umbrella", "Hooli"]
+    clients = [f"Client {i}" for i in range(20)]
+    items = [("Paper", "box"), ("Toner", "each"), ("Chair", "each"), ("Cable", "m"), ("Coffee", "kg")]
+    info_query = SQLQueryBuilder.build_insert_query("invoice_info", INVOICE_INFO_COLUMNS)
+    items_query = SQLQueryBuilder.build_insert_query("invoice_items", INVOICE_ITEMS_COLUMNS)
+    rows = []
+    for i in range(invoices):
+        invoice_id = f"GOLD-{i:06d}"
+        date = datetime.date(2020, 1, 1) + datetime.timedelta(days=rng.randint(0, 4 * 365))
+        lines = []
+        for _ in range(rng.randint(1, 5)):
+            name, unit = rng.choice(items)
+            quantity = Decimal(rng.randint(1, 20))
+            price = Decimal(rng.randint(100, 50000)) / 100
+            worth = quantity * price
+            lines.append((invoice_id, date, name, quantity, unit, price, worth, Decimal("10"),
+                          (worth * Decimal("1.1")).quantize(Decimal("0.01"))))
+        total = sum(line[-1] for line in lines)
+        rows.append((info_query, (invoice_id, date, rng.choice(sellers), "Main street", "TAX", "IBAN",
+                                  rng.choice(clients), "High street", "TAX", total - sum(line[6] for line in lines), total)))
+        rows += [(items_query, line) for line in lines]
+    DBWriter(DatabaseConnector()).insert_data(rows)
+
+
+def _value(value):
+    if isinstance(value, (Decimal, float)):
+        return round(float(value), 2)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def result_key(rows: list, ordered: bool) -> list:
+    # Column names and projection order of aggregates differ between models: compare each row as
+    # the multiset of its values, so "SUM(total), seller_name" matches "seller_name, SUM(total)"
+    values = [tuple(sorted((_value(value) for value in row.values()), key=repr)) for row in rows]
+    return values if ordered else sorted(values, key=repr)
+
+
+def load_golden(path: str) -> list:
+    golden = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                ordered = re.search(r"\border\s+by\b", record["sql"], re.IGNORECASE) is not None
+                record["ordered"] = ordered
+                record["expected"] = result_key(query_database(record["sql"], use_rollups=False), ordered)
+                golden.append(record)
+    return golden
+
+
+def run(model: str, model_type: str, threads: int, golden: list, args, queue) -> None:
+    from langchain_community.llms import CTransformers
+    from utils.llm import invoke_llm
+
+    timer = TokenTimer()
+    start = time.perf_counter()
+    llm = CTransformers(model=model, model_type=model_type, callbacks=[timer], config={
+        "max_new_tokens": args.max_new_tokens, "temperature": 0, "threads": threads,
+    })
+    load_seconds = time.perf_counter() - start
+
+    latencies, ttfts, rates, correct, failures = [], [], [], 0, []
+    for record in golden:
+        start = time.perf_counter()
+        try:
+            sql = invoke_llm(record["question"], llm)
+        except Exception as e:
+            # invoke_llm raises when the output has no SELECT statement
+            sql, error = None, f"{type(e).__name__}: {e}"
+        latencies.append(time.perf_counter() - start)
+        if timer.first is not None:
+            ttfts.append(timer.first - timer.start)
+            if timer.tokens > 1:
+                rates.append((timer.tokens - 1) / max(1e-9, time.perf_counter() - timer.first))
+        if sql is not None:
+            try:
+                rows = query_database(sql, use_rollups=False)
+                if result_key(rows, record["ordered"]) == record["expected"]:
+                    correct += 1
+                    continue
+                error = "wrong result"
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+        failures.append({"question": record["question"], "sql": sql, "error": error[:200]})
+
+    queue.put({
+        "model": model.rsplit("/", 1)[-1],
+        "threads": threads,
+        "load_s": round(load_seconds, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "p50_s": round(float(np.percentile(latencies, 50)), 2),
+        "p95_s": round(float(np.percentile(latencies, 95)), 2),
+        "ttft_s": round(float(np.median(ttfts)), 2) if ttfts else None,
+        "tokens_per_s": round(float(np.median(rates)), 1) if rates else None,
+        "accuracy": round(correct / len(golden), 3),
+        "failures": failures,
+    })
+
+
+def pareto(results: list) -> list:
+    # Minimize p50 latency and peak RSS, maximize accuracy
+    def dominates(a, b):
+        no_worse = a["p50_s"] <= b["p50_s"] and a["peak_rss_mb"] <= b["peak_rss_mb"] and a["accuracy"] >= b["accuracy"]
+        better = a["p50_s"] < b["p50_s"] or a["peak_rss_mb"] < b["peak_rss_mb"] or a["accuracy"] > b["accuracy"]
+        return no_worse and better
+    return [not any(dominates(other, result) for other in results) for result in results]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare GGUF models and thread counts on a golden set of SQL questions.")
+    parser.add_argument("--models", nargs="+", default=sorted(glob.glob("model/*.gguf")),
+                        help="GGUF files, optionally as path:model_type (default model_type llama).")
+    parser.add_argument("--threads", type=int, nargs="+", default=[psutil.cpu_count(logical=False) or 4])
+    parser.add_argument("--golden", default="benchmarks/golden_sql.jsonl")
+    parser.add_argument("--max-new-tokens", type=int, default=256)
+    parser.add_argument("--seed-invoices", type=int, default=0, help="Insert this many synthetic invoices first.")
+    parser.add_argument("--output", help="Write every result, with the failed questions, as JSON lines.")
+    args = parser.parse_args()
+
+    if args.seed_invoices:
+        seed_database(args.seed_invoices)
+    golden = load_golden(args.golden)
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for spec in args.models:
+        model, _, model_type = spec.partition(":")
+        for threads in args.threads:
+            queue = context.Queue()
+            process = context.Process(target=run, args=(model, model_type or "llama", threads, golden, args, queue))
+            process.start()
+            result = None
+            while result is None and (process.is_alive() or not queue.empty()):
+                try:
+                    result = queue.get(timeout=1)
+                except Empty:
+                    pass
+            process.join()
+            if result is None:
+                print(json.dumps({"model": model, "threads": threads, "error": f"exit code {process.exitcode}"}))
+                continue
+            print(json.dumps({key: value for key, value in result.items() if key != "failures"}))
+            results.append(result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.writelines(json.dumps(result) + "\n" for result in results)
+
+    columns = ["threads", "load_s", "peak_rss_mb", "p50_s", "p95_s", "ttft_s", "tokens_per_s", "accuracy"]
+    print(f"\n{'model':<44}" + "".join(f"{column:>13}" for column in columns) + f"{'pareto':>8}")
+    for result, optimal in sorted(zip(results, pareto(results)), key=lambda pair: pair[0]["p50_s"]):
+        print(f"{result['model']:<44}" + "".join(f"{str(result[column]):>13}" for column in columns)
+              + f"{'*' if optimal else '':>8}")
@@ -0,0 +1,127 @@
+"""Benchmark recall@k and latency of HNSW parameters, to pick the settings of the Chroma collection.
+
+The sweep builds one hnswlib index (the library behind Chroma's collections) per M and
+construction_ef, then queries it at every search_ef. Recall@k is measured against exact brute-force
+search in the same distance. The cheapest configuration reaching --recall-target (lowest p50, then
+smallest index) is then built as a real Chroma collection and compared with Chroma's defaults. That
+comparison adds Chroma's own per-query overhead to the latency.
+
+Vectors are synthetic clustered embeddings, or the embeddings of an existing store with --vectordb.
+With --vectordb, --queries of the chunks are held out of the index and used as queries.
+
+Apply the chosen settings with: python vector_index.py rebuild --M ... --construction-ef ... --search-ef ...
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import itertools
+
+import hnswlib
+import numpy as np
+
+from benchmarks.vector_store_benchmark import make_vectors
+from utils.vector_maintenance import HNSW_DEFAULTS, directory_bytes, exact_neighbors, measure_recall
+
+
+def load_store(directory: str, collection: str):
+    import chromadb
+    data = chromadb.PersistentClient(path=directory).get_collection(collection).get(include=["embeddings"])
+    return np.asarray(data["embeddings"], dtype=np.float32)
+
+
+def sweep(vectors, queries, exact, args) -> list:
+    results = []
+    for M, construction_ef in itertools.product(args.M, args.construction_ef):
+        index = hnswlib.Index(space=args.space, dim=vectors.shape[1])
+        start = time.perf_counter()
+        index.init_index(max_elements=len(vectors), ef_construction=construction_ef, M=M)
+        index.add_items(vectors, np.arange(len(vectors)))
+        build_seconds = time.perf_counter() - start
+        path = os.path.join(tempfile.mkdtemp(prefix="hnsw_"), "index.bin")
+        index.save_index(path)
+        index_mb = os.path.getsize(path) / (1024 * 1024)
+        shutil.rmtree(os.path.dirname(path))
+        # One thread, like a single query of the API
+        index.set_num_threads(1)
+        for search_ef in args.search_ef:
+            index.set_ef(search_ef)
+            latencies, hits = [], 0
+            for query, expected in zip(queries, exact):
+                start = time.perf_counter()
+                labels, _ = index.knn_query(query, k=args.k)
+                latencies.append((time.perf_counter() - start) * 1000)
+                hits += len(set(labels[0].tolist()) & set(expected.tolist()))
+            results.append({
+                "M": M, "construction_ef": construction_ef, "search_ef": search_ef,
+                "recall": round(hits / (args.k * len(queries)), 4),
+                "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+                "build_s": round(build_seconds, 2),
+                "index_mb": round(index_mb, 1),
+            })
+            print(json.dumps(results[-1]))
+    return results
+
+
+def chroma_check(vectors, queries, params: dict, args) -> dict:
+    import chromadb
+    directory = tempfile.mkdtemp(prefix="chroma_")
+    try:
+        collection = chromadb.PersistentClient(path=directory).create_collection("benchmark", metadata=params)
+        ids = [str(i) for i in range(len(vectors))]
+        start = time.perf_counter()
+        for offset in range(0, len(vectors), 5000):
+            collection.add(ids=ids[offset:offset + 5000], embeddings=vectors[offset:offset + 5000].tolist())
+        build_seconds = time.perf_counter() - start
+        result = measure_recall(collection, vectors, ids, queries, k=args.k)
+        result.update({"hnsw": params, "build_s": round(build_seconds, 2),
+                       "store_mb": round(directory_bytes(directory) / (1024 * 1024), 1)})
+        return result
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure recall@k and latency of HNSW settings against exact search.")
+    parser.add_argument("--vectordb", help="Take the vectors from this Chroma store instead of synthetic ones.")
+    parser.add_argument("--collection", default="langchain")
+    parser.add_argument("--size", type=int, default=100000, help="Synthetic vectors.")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding size (all-MiniLM-L6-v2 is 384).")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--space", choices=("l2", "cosine", "ip"), default="l2")
+    parser.add_argument("--M", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--construction-ef", type=int, nargs="+", default=[100, 200])
+    parser.add_argument("--search-ef", type=int, nargs="+", default=[10, 20, 50, 100, 200])
+    parser.add_argument("--recall-target", type=float, default=0.95)
+    parser.add_argument("--skip-chroma", action="store_true", help="Only run the hnswlib sweep.")
+    args = parser.parse_args()
+
+    if args.vectordb:
+        vectors = load_store(args.vectordb, args.collection)
+        rng = np.random.default_rng(0)
+        held_out = rng.choice(len(vectors), args.queries, replace=False)
+        queries = vectors[held_out]
+        vectors = np.delete(vectors, held_out, axis=0)
+    else:
+        vectors = make_vectors(args.size, args.dim, seed=0)
+        queries = make_vectors(args.queries, args.dim, seed=1)
+    exact = exact_neighbors(vectors, queries, args.k, args.space)
+
+    results = sweep(vectors, queries, exact, args)
+    passing = [result for result in results if result["recall"] >= args.recall_target]
+    if not passing:
+        print(f"\nNo setting reaches recall@{args.k} >= {args.recall_target}; try larger --search-ef or --M")
+    else:
+        best = min(passing, key=lambda result: (result["p50_ms"], result["index_mb"]))
+        print(f"\nCheapest setting with recall@{args.k} >= {args.recall_target}: {json.dumps(best)}")
+        if not args.skip_chroma:
+            chosen = {"hnsw:space": args.space, "hnsw:M": best["M"],
+                      "hnsw:construction_ef": best["construction_ef"], "hnsw:search_ef": best["search_ef"]}
+            defaults = dict(HNSW_DEFAULTS, **{"hnsw:space": args.space})
+            for label, params in (("chroma defaults", defaults), ("chroma chosen", chosen)):
+                print(label, json.dumps(chroma_check(vectors, queries, params, args)))
@@ -0,0 +1,102 @@
+"""Benchmark retrieval latency and memory of the vector store backends at several collection sizes."""
+
+import os
+import gc
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+import psutil
+
+from utils.vector_store import ChromaBackend, MmapIndexBackend
+
+
+def rss_mb() -> float:
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def make_vectors(count: int, dim: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    # Clustered data resembles sentence embeddings better than uniform noise
+    centers = rng.normal(size=(max(1, count // 1000), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), count)] + 0.3 * rng.normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def load(backend, vectors: np.ndarray, batch_size: int) -> None:
+    for start in range(0, len(vectors), batch_size):
+        end = min(start + batch_size, len(vectors))
+        backend.upsert(
+            ids=[str(i) for i in range(start, end)],
+            documents=[f"chunk {i}" for i in range(start, end)],
+            metadatas=[{"source": f"doc{i % 100}"} for i in range(start, end)],
+            embeddings=vectors[start:end]
+        )
+
+
+def measure(backend, vectors: np.ndarray, queries: np.ndarray, k: int) -> dict:
+    latencies, hits = [], 0
+    for query in queries:
+        start = time.perf_counter()
+        result = backend.search(query, k=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        exact = set(np.argsort(vectors @ query)[::-1][:k].tolist())
+        hits += len(exact & {int(chunk_id) for chunk_id, _, _, _ in result})
+    latencies = np.array(latencies)
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "recall": round(hits / (k * len(queries)), 4),
+    }
+
+
+def run(backend_name: str, size: int, args) -> dict:
+    directory = tempfile.mkdtemp(prefix=f"vs_{backend_name}_")
+    try:
+        vectors = make_vectors(size, args.dim, seed=size)
+        queries = make_vectors(args.queries, args.dim, seed=size + 1)
+
+        if backend_name == "mmap":
+            backend = MmapIndexBackend(directory, nprobe=args.nprobe, delta_limit=size + 1)
+            load(backend, vectors, args.batch_size)
+            backend.save()
+        else:
+            backend = ChromaBackend(directory)
+            load(backend, vectors, args.batch_size)
+        del backend
+        gc.collect()
+
+        # Measure memory of a fresh handle the way the API opens the store at startup
+        before = rss_mb()
+        start = time.perf_counter()
+        backend = MmapIndexBackend(directory, nprobe=args.nprobe) if backend_name == "mmap" else ChromaBackend(directory)
+        load_seconds = time.perf_counter() - start
+        result = measure(backend, vectors, queries, args.k)
+        result.update({
+            "backend": backend_name,
+            "chunks": size,
+            "open_s": round(load_seconds, 3),
+            "rss_delta_mb": round(rss_mb() - before, 1),
+        })
+        return result
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare Chroma and the in-process mmap index.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--backends", type=str, nargs="+", default=["chroma", "mmap"])
+    parser.add_argument("--dim", type=int, default=384, help="Embedding size (all-MiniLM-L6-v2 is 384).")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        for backend_name in args.backends:
+            print(json.dumps(run(backend_name, size, args)))
@@ -1,15 +1,20 @@
 import re
 import os
 import json
+import time
 import argparse
-from pathlib import Path
 import google.generativeai as genai
 
 from dotenv import load_dotenv, find_dotenv
 
 from utils.logger import create_logger
-from utils.data_pipeline import DBWriter, SQLQueryBuilder, DataParser
+from utils.document_input import image_parts
+from utils.data_pipeline import (
+    DBWriter, SQLQueryBuilder, DataParser, INVOICE_INFO_COLUMNS, INVOICE_ITEMS_COLUMNS
+)
 from utils.database_connector import DatabaseConnector
+from utils.rollups import RollupManager, USE_ROLLUPS
+from utils.staging import StagingWriter, STAGING_DIR
 
 
 
@@ -54,27 +59,27 @@ model = genai.GenerativeModel(
     safety_settings = safety_settings
 )
 
-Writer = DBWriter(connector=DatabaseConnector())
+Writer = DBWriter(
+    connector=DatabaseConnector(),
+    rollups=RollupManager() if USE_ROLLUPS else None
+)
 Parser = DataParser()
 
 
-def image_format(image_path):
-    img = Path(image_path)
-    if not img.exists():
-        raise FileNotFoundError(f"Could not find image: {img}")
-    image_parts = [
-        {
-            "mime_type": "image/png", ## Mime type are PNG - image/png. JPEG - image/jpeg. WEBP - image/webp
-            "data": img.read_bytes()
-        }
-    ]
-    return image_parts
-
-def gemini_output(image_path, system_prompt, user_prompt):
-    image_info = image_format(image_path)
-    input_prompt= [system_prompt, image_info[0], user_prompt]
+def image_format(source):
+    """
+    Build the Gemini image parts of a PDF or image given as a path, bytes-like or file-like object.
+    PDFs yield one part per page.
+    """
+    return image_parts(source)
+
+def gemini_output(source, system_prompt, user_prompt):
+    start = time.perf_counter()
+    image_info = image_format(source)
+    input_prompt= [system_prompt, *image_info, user_prompt]
     response = model.generate_content(input_prompt)
-    _logger.info("Gemini output  %s", response)
+    _logger.debug("Gemini output  %s", response)
+    _logger.info("Extracted %d page(s) in %.3f seconds", len(image_info), time.perf_counter() - start)
     json_data = re.sub(r'```', '', response.candidates[0].content.parts[0].text)
     json_data = re.sub(r'json', '', json_data)
     json_data= json.loads(json_data)
@@ -105,58 +110,74 @@ def get_files_from_folder(folder_path):
             files.append(file_name)
     return files
 
-def main(folder_path):
-  
-  files = get_files_from_folder(folder_path)
-  
-  invoice_info_SQLstring = SQLQueryBuilder.build_insert_query(
-      table_name = "public.invoice_info",
-      columns = (
-          "invoice_id", "invoice_date", "seller_name", "seller_address", 
-          "seller_taxid", "seller_iban", "client_name", "client_address", 
-          "client_taxid", "total_tax", "total"
-      )
-  )
+invoice_info_SQLstring = SQLQueryBuilder.build_insert_query(
+    table_name = "public.invoice_info",
+    columns = INVOICE_INFO_COLUMNS
+)
 
 
-  invoice_items_SQLstring = SQLQueryBuilder.build_insert_query(
-      table_name="invoice_items",
-      columns=(
-          "invoice_id", "item_name", "quantity", "unit_measure", "net_price",
-          "net_worth", "vat", "sales"
-      )
+invoice_items_SQLstring = SQLQueryBuilder.build_insert_query(
+    table_name="invoice_items",
+    columns=INVOICE_ITEMS_COLUMNS
+)
+
+def ingest_file(file_path):
+  """
+  Extract, parse and insert one invoice file. Raises on any failure, including the insert.
+  """
+  _logger.info("File path %s", file_path)
+  output = gemini_output(file_path, system_prompt, user_prompt)
+  _logger.debug("Record to be inserted: %s", output)
+
+  record = Parser.ParseData(output)
+
+  _logger.info("Invoice info: %s", record[0])
+  _logger.info("Invoice items: %s", record[1])
+
+  # Insert the invoice and its items in one transaction
+  Writer.insert_data(
+      [(invoice_info_SQLstring, record[0])] +
+      [(invoice_items_SQLstring, i) for i in record[1]],
+      raise_errors=True
   )
 
+def stage_file(file_path, writer):
+  """
+  Extract and parse one invoice file and append it to a staging segment instead of inserting it.
+  """
+  _logger.info("File path %s", file_path)
+  output = gemini_output(file_path, system_prompt, user_prompt)
+  _logger.debug("Record to be staged: %s", output)
+
+  record = Parser.ParseData(output)
+  writer.write(record[0], record[1], source=file_path)
+
+def main(folder_path, staging_dir=None):
+  
+  files = get_files_from_folder(folder_path)
+  # With a staging directory, load the segments later with load_staging.py
+  writer = StagingWriter(staging_dir) if staging_dir else None
+
   for file in files:
 
     try:
-      _logger.info("File path %s",os.path.join(folder_path, file))
-      output = gemini_output(os.path.join(folder_path, file), system_prompt, user_prompt)
-      _logger.info("Record to be inserted: %s", str(output))
-      
-      record = Parser.ParseData(output)
-
-      _logger.info("Invoice info: %s", record[0])
-      _logger.info("Invoice items: %s", record[1])
-
-      Writer.insert_single_query_data(
-          query=invoice_info_SQLstring,
-          data=record[0]
-      )
-      for i in record[1]:
-        Writer.insert_single_query_data(
-            query=invoice_items_SQLstring,
-            data=i
-        )
-      _logger.info("Data inserted successfully")
+      if writer is not None:
+        stage_file(os.path.join(folder_path, file), writer)
+      else:
+        ingest_file(os.path.join(folder_path, file))
     except Exception as e:
       _logger.error("Error: %s", e)
       pass
+
+  if writer is not None:
+    writer.seal()
   
 
   
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Process PDF files containing invoice data.")
     parser.add_argument("folder_path", type=str, help="Path to the folder containing PDF files.")
+    parser.add_argument("--stage", nargs="?", const=STAGING_DIR, default=None, metavar="DIR",
+                        help="Write staging segments to DIR instead of inserting into the database.")
     args = parser.parse_args()
-    main(args.folder_path)
+    main(args.folder_path, args.stage)
@@ -0,0 +1,44 @@
+"""Command line entry point to export the vector path models to ONNX and check their parity."""
+
+import sys
+import json
+import argparse
+
+from utils.inference import EMBEDDING_MODEL, SEQ2SEQ_MODEL, export_onnx, parity_check
+from utils.intent import SEED_EXAMPLES
+
+
+def sample_texts(path):
+    if path:
+        with open(path, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    return [text for text, _ in SEED_EXAMPLES]
+
+
+def main(args):
+    models = {"seq2seq": SEQ2SEQ_MODEL, "embeddings": EMBEDDING_MODEL}
+    kinds = list(models) if args.kind == "all" else [args.kind]
+    texts = sample_texts(args.texts)
+    passed = True
+    for kind in kinds:
+        if not args.parity_only and args.backend.startswith("onnx"):
+            export_onnx(kind, models[kind], quantize=args.backend == "onnx-int8", arch=args.arch)
+        result = parity_check(kind, args.backend, texts, min_cosine=args.min_cosine, min_match=args.min_match)
+        print(json.dumps(result))
+        passed = passed and result["passed"]
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export flan-t5 and MiniLM to ONNX (optionally int8) and compare them with fp32.")
+    parser.add_argument("--kind", type=str, default="all", choices=["seq2seq", "embeddings", "all"])
+    parser.add_argument("--backend", type=str, default="onnx-int8", choices=["onnx", "onnx-int8", "torch-int8"],
+                        help="torch-int8 is quantized at load time and only checked.")
+    parser.add_argument("--arch", type=str, default="avx2", choices=["avx2", "avx512", "avx512_vnni", "arm64"],
+                        help="Instruction set targeted by the int8 kernels.")
+    parser.add_argument("--texts", type=str, default=None, help="Sample inputs, one per line. Defaults to the /ask examples.")
+    parser.add_argument("--parity-only", action="store_true", help="Check an existing export without exporting again.")
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    parser.add_argument("--min-match", type=float, default=0.8)
+    args = parser.parse_args()
+    sys.exit(0 if main(args) else 1)
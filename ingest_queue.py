@@ -0,0 +1,180 @@
+"""Command line entry point for queue-based invoice ingestion across processes and hosts.
+
+    python ingest_queue.py enqueue path/to/invoices          # producer
+    python ingest_queue.py worker --processes 4              # on every ingestion host
+    python ingest_queue.py status
+"""
+
+import os
+import json
+import time
+import socket
+import argparse
+import threading
+import multiprocessing
+
+from utils.logger import create_logger
+from utils.work_queue import WorkQueue
+
+_logger = create_logger("ingest_queue")
+
+
+class Heartbeat:
+    """Extend the leases of the jobs being processed until the block exits.
+
+    Jobs are dropped once acked or failed. When the running job exceeds job_timeout the worker is
+    considered hung: extensions stop, so the leases expire and other workers take the jobs.
+    """
+
+    def __init__(self, queue_path: str, jobs: list, worker: str, interval: float, job_timeout: float) -> None:
+        self.queue_path, self.worker, self.interval, self.job_timeout = queue_path, worker, interval, job_timeout
+        self.jobs = {job.id: job for job in jobs}
+        self._running = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self, job) -> None:
+        with self._lock:
+            self._running = (job.id, time.monotonic())
+
+    def finish(self, job) -> None:
+        with self._lock:
+            self.jobs.pop(job.id, None)
+            self._running = None
+
+    def _hung(self) -> bool:
+        with self._lock:
+            if self._running is None:
+                return False
+            job_id, started = self._running
+        elapsed = time.monotonic() - started
+        if elapsed <= self.job_timeout:
+            return False
+        _logger.warning("Job %d has run for %.0f seconds, letting the leases of %d jobs expire",
+                        job_id, elapsed, len(self.jobs))
+        return True
+
+    def _run(self) -> None:
+        # SQLite connections belong to the thread that opened them
+        with WorkQueue(self.queue_path) as queue:
+            while not self._stop.wait(self.interval):
+                if self._hung():
+                    return
+                with self._lock:
+                    job_ids = list(self.jobs)
+                for job_id in job_ids:
+                    if not queue.extend(job_id, self.worker) and job_id in self.jobs:
+                        _logger.warning("Lost the lease of job %d", job_id)
+
+    def __enter__(self) -> "Heartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def work(args) -> None:
+    # Imported in the worker: it configures the Gemini client and the database writer
+    from psycopg2 import errors
+    from data_extraction import ingest_file
+
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    queue = WorkQueue(args.queue)
+    _logger.info("Worker %s started", worker)
+    while True:
+        jobs = queue.lease(worker, args.batch)
+        if not jobs:
+            if args.exit_when_empty and queue.status()["depth"] == 0:
+                break
+            time.sleep(args.poll_interval)
+            continue
+        with Heartbeat(args.queue, jobs, worker, queue.visibility_timeout / 3, args.job_timeout) as heartbeat:
+            for job in jobs:
+                start = time.perf_counter()
+                heartbeat.start(job)
+                try:
+                    ingest_file(job.payload)
+                except errors.UniqueViolation:
+                    # Delivery is at least once: an earlier attempt already inserted this invoice
+                    _logger.info("Job %d was already ingested", job.id)
+                except Exception as e:
+                    heartbeat.finish(job)
+                    state = queue.fail(job.id, worker, f"{type(e).__name__}: {e}")
+                    _logger.error("Job %d failed (attempt %d, now %s): %s", job.id, job.attempts, state, e)
+                    continue
+                heartbeat.finish(job)
+                if queue.ack(job.id, worker):
+                    _logger.info("Job %d done in %.1f seconds", job.id, time.perf_counter() - start)
+    queue.close()
+
+
+def enqueue(args) -> None:
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            files += [os.path.join(path, name) for name in sorted(os.listdir(path))
+                      if os.path.isfile(os.path.join(path, name))]
+        else:
+            files.append(path)
+    # Absolute paths, so workers on other hosts mounting the same storage find the files
+    with WorkQueue(args.queue) as queue:
+        added = queue.enqueue(os.path.abspath(file) for file in files)
+    print(f"Enqueued {added} of {len(files)} files ({len(files) - added} already queued)")
+
+
+def workers(args) -> None:
+    if args.processes == 1:
+        work(args)
+        return
+    processes = [multiprocessing.Process(target=work, args=(args,)) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # Leases of interrupted jobs expire and the jobs are picked up again
+        for process in processes:
+            process.terminate()
+
+
+def status(args) -> None:
+    with WorkQueue(args.queue) as queue:
+        print(json.dumps(queue.status(window=args.window), indent=2))
+
+
+def requeue_dead(args) -> None:
+    with WorkQueue(args.queue) as queue:
+        print(f"Requeued {queue.requeue_dead()} dead-lettered jobs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distribute invoice ingestion over worker processes with a durable queue.")
+    parser.add_argument("--queue", default=os.getenv("INGEST_QUEUE_DB", "ingest_queue.sqlite"), help="SQLite file of the queue.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = subparsers.add_parser("enqueue", help="Add invoice files (or folders of them) to the queue.")
+    enqueue_parser.add_argument("paths", nargs="+")
+    enqueue_parser.set_defaults(func=enqueue)
+
+    worker_parser = subparsers.add_parser("worker", help="Lease and ingest queued files.")
+    worker_parser.add_argument("--processes", type=int, default=1)
+    worker_parser.add_argument("--batch", type=int, default=1, help="Jobs leased at a time per process.")
+    worker_parser.add_argument("--poll-interval", type=float, default=5.0)
+    worker_parser.add_argument("--exit-when-empty", action="store_true")
+    worker_parser.add_argument("--job-timeout", type=float, default=float(os.getenv("INGEST_JOB_TIMEOUT", "900")),
+                               help="Seconds after which a running job stops renewing its lease, so a hung worker gives it up.")
+    worker_parser.set_defaults(func=workers)
+
+    status_parser = subparsers.add_parser("status", help="Show queue depth, throughput and dead letters.")
+    status_parser.add_argument("--window", type=float, default=300.0, help="Seconds over which throughput is measured.")
+    status_parser.set_defaults(func=status)
+
+    requeue_parser = subparsers.add_parser("requeue-dead", help="Retry every dead-lettered job.")
+    requeue_parser.set_defaults(func=requeue_dead)
+
+    args = parser.parse_args()
+    args.func(args)
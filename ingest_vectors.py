@@ -0,0 +1,63 @@
+"""Command line entry point for loading documents into the vector DB read by /vectorQuery."""
+
+import os
+import json
+import argparse
+
+from dotenv import load_dotenv, find_dotenv
+
+from utils.vector_search import VectorQueryFromDirectory
+from utils.vector_ingestion import VectorIngestionPipeline
+from utils.query_history import QueryHistory
+
+
+load_dotenv(find_dotenv())
+
+
+def main(args):
+    vector_query = VectorQueryFromDirectory(
+        embedding_model_name=args.embedding_model,
+        embedding_model_kwargs={},
+        vectorDB_directory=args.vectordb,
+        llm=None,
+        query=None,
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        vector_backend=args.backend
+    )
+    pipeline = VectorIngestionPipeline(
+        vector_query=vector_query,
+        embed_batch_size=args.embed_batch_size,
+        upsert_batch_size=args.upsert_batch_size,
+        workers=args.workers
+    )
+
+    if args.delete:
+        stats = pipeline.delete_documents(args.delete)
+    else:
+        stats = pipeline.ingest_directory(args.folder_path, prune=not args.no_prune)
+    print(json.dumps(stats.to_dict(), indent=2))
+
+    # Running APIs drop their cached vector answers and prewarm them again
+    history = QueryHistory(background=False)
+    history.mark_ingestion("vectors")
+    history.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index documents from a folder into the vector DB.")
+    parser.add_argument("folder_path", type=str, nargs="?", help="Path to the folder containing documents.")
+    parser.add_argument("--vectordb", type=str, default=os.getenv("VECTORDB"), help="Vector DB directory.")
+    parser.add_argument("--backend", type=str, choices=("chroma", "mmap"), default=os.getenv("VECTOR_BACKEND", "chroma"))
+    parser.add_argument("--embedding-model", type=str, default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    parser.add_argument("--embed-batch-size", type=int, default=256)
+    parser.add_argument("--upsert-batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--no-prune", action="store_true", help="Keep documents that were removed from the folder.")
+    parser.add_argument("--delete", type=str, nargs="+", help="Remove the given document paths from the vector DB.")
+    args = parser.parse_args()
+    if not args.delete and not args.folder_path:
+        parser.error("folder_path is required unless --delete is given")
+    main(args)
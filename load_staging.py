@@ -0,0 +1,48 @@
+"""Command line entry point for bulk-loading staged invoices into the database.
+
+    python data_extraction.py invoices/ --stage staging     # extraction, no database writes
+    python load_staging.py --dir staging --workers 2         # loading, at any later time
+"""
+
+import json
+import argparse
+import multiprocessing
+
+from utils.rollups import RollupManager, USE_ROLLUPS
+from utils.staging import StagingLoader, seal_stale_parts, STAGING_DIR
+
+
+def load(args, segments=None):
+    loader = StagingLoader(args.dir, batch_segments=args.batch_segments,
+                           rollups=RollupManager() if USE_ROLLUPS else None)
+    return loader.load(segments, reload=args.reload)
+
+
+def main(args):
+    if args.seal_stale is not None:
+        for segment in seal_stale_parts(args.dir, args.seal_stale):
+            print(f"Sealed stale segment {segment}")
+    if args.workers == 1:
+        totals = load(args)
+    else:
+        from utils.database_connector import DatabaseConnector
+        with DatabaseConnector() as connector:
+            pending = StagingLoader(args.dir).pending(connector.connection, args.reload)
+        # Disjoint shares per worker; the advisory locks also protect against other loader runs
+        with multiprocessing.get_context("spawn").Pool(args.workers) as pool:
+            results = pool.starmap(load, [(args, pending[i::args.workers]) for i in range(args.workers)])
+        totals = {key: sum(result[key] for result in results) for key in results[0]}
+        totals["seconds"] = max(result["seconds"] for result in results)
+    print(json.dumps(totals))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-load sealed staging segments into the invoice tables.")
+    parser.add_argument("--dir", default=STAGING_DIR, help="Staging directory.")
+    parser.add_argument("--workers", type=int, default=1, help="Loader processes, one connection each.")
+    parser.add_argument("--batch-segments", type=int, default=10, help="Segments loaded per transaction.")
+    parser.add_argument("--reload", action="store_true", help="Load segments again even if already loaded.")
+    parser.add_argument("--seal-stale", type=float, metavar="SECONDS",
+                        help="First seal open segments not written to for this many seconds.")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,30 @@
+"""Command line entry point for creating, rebuilding and checking the invoice rollup tables."""
+
+import json
+import argparse
+
+from utils.database_connector import DatabaseConnector
+from utils.rollups import RollupManager
+
+
+def main(command):
+    rollups = RollupManager()
+    with DatabaseConnector() as connector:
+        if command == "create":
+            with connector.connection.cursor() as cursor:
+                rollups.create_tables(cursor)
+            connector.connection.commit()
+            print("Rollup tables created")
+        else:
+            mismatches = rollups.check_consistency(connector.connection, repair=command == "rebuild")
+            print(json.dumps(mismatches, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the rollup tables used for aggregate queries.")
+    parser.add_argument(
+        "command", choices=("create", "check", "rebuild"),
+        help="create the tables, check them against the base tables, or rebuild them from the base tables."
+    )
+    args = parser.parse_args()
+    main(args.command)
@@ -0,0 +1,25 @@
+"""Command line entry point for applying the managed schema migrations."""
+
+import argparse
+
+from utils.database_connector import DatabaseConnector
+from utils.schema import migrate, ensure_partitions
+
+
+def main(args):
+    with DatabaseConnector() as connector:
+        applied = migrate(connector.connection)
+        print(f"Applied migrations: {applied or 'none'}")
+        if args.partitions_until:
+            with connector.connection.cursor() as cursor:
+                ensure_partitions(cursor, args.partitions_from, args.partitions_until)
+            connector.connection.commit()
+            print(f"Partitions ensured for {args.partitions_from}-{args.partitions_until}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create or upgrade the invoice tables.")
+    parser.add_argument("--partitions-from", type=int, default=2000, help="First year to create partitions for.")
+    parser.add_argument("--partitions-until", type=int, help="Create yearly partitions up to this year.")
+    args = parser.parse_args()
+    main(args)
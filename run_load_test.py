@@ -0,0 +1,43 @@
+"""Command line entry point for the replayable load-test scenarios."""
+
+import sys
+import json
+import asyncio
+import argparse
+import dataclasses
+
+from utils.load_harness import format_report, load_corpus, load_scenarios, run_scenario
+
+
+def main(args) -> int:
+    scenarios = load_scenarios(args.scenarios)
+    corpus = load_corpus(args.corpus)
+    summaries = []
+    for name in args.scenario or list(scenarios):
+        scenario = scenarios[name]
+        if args.duration is not None:
+            scenario = dataclasses.replace(scenario, duration=args.duration)
+        if args.rate is not None:
+            scenario = dataclasses.replace(scenario, arrival=dict(scenario.arrival, rate=args.rate))
+        summary = asyncio.run(run_scenario(scenario, corpus, args.host, seed=args.seed))
+        print(format_report(summary))
+        print()
+        summaries.append(summary)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as file:
+            json.dump(summaries, file, indent=2)
+    return 1 if any(summary["violations"] for summary in summaries) else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded questions against the API and check the SLOs.")
+    parser.add_argument("scenario", nargs="*", help="Scenarios to run. Defaults to all of them.")
+    parser.add_argument("--scenarios", default="tests/load/scenarios.json")
+    parser.add_argument("--corpus", default="tests/load/questions.jsonl")
+    parser.add_argument("--host", default="http://127.0.0.1:8000")
+    parser.add_argument("--duration", type=float, help="Override the duration of every scenario.")
+    parser.add_argument("--rate", type=float, help="Override the arrival rate of every scenario.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report", help="Write the summaries as JSON to this file.")
+    args = parser.parse_args()
+    sys.exit(main(args))
@@ -0,0 +1,62 @@
+"""Command line entry point for answering a file of questions in one batch, e.g. for nightly reports.
+
+    python run_question_batch.py reports/nightly.txt --output results.parquet
+"""
+
+import os
+import json
+import time
+import asyncio
+import argparse
+from functools import partial
+
+from utils.llm import invoke_llm
+from utils.query import query_database_async
+from utils.async_database import AsyncDatabase
+from utils.fake_llm import LLM_MODE, fake_llm_from_env
+from utils.batch_questions import SQLCache, load_questions, run_batch, summarize, write_results
+
+
+def load_llm(args):
+    if LLM_MODE == "fake":
+        return fake_llm_from_env()
+    from langchain_community.llms import CTransformers
+    # The API's model; the batch has the machine to itself, so it may use every core
+    return CTransformers(model=args.model, model_type="llama", config={
+        "max_new_tokens": 512, "temperature": 0, "threads": args.threads,
+    })
+
+
+async def answer(args, questions):
+    llm = load_llm(args)
+    database = AsyncDatabase(max_size=args.concurrency)
+    cache = SQLCache(None if args.no_cache else args.cache)
+    try:
+        return await run_batch(questions, partial(invoke_llm, llm=llm),
+                               partial(query_database_async, database=database),
+                               cache=cache, concurrency=args.concurrency)
+    finally:
+        await database.close()
+        cache.save()
+
+
+def main(args):
+    questions = load_questions(args.questions)
+    start = time.perf_counter()
+    results = asyncio.run(answer(args, questions))
+    write_results(results, args.output)
+    print(json.dumps(summarize(results, time.perf_counter() - start)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate and run the SQL of a file of questions in one batch.")
+    parser.add_argument("questions", help="Questions as .txt (one per line), .jsonl (id, question) or .csv (id, question).")
+    parser.add_argument("--output", default="batch_results.json", help="Result file: .json, .csv or .parquet.")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("BATCH_QUERY_CONCURRENCY", "8")),
+                        help="Queries executed at the same time (pooled connections).")
+    parser.add_argument("--cache", default=os.getenv("SQL_CACHE_PATH", "sql_cache.json"), help="SQL cache file.")
+    parser.add_argument("--no-cache", action="store_true", help="Generate every question's SQL.")
+    parser.add_argument("--model", default=os.getenv("SQL_MODEL_PATH", "model/mistral-7b-instruct-v0.1.Q3_K_L.gguf"))
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 4, help="Model threads.")
+    args = parser.parse_args()
+    main(args)
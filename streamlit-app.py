@@ -1,10 +1,18 @@
 import streamlit as st
 import os
-import tempfile
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
 from utils.llm import invoke_llm
 from utils.database_connector import DatabaseConnector
-from utils.data_pipeline import DBWriter, SQLQueryBuilder, DataParser  # Import DataParser class
-from data_extraction import gemini_output  # Import gemini_output function from data_extraction module
+from utils.data_pipeline import (  # Import DataParser class
+    DBWriter, SQLQueryBuilder, DataParser, INVOICE_INFO_COLUMNS, INVOICE_ITEMS_COLUMNS
+)
+from utils.rollups import RollupManager, USE_ROLLUPS
+from data_extraction import gemini_output, system_prompt, user_prompt  # Import gemini_output function from data_extraction module
 from dotenv import load_dotenv, find_dotenv
 from langchain_community.llms import CTransformers
 from utils.query import query_database
@@ -12,60 +20,161 @@ from utils.query import query_database
 
 load_dotenv(find_dotenv())
 
-# Function to connect to the database
-def connect_to_database():
-    connector = DatabaseConnector()
-    connector.create_connection()
-    return connector
+# When set, questions are answered by the FastAPI service and the app never loads the SQL model
+API_URL = os.getenv("API_URL")
+# Number of uploaded files extracted concurrently
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "4"))
 
-Writer = DBWriter(connector=connect_to_database())
-parser = DataParser()
 
-# Initialize the language model for SQL queries.
-llmSQL = CTransformers(
-    model = "model/mistral-7b-instruct-v0.1.Q3_K_L.gguf",
-    model_type="llama",
-    config={
-        'max_new_tokens': 512,  # Set the maximum number of tokens here
-        'temperature': 0,
-    }
-)
+def get_writer() -> DBWriter:
+    # Not cached: the connector holds a single connection, which sessions running in different
+    # threads must not share. DBWriter opens and closes it around every insert.
+    return DBWriter(
+        connector=DatabaseConnector(),
+        rollups=RollupManager() if USE_ROLLUPS else None
+    )
+
+
+# Streamlit reruns this script on every interaction. Resources are created once per process.
+@st.cache_resource
+def get_llm() -> CTransformers:
+    # Initialize the language model for SQL queries.
+    return CTransformers(
+        model = "model/mistral-7b-instruct-v0.1.Q3_K_L.gguf",
+        model_type="llama",
+        config={
+            'max_new_tokens': 512,  # Set the maximum number of tokens here
+            'temperature': 0,
+        }
+    )
+
 
+class ExtractionCache:
+    """
+    Extraction results by uploaded file hash, shared by all sessions of the process.
+    """
+
+    def __init__(self, max_entries: int = 512) -> None:
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, file_hash: str):
+        with self._lock:
+            if file_hash in self._entries:
+                self._entries.move_to_end(file_hash)
+            return self._entries.get(file_hash)
+
+    def put(self, file_hash: str, data) -> None:
+        with self._lock:
+            self._entries[file_hash] = data
+            self._entries.move_to_end(file_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+@st.cache_resource
+def get_extraction_cache() -> ExtractionCache:
+    return ExtractionCache()
 
 
 invoice_info_SQLstring = SQLQueryBuilder.build_insert_query(
     table_name = "public.invoice_info",
-    columns = (
-        "invoice_id", "invoice_date", "seller_name", "seller_address", 
-        "seller_taxid", "seller_iban", "client_name", "client_address", 
-        "client_taxid", "total_tax", "total"
-    )
+    columns = INVOICE_INFO_COLUMNS
 )
 
 
 invoice_items_SQLstring = SQLQueryBuilder.build_insert_query(
     table_name="invoice_items",
-    columns=(
-        "invoice_id", "item_name", "quantity", "unit_measure", "net_price",
-        "net_worth", "vat", "sales"
-    )
+    columns=INVOICE_ITEMS_COLUMNS
 )
 
+parser = DataParser()
+
 # Function to insert data into the database
 def insert_data(data):
-    # Create an instance of DataParser
-    
     record = parser.ParseData(data)
 
-    Writer.insert_single_query_data(
-        query=invoice_info_SQLstring,
-        data=record[0]
+    # Insert the invoice and its items in one transaction, raising so failed inserts are reported
+    get_writer().insert_data(
+        [(invoice_info_SQLstring, record[0])] +
+        [(invoice_items_SQLstring, i) for i in record[1]],
+        raise_errors=True
     )
-    for i in record[1]:
-      Writer.insert_single_query_data(
-          query=invoice_items_SQLstring,
-          data=i
-      )
+
+
+def extract(content: bytes) -> dict:
+    """
+    Extract the invoice data of an uploaded file. Runs in a worker thread.
+    """
+    # The upload is passed as bytes; the file type is detected from its content
+    return gemini_output(content, system_prompt, user_prompt)
+
+
+def extract_uploads(pdf_files) -> list:
+    """
+    Extract every uploaded file, reusing results of files already extracted by any rerun or session,
+    and insert newly extracted invoices into the database once per session.
+
+    Returns:
+        list: (file name, extracted data or None, error or None) per uploaded file.
+    """
+    cache = get_extraction_cache()
+    inserted = st.session_state.setdefault("inserted_hashes", set())
+    uploads = []
+    for pdf_file in pdf_files:
+        content = pdf_file.getvalue()
+        uploads.append((pdf_file.name, hashlib.sha256(content).hexdigest(), content))
+
+    results = {file_hash: (cache.get(file_hash), None) for _, file_hash, _ in uploads}
+    pending = {file_hash: content for _, file_hash, content in uploads if results[file_hash][0] is None}
+    if pending:
+        progress = st.progress(0.0, text=f"Extracting {len(pending)} file(s)")
+        with ThreadPoolExecutor(max_workers=EXTRACTION_WORKERS) as executor:
+            futures = {
+                executor.submit(extract, content): file_hash
+                for file_hash, content in pending.items()
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                file_hash = futures[future]
+                try:
+                    data = future.result()
+                    cache.put(file_hash, data)
+                    results[file_hash] = (data, None)
+                except Exception as e:
+                    results[file_hash] = (None, e)
+                progress.progress(done / len(pending), text=f"Extracted {done} of {len(pending)} file(s)")
+        progress.empty()
+
+    output = []
+    for name, file_hash, _ in uploads:
+        data, error = results[file_hash]
+        if data is not None and file_hash not in inserted:
+            try:
+                # Insert extracted data into the database
+                insert_data(data)
+                inserted.add(file_hash)
+            except Exception as e:
+                data, error = None, e
+        output.append((name, data, error))
+    return output
+
+
+def answer_question(prompt: str):
+    """
+    Answer a question through the FastAPI service when API_URL is set, otherwise locally.
+
+    Returns:
+        tuple: (generated query or None, answer rows)
+    """
+    if API_URL:
+        response = requests.post(f"{API_URL.rstrip('/')}/sqlQuery", json={"text": prompt}, timeout=300)
+        response.raise_for_status()
+        return None, response.json()["answer"]
+    # Generate SQL query
+    query = invoke_llm(prompt, get_llm())
+    return query, query_database(query)
+
 
 # Streamlit app interface
 def main():
@@ -75,51 +184,21 @@ def main():
     st.header('Data Extraction')
     pdf_files = st.file_uploader('Upload PDF Files', accept_multiple_files=True)
     if pdf_files:
-        for pdf_file in pdf_files:
-            with tempfile.NamedTemporaryFile(delete=False) as tmpfile:
-                tmpfile.write(pdf_file.read())
-                tmpfile_path = tmpfile.name
-            
-            system_prompt = """
-                    You are a specialist in comprehending receipts.
-                    Input images in the form of receipts will be provided to you,
-                    and your task is to respond to questions based on the content of the input image.
-                    """  # Provide your system prompt
-            user_prompt =  """
-                            retrieve these values: invoice number, invoice date, client name, client address and tax ID, seller name, 
-                            seller address and tax ID, invoice iban, names of invoice items included into this invoice, gross worth value 
-                            for each invoice item from the table, total tax total.format response as following 
-                            \"invoice_number\": {}, \"invoice_date\": {}, {\"client_name\": {}, \"client_address\": {}, 
-                            \"client_tax_id\": {}, \", \"seller_name\": {},\"seller_address\": {},\"seller_tax_id\": {}, 
-                            \"invoice_iban\": {}, \"item\": [{"description": "description or name of the item that has been bougth", 
-                            "quantity":"total number of each item", "unit":"unit for measurement", "net_price":"price of each item", 
-                            "net_worth":"multiple of quantity and net_price", "tax":"tax or vat" ,"gross_worth": "how much does the item cost"}], 
-                            \"total_tax\": {}, \"total\": {}}"
-                            """
-            
-            try:
-                extracted_data = gemini_output(tmpfile_path, system_prompt, user_prompt)  # Call gemini_output function
-                st.write(f'Extracted Data from {pdf_file.name}:')
+        for name, extracted_data, error in extract_uploads(pdf_files):
+            if error is None:
+                st.write(f'Extracted Data from {name}:')
                 st.write(extracted_data)
-
-                # Insert extracted data into the database
-                insert_data(extracted_data)
-            except Exception as e:
-                st.write(f"Unable to etract and save data for file -> {pdf_file.name}")
-                st.write(f"error -> {e}")
-
-            # Remove temporary file
-            os.remove(tmpfile_path)
+            else:
+                st.write(f"Unable to etract and save data for file -> {name}")
+                st.write(f"error -> {error}")
 
     # Query Generation Section
     st.header('Query Generation')
     prompt = st.text_input('Enter Prompt')
     if st.button('Generate Query'):
-        # Generate SQL query
-        query = invoke_llm(prompt, llmSQL)
-        st.write(f"Generated Query: {query}")
-
-        answer = query_database(query)
+        query, answer = answer_question(prompt)
+        if query is not None:
+            st.write(f"Generated Query: {query}")
 
         st.json(answer)
 
@@ -0,0 +1,127 @@
+import asyncio
+from contextlib import asynccontextmanager
+from decimal import Decimal
+from utils.async_database import AsyncDatabase
+from utils.query import query_database_async
+from utils.replicas import ReplicaRouter
+
+ROLLUP_QUERY = "SELECT seller_name, SUM(total) AS total_sales FROM invoice_info GROUP BY seller_name"
+
+class FakeConnection:
+    """
+    asyncpg connection replacement returning the given rows per query (an Exception fails the query).
+    """
+    def __init__(self, results):
+        self.results = results
+        self.executed = []
+
+    @asynccontextmanager
+    async def transaction(self, readonly=False):
+        yield
+
+    async def fetch(self, query, *args):
+        self.executed.append(query)
+        result = self.results.get(query.split(" FROM ")[1].split()[0], [])
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+class FakePool:
+    def __init__(self, name, connection, failing=False):
+        self.name = name
+        self.connection = connection
+        self.failing = failing
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self.failing:
+            raise ConnectionRefusedError(self.name)
+        self.connection.pool = self.name
+        yield self.connection
+
+    async def close(self):
+        pass
+
+def fake_database(connection, router=None, down=()):
+    """
+    Build an AsyncDatabase whose pools hand out connection, failing for the DSNs in down.
+    """
+    database = AsyncDatabase(dsn="primary", router=router)
+
+    async def create_pool(dsn):
+        if dsn in down:
+            raise ConnectionError(dsn)
+        return FakePool(dsn, connection)
+    database._create_pool = create_pool
+    return database
+
+def test_rows_match_sync_format():
+    """
+    Test that rows are returned as a list of dictionaries keyed by column name.
+    """
+    # Given
+    connection = FakeConnection({"invoice_info": [{"seller_name": "ACME", "total": Decimal("10.00")}]})
+
+    # When
+    rows = asyncio.run(query_database_async("SELECT seller_name, total FROM invoice_info",
+                                            use_rollups=False, database=fake_database(connection)))
+
+    # Then
+    assert rows == [{"seller_name": "ACME", "total": Decimal("10.00")}]
+    assert connection.pool == "primary"
+
+def test_rollup_failure_falls_back_to_base_tables():
+    """
+    Test that a failing rollup query is retried against the base tables in the same transaction.
+    """
+    # Given
+    connection = FakeConnection({
+        "rollup_seller": Exception("relation rollup_seller does not exist"),
+        "invoice_info": [{"seller_name": "ACME", "total_sales": Decimal("30.00")}],
+    })
+
+    # When
+    rows = asyncio.run(query_database_async(ROLLUP_QUERY, use_rollups=True, database=fake_database(connection)))
+
+    # Then
+    assert "rollup_seller" in connection.executed[0]
+    assert connection.executed[1] == ROLLUP_QUERY
+    assert rows == [{"seller_name": "ACME", "total_sales": Decimal("30.00")}]
+
+def test_reads_use_healthy_reader_and_fall_back_to_primary():
+    """
+    Test that reads go to a reader pool, and to the primary when the reader cannot be reached.
+    """
+    # Given
+    router = ReplicaRouter(["reader1"])
+    connection = FakeConnection({"invoice_info": []})
+
+    # When
+    asyncio.run(fake_database(connection, router=router).fetch("SELECT 1 FROM invoice_info"))
+    on_reader = connection.pool
+    asyncio.run(fake_database(connection, router=router, down={"reader1"}).fetch("SELECT 1 FROM invoice_info"))
+    on_primary = connection.pool
+
+    # Then
+    assert on_reader == "reader1"
+    assert on_primary == "primary"
+    assert router.status()[0] == {"reader": 0, "healthy": False, "lag": None, "in_use": 0}
+
+def test_reader_failing_after_its_pool_was_created_is_skipped():
+    """
+    Test that readers whose pools exist but refuse connections are marked failed and the read is retried on the primary.
+    """
+    # Given
+    router = ReplicaRouter(["reader1", "reader2"])
+    connection = FakeConnection({"invoice_info": [{"n": 1}]})
+    database = fake_database(connection, router=router)
+    database._pools = {"reader1": FakePool("reader1", connection, failing=True),
+                       "reader2": FakePool("reader2", connection, failing=True)}
+
+    # When
+    rows = asyncio.run(database.fetch("SELECT 1 FROM invoice_info"))
+
+    # Then
+    assert rows == [{"n": 1}] and connection.pool == "primary"
+    assert [reader["healthy"] for reader in router.status()] == [False, False]
+    assert [reader["in_use"] for reader in router.status()] == [0, 0]
@@ -0,0 +1,145 @@
+import json
+import time
+import asyncio
+import datetime
+from decimal import Decimal
+
+import pyarrow.parquet as pq
+
+from utils.batch_questions import SQLCache, load_questions, run_batch, summarize, write_results
+
+QUESTIONS = [
+    {"id": "1", "question": "Total sales per seller?"},
+    {"id": "2", "question": "Top 5 clients"},
+    {"id": "3", "question": "total sales per seller"},
+    {"id": "4", "question": "Broken question"},
+]
+
+class FakeDatabase:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.queries = []
+        self.running = self.peak = 0
+
+    async def execute(self, sql):
+        self.queries.append(sql)
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(self.delay)
+        self.running -= 1
+        if "broken" in sql:
+            raise ValueError("syntax error")
+        return [{"seller_name": "ACME", "total": Decimal("10.50"), "day": datetime.date(2024, 1, 1)}]
+
+def generate(question):
+    return f"SELECT /* {question.lower()} */ 1"
+
+def test_duplicates_are_answered_once_and_cache_is_reused(tmp_path):
+    """
+    Test that normalized duplicates share one answer and that successful SQL is cached for the next batch.
+    """
+    # Given
+    cache = SQLCache(str(tmp_path / "cache.json"))
+    database = FakeDatabase()
+    generated = []
+
+    # When
+    results = asyncio.run(run_batch(QUESTIONS, lambda q: generated.append(q) or generate(q), database.execute, cache=cache))
+    cache.save()
+    again = asyncio.run(run_batch(QUESTIONS, generate, FakeDatabase().execute, cache=SQLCache(str(tmp_path / "cache.json"))))
+
+    # Then
+    assert [result["id"] for result in results] == ["1", "2", "3", "4"]
+    assert generated == ["Total sales per seller?", "Top 5 clients", "Broken question"]
+    assert len(database.queries) == 3
+    assert results[2]["duplicate_of"] == "1" and results[2]["rows"] == results[0]["rows"]
+    assert results[3]["status"] == "error" and results[3]["error"] == "ValueError: syntax error"
+    assert [result["cached"] for result in again] == [True, True, True, False]
+    assert summarize(again, 1.0)["cached"] == 2
+
+def test_questions_differing_by_an_operator_do_not_share_sql(tmp_path):
+    """
+    Test that the SQL cache keeps comparison operators and numbers in its keys and ignores files keyed the old way.
+    """
+    # Given
+    path = str(tmp_path / "cache.json")
+    with open(path, "w") as file:
+        json.dump({"show invoices with total 1000": "SELECT 'stale'"}, file)
+    cache = SQLCache(path)
+
+    # When
+    cache.put("Show invoices with total > 1000", "SELECT '>'")
+    cache.save()
+    reloaded = SQLCache(path)
+
+    # Then
+    assert len(cache) == 1
+    for other in ("Show invoices with total < 1000", "Show invoices with total = 1000", "Show invoices with total > 100"):
+        assert reloaded.get(other) is None
+    assert reloaded.get("show invoices with TOTAL > 1000?") == "SELECT '>'"
+
+def test_queries_run_concurrently_while_generation_continues():
+    """
+    Test that each query starts as soon as its SQL is generated and that queries overlap up to the concurrency.
+    """
+    # Given
+    questions = [{"id": str(i), "question": f"question {i}"} for i in range(8)]
+    database = FakeDatabase(delay=0.2)
+
+    def slow_generate(question):
+        time.sleep(0.05)
+        return generate(question)
+
+    # When
+    start = time.perf_counter()
+    results = asyncio.run(run_batch(questions, slow_generate, database.execute, concurrency=4))
+    elapsed = time.perf_counter() - start
+
+    # Then
+    assert all(result["status"] == "ok" for result in results)
+    assert database.peak == 4
+    # Sequential would take 8 * (0.05 + 0.2) = 2 seconds
+    assert elapsed < 1.0
+
+def test_generation_failure_is_reported_per_question():
+    """
+    Test that a question whose SQL cannot be generated fails alone.
+    """
+    # Given
+    def failing_generate(question):
+        if question == "Top 5 clients":
+            raise AttributeError("No SELECT statement found")
+        return generate(question)
+
+    # When
+    results = asyncio.run(run_batch(QUESTIONS[:3], failing_generate, FakeDatabase().execute))
+
+    # Then
+    assert [result["status"] for result in results] == ["ok", "error", "ok"]
+    assert results[1]["sql"] is None and results[1]["row_count"] == 0
+
+def test_questions_and_results_file_formats(tmp_path):
+    """
+    Test reading the question formats and writing the same results as JSON, CSV and Parquet.
+    """
+    # Given
+    (tmp_path / "questions.txt").write_text("Top 5 clients\n\nTotal sales\n")
+    (tmp_path / "questions.jsonl").write_text('{"id": "q1", "question": "Top 5 clients"}\n')
+    (tmp_path / "questions.csv").write_text("id,question\nq1,Top 5 clients\n")
+    results = asyncio.run(run_batch(QUESTIONS[:2], generate, FakeDatabase().execute))
+
+    # When
+    for extension in ("json", "csv", "parquet"):
+        write_results(results, str(tmp_path / f"results.{extension}"))
+
+    # Then
+    assert load_questions(str(tmp_path / "questions.txt")) == [
+        {"id": "1", "question": "Top 5 clients"}, {"id": "2", "question": "Total sales"}]
+    assert load_questions(str(tmp_path / "questions.jsonl")) == load_questions(str(tmp_path / "questions.csv")) == [
+        {"id": "q1", "question": "Top 5 clients"}]
+    written = json.loads((tmp_path / "results.json").read_text())
+    table = pq.read_table(tmp_path / "results.parquet").to_pylist()
+    assert written[0]["rows"] == [{"seller_name": "ACME", "total": 10.5, "day": "2024-01-01"}]
+    assert json.loads(table[0]["rows"]) == written[0]["rows"]
+    assert [row["question"] for row in table] == ["Total sales per seller?", "Top 5 clients"]
+    assert "generate_ms" in (tmp_path / "results.csv").read_text().splitlines()[0]
@@ -0,0 +1,126 @@
+import asyncio
+import uuid
+import chromadb
+import pytest
+import requests
+from chromadb.config import Settings
+from unittest.mock import Mock
+from utils.chroma_client import ChromaDocumentCollection, AsyncChromaDocumentCollection
+from utils.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, call_with_retry
+
+@pytest.fixture
+def collection():
+    client = chromadb.EphemeralClient(settings=Settings(anonymized_telemetry=False, allow_reset=True))
+    collection = ChromaDocumentCollection(
+        client=client,
+        retry_policy=RetryPolicy(max_attempts=2, base_delay=0),
+        batch_size=10
+    )
+    collection.get_document_collection(f"test_{uuid.uuid4().hex}")
+    return collection
+
+def test_retry_then_success():
+    """
+    Test that a transient failure is retried and counted.
+    """
+    # Given
+    func = Mock(side_effect=[ConnectionError("down"), "ok"])
+    breaker = CircuitBreaker(failure_threshold=5)
+
+    # When
+    result = call_with_retry(func, "op", RetryPolicy(max_attempts=3, base_delay=0), breaker)
+
+    # Then
+    assert result == "ok"
+    assert func.call_count == 2
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_circuit_opens_and_rejects():
+    """
+    Test that the breaker opens after repeated failures and rejects further calls.
+    """
+    # Given
+    func = Mock(side_effect=TimeoutError("down"))
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+
+    # When
+    with pytest.raises(Exception):
+        call_with_retry(func, "op", RetryPolicy(max_attempts=2, base_delay=0), breaker)
+
+    # Then
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        call_with_retry(func, "op", RetryPolicy(max_attempts=2, base_delay=0), breaker)
+    assert func.call_count == 2
+
+def test_only_transient_errors_are_retried(collection):
+    """
+    Test that invalid requests fail at once without opening the breaker, while 5xx responses are retried.
+    """
+    # Given
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    client = ChromaDocumentCollection(client=collection.chroma_client, retry_policy=RetryPolicy(max_attempts=5, base_delay=0),
+                                      circuit_breaker=breaker)
+    server_error = requests.HTTPError("503 Server Error", response=Mock(status_code=503))
+    func = Mock(side_effect=[server_error, "ok"])
+    bad_request = Mock(side_effect=requests.HTTPError("400 Client Error", response=Mock(status_code=400)))
+
+    # When
+    with pytest.raises(ValueError):
+        client.get_document_collection("t")
+    with pytest.raises(requests.HTTPError):
+        call_with_retry(bad_request, "op", RetryPolicy(max_attempts=5, base_delay=0), breaker)
+    result = call_with_retry(func, "op", RetryPolicy(max_attempts=5, base_delay=0), breaker)
+
+    # Then
+    assert client.metrics.snapshot()["get_or_create_collection"]["calls"] == 1
+    assert bad_request.call_count == 1 and result == "ok" and func.call_count == 2
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_upsert_and_query_in_batches(collection):
+    """
+    Test that bulk upserts and queries are split into batches and merged back.
+    """
+    # Given
+    ids = [str(i) for i in range(25)]
+    embeddings = [[float(i), 1.0] for i in range(25)]
+
+    # When
+    sent = collection.upsert(ids=ids, embeddings=embeddings, documents=ids)
+    result = collection.query(query_embeddings=embeddings[:12], n_results=1)
+
+    # Then
+    assert sent == 3
+    assert collection.collection.count() == 25
+    assert len(result["ids"]) == 12
+    assert collection.metrics.snapshot()["upsert"]["calls"] == 3
+
+def test_byte_budget_splits_batches(collection):
+    """
+    Test that large records are split by the request size budget.
+    """
+    # Given
+    collection.max_request_bytes = 1000
+    documents = ["x" * 400] * 5
+
+    # When
+    batches = list(collection.iter_batches(len(documents), documents=documents))
+
+    # Then
+    assert batches == [(0, 2), (2, 4), (4, 5)]
+
+def test_async_add(collection):
+    """
+    Test the async variant against the same collection.
+    """
+    # Given
+    client = AsyncChromaDocumentCollection(collection)
+    ids = [str(i) for i in range(15)]
+
+    # When
+    sent = asyncio.run(client.add(ids=ids, embeddings=[[1.0, float(i)] for i in range(15)]))
+    again = asyncio.run(client.add(ids=ids, embeddings=[[1.0, float(i)] for i in range(15)]))
+
+    # Then
+    assert sent == again == 2
+    assert collection.collection.count() == 15
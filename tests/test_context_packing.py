@@ -0,0 +1,78 @@
+from typing import Any, List
+from langchain.schema import Document
+from langchain_core.retrievers import BaseRetriever
+from utils.context_packing import ContextPacker, PackedRetriever, packing_report, strip_overlap
+
+class WordTokenizer:
+    """
+    Stand-in for the flan-t5 tokenizer: one token per word, plus </s> with special tokens.
+    """
+    def encode(self, text, add_special_tokens=True):
+        return text.split() + (["</s>"] if add_special_tokens else [])
+
+class ListRetriever(BaseRetriever):
+    documents: Any
+
+    def _get_relevant_documents(self, query, *, run_manager) -> List[Document]:
+        return list(self.documents)
+
+def render(context, question):
+    return f"Context: {context} Question: {question} Answer:"
+
+def packer(max_input_tokens):
+    return ContextPacker(tokenizer=WordTokenizer(), render=render, max_input_tokens=max_input_tokens, chunk_overlap=40)
+
+def test_prompt_fits_budget_and_reports_truncation():
+    """
+    Test that the packed prompt never exceeds max_input_tokens and that truncation is reported.
+    """
+    # Given
+    candidates = [Document(page_content=f"Sentence {i} about invoices. " * 20, metadata={"source": f"doc{i}"})
+                  for i in range(6)]
+
+    # When
+    packed = packer(120).pack("What about invoices?", candidates)
+
+    # Then
+    assert packed.report["prompt_tokens"] <= 120
+    assert packed.report["prompt_tokens"] == len(WordTokenizer().encode(
+        render("\n\n".join(d.page_content for d in packed.documents), "What about invoices?")))
+    assert packed.report["truncated"] is True
+    assert packed.report["candidates"] == 6
+
+def test_rerank_prefers_relevant_chunks():
+    """
+    Test that a lower ranked chunk matching the question beats unrelated chunks when space is short.
+    """
+    # Given
+    candidates = [
+        Document(page_content="The office is closed on public holidays.", metadata={"source": "a"}),
+        Document(page_content="Opening hours are nine to five.", metadata={"source": "b"}),
+        Document(page_content="Refunds are issued within thirty days of purchase.", metadata={"source": "c"}),
+    ]
+
+    # When
+    packed = packer(19).pack("How are refunds issued?", candidates)
+
+    # Then
+    assert [d.metadata["source"] for d in packed.documents] == ["c"]
+
+def test_chunk_overlap_is_removed():
+    """
+    Test that text repeated by the splitter's chunk overlap is included only once.
+    """
+    # Given
+    shared = "payment is due within thirty days"
+    first = Document(page_content=f"The invoice terms say {shared}", metadata={"source": "terms"})
+    second = Document(page_content=f"{shared} and late fees apply afterwards.", metadata={"source": "terms"})
+    retriever = PackedRetriever(base_retriever=ListRetriever(documents=[first, second]), packer=packer(512))
+
+    # When
+    documents = retriever.get_relevant_documents("When is payment due?")
+
+    # Then
+    context = " ".join(d.page_content for d in documents)
+    assert context.count(shared) == 1
+    assert "late fees apply" in context
+    assert packing_report(documents)["overlap_chars_removed"] == len(shared)
+    assert strip_overlap("abc", "abd", max_overlap=40) == ("abd", 0)
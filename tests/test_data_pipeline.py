@@ -0,0 +1,55 @@
+import datetime
+from decimal import Decimal
+from utils.data_pipeline import DataParser, INVOICE_INFO_COLUMNS, INVOICE_ITEMS_COLUMNS
+from utils.normalize import parse_amount, parse_date
+
+def test_parse_amount():
+    """
+    Test parsing of the amount formats returned by the extraction model.
+    """
+    assert parse_amount("1 234,50") == Decimal("1234.50")
+    assert parse_amount("$ 1,234.5") == Decimal("1234.5")
+    assert parse_amount("10%") == Decimal("10")
+    assert parse_amount("1.234,5") == Decimal("1234.5")
+    assert parse_amount("1.234") == Decimal("1.234")
+    assert parse_amount("1.234 €") == Decimal("1.234")
+    assert parse_amount("$0.125") == Decimal("0.125")
+    assert parse_amount("1,234,567") == Decimal("1234567")
+    assert parse_amount("(5.00)") == Decimal("-5.00")
+    assert parse_amount("($ 1,234.50)") == Decimal("-1234.50")
+    assert parse_amount("-12,50 €") == Decimal("-12.50")
+    assert parse_amount("n/a") is None
+
+def test_parse_date():
+    """
+    Test parsing of the date formats returned by the extraction model.
+    """
+    assert parse_date("2021-03-04") == datetime.date(2021, 3, 4)
+    assert parse_date("12/31/2020") == datetime.date(2020, 12, 31)
+    assert parse_date("someday") is None
+
+def test_parse_data_normalizes_values():
+    """
+    Test that ParseData returns typed rows in the declared column order.
+    """
+    # Given
+    data = {
+        "invoice_number": "51109338", "invoice_date": "04/13/2013",
+        "client_name": "Globex", "client_address": "", "client_tax_id": "994-72-1270",
+        "seller_name": "ACME", "seller_address": "Main St", "seller_tax_id": "985-73-8194",
+        "invoice_iban": "GB81LZWO32519172531418", "total_tax": "$ 8,25", "total": "$ 90,75",
+        "items": [{"description": "Bolt", "quantity": "3,00", "unit": "each", "net_price": "27,50",
+                   "net_worth": "82,50", "tax": "10%", "gross_worth": "90,75"}]
+    }
+
+    # When
+    info, items = DataParser().ParseData(data)
+
+    # Then
+    assert len(info) == len(INVOICE_INFO_COLUMNS)
+    assert info[1] == datetime.date(2013, 4, 13)
+    assert info[7] is None
+    assert info[9:] == (Decimal("8.25"), Decimal("90.75"))
+    assert len(items[0]) == len(INVOICE_ITEMS_COLUMNS)
+    assert items[0] == ("51109338", datetime.date(2013, 4, 13), "Bolt", Decimal("3.00"), "each",
+                        Decimal("27.50"), Decimal("82.50"), Decimal("10"), Decimal("90.75"))
@@ -0,0 +1,79 @@
+import io
+import pytest
+import pypdfium2 as pdfium
+from PIL import Image
+from utils.document_input import detect_mime, image_parts, rasterize_pdf, read_input
+
+def make_png(width, height):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def make_pdf(pages):
+    document = pdfium.PdfDocument.new()
+    for _ in range(pages):
+        document.new_page(612, 792)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+def test_inputs_without_temp_files(tmp_path):
+    """
+    Test that paths, bytes, memoryviews and file-like objects yield the same content.
+    """
+    # Given
+    data = make_png(10, 10)
+    path = tmp_path / "invoice.png"
+    path.write_bytes(data)
+
+    # Then
+    assert read_input(str(path)) == data
+    assert read_input(memoryview(data)) == data
+    assert read_input(io.BytesIO(data)) == data
+    with pytest.raises(FileNotFoundError):
+        read_input(str(tmp_path / "missing.png"))
+
+def test_mime_detection():
+    """
+    Test that the MIME type is detected from the content rather than assumed.
+    """
+    assert detect_mime(make_pdf(1)) == "application/pdf"
+    assert detect_mime(make_png(4, 4)) == "image/png"
+    with pytest.raises(ValueError):
+        detect_mime(b"plain text")
+
+def make_jpeg(width, height):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+def test_images_are_downscaled_and_recompressed():
+    """
+    Test that large images are resized to max_side, JPEG staying JPEG and PNG staying lossless.
+    """
+    # When
+    jpeg = image_parts(make_jpeg(3000, 1500), max_side=1000)
+    png = image_parts(make_png(3000, 1500), max_side=1000)
+    small = image_parts(make_png(100, 50), max_side=1000)
+
+    # Then
+    assert [part["mime_type"] for part in jpeg + png + small] == ["image/jpeg", "image/png", "image/png"]
+    assert Image.open(io.BytesIO(jpeg[0]["data"])).size == (1000, 500)
+    assert Image.open(io.BytesIO(png[0]["data"])).size == (1000, 500)
+    assert small[0]["data"] == make_png(100, 50)
+
+def test_pdf_pages_are_rasterized_in_order():
+    """
+    Test that every page of a PDF becomes one image, in page order, with and without the pool.
+    """
+    # Given
+    data = make_pdf(4)
+
+    # When
+    inline = rasterize_pdf(data, max_side=400, workers=1)
+    pooled = rasterize_pdf(data, max_side=400, workers=2)
+
+    # Then
+    assert len(inline) == len(pooled) == 4
+    assert all(max(Image.open(io.BytesIO(page)).size) <= 400 for page in pooled)
+    assert [part["mime_type"] for part in image_parts(make_pdf(2))] == ["image/jpeg", "image/jpeg"]
@@ -0,0 +1,75 @@
+from utils.index_advisor import ColumnUsage, Recommendation, analyze_plan, normalize_query
+
+TABLE_COLUMNS = {
+    "invoice_info": {"invoice_id", "invoice_date", "seller_name", "client_name", "total"},
+    "invoice_items": {"item_id", "invoice_id", "item_name", "quantity", "sales"},
+}
+
+PLAN = {
+    "Node Type": "Sort",
+    "Sort Key": ["(sum(ii.sales)) DESC"],
+    "Plans": [{
+        "Node Type": "Hash Join",
+        "Hash Cond": "(ii.invoice_id = i.invoice_id)",
+        "Plans": [
+            {"Node Type": "Seq Scan", "Relation Name": "invoice_items", "Alias": "ii"},
+            {"Node Type": "Hash", "Plans": [{
+                "Node Type": "Seq Scan", "Relation Name": "invoice_info", "Alias": "i",
+                "Filter": "((seller_name)::text = 'ACME'::text)"
+            }]}
+        ]
+    }]
+}
+
+def test_normalize_query_groups_literals():
+    """
+    Test that statements differing only in constants share a key.
+    """
+    assert normalize_query("SELECT * FROM invoice_info WHERE total > 100;") == \
+        normalize_query("select *  from invoice_info where total > 250")
+    assert normalize_query("SELECT 1 WHERE seller_name = 'A'") == normalize_query("SELECT 2 WHERE seller_name = 'B'")
+
+def test_analyze_plan_finds_filter_join_and_sort_columns():
+    """
+    Test that plan nodes are resolved to table columns through their aliases.
+    """
+    # Given
+    usage = ColumnUsage()
+
+    # When
+    analyze_plan(PLAN, TABLE_COLUMNS, usage, weight=3)
+
+    # Then
+    assert usage.filters == {("invoice_info", "seller_name"): 3}
+    assert usage.joins == {("invoice_items", "invoice_id"): 3, ("invoice_info", "invoice_id"): 3}
+    assert usage.sorts == {("invoice_items", "sales"): 3}
+
+def test_recommendation_report():
+    """
+    Test the DDL and speedup reported for a recommendation.
+    """
+    # Given
+    recommendation = Recommendation("invoice_items", ("invoice_id",), uses=10,
+                                    expected_cost_before=100.0, expected_cost_after=25.0)
+
+    # Then
+    assert recommendation.ddl == ("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_invoice_items_invoice_id "
+                                  "ON invoice_items (invoice_id)")
+    assert recommendation.to_dict()["expected_speedup"] == 4.0
+
+def test_partitioned_recommendation_builds_each_partition_concurrently():
+    """
+    Test that an index on a partitioned table is created on the parent only, built concurrently per partition and attached.
+    """
+    # Given
+    recommendation = Recommendation("invoice_items", ("invoice_id",), uses=10,
+                                    partitions=("invoice_items_2024", "invoice_items_default"))
+
+    # Then
+    assert recommendation.statements == [
+        "CREATE INDEX IF NOT EXISTS idx_invoice_items_invoice_id ON ONLY invoice_items (invoice_id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_invoice_items_2024_invoice_id ON invoice_items_2024 (invoice_id)",
+        "ALTER INDEX idx_invoice_items_invoice_id ATTACH PARTITION idx_invoice_items_2024_invoice_id",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_invoice_items_default_invoice_id ON invoice_items_default (invoice_id)",
+        "ALTER INDEX idx_invoice_items_invoice_id ATTACH PARTITION idx_invoice_items_default_invoice_id",
+    ]
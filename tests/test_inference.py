@@ -0,0 +1,33 @@
+import pytest
+from utils import inference
+from utils.inference import create_embeddings, load_seq2seq, onnx_path
+
+def test_onnx_paths_per_backend(monkeypatch):
+    """
+    Test that the fp32 and int8 exports of a model live in separate directories.
+    """
+    monkeypatch.setattr(inference, "ONNX_MODEL_DIR", "exports")
+    assert onnx_path("google/flan-t5-large", "onnx") == "exports/flan-t5-large"
+    assert onnx_path("sentence-transformers/all-MiniLM-L6-v2", "onnx-int8") == "exports/all-MiniLM-L6-v2-int8"
+
+def test_unknown_backend_is_rejected():
+    """
+    Test that a misspelled backend fails before any model is loaded.
+    """
+    with pytest.raises(ValueError):
+        create_embeddings(backend="tensorrt")
+    with pytest.raises(ValueError):
+        load_seq2seq(backend="fp16")
+
+def test_missing_export_points_to_export_command(monkeypatch, tmp_path):
+    """
+    Test that selecting an ONNX backend without an export explains how to create it.
+    """
+    # Given
+    monkeypatch.setattr(inference, "ONNX_MODEL_DIR", str(tmp_path))
+
+    # Then
+    with pytest.raises(FileNotFoundError, match="export_models.py"):
+        create_embeddings(backend="onnx-int8")
+    with pytest.raises(FileNotFoundError, match="export_models.py"):
+        load_seq2seq(backend="onnx")
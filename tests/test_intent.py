@@ -0,0 +1,63 @@
+import zlib
+import numpy as np
+import pytest
+from utils.intent import IntentClassifier, RouteStats, SEED_EXAMPLES, load_examples
+
+def bag_of_words(texts, dim=256):
+    """
+    Deterministic stand-in for the sentence embedding model.
+    """
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in text.lower().replace("?", " ").replace(",", " ").split():
+            vectors[row, zlib.crc32(word.encode()) % dim] += 1
+    return vectors
+
+@pytest.fixture
+def classifier():
+    return IntentClassifier(embed=bag_of_words).fit(SEED_EXAMPLES)
+
+def test_routes_training_questions(classifier):
+    """
+    Test that the head fits the labeled examples and reports a validation accuracy.
+    """
+    predicted = [classifier.predict(text)[0] for text, _ in SEED_EXAMPLES]
+    accuracy = np.mean([p == route for p, (_, route) in zip(predicted, SEED_EXAMPLES)])
+    assert accuracy > 0.9
+    assert 0 <= classifier.validation_accuracy <= 1
+
+def test_low_confidence_routes_to_both(classifier):
+    """
+    Test that an uncertain prediction is sent to both paths.
+    """
+    # Given
+    classifier.min_confidence = 1.0
+
+    # When
+    route, scores = classifier.predict("How many invoices were issued in 2021?")
+
+    # Then
+    assert route == "both"
+    assert abs(sum(scores.values()) - 1) < 1e-5
+
+def test_route_stats_and_extra_examples(tmp_path):
+    """
+    Test accuracy on labeled requests and loading of extra examples from JSONL.
+    """
+    # Given
+    stats = RouteStats()
+    path = tmp_path / "examples.jsonl"
+    path.write_text('{"text": "Total per seller", "route": "sql"}\n{"text": "x", "route": "unknown"}\n')
+
+    # When
+    stats.record("sql", 0.002, expected="sql")
+    stats.record("vector", 0.004, expected="sql")
+    stats.record("both", 0.003)
+
+    # Then
+    snapshot = stats.snapshot()
+    assert snapshot["routes"] == {"sql": 1, "vector": 1, "both": 1}
+    assert snapshot["accuracy"] == 0.5
+    assert snapshot["classifier_p50_ms"] == 3.0
+    assert load_examples(str(path))[-1] == ("Total per seller", "sql")
+    assert len(load_examples(str(path))) == len(SEED_EXAMPLES) + 1
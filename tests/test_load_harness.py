@@ -0,0 +1,86 @@
+import time
+import asyncio
+from collections import Counter
+from utils.fake_llm import FakeLLM
+from utils.load_harness import Scenario, arrival_times, plan_requests, run_plan, summarize
+
+CORPUS = [
+    {"endpoint": "/sqlQuery", "text": f"SQL question {i}"} for i in range(10)
+] + [
+    {"endpoint": "/ask", "text": "What is the return policy?", "route": "vector"},
+]
+
+def test_arrival_patterns():
+    """
+    Test the number and spacing of constant, poisson and burst arrivals.
+    """
+    # When
+    constant = arrival_times({"type": "constant", "rate": 4}, duration=10)
+    poisson = arrival_times({"type": "poisson", "rate": 50}, duration=10, seed=1)
+    burst = arrival_times({"type": "burst", "rate": 0, "burst_size": 5, "burst_interval": 4}, duration=10)
+
+    # Then
+    assert len(constant) == 40 and constant[1] - constant[0] == 0.25
+    assert 400 < len(poisson) < 600 and max(poisson) < 10
+    assert Counter(burst) == {0.0: 5, 4.0: 5, 8.0: 5}
+
+def test_plan_follows_mix_and_repeat():
+    """
+    Test that the plan follows the endpoint mix and sends repeated requests to the hot questions.
+    """
+    # Given
+    scenario = Scenario(name="t", duration=100, mix={"/sqlQuery": 0.75, "/ask": 0.25},
+                        arrival={"type": "constant", "rate": 10}, repeat=1.0, hot_questions=2)
+
+    # When
+    plan = plan_requests(scenario, CORPUS, seed=3)
+
+    # Then
+    endpoints = Counter(endpoint for _, endpoint, _ in plan)
+    assert 0.7 < endpoints["/sqlQuery"] / len(plan) < 0.8
+    assert {body["text"] for _, endpoint, body in plan if endpoint == "/sqlQuery"} == {"SQL question 0", "SQL question 1"}
+    assert all(body["route"] == "vector" for _, endpoint, body in plan if endpoint == "/ask")
+
+def test_open_loop_latency_and_slo_report():
+    """
+    Test that latency includes the wait behind a saturated server and that SLO violations are reported.
+    """
+    # Given
+    server = asyncio.Semaphore(1)
+
+    async def send(endpoint, body):
+        # A single-worker server taking 20 ms per request; "fail" questions return HTTP 500
+        async with server:
+            await asyncio.sleep(0.02)
+        return (500 if body["text"] == "fail" else 200), 100
+
+    plan = [(0.0, "/sqlQuery", {"text": "ok"}) for _ in range(10)] + [(0.0, "/ask", {"text": "fail"})]
+    scenario = Scenario(name="t", duration=1, slo={"p99_ms": 100, "error_rate": 0.05})
+
+    # When
+    results, wall = asyncio.run(run_plan(plan, send))
+    summary = summarize(scenario, results, wall)
+
+    # Then
+    assert summary["overall"]["p99_ms"] >= 150
+    assert summary["endpoints"]["/ask"]["error_rate"] == 1.0
+    assert summary["error_kinds"] == {"HTTP 500": 1}
+    assert len(summary["violations"]) == 2
+
+def test_fake_llm_latency_and_recorded_responses():
+    """
+    Test that the fake LLM answers recorded questions after latency plus output tokens at the token rate.
+    """
+    # Given
+    llm = FakeLLM(responses={"how many invoices": "SELECT COUNT(*) FROM invoice_info"},
+                  latency=0.05, tokens_per_second=100)
+
+    # When
+    start = time.perf_counter()
+    output = llm.invoke("Question: How many invoices? Just SQL query:")
+    elapsed = time.perf_counter() - start
+
+    # Then
+    assert output == "SELECT COUNT(*) FROM invoice_info"
+    assert elapsed >= 0.05 + 4 / 100
+    assert llm.invoke("Create a MongoDB aggregation pipeline for: anything").startswith("[")
@@ -0,0 +1,90 @@
+import io
+import json
+import pytest
+from utils.logger import configure_logging, create_logger, request_id_var, shutdown_logging
+
+@pytest.fixture
+def output():
+    """
+    Route the background writer to a buffer; read() flushes the queue and returns the JSON records.
+    """
+    stream = io.StringIO()
+    configure_logging(stream=stream, log_format="json")
+
+    def read():
+        shutdown_logging()
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    yield read
+    configure_logging()
+
+def test_repeated_create_logger_does_not_duplicate_output(output):
+    """
+    Test that creating the same logger twice writes each record once.
+    """
+    # Given
+    create_logger("test_idempotent")
+    logger = create_logger("test_idempotent")
+
+    # When
+    logger.info("once")
+
+    # Then
+    assert [record["message"] for record in output()] == ["once"]
+    assert len(logger.handlers) == 1
+
+def test_records_are_json_with_request_id_and_extra_fields(output):
+    """
+    Test that records carry the request ID of the caller's context and the extra fields.
+    """
+    # Given
+    logger = create_logger("test_json")
+    token = request_id_var.set("req-42")
+
+    # When
+    try:
+        logger.info("Query done in %.1f ms", 12.5, extra={"rows": 3})
+    finally:
+        request_id_var.reset(token)
+    logger.warning("no request")
+
+    # Then
+    first, second = output()
+    assert first["message"] == "Query done in 12.5 ms"
+    assert first["request_id"] == "req-42"
+    assert first["rows"] == 3
+    assert first["logger"] == "test_json"
+    assert second["request_id"] is None
+
+def test_sampling_and_truncation(output):
+    """
+    Test that sampling drops only records below WARNING and that long messages are truncated.
+    """
+    # Given
+    logger = create_logger("test_sampled", sample_rate=0.0, max_chars=10)
+
+    # When
+    for _ in range(5):
+        logger.info("dropped")
+    logger.warning("x" * 50)
+
+    # Then
+    records = output()
+    assert len(records) == 1
+    assert records[0]["message"] == "x" * 10 + "... [40 chars truncated]"
+
+def test_records_after_shutdown_are_written_directly(output):
+    """
+    Test that records logged after shutdown_logging stopped the background writer are still written.
+    """
+    # Given
+    logger = create_logger("test_shutdown")
+    logger.info("before")
+    output()
+
+    # When
+    logger.info("after")
+    logger.warning("still after")
+
+    # Then
+    assert [record["message"] for record in output()] == ["before", "after", "still after"]
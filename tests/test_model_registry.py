@@ -0,0 +1,122 @@
+import time
+import threading
+
+import pytest
+from utils import model_registry
+from utils.model_registry import ModelRegistry
+
+@pytest.fixture
+def memory(monkeypatch):
+    """
+    Simulated process RSS in MB: every loader adds its model size.
+    """
+    state = {"rss": 100.0}
+    monkeypatch.setattr(model_registry, "rss_mb", lambda: state["rss"])
+    monkeypatch.setattr(model_registry, "_release_memory", lambda: None)
+    return state
+
+def loader(memory, name, size):
+    def load():
+        memory["rss"] += size
+        return name
+    return load
+
+@pytest.fixture
+def registry(memory):
+    registry = ModelRegistry(budget_mb=1000)
+    registry.register("sql_llm", loader(memory, "sql_llm", 600))
+    registry.register("seq2seq", loader(memory, "seq2seq", 300))
+    registry.register("embeddings", loader(memory, "embeddings", 200), pinned=True)
+    return registry
+
+def loaded(registry):
+    return {model["name"] for model in registry.status()["models"] if model["loaded"]}
+
+def test_models_load_on_first_use(registry):
+    """
+    Test that nothing is loaded before use and that load size and time are recorded.
+    """
+    # Given
+    assert loaded(registry) == set()
+
+    # When
+    with registry.use("seq2seq") as model:
+        pass
+
+    # Then
+    status = registry.status()
+    assert model == "seq2seq"
+    assert loaded(registry) == {"seq2seq"}
+    assert status["loaded_mb"] == 300
+    assert [event["event"] for event in status["events"]] == ["load"]
+
+def test_budget_evicts_least_recently_used(registry):
+    """
+    Test that loading over budget evicts the least recently used unpinned model, never a pinned one.
+    """
+    # Given
+    with registry.use("embeddings"):
+        pass
+    with registry.use("seq2seq"):
+        pass
+
+    # When
+    with registry.use("sql_llm"):
+        pass
+
+    # Then
+    assert loaded(registry) == {"embeddings", "sql_llm"}
+    assert registry.status()["events"][-1]["event"] == "evict"
+    assert registry.status()["events"][-1]["model"] == "seq2seq"
+
+def test_models_in_use_are_not_evicted(registry):
+    """
+    Test that a model held by a request survives budget pressure and idle eviction.
+    """
+    # Given
+    registry.idle_ttl = 1e-9
+
+    # When
+    with registry.use("seq2seq"):
+        with registry.use("sql_llm"):
+            with registry.use("embeddings"):
+                still_loaded = loaded(registry)
+        assert registry.evict("seq2seq") is False
+
+    # Then
+    assert still_loaded == {"seq2seq", "sql_llm", "embeddings"}
+    registry.evict_idle()
+    assert loaded(registry) == {"embeddings"}
+
+def test_model_is_used_by_one_thread_at_a_time_and_requests_go_first(registry):
+    """
+    Test that concurrent users of a model never overlap and that a background user waits for queued requests.
+    """
+    # Given
+    order, running, peak = [], [0], [0]
+
+    def work(label, background=False, hold=0.05):
+        with registry.use("sql_llm", background=background):
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            order.append(label)
+            time.sleep(hold)
+            running[0] -= 1
+
+    # When
+    first = threading.Thread(target=work, args=("request 1",), kwargs={"hold": 0.2})
+    first.start()
+    time.sleep(0.05)
+    background = threading.Thread(target=work, args=("prewarm",), kwargs={"background": True})
+    background.start()
+    time.sleep(0.05)
+    others = [threading.Thread(target=work, args=(f"request {i}",)) for i in (2, 3)]
+    for thread in others:
+        thread.start()
+    for thread in [first, background] + others:
+        thread.join()
+
+    # Then
+    assert peak[0] == 1
+    assert order[0] == "request 1" and order[-1] == "prewarm"
+    assert registry.status()["models"][0]["waiting"] == 0
@@ -0,0 +1,103 @@
+import json
+
+import mongomock
+import pytest
+from unittest.mock import Mock
+from utils.mongo_client import (
+    MongoConnector, MongoQueryBuilder, PipelineValidationError, extract_pipeline, normalize_question
+)
+
+@pytest.fixture
+def connector():
+    connector = MongoConnector(client=mongomock.MongoClient(), database="test", collection="invoices")
+    connector.collection.insert_many([
+        {"invoice_no": "1", "seller": {"name": "ACME"}, "summary": {"gross_total": 10}},
+        {"invoice_no": "2", "seller": {"name": "ACME"}, "summary": {"gross_total": 5}},
+        {"invoice_no": "3", "seller": {"name": "Globex"}, "summary": {"gross_total": 7}},
+    ])
+    return connector
+
+@pytest.fixture
+def llm_chain():
+    chain = Mock()
+    chain.invoke.return_value = {"text": """```json
+    [{"$group": {"_id": "$seller.name", "total": {"$sum": "$summary.gross_total"}}},
+     {"$sort": {"total": -1}}]
+    ```"""}
+    return chain
+
+def test_normalize_question():
+    """
+    Test that case, punctuation and whitespace do not change the cache key.
+    """
+    assert normalize_question("Total by seller?") == normalize_question("  total   BY seller ")
+
+def test_normalize_question_keeps_operators():
+    """
+    Test that questions differing only by an operator, sign or number get different cache keys.
+    """
+    keys = {normalize_question(f"Invoices with total {operator} 100?") for operator in (">", "<", "=", ">=", "!=")}
+    assert len(keys) == 5
+    assert normalize_question("Net worth -5%") != normalize_question("Net worth +5%")
+    assert normalize_question("Top 5 clients") != normalize_question("Top 50 clients")
+
+def test_extract_pipeline_rejects_write_stages():
+    """
+    Test that pipelines writing to the database are rejected.
+    """
+    with pytest.raises(PipelineValidationError):
+        extract_pipeline('[{"$match": {}}, {"$out": "stolen"}]')
+    with pytest.raises(PipelineValidationError):
+        extract_pipeline("no pipeline here")
+
+def test_extract_pipeline_rejects_nested_javascript_and_foreign_collections():
+    """
+    Test that JavaScript operators are rejected at any depth and lookups only read allowed collections.
+    """
+    # Given
+    rejected = [
+        [{"$match": {"$where": "sleep(1000)"}}],
+        [{"$match": {"$expr": {"$function": {"body": "return 1", "args": [], "lang": "js"}}}}],
+        [{"$group": {"_id": None, "total": {"$accumulator": {"init": "function() {}"}}}}],
+        [{"$lookup": {"from": "users", "localField": "a", "foreignField": "b", "as": "c"}}],
+        [{"$lookup": {"from": "invoices", "as": "c", "pipeline": [{"$unionWith": "users"}]}}],
+        [{"$facet": {"written": [{"$merge": "stolen"}]}}],
+        [{"$unionWith": {"coll": "users"}}],
+    ]
+    allowed = [{"$lookup": {"from": "invoices", "as": "same_seller",
+                            "pipeline": [{"$match": {"$expr": {"$gt": ["$summary.gross_total", 5]}}}]}},
+               {"$unionWith": "invoices"}]
+
+    # When / Then
+    for pipeline in rejected:
+        with pytest.raises(PipelineValidationError):
+            extract_pipeline(json.dumps(pipeline))
+    assert extract_pipeline(json.dumps(allowed)) == allowed
+
+def test_run_uses_cache(connector, llm_chain):
+    """
+    Test that the pipeline is generated once and executed against MongoDB.
+    """
+    # Given
+    builder = MongoQueryBuilder(llm=Mock(), connector=connector)
+    builder._chain = llm_chain
+
+    # When
+    first = builder.run("Total sales by seller?")
+    second = builder.run("total sales by seller")
+
+    # Then
+    assert first == [{"_id": "ACME", "total": 15}, {"_id": "Globex", "total": 7}]
+    assert second == first
+    assert llm_chain.invoke.call_count == 1
+    assert builder.cache.hits == 1
+
+def test_aggregate_streams_batches(connector):
+    """
+    Test that results are streamed in batches of the requested size.
+    """
+    # When
+    batches = list(connector.aggregate([{"$project": {"_id": 0, "invoice_no": 1}}], batch_size=2))
+
+    # Then
+    assert [len(batch) for batch in batches] == [2, 1]
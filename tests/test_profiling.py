@@ -0,0 +1,114 @@
+import time
+import marshal
+import tracemalloc
+import threading
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.testclient import TestClient
+from utils import profiling
+from utils.profiling import SamplingProfiler, install_profiling
+
+ADMIN = {"X-Admin-Token": "secret"}
+
+def busy_work(seconds):
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += sum(range(1000))
+    return total
+
+def make_client(monkeypatch):
+    """
+    A small app with one endpoint that does work in a worker thread, like /sqlQuery.
+    """
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    worker = profiling.profiled_in_thread(lambda: busy_work(0.05))
+    app = FastAPI()
+
+    @app.get("/work")
+    async def work():
+        return {"total": await run_in_threadpool(worker)}
+
+    install_profiling(app, admin_token="secret")
+    return TestClient(app)
+
+def test_disabled_without_admin_token(monkeypatch):
+    """
+    Test that nothing is installed or wrapped when no admin token is configured.
+    """
+    # Given
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", False)
+    app = FastAPI()
+
+    # When
+    profiler = install_profiling(app, admin_token="")
+
+    # Then
+    assert profiler is None
+    assert not any(route.path.startswith("/admin") for route in app.routes)
+    assert profiling.profiled_in_thread(busy_work) is busy_work
+
+def test_request_profile_covers_worker_threads(monkeypatch):
+    """
+    Test that a request sent with X-Profile is profiled in the worker thread and downloadable as pstats.
+    """
+    # Given
+    client = make_client(monkeypatch)
+
+    # When
+    unprofiled = client.get("/work", headers={"X-Profile": "1"})
+    response = client.get("/work", headers={"X-Profile": "1", **ADMIN})
+    profile_id = response.headers["X-Profile-Id"]
+    download = client.get(f"/admin/profile/requests/{profile_id}", params={"format": "pstats"}, headers=ADMIN)
+
+    # Then
+    assert "X-Profile-Id" not in unprofiled.headers
+    assert client.get("/admin/profile/requests").status_code == 401
+    stats = marshal.loads(download.content)
+    assert any(function == "busy_work" for (_, _, function) in stats)
+    text = client.get(f"/admin/profile/requests/{profile_id}", headers=ADMIN).text
+    assert "busy_work" in text
+
+def test_sampling_profiler_collapsed_stacks():
+    """
+    Test that the sampling profiler sees a busy thread and reports collapsed stacks.
+    """
+    # Given
+    profiler = SamplingProfiler(interval=0.001)
+    worker = threading.Thread(target=busy_work, args=(0.3,), name="busy")
+
+    # When
+    worker.start()
+    profiler.start(seconds=0.2)
+    time.sleep(0.25)
+    profiler.stop()
+    worker.join()
+
+    # Then
+    lines = profiler.collapsed().splitlines()
+    assert profiler.samples > 10
+    assert any(line.startswith("busy;") and "busy_work" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+def test_allocations_tracked_per_endpoint(monkeypatch):
+    """
+    Test that tracemalloc snapshots and per-endpoint allocations are served while tracing.
+    """
+    # Given
+    client = make_client(monkeypatch)
+    client.post("/admin/tracemalloc/start", headers=ADMIN)
+
+    # When
+    try:
+        client.get("/admin/tracemalloc/snapshot", headers=ADMIN)
+        client.get("/work")
+        client.get("/work")
+        snapshot = client.get("/admin/tracemalloc/snapshot", headers=ADMIN).json()
+        endpoints = client.get("/admin/tracemalloc/endpoints", headers=ADMIN).json()
+    finally:
+        client.post("/admin/tracemalloc/stop", headers=ADMIN)
+
+    # Then
+    assert endpoints["GET /work"]["requests"] == 2
+    assert snapshot["top"] and "growth" in snapshot
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,123 @@
+import time
+
+from utils.query_history import AnswerCache, Prewarmer, QueryHistory
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def test_answer_cache_evicts_least_recently_used():
+    """
+    Test that the answer cache keys by normalized question and evicts the least recently used answer.
+    """
+    # Given
+    cache = AnswerCache(maxsize=2)
+    cache.put("Total sales?", "a")
+    cache.put("Top clients", "b")
+
+    # When
+    cache.get("total SALES")
+    cache.put("Top sellers", "c")
+
+    # Then
+    assert "total sales" in cache and cache.get("Total sales?") == "a"
+    assert "Top clients" not in cache and cache.get("top sellers") == "c"
+
+def test_top_ranks_by_recency_weighted_frequency(tmp_path):
+    """
+    Test that scores decay with the half-life, so recent questions outrank older frequent ones, and errors are not ranked.
+    """
+    # Given
+    clock = Clock()
+    history = QueryHistory(str(tmp_path / "history.sqlite"), half_life=3600, background=False, clock=clock)
+    for _ in range(4):
+        history.record("sql", "Total sales per seller?", 2.0, sql="SELECT 1")
+    clock.now += 3 * 3600
+    for _ in range(2):
+        history.record("sql", "top clients", 1.0, sql="SELECT 2")
+    history.record("sql", "Broken question", 0.5, status="error")
+    history.record("vector", "What is an invoice?", 1.0)
+
+    # When
+    written = history.flush()
+    top = history.top("sql", 5)
+
+    # Then
+    assert written == 8
+    assert [question["normalized"] for question in top] == ["top clients", "total sales per seller"]
+    assert top[1]["count"] == 4 and abs(top[1]["score"] - 0.5) < 1e-9 and top[1]["sql"] == "SELECT 1"
+    assert abs(history.total_score("sql") - 2.5) < 1e-9
+    history.close()
+
+def test_prewarm_skips_cached_questions_and_reports_coverage(tmp_path):
+    """
+    Test that a run warms only uncached top questions, reports failures and predicted coverage, and measures hits afterwards.
+    """
+    # Given
+    history = QueryHistory(str(tmp_path / "history.sqlite"), background=False)
+    for question, times in (("q1", 5), ("q2", 2), ("fails", 2), ("q3", 1)):
+        for _ in range(times):
+            history.record("sql", question, 1.0)
+    history.flush()
+    cache = AnswerCache()
+    cache.put("q1", ["cached"])
+
+    def warm(question):
+        if question["question"] == "fails":
+            raise ValueError("syntax error")
+        cache.put(question["question"], ["rows"])
+
+    prewarmer = Prewarmer(history, {"sql": (cache.__contains__, warm)}, top_n=3)
+
+    # When
+    report = prewarmer.run("startup")
+    history.record("sql", "q2", 0.01, cached=True)
+    history.record("sql", "new question", 1.0)
+    history.flush()
+    status = prewarmer.status()
+
+    # Then
+    stats = report["endpoints"]["sql"]
+    assert (stats["questions"], stats["already_cached"], stats["warmed"], stats["failed"]) == (3, 1, 1, 1)
+    assert stats["predicted_coverage"] == 0.9 and "q2" in cache
+    assert status["coverage"]["sql"] == {"requests": 2, "warmed_share": 0.5, "cache_hit_rate": 0.5}
+    history.close()
+
+def test_ingestion_mark_invalidates_and_prewarms_again(tmp_path):
+    """
+    Test that the background prewarmer runs at startup, then clears the stale cache and reruns after an ingestion mark.
+    """
+    # Given
+    path = str(tmp_path / "history.sqlite")
+    history = QueryHistory(path, background=False)
+    history.record("vector", "What is an invoice?", 1.0)
+    history.flush()
+    cache = AnswerCache()
+    warmed = []
+
+    def warm(question):
+        warmed.append(question["question"])
+        cache.put(question["question"], "answer")
+
+    prewarmer = Prewarmer(history, {"vector": (cache.__contains__, warm)}, invalidate={"vectors": cache.clear},
+                          poll_interval=0.05, nice=0)
+
+    # When
+    prewarmer.start()
+    deadline = time.time() + 5
+    while prewarmer.last_run is None and time.time() < deadline:
+        time.sleep(0.02)
+    ingestion = QueryHistory(path, background=False)
+    ingestion.mark_ingestion("vectors")
+    ingestion.close()
+    while prewarmer.last_run["trigger"] == "startup" and time.time() < deadline:
+        time.sleep(0.02)
+    prewarmer.stop()
+
+    # Then
+    assert warmed == ["What is an invoice?", "What is an invoice?"]
+    assert prewarmer.last_run["trigger"] == "ingestion:vectors"
+    history.close()
@@ -0,0 +1,85 @@
+import pytest
+from unittest.mock import MagicMock
+from utils import database_connector, replicas
+from utils.database_connector import DatabaseConnector
+from utils.replicas import ReplicaRouter
+
+def fake_connect(lags):
+    """
+    Build a psycopg2.connect replacement returning the given lag per DSN (an Exception means down).
+    """
+    def connect(dsn=None, **kwargs):
+        lag = lags.get(dsn, 0)
+        if isinstance(lag, Exception):
+            raise lag
+        connection = MagicMock()
+        connection.dsn = dsn
+        connection.cursor.return_value.__enter__.return_value.fetchone.return_value = (lag,)
+        return connection
+    return connect
+
+@pytest.fixture
+def router(monkeypatch):
+    monkeypatch.setattr(replicas.psycopg2, "connect", fake_connect({"reader2": 30.0}))
+    router = ReplicaRouter(["reader1", "reader2", "reader3"], max_lag=5)
+    router.check_all()
+    return router
+
+def test_lagging_reader_is_skipped(router):
+    """
+    Test that readers lagging more than max_lag receive no reads.
+    """
+    picked = {router.pick() for _ in range(4)}
+    assert picked == {"reader1", "reader3"}
+
+def test_least_loaded_reader_is_picked(router):
+    """
+    Test that a reader with connections in use is skipped while another is idle.
+    """
+    # Given
+    first = router.pick()
+
+    # When
+    second = router.pick()
+    router.release(first)
+    third = router.pick()
+
+    # Then
+    assert first != second
+    assert third == first
+
+def test_failback_to_primary(monkeypatch):
+    """
+    Test that reads go to the primary when no reader is healthy, and to a reader once it recovers.
+    """
+    # Given
+    lags = {"reader1": Exception("down")}
+    monkeypatch.setattr(replicas.psycopg2, "connect", fake_connect(lags))
+    monkeypatch.setattr(database_connector.psycopg2, "connect", fake_connect(lags))
+    router = ReplicaRouter(["reader1"], max_lag=5)
+    router.check_all()
+    connector = DatabaseConnector(dsn="primary", readonly=True, router=router)
+
+    # When
+    connector.create_connection()
+    on_primary = connector.connection.dsn
+    connector.close_connection()
+    lags["reader1"] = 0
+    router.check_all()
+    connector.create_connection()
+    on_reader = connector.connection.dsn
+    connector.close_connection()
+
+    # Then
+    assert on_primary == "primary"
+    assert on_reader == "reader1"
+    assert router.status()[0]["in_use"] == 0
+
+def test_writes_go_to_primary(router, monkeypatch):
+    """
+    Test that connectors that are not read-only never use a reader.
+    """
+    monkeypatch.setattr(database_connector.psycopg2, "connect", fake_connect({}))
+    connector = DatabaseConnector(dsn="primary", router=router)
+    connector.create_connection()
+    assert connector.connection.dsn == "primary"
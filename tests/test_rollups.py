@@ -0,0 +1,102 @@
+import datetime
+from decimal import Decimal
+from unittest.mock import MagicMock, Mock
+from utils.data_pipeline import SQLQueryBuilder
+from utils.rollups import RollupManager, RollupRouter
+
+INFO_SQL = SQLQueryBuilder.build_insert_query(
+    table_name="public.invoice_info",
+    columns=("invoice_id", "invoice_date", "seller_name", "client_name", "total_tax", "total")
+)
+ITEMS_SQL = SQLQueryBuilder.build_insert_query(
+    table_name="invoice_items",
+    columns=("invoice_id", "item_name", "quantity", "net_worth", "sales")
+)
+
+def test_apply_upserts_deltas():
+    """
+    Test that an insert batch is aggregated into one upsert per rollup table.
+    """
+    # Given
+    cursor = Mock()
+    batch = [
+        (INFO_SQL, ("1", "2021-03-04", "ACME", "Globex", "1,00", "10,00")),
+        (INFO_SQL, ("2", "2021-03-20", "ACME", "Initech", "2,00", "20,00")),
+        (ITEMS_SQL, ("1", "Bolt", "3", "9,00", "9,90")),
+    ]
+
+    # When
+    RollupManager().apply(cursor, batch)
+
+    # Then
+    calls = {call.args[0].split()[2]: call.args[1] for call in cursor.executemany.call_args_list}
+    assert calls["rollup_seller"] == [("ACME", Decimal(2), Decimal("30.00"), Decimal("3.00"))]
+    assert calls["rollup_month"] == [(datetime.date(2021, 3, 1), Decimal(2), Decimal("30.00"), Decimal("3.00"))]
+    assert calls["rollup_item"] == [("Bolt", Decimal(1), Decimal(3), Decimal("9.00"), Decimal("9.90"))]
+    assert len(calls["rollup_client"]) == 2
+
+def test_null_keys_are_rolled_up_as_their_own_group():
+    """
+    Test that a NULL seller is aggregated like GROUP BY does, into a row the NULL-safe unique key can upsert.
+    """
+    # Given
+    cursor = Mock()
+    batch = [
+        (INFO_SQL, ("1", "2021-03-04", None, "Globex", "1,00", "10,00")),
+        (INFO_SQL, ("2", "2021-03-20", None, "Globex", "2,00", "20,00")),
+        (INFO_SQL, ("3", None, "ACME", "Globex", "3,00", "30,00")),
+    ]
+
+    # When
+    RollupManager().apply(cursor, batch)
+
+    # Then
+    calls = {call.args[0].split()[2]: call.args for call in cursor.executemany.call_args_list}
+    query, rows = calls["rollup_seller"]
+    assert rows == [(None, Decimal(2), Decimal("30.00"), Decimal("3.00"))]
+    assert "ON CONFLICT ((seller_name IS NULL), (COALESCE(seller_name, ''))) DO UPDATE" in query
+
+def test_repair_locks_the_rollups_inside_one_snapshot():
+    """
+    Test that check_consistency reads in a REPEATABLE READ transaction and that a repair locks the rollup tables first.
+    """
+    # Given
+    connection = MagicMock()
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.__iter__.return_value = iter([])
+    cursor.fetchall.return_value = [("ACME", 1, 10, 1)]
+
+    # When
+    mismatches = RollupManager().check_consistency(connection, repair=True)
+
+    # Then
+    statements = [call.args[0] for call in cursor.execute.call_args_list]
+    assert statements[:2] == [
+        "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ",
+        "LOCK TABLE rollup_seller, rollup_client, rollup_month, rollup_item IN EXCLUSIVE MODE",
+    ]
+    assert mismatches["rollup_seller"] == 1 and "DELETE FROM rollup_seller" in statements
+    connection.commit.assert_called_once()
+
+def test_router_rewrites_aggregates():
+    """
+    Test that supported aggregate shapes are routed to the rollup tables.
+    """
+    router = RollupRouter()
+    assert router.rewrite(
+        "SELECT seller_name, SUM(total) AS total_sales FROM invoice_info GROUP BY seller_name ORDER BY total_sales DESC LIMIT 5;"
+    ) == "SELECT seller_name AS seller_name, total_sum AS total_sales FROM rollup_seller ORDER BY total_sales DESC LIMIT 5"
+    assert router.rewrite(
+        "SELECT item_name, SUM(quantity) FROM invoice_items GROUP BY item_name ORDER BY SUM(quantity) DESC"
+    ) == "SELECT item_name AS item_name, quantity_sum AS sum FROM rollup_item ORDER BY sum DESC"
+    assert router.rewrite(
+        "SELECT date_trunc('month', invoice_date) AS month, COUNT(*) AS n FROM invoice_info GROUP BY 1"
+    ) == "SELECT month::timestamp AS month, invoice_count AS n FROM rollup_month"
+
+def test_router_ignores_other_queries():
+    """
+    Test that filtered or joined queries are left untouched.
+    """
+    router = RollupRouter()
+    assert router.rewrite("SELECT seller_name, SUM(total) FROM invoice_info WHERE total > 10 GROUP BY seller_name") is None
+    assert router.rewrite("SELECT * FROM invoice_info") is None
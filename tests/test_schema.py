@@ -0,0 +1,31 @@
+from unittest.mock import Mock
+from utils.schema import ensure_partitions
+
+def test_ensure_partitions_moves_default_rows_before_attaching():
+    """
+    Test that a year with rows in the default partition is filled from it and attached, instead of created in place.
+    """
+    # Given
+    cursor = Mock()
+    # Neither 2024 partition exists, both default partitions exist, both hold 2024 rows
+    cursor.fetchone.side_effect = [(False,), (False,), (True,), (True,), (True,), (True,)]
+
+    # When
+    ensure_partitions(cursor, 2024, 2024)
+
+    # Then
+    statements = [" ".join(call.args[0].split()[:4]) for call in cursor.execute.call_args_list[4:]]
+    assert statements == [
+        "LOCK TABLE invoice_info_default, invoice_items_default",
+        "SELECT EXISTS (SELECT 1",
+        "SELECT EXISTS (SELECT 1",
+        "CREATE TABLE invoice_info_2024 (LIKE",
+        "INSERT INTO invoice_info_2024 SELECT",
+        "CREATE TABLE invoice_items_2024 (LIKE",
+        "INSERT INTO invoice_items_2024 SELECT",
+        "DELETE FROM invoice_items_default WHERE",
+        "DELETE FROM invoice_info_default WHERE",
+        "ALTER TABLE invoice_info ATTACH",
+        "ALTER TABLE invoice_items ATTACH",
+    ]
+    assert "PARTITION OF" not in str(cursor.execute.call_args_list)
@@ -0,0 +1,96 @@
+import io
+import gzip
+import json
+import uuid
+import datetime
+import ipaddress
+from decimal import Decimal
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from fastapi.encoders import jsonable_encoder
+from utils import serialization
+from utils.serialization import rows_response, negotiate_encoding, negotiate_media_type
+
+@pytest.fixture
+def rows():
+    return [
+        {"invoice_id": str(i), "invoice_date": datetime.date(2021, 3, i % 28 + 1),
+         "seller_name": "ACME", "total": Decimal("10.50") * i, "quantity": Decimal(i)}
+        for i in range(1, 200)
+    ]
+
+def test_json_matches_default_encoder(rows):
+    """
+    Test that the default format is identical to FastAPI's jsonable_encoder output.
+    """
+    # When
+    response = rows_response(rows, {})
+
+    # Then
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == jsonable_encoder({"answer": rows})
+
+def test_other_database_types_match_default_encoder():
+    """
+    Test that intervals, bytea, UUID, inet and array-like values are encoded as jsonable_encoder does.
+    """
+    # Given
+    rows = [{"age": datetime.timedelta(days=3, seconds=1.5), "id": uuid.UUID(int=1), "ip": ipaddress.ip_address("10.0.0.1"),
+             "text_bytes": b"ACME", "tags": frozenset(["a"]), "time": datetime.time(12, 30)}]
+    binary = [{"bytea": memoryview(b"\xff\x00")}, {"bytea": b"\xff\x00"}]
+
+    # When
+    encoded = json.loads(serialization.dumps(rows))
+    encoded_binary = json.loads(serialization.dumps(binary))
+    table = pq.read_table(io.BytesIO(rows_response(rows, {"accept": "application/vnd.apache.parquet"}).body))
+
+    # Then
+    assert encoded == jsonable_encoder(rows)
+    assert encoded[0]["age"] == 259201.5
+    assert encoded_binary == [{"bytea": "/wA="}, {"bytea": "/wA="}]
+    assert table.column("id").to_pylist() == [str(uuid.UUID(int=1))]
+    assert table.column("ip").to_pylist() == ["10.0.0.1"]
+
+def test_columnar_and_arrow_formats(rows):
+    """
+    Test that column-wise JSON, Arrow and Parquet bodies hold the same rows.
+    """
+    # When
+    columnar = json.loads(rows_response(rows, {"accept": "application/vnd.columnar+json"}).body)["answer"]
+    arrow = pa.ipc.open_stream(rows_response(rows, {"accept": "application/vnd.apache.arrow.stream"}).body).read_all()
+    parquet = pq.read_table(io.BytesIO(rows_response(rows, {"accept": "application/x-parquet"}).body))
+
+    # Then
+    assert columnar["columns"] == list(rows[0])
+    assert columnar["rows"][1] == ["2", "2021-03-03", "ACME", 21.0, 2]
+    assert arrow.to_pylist() == rows
+    assert parquet.to_pylist() == rows
+
+def test_negotiation():
+    """
+    Test Accept and Accept-Encoding negotiation with q-values and unsupported values.
+    """
+    assert negotiate_media_type(None) == "application/json"
+    assert negotiate_media_type("text/html, */*;q=0.1") == "application/json"
+    assert negotiate_media_type("application/json;q=0.5, application/vnd.apache.arrow.stream") == \
+        "application/vnd.apache.arrow.stream"
+    assert negotiate_encoding("gzip, deflate, br") == "gzip"
+    assert negotiate_encoding("gzip;q=0.8, zstd") == "zstd"
+    assert negotiate_encoding("identity") is None
+
+def test_compression(rows, monkeypatch):
+    """
+    Test that large bodies are compressed and small ones are not.
+    """
+    # Given
+    monkeypatch.setattr(serialization, "zstandard", None)
+
+    # When
+    large = rows_response(rows, {"accept-encoding": "zstd, gzip"})
+    small = rows_response(rows[:1], {"accept-encoding": "gzip"})
+
+    # Then
+    assert large.headers["content-encoding"] == "gzip"
+    assert json.loads(gzip.decompress(large.body)) == jsonable_encoder({"answer": rows})
+    assert "content-encoding" not in small.headers
@@ -0,0 +1,124 @@
+import os
+import csv
+import datetime
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+from utils.staging import (
+    StagingWriter, StagingLoader, read_segment, seal_stale_parts, staged_segments, _csv, _read_jsonl
+)
+
+INFO = ("INV-1", datetime.date(2024, 3, 1), "ACME", "Main street", "TAX1", "IBAN",
+        "Client", "", None, Decimal("1.50"), Decimal("16.50"))
+ITEMS = [("INV-1", datetime.date(2024, 3, 1), "Paper", Decimal("2.000"), "box",
+          Decimal("7.50"), Decimal("15.00"), Decimal("10.00"), Decimal("16.50"))]
+
+def test_writer_seals_segments_with_equal_parquet_and_jsonl(tmp_path):
+    """
+    Test that a full segment is sealed and that its Parquet and JSONL copies hold the same typed rows.
+    """
+    # Given
+    writer = StagingWriter(str(tmp_path), segment_rows=2)
+
+    # When
+    writer.write(INFO, ITEMS, source="a.pdf")
+    writer.write(("INV-2",) + INFO[1:], [], source="b.pdf")
+    writer.write(("INV-3",) + INFO[1:], ITEMS)
+    assert len(staged_segments(str(tmp_path))) == 1
+    writer.close()
+
+    # Then
+    first, second = staged_segments(str(tmp_path))
+    info, items = read_segment(str(tmp_path), first)
+    assert info[0] == INFO + (0,) and info[1][0] == "INV-2" and info[1][-1] == 1
+    assert items == [ITEMS[0] + (0,)]
+    os.remove(tmp_path / f"{first}.info.parquet")
+    assert read_segment(str(tmp_path), first) == (info, items)
+    assert read_segment(str(tmp_path), second)[1] == [ITEMS[0] + (0,)]
+
+def test_seal_stale_parts_drops_truncated_line(tmp_path):
+    """
+    Test that the open segment of a crashed writer is sealed without its half-written last line.
+    """
+    # Given
+    writer = StagingWriter(str(tmp_path), segment_rows=10)
+    writer.write(INFO, ITEMS)
+    writer._file.write('{"source": "b.pdf", "invoice_info": ["INV')
+    writer._file.flush()
+
+    # When
+    assert seal_stale_parts(str(tmp_path), older_than=3600) == []
+    sealed = seal_stale_parts(str(tmp_path), older_than=-1)
+
+    # Then
+    assert staged_segments(str(tmp_path)) == sealed
+    info, items = read_segment(str(tmp_path), sealed[0])
+    assert [row[0] for row in info] == ["INV-1"]
+    assert len(_read_jsonl(str(tmp_path / f"{sealed[0]}.jsonl"))) == 1
+
+def test_copy_csv_keeps_null_apart_from_empty_string():
+    """
+    Test that None is written as an unquoted empty field (NULL for COPY) and strings are always quoted.
+    """
+    # When
+    text = _csv([("a,b", "", None, 'say "hi"', datetime.date(2024, 3, 1), Decimal("1.50"))]).getvalue()
+
+    # Then
+    assert text == '"a,b","",,"say ""hi""","2024-03-01","1.50"\n'
+    assert next(csv.reader([text])) == ["a,b", "", "", 'say "hi"', "2024-03-01", "1.50"]
+
+def test_loader_skips_loaded_segments_and_segments_locked_by_another_loader(tmp_path):
+    """
+    Test that pending() excludes tracked segments and a batch skips segments whose advisory lock is held.
+    """
+    # Given
+    with StagingWriter(str(tmp_path), segment_rows=1) as writer:
+        writer.write(INFO, ITEMS)
+        writer.write(("INV-2",) + INFO[1:], [])
+    first, second = staged_segments(str(tmp_path))
+    connection = MagicMock()
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = [(first,)]
+    loader = StagingLoader(str(tmp_path))
+
+    # When
+    pending = loader.pending(connection)
+    cursor.fetchone.side_effect = [(False,)]
+    stats = loader._load_batch(cursor, [second], reload=False)
+
+    # Then
+    assert pending == [second]
+    assert loader.pending(connection, reload=True) == [first, second]
+    assert stats == {"segments": 0, "invoices": 0, "inserted": 0, "items": 0}
+    cursor.copy_expert.assert_not_called()
+
+def test_load_batch_copies_rows_and_parks_undated_invoices(tmp_path):
+    """
+    Test the COPY data, the insert statements and their parameters, with one dated and one undated invoice.
+    """
+    # Given
+    undated = ("INV-2", None) + INFO[2:]
+    with StagingWriter(str(tmp_path), segment_rows=2) as writer:
+        writer.write(INFO, ITEMS)
+        writer.write(undated, [("INV-2", None) + ITEMS[0][2:]])
+    segment, = staged_segments(str(tmp_path))
+    cursor = MagicMock()
+    cursor.fetchone.side_effect = [(True,), None]
+    cursor.fetchall.return_value = [(0,), (1,)]
+    cursor.rowcount = 1
+
+    # When
+    stats = StagingLoader(str(tmp_path))._load_batch(cursor, [segment], reload=False)
+
+    # Then
+    copies = [call.args[1].getvalue() for call in cursor.copy_expert.call_args_list]
+    assert copies[0].splitlines()[1].startswith('"INV-2",,"ACME"') and copies[0].splitlines()[1].endswith(',"1"')
+    statements = [(" ".join(call.args[0].split()), call.args[1:]) for call in cursor.execute.call_args_list]
+    load = next(sql for sql, _ in statements if sql.startswith("WITH chosen"))
+    assert "INSERT INTO invoice_info (invoice_id" in load and "WHERE invoice_date IS NOT NULL" in load
+    assert "INSERT INTO invoice_info_undated (invoice_id" in load and "ON CONFLICT (invoice_id) DO NOTHING" in load
+    items = [(sql.split()[2], sql.split("AND ")[-1], params) for sql, params in statements if sql.startswith("INSERT INTO invoice_items")]
+    assert items == [("invoice_items", "invoice_date IS NOT NULL ORDER BY record_no", (([0, 1],),)),
+                     ("invoice_items_undated", "invoice_date IS NULL ORDER BY record_no", (([0, 1],),))]
+    assert statements[-1][1] == ((segment, 2, 2, 2),)
+    assert stats == {"segments": 1, "invoices": 2, "inserted": 2, "items": 2}
@@ -0,0 +1,180 @@
+import os
+import hashlib
+
+import pytest
+from utils import vector_ingestion
+from utils.vector_ingestion import IngestionManifest, VectorIngestionPipeline, content_hash, iter_documents
+from utils.vector_search import VectorQueryFromDirectory
+
+@pytest.fixture
+def manifest(tmp_path):
+    manifest = IngestionManifest(str(tmp_path / "manifest.sqlite"))
+    yield manifest
+    manifest.close()
+
+def init_fake_worker(*args):
+    pass
+
+def failing_embed(texts):
+    # Fails in the worker process while FAIL_EMBED is set in the environment it was forked from
+    if os.environ.get("FAIL_EMBED"):
+        raise RuntimeError("embedding service unavailable")
+    return fake_embed(texts)
+
+def fake_embed(texts):
+    # Deterministic 8-dimensional embedding per text, computed in the worker process
+    return [[byte / 255 for byte in hashlib.sha1(text.encode()).digest()[:8]] for text in texts]
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_ingestion, "_init_worker", init_fake_worker)
+    monkeypatch.setattr(vector_ingestion, "_embed_batch", fake_embed)
+    vector_query = VectorQueryFromDirectory(
+        embedding_model_name="fake", embedding_model_kwargs={}, vectorDB_directory=str(tmp_path / "store"),
+        llm=None, query=None, chunk_size=40, chunk_overlap=0, vector_backend="mmap")
+    return VectorIngestionPipeline(vector_query, workers=1)
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+def test_content_hash_is_stable():
+    """
+    Test that identical chunks map to the same ID.
+    """
+    assert content_hash("invoice") == content_hash("invoice")
+    assert content_hash("invoice") != content_hash("invoices")
+
+def test_record_and_remove_document(manifest):
+    """
+    Test that removing a document only orphans chunks no other document references.
+    """
+    # Given
+    manifest.record_document("a.txt", "h1", {"c1", "c2"})
+    manifest.record_document("b.txt", "h2", {"c2", "c3"})
+
+    # When
+    orphaned = manifest.remove_document("a.txt")
+
+    # Then
+    assert orphaned == {"c1"}
+    assert manifest.document_hash("a.txt") is None
+    assert manifest.known_chunks(["c1", "c2", "c3"]) == {"c2", "c3"}
+
+def test_record_document_replaces_chunks(manifest):
+    """
+    Test that re-recording a changed document replaces its chunk references.
+    """
+    # Given
+    manifest.record_document("a.txt", "h1", {"c1", "c2"})
+
+    # When
+    manifest.record_document("a.txt", "h2", {"c2", "c4"})
+
+    # Then
+    assert manifest.document_hash("a.txt") == "h2"
+    assert manifest.document_chunks("a.txt") == {"c2", "c4"}
+    assert manifest.orphaned({"c1", "c2"}) == {"c1"}
+
+def test_iter_documents_filters_extensions(tmp_path):
+    """
+    Test that only text documents are yielded, including nested folders.
+    """
+    # Given
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "a.txt").write_text("a")
+    (tmp_path / "sub" / "b.md").write_text("b")
+    (tmp_path / "c.png").write_bytes(b"")
+
+    # When
+    paths = sorted(iter_documents(str(tmp_path)))
+
+    # Then
+    assert paths == sorted([str(tmp_path / "a.txt"), str(tmp_path / "sub" / "b.md")])
+
+def test_manifest_changes_need_a_commit(tmp_path):
+    """
+    Test that documents recorded after the last commit are forgotten, as after a crash before the store was saved.
+    """
+    # Given
+    path = str(tmp_path / "manifest.sqlite")
+    manifest = IngestionManifest(path)
+    manifest.record_document("a.txt", "h1", {"c1"})
+    manifest.commit()
+
+    # When
+    manifest.record_document("b.txt", "h2", {"c2"})
+    manifest.remove_document("a.txt")
+    manifest.close()
+    reopened = IngestionManifest(path)
+
+    # Then
+    assert reopened.document_hash("a.txt") == "h1"
+    assert reopened.document_hash("b.txt") is None
+    reopened.close()
+
+def test_ingest_directory_is_incremental_and_prunes_only_its_folder(tmp_path, pipeline, monkeypatch):
+    """
+    Test that re-runs skip unchanged documents, that "./docs" and "docs" are the same folder and that pruning "docs" keeps "docs2".
+    """
+    # Given
+    monkeypatch.chdir(tmp_path)
+    write(tmp_path / "docs" / "a.txt", "Invoices are due in thirty days.")
+    write(tmp_path / "docs" / "b.txt", "Credit notes cancel an invoice.")
+    write(tmp_path / "docs2" / "c.txt", "Sellers issue invoices to clients.")
+
+    # When
+    first = pipeline.ingest_directory("docs")
+    second = pipeline.ingest_directory("./docs2")
+    os.remove(tmp_path / "docs" / "b.txt")
+    write(tmp_path / "docs" / "a.txt", "Invoices are due in sixty days.")
+    third = pipeline.ingest_directory("./docs")
+
+    # Then
+    assert (first.docs_indexed, second.docs_indexed) == (2, 1)
+    assert (third.docs_indexed, third.docs_skipped, third.docs_deleted) == (1, 0, 1)
+    assert third.chunks_deleted == 2
+    manifest = IngestionManifest(str(tmp_path / "store" / "ingest_manifest.sqlite"))
+    assert sorted(manifest.paths()) == [str(tmp_path / "docs" / "a.txt"), str(tmp_path / "docs2" / "c.txt")]
+    manifest.close()
+    assert pipeline.backend.count() == 2
+
+def test_delete_documents_removes_only_unshared_chunks(tmp_path, pipeline, monkeypatch):
+    """
+    Test that deleting a document by relative path removes the chunks no other document shares.
+    """
+    # Given
+    monkeypatch.chdir(tmp_path)
+    write(tmp_path / "docs" / "a.txt", "Shared paragraph.")
+    write(tmp_path / "docs" / "b.txt", "Shared paragraph.")
+    write(tmp_path / "docs" / "c.txt", "Only in c.")
+    pipeline.ingest_directory(str(tmp_path / "docs"))
+
+    # When
+    shared = pipeline.delete_documents(["docs/a.txt"])
+    unique = pipeline.delete_documents(["./docs/c.txt"])
+
+    # Then
+    assert (shared.docs_deleted, shared.chunks_deleted) == (1, 0)
+    assert (unique.docs_deleted, unique.chunks_deleted) == (1, 1)
+    assert [chunk[1] for chunk in pipeline.backend.search(fake_embed(["Shared paragraph."])[0], k=5)] == ["Shared paragraph."]
+
+def test_document_waiting_on_a_failed_shared_chunk_is_not_recorded(tmp_path, pipeline, monkeypatch):
+    """
+    Test that a document whose only chunk is in flight for another document is not recorded when that batch fails.
+    """
+    # Given
+    write(tmp_path / "docs" / "a.txt", "Shared paragraph.")
+    write(tmp_path / "docs" / "b.txt", "Shared paragraph.")
+    monkeypatch.setattr(vector_ingestion, "_embed_batch", failing_embed)
+    monkeypatch.setenv("FAIL_EMBED", "1")
+
+    # When
+    with pytest.raises(RuntimeError):
+        pipeline.ingest_directory(str(tmp_path / "docs"))
+    monkeypatch.delenv("FAIL_EMBED")
+    retried = pipeline.ingest_directory(str(tmp_path / "docs"))
+
+    # Then
+    assert (retried.docs_indexed, retried.docs_skipped, retried.chunks_embedded) == (2, 0, 1)
+    assert pipeline.backend.count() == 1
@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+import pytest
+
+from utils.vector_store import ChromaBackend
+from utils.vector_maintenance import (
+    exact_neighbors, index_report, measure_recall, orphan_segments, rebuild_collection, remove_orphans, vacuum
+)
+
+@pytest.fixture
+def store(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(300, 16)).astype(np.float32)
+    backend = ChromaBackend(str(tmp_path), hnsw={"hnsw:M": 8})
+    backend.upsert(ids=[str(i) for i in range(300)], documents=[f"chunk {i}" for i in range(300)],
+                   metadatas=[{"source": f"doc{i % 3}"} for i in range(300)], embeddings=vectors.tolist())
+    backend.delete(ids=[str(i) for i in range(100)])
+    return str(tmp_path), vectors
+
+def test_rebuild_applies_parameters_and_keeps_chunks(store):
+    """
+    Test that a rebuild changes the HNSW parameters, keeps the name, chunks and metadata, and drops the queued deletes.
+    """
+    # Given
+    directory, vectors = store
+    before = index_report(directory)
+
+    # When
+    result = rebuild_collection(directory, params={"hnsw:search_ef": 50}, batch_size=64)
+
+    # Then
+    after = index_report(directory)
+    collection = after["collections"][0]
+    assert before["collections"][0]["hnsw"]["hnsw:search_ef"] == 10
+    assert result["chunks"] == 200 and collection["name"] == "langchain" and collection["chunks"] == 200
+    assert collection["hnsw"] == {"hnsw:space": "l2", "hnsw:M": 8, "hnsw:construction_ef": 100, "hnsw:search_ef": 50}
+    assert after["queue_rows"] < before["queue_rows"]
+    chunk = ChromaBackend(directory).search(vectors[150], k=1)[0]
+    assert chunk[:3] == ("150", "chunk 150", {"source": "doc0"})
+
+def test_orphaned_segments_are_removed_and_store_vacuumed(store):
+    """
+    Test that segment folders without a collection are reported and deleted, and that VACUUM reclaims free pages.
+    """
+    # Given
+    directory, _ = store
+    orphan = os.path.join(directory, "0b6d8a1e-orphan")
+    os.makedirs(orphan)
+    with open(os.path.join(orphan, "header.bin"), "wb") as file:
+        file.write(b"\0" * 4096)
+    rebuild_collection(directory)
+
+    # When
+    report = index_report(directory)
+    freed = remove_orphans(directory)
+
+    # Then
+    assert report["orphans"] == ["0b6d8a1e-orphan"] and report["orphan_bytes"] == 4096
+    assert freed == 4096 and orphan_segments(directory) == []
+    assert vacuum(directory) >= 0
+    assert index_report(directory)["sqlite_free_bytes"] == 0
+
+def test_exact_neighbors_and_recall(store):
+    """
+    Test brute-force neighbors in each distance and recall@k of a collection against them.
+    """
+    # Given
+    directory, vectors = store
+    live = vectors[100:]
+    ids = [str(i) for i in range(100, 300)]
+    points = np.array([[1.0, 0.0], [3.0, 1.0], [0.0, 1.0]])
+
+    # When
+    backend = ChromaBackend(directory)
+    result = measure_recall(backend.collection, live, ids, live[:20], k=3)
+
+    # Then
+    assert exact_neighbors(points, np.array([[10.0, 0.0]]), 2, "l2").tolist() == [[1, 0]]
+    assert exact_neighbors(points, np.array([[10.0, 0.0]]), 2, "cosine").tolist() == [[0, 1]]
+    assert exact_neighbors(points, np.array([[-1.0, 1.0]]), 1, "ip").tolist() == [[2]]
+    assert result["recall"] >= 0.9 and result["p50_ms"] > 0
+
+def test_rebuild_finishes_an_interrupted_rename(store):
+    """
+    Test that a rebuild interrupted after deleting the old collection is completed by the next rebuild.
+    """
+    # Given
+    directory, _ = store
+    import chromadb
+    client = chromadb.PersistentClient(path=directory)
+    client.get_collection("langchain").modify(name="langchain-rebuild")
+
+    # When
+    result = rebuild_collection(directory)
+
+    # Then
+    assert result["collection"] == "langchain" and result["chunks"] == 200
+    assert [collection["name"] for collection in index_report(directory)["collections"]] == ["langchain"]
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+from utils.vector_store import MmapIndexBackend, matches_filter
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(0)
+    return rng.normal(size=(200, 16)).astype(np.float32)
+
+@pytest.fixture
+def backend(tmp_path, vectors):
+    backend = MmapIndexBackend(str(tmp_path), nprobe=64)
+    backend.upsert(
+        ids=[str(i) for i in range(len(vectors))],
+        documents=[f"chunk {i}" for i in range(len(vectors))],
+        metadatas=[{"source": "a.txt" if i % 2 else "b.txt"} for i in range(len(vectors))],
+        embeddings=vectors
+    )
+    return backend
+
+def test_matches_filter():
+    """
+    Test equality and membership filters on metadata.
+    """
+    assert matches_filter({"source": "a.txt"}, None)
+    assert matches_filter({"source": "a.txt"}, {"source": "a.txt"})
+    assert matches_filter({"source": "a.txt"}, {"source": ["a.txt", "b.txt"]})
+    assert not matches_filter({"source": "a.txt"}, {"source": "b.txt"})
+
+def test_search_before_and_after_save(tmp_path, backend, vectors):
+    """
+    Test that the nearest chunk is found from the delta and from the memory-mapped index.
+    """
+    # Given
+    query = vectors[42]
+
+    # When
+    before = backend.search(query, k=1)
+    backend.save()
+    reloaded = MmapIndexBackend(str(tmp_path), nprobe=64)
+    after = reloaded.search(query, k=1)
+
+    # Then
+    assert before[0][0] == "42"
+    assert after[0][0] == "42"
+    assert isinstance(reloaded.vectors, np.memmap)
+    assert reloaded.count() == len(vectors)
+
+def test_filtered_search(backend, vectors):
+    """
+    Test that filtered search only returns chunks with matching metadata.
+    """
+    # Given
+    backend.save()
+
+    # When
+    results = backend.search(vectors[42], k=5, where={"source": "a.txt"})
+
+    # Then
+    assert len(results) == 5
+    assert all(metadata["source"] == "a.txt" for _, _, metadata, _ in results)
+
+def test_delete_and_compact(tmp_path, backend, vectors):
+    """
+    Test that deleted chunks are hidden immediately and dropped by compaction.
+    """
+    # Given
+    backend.save()
+
+    # When
+    backend.delete(["42"])
+    hidden = backend.search(vectors[42], k=1)
+    backend.compact()
+
+    # Then
+    assert hidden[0][0] != "42"
+    assert backend.count() == len(vectors) - 1
+    assert "42" not in backend.row_of
+
+def test_failed_compaction_keeps_the_live_index(tmp_path, backend, vectors, monkeypatch):
+    """
+    Test that a compaction failing halfway leaves the previous index complete, and the next one cleans up after it.
+    """
+    # Given
+    backend.save()
+    backend.delete(["42"])
+    writes = []
+
+    def failing_save(file, array):
+        writes.append(file.name)
+        if len(writes) == 2:
+            raise OSError("disk full")
+        np.lib.format.write_array(file, np.asanyarray(array))
+
+    # When
+    monkeypatch.setattr(np, "save", failing_save)
+    with pytest.raises(OSError):
+        backend.compact()
+    monkeypatch.undo()
+    reloaded = MmapIndexBackend(str(tmp_path), nprobe=64)
+    reloaded.delete(["42"])
+    reloaded.compact()
+
+    # Then
+    assert reloaded.count() == len(vectors) - 1
+    assert reloaded.search(vectors[7], k=1)[0][0] == "7"
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "centroids-2.npy", "current.json", "offsets-2.npy", "records-2.jsonl", "vectors-2.npy"]
@@ -0,0 +1,130 @@
+import time
+import pytest
+from utils.work_queue import WorkQueue
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    with WorkQueue(str(tmp_path / "queue.sqlite"), visibility_timeout=60, max_attempts=2,
+                   retry_delay=10, clock=clock) as queue:
+        yield queue
+
+def test_enqueue_is_idempotent_and_leases_are_exclusive(queue, tmp_path, clock):
+    """
+    Test that payloads are queued once and that two workers never lease the same job.
+    """
+    # Given
+    assert queue.enqueue(["a.pdf", "b.pdf", "c.pdf"]) == 3
+    assert queue.enqueue(["a.pdf", "d.pdf"]) == 1
+    other = WorkQueue(str(tmp_path / "queue.sqlite"), visibility_timeout=60, clock=clock)
+
+    # When
+    first = queue.lease("host1:1", count=3)
+    second = other.lease("host2:1", count=3)
+
+    # Then
+    assert [job.payload for job in first] == ["a.pdf", "b.pdf", "c.pdf"]
+    assert [job.payload for job in second] == ["d.pdf"]
+    assert other.lease("host2:1") == []
+    other.close()
+
+def test_expired_lease_is_released_and_stale_ack_rejected(queue, clock):
+    """
+    Test that a job whose worker stopped responding is leased again and the old worker cannot ack it.
+    """
+    # Given
+    queue.enqueue(["a.pdf"])
+    job = queue.lease("slow")[0]
+
+    # When
+    clock.now += 30
+    assert queue.extend(job.id, "slow")
+    clock.now += 61
+    retried = queue.lease("fast")
+
+    # Then
+    assert [j.attempts for j in retried] == [2]
+    assert queue.ack(job.id, "slow") is False
+    assert queue.ack(job.id, "fast") is True
+    assert queue.status()["states"]["done"] == 1
+
+def test_failures_retry_with_backoff_then_dead_letter(queue, clock):
+    """
+    Test that a failed job waits for the retry delay, is dead-lettered after max_attempts and can be requeued.
+    """
+    # Given
+    queue.enqueue(["bad.pdf"])
+
+    # When
+    job = queue.lease("w")[0]
+    assert queue.fail(job.id, "w", "ValueError: bad JSON") == "ready"
+    assert queue.lease("w") == []
+    clock.now += 10
+    job = queue.lease("w")[0]
+    state = queue.fail(job.id, "w", "ValueError: bad JSON")
+
+    # Then
+    status = queue.status()
+    assert state == "dead"
+    assert status["states"]["dead"] == 1 and status["depth"] == 0
+    assert status["dead_letters"][0]["last_error"] == "ValueError: bad JSON"
+    assert queue.requeue_dead() == 1
+    assert queue.lease("w")[0].attempts == 1
+
+def test_status_reports_depth_and_throughput(queue, clock):
+    """
+    Test the queue depth, the oldest waiting job and the throughput per worker.
+    """
+    # Given
+    queue.enqueue([f"{i}.pdf" for i in range(5)])
+    clock.now += 20
+
+    # When
+    for worker in ("w1", "w1", "w2"):
+        job = queue.lease(worker)[0]
+        queue.ack(job.id, worker)
+    status = queue.status(window=60)
+
+    # Then
+    assert status["depth"] == 2
+    assert status["oldest_ready_seconds"] == 20
+    assert status["workers"] == {"w1": 2, "w2": 1}
+    assert status["throughput_per_minute"] == 3
+    assert status["eta_seconds"] == 40
+
+def test_heartbeat_drops_finished_jobs_and_gives_up_on_hung_ones(tmp_path, monkeypatch):
+    """
+    Test that finished jobs are no longer extended and that extensions stop once the running job exceeds its timeout.
+    """
+    # Given
+    from ingest_queue import Heartbeat
+    path = str(tmp_path / "queue.sqlite")
+    with WorkQueue(path, visibility_timeout=60) as queue:
+        queue.enqueue(["a.pdf", "b.pdf"])
+        done, hung = queue.lease("w", count=2)
+    extended = []
+    extend = WorkQueue.extend
+    monkeypatch.setattr(WorkQueue, "extend", lambda self, job_id, worker: extended.append(job_id) or extend(self, job_id, worker))
+
+    # When
+    with Heartbeat(path, [done, hung], "w", interval=0.02, job_timeout=0.3) as heartbeat:
+        heartbeat.start(done)
+        heartbeat.finish(done)
+        heartbeat.start(hung)
+        deadline = time.time() + 5
+        while heartbeat._thread.is_alive() and time.time() < deadline:
+            time.sleep(0.02)
+
+        # Then
+        assert not heartbeat._thread.is_alive()
+    assert extended and set(extended) == {hung.id}
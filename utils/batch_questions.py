@@ -0,0 +1,234 @@
+"""
+Module Docstring: This module answers a file of natural-language questions in one batch.
+
+Scheduled reports ask dozens of questions, many of them repeated from night to night. The batch:
+1. deduplicates the questions (normalized as in the MongoDB pipeline cache), so each distinct
+   question is generated and executed once;
+2. takes the SQL of questions answered before from a persistent SQL cache, and generates the rest
+   back to back on one model instance, whose prompt template prefix is identical for every question;
+3. executes every query as soon as its SQL is ready, concurrently on the asyncpg pool, while the
+   model generates the next one.
+
+The results keep the input order and hold the SQL, the rows, the status and the timings of each
+question. They are written as JSON, CSV or Parquet (rows as a JSON column in the tabular formats).
+
+Dependencies: asyncio, orjson, pyarrow
+"""
+
+# Import dependencies
+import os
+import csv
+import json
+import time
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .mongo_client import normalize_question
+from .serialization import dumps
+from .logger import create_logger
+_logger = create_logger("batch_questions")
+
+RESULT_COLUMNS = ("id", "question", "status", "cached", "duplicate_of", "sql", "row_count",
+                  "error", "generate_ms", "execute_ms", "total_ms")
+
+# Bumped when normalize_question changes: entries keyed the old way may belong to another question
+CACHE_KEY_VERSION = 2
+
+
+def load_questions(path: str) -> List[Dict]:
+    """
+    Read questions from a text file (one per line), JSON lines ({"id", "question"}) or CSV (id, question).
+
+    Returns:
+        List[Dict]: Questions with their id (the line number when the file has none).
+    """
+    with open(path, encoding="utf-8", newline="") as file:
+        if path.endswith(".jsonl"):
+            records = [json.loads(line) for line in file if line.strip()]
+        elif path.endswith(".csv"):
+            records = list(csv.DictReader(file))
+        else:
+            records = [{"question": line.strip()} for line in file if line.strip()]
+    return [{"id": str(record.get("id") or number), "question": record["question"]}
+            for number, record in enumerate(records, 1)]
+
+
+class SQLCache:
+    """
+    This class keeps the SQL of answered questions in a JSON file, keyed by normalized question.
+
+    Keys keep operators, signs and digits, so "total > 1000" and "total < 1000" never share SQL.
+    Files written with another CACHE_KEY_VERSION are ignored.
+    """
+
+    def __init__(self, path: Optional[str] = os.getenv("SQL_CACHE_PATH", "sql_cache.json")) -> None:
+        """
+        Initialize the SQLCache and load its file if it exists.
+
+        Args:
+            path (str, optional): Cache file, or None for an in-memory cache.
+                                Defaults to os.getenv("SQL_CACHE_PATH", "sql_cache.json").
+        """
+        self.path = path
+        self._entries: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                data = json.load(file)
+            if data.get("key_version") == CACHE_KEY_VERSION:
+                self._entries = data["entries"]
+            else:
+                _logger.warning("Ignoring SQL cache %s written with older question keys", path)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, question: str) -> Optional[str]:
+        return self._entries.get(normalize_question(question))
+
+    def put(self, question: str, sql: str) -> None:
+        with self._lock:
+            self._entries[normalize_question(question)] = sql
+
+    def discard(self, question: str) -> None:
+        with self._lock:
+            self._entries.pop(normalize_question(question), None)
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            with open(self.path + ".tmp", "w", encoding="utf-8") as file:
+                json.dump({"key_version": CACHE_KEY_VERSION, "entries": self._entries}, file, indent=1, sort_keys=True)
+            os.replace(self.path + ".tmp", self.path)
+
+
+async def run_batch(
+    questions: List[Dict],
+    generate: Callable[[str], str],
+    execute: Callable[[str], Awaitable[list]],
+    cache: Optional[SQLCache] = None,
+    concurrency: int = int(os.getenv("BATCH_QUERY_CONCURRENCY", "8"))
+) -> List[Dict]:
+    """
+    Answer a batch of questions.
+
+    Args:
+        questions (List[Dict]): Questions with an id, as returned by load_questions.
+        generate (Callable[[str], str]): Blocking SQL generation, e.g. invoke_llm with the SQL model.
+                                It runs in one worker thread, one question at a time.
+        execute (Callable[[str], Awaitable[list]]): Runs a query and returns its rows, e.g. query_database_async.
+        cache (SQLCache, optional): SQL of earlier batches. Successful queries are added to it.
+        concurrency (int, optional): Queries executed at the same time. Defaults to os.getenv("BATCH_QUERY_CONCURRENCY", "8").
+
+    Returns:
+        List[Dict]: One result per question, in input order.
+    """
+    start = time.perf_counter()
+    cache = cache if cache is not None else SQLCache(None)
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    # The first question of each normalized group is answered, the others reuse its result
+    distinct: Dict[str, Dict] = {}
+    for question in questions:
+        distinct.setdefault(normalize_question(question["question"]), question)
+
+    async def answer(question: Dict, sql: str, generate_seconds: float, cached: bool) -> Dict:
+        async with semaphore:
+            execute_start = time.perf_counter()
+            try:
+                rows = await execute(sql)
+                status, error = "ok", None
+                cache.put(question["question"], sql)
+            except Exception as e:
+                rows, status, error = [], "error", f"{type(e).__name__}: {e}"
+                # A cached query that stopped working is generated again next time
+                if cached:
+                    cache.discard(question["question"])
+            execute_seconds = time.perf_counter() - execute_start
+        return {"sql": sql, "rows": rows, "status": status, "error": error, "cached": cached,
+                "generate_ms": round(generate_seconds * 1000, 1), "execute_ms": round(execute_seconds * 1000, 1),
+                "total_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+    tasks: Dict[str, asyncio.Task] = {}
+    failed: Dict[str, Dict] = {}
+    pending = []
+    # Cached questions go straight to the database
+    for key, question in distinct.items():
+        sql = cache.get(question["question"])
+        if sql is not None:
+            tasks[key] = asyncio.create_task(answer(question, sql, 0.0, True))
+        else:
+            pending.append((key, question))
+    _logger.info("Batch of %d questions: %d distinct, %d cached", len(questions), len(distinct), len(tasks))
+
+    # One model instance, one question at a time: concurrent generations only compete for its threads
+    for key, question in pending:
+        generate_start = time.perf_counter()
+        try:
+            sql = await loop.run_in_executor(None, generate, question["question"])
+        except Exception as e:
+            failed[key] = {"sql": None, "rows": [], "status": "error", "error": f"{type(e).__name__}: {e}",
+                           "cached": False, "generate_ms": round((time.perf_counter() - generate_start) * 1000, 1),
+                           "execute_ms": 0.0, "total_ms": round((time.perf_counter() - start) * 1000, 1)}
+            continue
+        tasks[key] = asyncio.create_task(answer(question, sql, time.perf_counter() - generate_start, False))
+
+    answers = dict(zip(tasks, await asyncio.gather(*tasks.values())))
+    answers.update(failed)
+
+    results = []
+    for question in questions:
+        key = normalize_question(question["question"])
+        result = answers[key]
+        first = distinct[key]
+        results.append({
+            "id": question["id"],
+            "question": question["question"],
+            "duplicate_of": None if first is question else first["id"],
+            "row_count": len(result["rows"]),
+            **result,
+        })
+    return results
+
+
+def summarize(results: List[Dict], seconds: float) -> Dict:
+    """
+    Count the questions per outcome and report the wall time of the batch.
+    """
+    return {
+        "questions": len(results),
+        "distinct": sum(result["duplicate_of"] is None for result in results),
+        "cached": sum(result["cached"] and result["duplicate_of"] is None for result in results),
+        "errors": sum(result["status"] == "error" for result in results),
+        "generate_seconds": round(sum(result["generate_ms"] for result in results
+                                      if result["duplicate_of"] is None) / 1000, 2),
+        "wall_seconds": round(seconds, 2),
+    }
+
+
+def write_results(results: List[Dict], path: str) -> None:
+    """
+    Write the results as JSON (.json), CSV (.csv) or Parquet (.parquet), chosen by the file extension.
+    In CSV and Parquet the rows of each question are a JSON-encoded "rows" column.
+    """
+    if path.endswith(".json"):
+        with open(path, "wb") as file:
+            file.write(dumps(results))
+        return
+    records = [{**{column: result[column] for column in RESULT_COLUMNS}, "rows": dumps(result["rows"]).decode()}
+               for result in results]
+    if path.endswith(".parquet"):
+        pq.write_table(pa.Table.from_pylist(records), path, compression="zstd")
+    elif path.endswith(".csv"):
+        with open(path, "w", encoding="utf-8", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=RESULT_COLUMNS + ("rows",))
+            writer.writeheader()
+            writer.writerows(records)
+    else:
+        raise ValueError(f"Unsupported output format: {path}")
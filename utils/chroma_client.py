@@ -1,89 +1,400 @@
 """
 Chroma Document Collection
 
-This module provides a class for interacting with ChromaDB and managing document collections.
+This module provides classes for interacting with ChromaDB and managing document collections.
+
+Calls failing with connection errors, timeouts or 5xx responses are retried with exponential backoff
+and jitter and guarded by a circuit breaker, so an unavailable Chroma server is neither hammered nor
+allowed to block callers indefinitely. Invalid requests fail at once and leave the breaker alone. HTTP clients
+are shared per host and port, which keeps one pooled keep-alive session per server for the whole
+process. Bulk helpers split large add/upsert/query payloads into requests that respect the server's
+maximum batch size and a request size budget.
 
 Dependencies:
 - chromadb: Provides the HttpClient class for interacting with ChromaDB.
 - chromadb.config: Provides the Settings class for configuring ChromaDB settings.
-- logging: Provides functionality for logging.
+- requests: Provides the HTTPAdapter used to size the connection pool.
+- resilience: Provides the retry policy, circuit breaker and metrics.
 - typing: Provides support for type hints.
-- dotenv: Provides functionality for loading environment variables from .env files.
 - os: Provides functions for interacting with the operating system.
 
 Usage:
-1. Instantiate the ChromaDocumentCollection class with the required parameters.
+1. Instantiate the ChromaDocumentCollection class (or AsyncChromaDocumentCollection in async code).
 2. Call the get_document_collection method to retrieve or create a document collection from ChromaDB.
+3. Use add, upsert and query for batched operations and metrics for latency and retry counters.
 """
 # Import depemdencies
 import os
-import logging
-from typing import Optional
-from dotenv import load_dotenv
+import json
+import asyncio
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 import chromadb
 from chromadb.config import Settings
+from requests.adapters import HTTPAdapter
+
+from .resilience import (
+    CircuitBreaker, OperationMetrics, RetryPolicy, acall_with_retry, call_with_retry
+)
 
 # Configure logging
 from .logger import create_logger
 _logger = create_logger("chroma_client")
 
+# Clients shared by every collection, keyed by (host, port)
+_http_clients: Dict[Tuple[str, int], Any] = {}
+_http_clients_lock = threading.Lock()
+
+
+def get_http_client(host: str, port: int, pool_size: int = 20) -> Any:
+    """
+    Return the process-wide ChromaDB HTTP client for a server, creating it on first use.
+
+    Args:
+        host (str): Chroma server host.
+        port (int): Chroma server port.
+        pool_size (int, optional): Number of keep-alive connections kept in the pool. Defaults to 20.
+
+    Returns:
+        chromadb.HttpClient: The shared client.
+    """
+    with _http_clients_lock:
+        client = _http_clients.get((host, port))
+        if client is None:
+            client = chromadb.HttpClient(
+                host=host,
+                port=port,
+                settings=Settings(
+                    allow_reset=True,
+                    anonymized_telemetry=False
+                )
+            )
+            # Size the pool of the underlying requests session for concurrent callers
+            session = getattr(getattr(client, "_server", None), "_session", None)
+            if session is not None:
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+            _http_clients[(host, port)] = client
+        return client
+
+
 class ChromaDocumentCollection:
     """
     A class to interact with ChromaDB and manage document collections.
 
     Attributes:
-        chroma_client (chromadb.HttpClient): An HTTP client for interacting with ChromaDB.
-        collection (Optional[DocumentCollection]): The document collection object.
+        chroma_client (chromadb.api.ClientAPI): The client used for every call.
+        collection (Optional[chromadb.Collection]): The document collection object.
+        metrics (OperationMetrics): Latency, error and retry counters per operation.
     """
 
-    def __init__(self) -> None:
+    def __init__(self,
+                 client: Optional[Any] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 batch_size: int = int(os.getenv("CHROMA_BATCH_SIZE", "1000")),
+                 max_request_bytes: int = int(os.getenv("CHROMA_MAX_REQUEST_BYTES", str(8 * 1024 * 1024)))
+                 ) -> None:
         """
         Initializes the ChromaDocumentCollection.
 
-        It loads the host and port from environment variables and creates the ChromaDB HTTP client.
+        Unless a client is given, it loads the host and port from environment variables and uses the
+        shared ChromaDB HTTP client for that server.
+
+        Args:
+            client (chromadb.api.ClientAPI, optional): Client to use, e.g. chromadb.EphemeralClient() in tests.
+            retry_policy (RetryPolicy, optional): Backoff settings. Defaults to RetryPolicy().
+            circuit_breaker (CircuitBreaker, optional): Breaker guarding the server. Defaults to CircuitBreaker().
+            batch_size (int, optional): Maximum number of records per request.
+                                Defaults to os.getenv("CHROMA_BATCH_SIZE", "1000").
+            max_request_bytes (int, optional): Approximate payload budget per request.
+                                Defaults to os.getenv("CHROMA_MAX_REQUEST_BYTES", 8 MiB).
         """
 
         # Get host and port from environment variables
         self.host: str = os.getenv("CHROMA_HOST", "localhost")
         self.port: int = int(os.getenv("CHROMA_PORT", "8005"))
 
-        # Create ChromaDB HTTP client
-        try:
-            self.chroma_client = chromadb.HttpClient(
-                host=self.host,
-                port=self.port,
-                settings=Settings(
-                    allow_reset=True,
-                    anonymized_telemetry=False
-                )
-            )
-        except Exception as e:
-            _logger.error(f"Failed to create ChromaDB HTTP client: {e}")
-            raise e
-        self.collection: Optional[chromadb.DocumentCollection] = None
+        # Create or reuse the ChromaDB client
+        if client is None:
+            try:
+                client = get_http_client(self.host, self.port)
+            except Exception as e:
+                _logger.error(f"Failed to create ChromaDB HTTP client: {e}")
+                raise e
+        self.chroma_client = client
+        self.collection: Optional[chromadb.Collection] = None
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.metrics = OperationMetrics()
+
+        # Never exceed the server side limit on records per request
+        server_limit = getattr(self.chroma_client, "max_batch_size", None) or batch_size
+        self.batch_size = max(1, min(batch_size, server_limit))
+        self.max_request_bytes = max_request_bytes
+
+    def _call(self, operation: str, func, *args, **kwargs) -> Any:
+        return call_with_retry(
+            lambda: func(*args, **kwargs), operation,
+            self.retry_policy, self.circuit_breaker, self.metrics
+        )
 
-    def get_document_collection(self, 
+    def get_document_collection(self,
                                 collection_name: str = os.getenv(
                                 "CHROMA_COLLECTION")
-                                ) -> chromadb.DocumentCollection:
+                                ) -> chromadb.Collection:
         """
         Get or create a document collection from ChromaDB.
 
         Args:
             collection_name (str, optional): The name of the collection. Defaults to os.getenv("CHROMA_COLLECTION").
 
+        Raises:
+            CircuitOpenError: If the circuit breaker is open.
+            Exception: If the collection could not be fetched after all retries.
+
         Returns:
-            chromadb.DocumentCollection: The document collection object.
+            chromadb.Collection: The document collection object.
         """
         if self.collection is None:
-            while True:
-                try:
-                    self.collection = self.chroma_client.get_or_create_collection(
-                        name=collection_name
-                    )
-                    break
-                except Exception as e:
-                    _logger.error(f"Failed to get or create document collection: {e}")
-                    pass
-
+            self.collection = self._call(
+                "get_or_create_collection",
+                self.chroma_client.get_or_create_collection,
+                name=collection_name
+            )
         return self.collection
+
+    @staticmethod
+    def _record_size(index: int, documents, embeddings, metadatas) -> int:
+        """
+        Approximate the JSON size of one record in bytes.
+        """
+        size = 64
+        if documents is not None:
+            size += len(documents[index]) + 8
+        if embeddings is not None:
+            # A float is serialized as roughly 20 characters
+            size += len(embeddings[index]) * 20
+        if metadatas is not None and metadatas[index]:
+            size += len(json.dumps(metadatas[index]))
+        return size
+
+    def iter_batches(self, count: int, documents=None, embeddings=None,
+                     metadatas=None) -> Iterator[Tuple[int, int]]:
+        """
+        Split count records into (start, end) ranges within the record and byte limits.
+
+        Args:
+            count (int): Number of records.
+            documents (List[str], optional): Documents used for the size estimate.
+            embeddings (List[List[float]], optional): Embeddings used for the size estimate.
+            metadatas (List[dict], optional): Metadata used for the size estimate.
+
+        Yields:
+            Tuple[int, int]: Start and end index of each batch.
+        """
+        start, size = 0, 0
+        for index in range(count):
+            record_size = self._record_size(index, documents, embeddings, metadatas)
+            if index > start and (index - start >= self.batch_size or size + record_size > self.max_request_bytes):
+                yield start, index
+                start, size = index, 0
+            size += record_size
+        if start < count:
+            yield start, count
+
+    @staticmethod
+    def _slice(values: Optional[List], start: int, end: int) -> Optional[List]:
+        return None if values is None else values[start:end]
+
+    def _write(self, operation: str, ids: List[str], documents=None, embeddings=None,
+               metadatas=None) -> int:
+        collection = self.get_document_collection()
+        batches = 0
+        for start, end in self.iter_batches(len(ids), documents, embeddings, metadatas):
+            # Always upsert: a retried batch that already reached the server must not fail or duplicate
+            self._call(
+                operation, collection.upsert,
+                ids=ids[start:end],
+                documents=self._slice(documents, start, end),
+                embeddings=self._slice(embeddings, start, end),
+                metadatas=self._slice(metadatas, start, end)
+            )
+            batches += 1
+        _logger.info("%s of %d records sent in %d requests", operation, len(ids), batches)
+        return batches
+
+    def add(self, ids: List[str], documents: Optional[List[str]] = None,
+            embeddings: Optional[List[List[float]]] = None,
+            metadatas: Optional[List[dict]] = None) -> int:
+        """
+        Add records to the collection in batches. Batches are sent as upserts so retries are idempotent.
+
+        Args:
+            ids (List[str]): Record IDs.
+            documents (List[str], optional): Record documents.
+            embeddings (List[List[float]], optional): Record embeddings.
+            metadatas (List[dict], optional): Record metadata.
+
+        Returns:
+            int: Number of requests sent.
+        """
+        return self._write("add", ids, documents, embeddings, metadatas)
+
+    def upsert(self, ids: List[str], documents: Optional[List[str]] = None,
+               embeddings: Optional[List[List[float]]] = None,
+               metadatas: Optional[List[dict]] = None) -> int:
+        """
+        Insert or update records in the collection in batches.
+
+        Args:
+            ids (List[str]): Record IDs.
+            documents (List[str], optional): Record documents.
+            embeddings (List[List[float]], optional): Record embeddings.
+            metadatas (List[dict], optional): Record metadata.
+
+        Returns:
+            int: Number of requests sent.
+        """
+        return self._write("upsert", ids, documents, embeddings, metadatas)
+
+    def query(self, query_embeddings: Optional[List[List[float]]] = None,
+              query_texts: Optional[List[str]] = None,
+              n_results: int = 3,
+              where: Optional[Dict] = None,
+              include: Optional[List[str]] = None) -> Dict[str, List]:
+        """
+        Run many queries against the collection in batches and merge the results.
+
+        Args:
+            query_embeddings (List[List[float]], optional): Query embeddings.
+            query_texts (List[str], optional): Query texts, embedded by the collection.
+            n_results (int, optional): Results per query. Defaults to 3.
+            where (Dict, optional): Metadata filter.
+            include (List[str], optional): Fields to return. Defaults to documents, metadatas and distances.
+
+        Returns:
+            Dict[str, List]: Chroma query result with one entry per query in every field.
+        """
+        collection = self.get_document_collection()
+        include = include or ["documents", "metadatas", "distances"]
+        queries = query_embeddings if query_embeddings is not None else query_texts
+        merged: Dict[str, List] = {}
+        for start, end in self.iter_batches(len(queries), embeddings=query_embeddings, documents=query_texts):
+            result = self._call(
+                "query", collection.query,
+                query_embeddings=self._slice(query_embeddings, start, end),
+                query_texts=self._slice(query_texts, start, end),
+                n_results=n_results,
+                where=where,
+                include=include
+            )
+            for key, value in result.items():
+                if isinstance(value, list):
+                    merged.setdefault(key, []).extend(value)
+        return merged
+
+
+class AsyncChromaDocumentCollection:
+    """
+    Async variant of ChromaDocumentCollection.
+
+    The chromadb client is synchronous, so every request runs in a worker thread while retries and
+    backoff sleeps are awaited on the event loop.
+    """
+
+    def __init__(self, collection: Optional[ChromaDocumentCollection] = None,
+                 concurrency: int = 4) -> None:
+        """
+        Initializes the AsyncChromaDocumentCollection.
+
+        Args:
+            collection (ChromaDocumentCollection, optional): Synchronous client to wrap.
+                                Defaults to ChromaDocumentCollection().
+            concurrency (int, optional): Maximum number of batches in flight. Defaults to 4.
+        """
+        self.sync = collection or ChromaDocumentCollection()
+        self.concurrency = concurrency
+
+    @property
+    def metrics(self) -> OperationMetrics:
+        return self.sync.metrics
+
+    async def _call(self, operation: str, func, **kwargs) -> Any:
+        return await acall_with_retry(
+            lambda: asyncio.to_thread(func, **kwargs), operation,
+            self.sync.retry_policy, self.sync.circuit_breaker, self.sync.metrics
+        )
+
+    async def get_document_collection(self, collection_name: str = os.getenv("CHROMA_COLLECTION")):
+        """
+        Get or create a document collection from ChromaDB without blocking the event loop.
+        """
+        if self.sync.collection is None:
+            self.sync.collection = await self._call(
+                "get_or_create_collection",
+                self.sync.chroma_client.get_or_create_collection,
+                name=collection_name
+            )
+        return self.sync.collection
+
+    async def _write(self, operation: str, ids, documents=None, embeddings=None, metadatas=None) -> int:
+        collection = await self.get_document_collection()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(start: int, end: int) -> None:
+            async with semaphore:
+                await self._call(
+                    operation, collection.upsert,
+                    ids=ids[start:end],
+                    documents=self.sync._slice(documents, start, end),
+                    embeddings=self.sync._slice(embeddings, start, end),
+                    metadatas=self.sync._slice(metadatas, start, end)
+                )
+
+        batches = list(self.sync.iter_batches(len(ids), documents, embeddings, metadatas))
+        await asyncio.gather(*(send(start, end) for start, end in batches))
+        return len(batches)
+
+    async def add(self, ids, documents=None, embeddings=None, metadatas=None) -> int:
+        """
+        Add records to the collection with up to `concurrency` batches in flight, sent as upserts.
+        """
+        return await self._write("add", ids, documents, embeddings, metadatas)
+
+    async def upsert(self, ids, documents=None, embeddings=None, metadatas=None) -> int:
+        """
+        Insert or update records with up to `concurrency` batches in flight.
+        """
+        return await self._write("upsert", ids, documents, embeddings, metadatas)
+
+    async def query(self, query_embeddings=None, query_texts=None, n_results: int = 3,
+                    where=None, include=None) -> Dict[str, List]:
+        """
+        Run many queries concurrently in batches and merge the results in input order.
+        """
+        collection = await self.get_document_collection()
+        include = include or ["documents", "metadatas", "distances"]
+        queries = query_embeddings if query_embeddings is not None else query_texts
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(start: int, end: int) -> Dict[str, List]:
+            async with semaphore:
+                return await self._call(
+                    "query", collection.query,
+                    query_embeddings=self.sync._slice(query_embeddings, start, end),
+                    query_texts=self.sync._slice(query_texts, start, end),
+                    n_results=n_results,
+                    where=where,
+                    include=include
+                )
+
+        batches = self.sync.iter_batches(len(queries), embeddings=query_embeddings, documents=query_texts)
+        results = await asyncio.gather(*(send(start, end) for start, end in batches))
+        merged: Dict[str, List] = {}
+        for result in results:
+            for key, value in result.items():
+                if isinstance(value, list):
+                    merged.setdefault(key, []).extend(value)
+        return merged
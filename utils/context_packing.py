@@ -0,0 +1,224 @@
+"""
+Module Docstring: This module packs retrieved chunks into the token budget of the answer model.
+
+The "stuff" chain concatenates every retrieved chunk into one prompt. With flan-t5 (512 input
+tokens) a few 1000-character chunks overflow the input, the tokenizer silently truncates the end of
+the prompt (including the question) and the encoder still pays for the overflow. ContextPacker
+over-fetches candidates, reranks them with a cheap lexical scorer combined with the retrieval rank,
+removes the text repeated by the splitter's chunk_overlap, and packs whole chunks, then the best
+sentences of the remaining chunks, until the rendered prompt reaches the budget as counted by the
+model's own tokenizer.
+
+Dependencies: math, re, langchain
+"""
+
+# Import dependencies
+import re
+import math
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain.schema import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+
+from .logger import create_logger
+_logger = create_logger("context_packing")
+
+_WORD = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by did do does for from has have how i in is it its me my of on or "
+    "the their this to was we what when where which who why with you your".split()
+)
+
+
+def _terms(text: str) -> List[str]:
+    return [word for word in _WORD.findall(text.lower()) if word not in _STOPWORDS]
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence for sentence in _SENTENCE_END.split(text.strip()) if sentence]
+
+
+def strip_overlap(neighbour: str, text: str, max_overlap: int, min_overlap: int = 10) -> Tuple[str, int]:
+    """
+    Remove from text the part that repeats a neighbouring chunk (the splitter's chunk overlap): a
+    prefix equal to the end of neighbour, or a suffix equal to its start. Matches shorter than
+    min_overlap characters are treated as coincidences.
+
+    Returns:
+        Tuple[str, int]: The remaining text and the number of characters removed.
+    """
+    removed = 0
+    for length in range(min(max_overlap, len(neighbour), len(text)), min_overlap - 1, -1):
+        if neighbour.endswith(text[:length]):
+            text, removed = text[length:].lstrip(), length
+            break
+    for length in range(min(max_overlap, len(neighbour), len(text)), min_overlap - 1, -1):
+        if neighbour.startswith(text[-length:]):
+            return text[:-length].rstrip(), removed + length
+    return text, removed
+
+
+@dataclass
+class PackedContext:
+    """
+    Documents fitted to the budget and the packing report.
+    """
+    documents: List[Document]
+    report: Dict[str, Any] = field(default_factory=dict)
+
+
+class ContextPacker:
+    """
+    This class reranks candidate chunks and packs them into an exact token budget.
+    """
+
+    def __init__(self, tokenizer: Any, render: Callable[[str, str], str],
+                 max_input_tokens: int = 512, chunk_overlap: int = 100,
+                 separator: str = "\n\n", rank_weight: float = 0.5) -> None:
+        """
+        Initialize the ContextPacker.
+
+        Args:
+            tokenizer (Any): Tokenizer of the answer model (a transformers tokenizer).
+            render (Callable[[str, str], str]): Renders the prompt from (context, question).
+            max_input_tokens (int, optional): Input size of the answer model. Defaults to 512.
+            chunk_overlap (int, optional): chunk_overlap of the text splitter. Defaults to 100.
+            separator (str, optional): Separator the chain puts between documents. Defaults to "\\n\\n".
+            rank_weight (float, optional): Weight of the retrieval rank against the lexical score.
+                                Defaults to 0.5.
+        """
+        self.tokenizer = tokenizer
+        self.render = render
+        self.max_input_tokens = max_input_tokens
+        self.chunk_overlap = chunk_overlap
+        self.separator = separator
+        self.rank_weight = rank_weight
+
+    def count_tokens(self, text: str, special_tokens: bool = False) -> int:
+        return len(self.tokenizer.encode(text, add_special_tokens=special_tokens))
+
+    def prompt_tokens(self, context: str, question: str) -> int:
+        return self.count_tokens(self.render(context, question), special_tokens=True)
+
+    def score(self, question: str, texts: List[str]) -> List[float]:
+        """
+        Score texts by the IDF-weighted share of question terms they contain and by retrieval rank.
+        """
+        query = set(_terms(question))
+        documents = [set(_terms(text)) for text in texts]
+        idf = {term: math.log(1 + len(texts) / (1 + sum(term in words for words in documents))) for term in query}
+        total = sum(idf.values()) or 1.0
+        scores = []
+        for rank, words in enumerate(documents):
+            lexical = sum(weight for term, weight in idf.items() if term in words) / total
+            prior = 1 - rank / max(1, len(texts))
+            scores.append((1 - self.rank_weight) * lexical + self.rank_weight * prior)
+        return scores
+
+    def pack(self, question: str, candidates: List[Document]) -> PackedContext:
+        """
+        Select and trim candidates so the rendered prompt fits max_input_tokens.
+
+        Args:
+            question (str): The question.
+            candidates (List[Document]): Retrieved chunks, most similar first.
+
+        Returns:
+            PackedContext: The packed documents (in retrieval order) and the report.
+        """
+        overhead = self.prompt_tokens("", question)
+        budget = self.max_input_tokens - overhead
+        separator_tokens = self.count_tokens(self.separator)
+        scores = self.score(question, [candidate.page_content for candidate in candidates])
+        order = sorted(range(len(candidates)), key=lambda index: -scores[index])
+
+        selected: Dict[int, str] = {}
+        used, overlap_removed, truncated = 0, 0, False
+        for index in order:
+            candidate = candidates[index]
+            text = candidate.page_content
+            source = candidate.metadata.get("source")
+            # Drop the text already included through a neighbouring chunk of the same source
+            for other, other_text in selected.items():
+                if candidates[other].metadata.get("source") == source:
+                    text, removed = strip_overlap(other_text, text, self.chunk_overlap)
+                    overlap_removed += removed
+            if not text:
+                continue
+            cost = self.count_tokens(text) + (separator_tokens if selected else 0)
+            if used + cost <= budget:
+                selected[index] = text
+                used += cost
+                continue
+            # Best sentences of a chunk that does not fit as a whole
+            truncated = True
+            sentences = split_sentences(text)
+            sentence_scores = self.score(question, sentences)
+            keep = []
+            for position in sorted(range(len(sentences)), key=lambda i: -sentence_scores[i]):
+                cost = self.count_tokens(sentences[position]) + (separator_tokens if selected or keep else 0)
+                if used + cost <= budget:
+                    keep.append(position)
+                    used += cost
+            if keep:
+                selected[index] = " ".join(sentences[position] for position in sorted(keep))
+
+        documents = [
+            Document(page_content=selected[index], metadata=dict(candidates[index].metadata))
+            for index in sorted(selected)
+        ]
+        # Tokens of the pieces do not always add up exactly; trim until the rendered prompt fits
+        while documents and self.prompt_tokens(self._join(documents), question) > self.max_input_tokens:
+            truncated = True
+            sentences = split_sentences(documents[-1].page_content)
+            if len(sentences) > 1:
+                documents[-1].page_content = " ".join(sentences[:-1])
+            else:
+                documents.pop()
+
+        context = self._join(documents)
+        report = {
+            "candidates": len(candidates),
+            "used_chunks": len(documents),
+            "context_tokens": self.count_tokens(context),
+            "prompt_tokens": self.prompt_tokens(context, question),
+            "budget": budget,
+            "max_input_tokens": self.max_input_tokens,
+            "overlap_chars_removed": overlap_removed,
+            "truncated": truncated or len(selected) < len(candidates),
+        }
+        for document in documents:
+            document.metadata["packing"] = report
+        _logger.info("Packed %d of %d chunks into %d prompt tokens", len(documents), len(candidates),
+                     report["prompt_tokens"])
+        return PackedContext(documents=documents, report=report)
+
+    def _join(self, documents: List[Document]) -> str:
+        return self.separator.join(document.page_content for document in documents)
+
+
+class PackedRetriever(BaseRetriever):
+    """
+    LangChain retriever that over-fetches from a base retriever and returns the packed documents.
+    """
+
+    base_retriever: Any
+    packer: Any
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        candidates = self.base_retriever.get_relevant_documents(query)
+        return self.packer.pack(query, candidates).documents
+
+
+def packing_report(documents: List[Document]) -> Optional[Dict[str, Any]]:
+    """
+    Return the packing report attached to the source documents of a chain result, if any.
+    """
+    for document in documents or []:
+        if "packing" in document.metadata:
+            return document.metadata["packing"]
+    return None
@@ -1,42 +1,64 @@
 """
 """
-from typing import List, Tuple, Dict, Union
+from typing import List, Tuple, Dict, Union, Optional
 from .database_connector import DatabaseConnector
+from .rollups import RollupManager
+from .normalize import parse_amount, parse_date
 from .logger import create_logger
 _logger = create_logger("DBWriter")
 
+# Column order of the tuples returned by DataParser.ParseData
+INVOICE_INFO_COLUMNS = (
+    "invoice_id", "invoice_date", "seller_name", "seller_address",
+    "seller_taxid", "seller_iban", "client_name", "client_address",
+    "client_taxid", "total_tax", "total"
+)
+INVOICE_ITEMS_COLUMNS = (
+    "invoice_id", "invoice_date", "item_name", "quantity", "unit_measure",
+    "net_price", "net_worth", "vat", "sales"
+)
+
 class DBWriter:
     """
     This class provides methods for inserting data into a PostgreSQL database.
     """
 
-    def __init__(self, connector: DatabaseConnector) -> None:
+    def __init__(self, connector: DatabaseConnector, rollups: Optional[RollupManager] = None) -> None:
         """
         Initialize the DataInserter with a DatabaseConnector instance.
 
         Args:
             connector (DatabaseConnector): An instance of DatabaseConnector.
+            rollups (RollupManager, optional): Rollup tables updated in the same transaction as every insert.
         """
         self.connector = connector
+        self.rollups = rollups
 
-    def insert_data(self, queries_data: List[Tuple[str, Tuple]]) -> None:
+    def insert_data(self, queries_data: List[Tuple[str, Tuple]], raise_errors: bool = False) -> None:
         """
         Insert data into the PostgreSQL database.
 
         Args:
             queries_data (list): List of tuples containing (query, data) pairs to be inserted.
+            raise_errors (bool, optional): Re-raise the error after the rollback instead of only
+                                logging it. Defaults to False.
         """
+        cursor = None
         try:
             self.connector.create_connection()
             cursor = self.connector.connection.cursor()
             for query, data in queries_data:
                 cursor.execute(query, data)
+            if self.rollups is not None:
+                self.rollups.apply(cursor, queries_data)
             self.connector.connection.commit()
             _logger.info("Data inserted successfully")
         except Exception as e:
             _logger.error("Failed to insert data: " + str(e))
             if self.connector.connection:
                 self.connector.connection.rollback()  # Rollback changes if insertion fails
+            if raise_errors:
+                raise
         finally:
             if cursor:
                 cursor.close()
@@ -51,11 +73,14 @@ class DBWriter:
             query (str): Insert query for the data
             data (Tuple): Data to be inserted.
         """
+        cursor = None
         try:
             self.connector.create_connection()
             cursor = self.connector.connection.cursor()
             _logger.info("Length of tuple: %s", len(data))
             cursor.execute(query, data)
+            if self.rollups is not None:
+                self.rollups.apply(cursor, [(query, data)])
             self.connector.connection.commit()
             _logger.info("Data inserted successfully")
         except Exception as e:
@@ -129,16 +154,21 @@ class DataParser:
         return invoice_details, items
     
     def ParseData(self, data: Dict) -> Union[Tuple, Tuple]:
-        """_summary_
+        """
+        Parse the extraction output into rows for invoice_info and invoice_items.
+
+        Amounts and dates are normalized into Decimal and date values so they can be stored in
+        typed columns.
 
         Returns:
-            Union[Tuple, Tuple]: _description_
+            Union[Tuple, Tuple]: The invoice_info row (INVOICE_INFO_COLUMNS order) and the list of
+                                invoice_items rows (INVOICE_ITEMS_COLUMNS order).
         """
         
         invoice_details, items = self.extract_items(data)
         
         invoice_no = invoice_details.get('invoice_number', '')
-        date_of_issue = invoice_details.get('invoice_date', '')
+        date_of_issue = parse_date(invoice_details.get('invoice_date', ''))
         seller_name = invoice_details.get('seller_name', '')
         seller_address = invoice_details.get('seller_address', '')
         seller_tax_id = invoice_details.get('seller_tax_id', '')  
@@ -146,8 +176,8 @@ class DataParser:
         client_name = invoice_details.get('client_name', '')
         client_address = invoice_details.get('client_address', '')
         client_tax_id = invoice_details.get('client_tax_id', '')
-        vat = invoice_details.get('total_tax', '')
-        gross_worth = invoice_details.get('total', '')
+        vat = parse_amount(invoice_details.get('total_tax', ''))
+        gross_worth = parse_amount(invoice_details.get('total', ''))
         
         invoice_info = self.replace_empty_with_null(
             (
@@ -170,13 +200,14 @@ class DataParser:
         for item in items:
             item_tuple = (
                 invoice_no,
+                date_of_issue,
                 item["description"],
-                item["quantity"],
+                parse_amount(item["quantity"]),
                 item["unit"],
-                item["net_price"],
-                item["net_worth"],
-                item["tax"],
-                item["gross_worth"]
+                parse_amount(item["net_price"]),
+                parse_amount(item["net_worth"]),
+                parse_amount(item["tax"]),
+                parse_amount(item["gross_worth"])
             )
             item_list.append(
                 self.replace_empty_with_null(item_tuple)
@@ -1,16 +1,22 @@
 """
 Module Docstring: This module provides functions for creating and closing a connection to a PostgreSQL database.
 
+Read-only connections are routed to the read replicas listed in DATABASE_READER_DSNS when any is
+healthy, and fall back to the primary otherwise. Writes always go to the primary, configured either
+with DATABASE_WRITER_DSN or with the HOST/PORT/USER/PASSWORD/DATABASE variables.
+
 Dependencies: os, psycopg2
 
 """
 
 # Import dependencies
 import os
+from typing import Optional
 import psycopg2
 
 from dotenv import load_dotenv, find_dotenv
 
+from .replicas import ReplicaRouter, get_router
 from .logger import create_logger
 _logger = create_logger("db")
 
@@ -27,7 +33,10 @@ class DatabaseConnector:
         user: str = os.getenv("USER"),
         port: str = os.getenv("PORT"),
         password: str = os.getenv("PASSWORD"),
-        database: str = os.getenv("DATABASE")
+        database: str = os.getenv("DATABASE"),
+        dsn: Optional[str] = os.getenv("DATABASE_WRITER_DSN"),
+        readonly: bool = False,
+        router: Optional[ReplicaRouter] = None
     ) -> None:
         """
         Initialize the DatabaseConnector with connection parameters.
@@ -43,6 +52,11 @@ class DatabaseConnector:
                                 Defaults to os.getenv("PASSWORD").
             database (str, optional): The name of the database. 
                                 Defaults to os.getenv("DATABASE").
+            dsn (str, optional): Connection string of the primary. Takes precedence over the separate parameters.
+                                Defaults to os.getenv("DATABASE_WRITER_DSN").
+            readonly (bool, optional): Open a read-only connection, served by a read replica when one is healthy.
+                                Defaults to False.
+            router (ReplicaRouter, optional): Reader router. Defaults to the router for DATABASE_READER_DSNS.
         """
         self.conn_params = {
             "host": host,
@@ -51,16 +65,47 @@ class DatabaseConnector:
             "password": password,
             "database": database
         }
+        self.dsn = dsn
+        self.readonly = readonly
+        self.router = router
         self.connection = None
+        self._reader_dsn = None
         # _logger.info("Connection parameter: %s", self.conn_params)
 
+    def _connect_reader(self) -> bool:
+        """
+        Connect to the least loaded healthy reader. Returns False if no reader could be used.
+        """
+        router = self.router or get_router()
+        if router is None:
+            return False
+        while True:
+            dsn = router.pick()
+            if dsn is None:
+                return False
+            try:
+                self.connection = psycopg2.connect(dsn)
+                self._reader_dsn = dsn
+                self.router = router
+                return True
+            except Exception as e:
+                _logger.warning("Reader unavailable, trying the next one: %s", e)
+                router.mark_failed(dsn)
+
     def create_connection(self) -> None:
         """
         Create a connection to the PostgreSQL database.
         """
         # Establish a connection to the database
         try:
-            self.connection = psycopg2.connect(**self.conn_params)
+            if not (self.readonly and self._connect_reader()):
+                # Writes, and reads while no reader is healthy, go to the primary
+                if self.dsn:
+                    self.connection = psycopg2.connect(self.dsn)
+                else:
+                    self.connection = psycopg2.connect(**self.conn_params)
+            if self.readonly:
+                self.connection.set_session(readonly=True)
             _logger.info("Connection to the PostgreSQL database established successfully")
         except Exception as e:
             _logger.info("Failed to establish connection" + str(e))
@@ -71,6 +116,9 @@ class DatabaseConnector:
         if self.connection is not None:
             self.connection.close()
             self.connection = None
+        if self._reader_dsn is not None:
+            self.router.release(self._reader_dsn)
+            self._reader_dsn = None
 
     def __enter__(self):
         """
@@ -0,0 +1,216 @@
+"""
+Module Docstring: This module turns uploaded invoices into the image parts sent to Gemini.
+
+Inputs may be file paths, bytes, bytearrays, memoryviews or file-like objects, so uploads never
+need a temporary file. The MIME type is detected from the content. PDFs are rasterized page by
+page (in a process pool for multi-page documents) and every image is downscaled to IMAGE_MAX_SIDE
+pixels on its longest side and recompressed as JPEG, which keeps the request payload small.
+Lossless images (PNG, GIF, TIFF, BMP) are recompressed as PNG instead, so small print and digits
+are not blurred by JPEG artifacts.
+
+The process pool uses the spawn start method: it is created lazily from the threads of Streamlit
+or FastAPI, and forking a multi-threaded process can deadlock the child.
+
+Dependencies: concurrent.futures, io, multiprocessing, pypdfium2, PIL
+"""
+
+# Import dependencies
+import io
+import os
+import threading
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import pypdfium2 as pdfium
+from PIL import Image
+
+from .logger import create_logger
+_logger = create_logger("document_input")
+
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1600"))
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+PDF_DPI = int(os.getenv("PDF_DPI", "150"))
+RASTER_WORKERS = int(os.getenv("RASTER_WORKERS", str(min(4, os.cpu_count() or 1))))
+# PDFs with fewer pages are rendered in the calling process, where the pool start-up would dominate
+PARALLEL_MIN_PAGES = 3
+
+# (signature, offset, MIME type)
+_SIGNATURES = (
+    (b"%PDF-", 0, "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", 0, "image/png"),
+    (b"\xff\xd8\xff", 0, "image/jpeg"),
+    (b"WEBP", 8, "image/webp"),
+    (b"GIF8", 0, "image/gif"),
+    (b"II*\x00", 0, "image/tiff"),
+    (b"MM\x00*", 0, "image/tiff"),
+    (b"BM", 0, "image/bmp"),
+)
+# Types Gemini accepts as they are, when they need no downscaling
+_PASSTHROUGH = ("image/jpeg", "image/webp", "image/png")
+# Types recompressed as PNG rather than JPEG
+_LOSSLESS = ("image/png", "image/gif", "image/tiff", "image/bmp")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+# PDFium is not thread-safe; in-process calls are serialized
+_pdfium_lock = threading.Lock()
+
+
+def read_input(source) -> bytes:
+    """
+    Return the content of a path, bytes-like or file-like input.
+
+    Args:
+        source: str or os.PathLike path, bytes, bytearray, memoryview or object with read().
+
+    Returns:
+        bytes: The content.
+    """
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, (bytearray, memoryview)):
+        return bytes(source)
+    if isinstance(source, (str, os.PathLike)):
+        path = Path(source)
+        if not path.exists():
+            raise FileNotFoundError(f"Could not find image: {path}")
+        return path.read_bytes()
+    if hasattr(source, "getvalue"):
+        return bytes(source.getvalue())
+    if hasattr(source, "read"):
+        return source.read()
+    raise TypeError(f"Unsupported input type: {type(source).__name__}")
+
+
+def detect_mime(data: bytes) -> str:
+    """
+    Detect the MIME type of a document from its leading bytes.
+
+    Raises:
+        ValueError: If the content is not a PDF or a supported image.
+    """
+    for signature, offset, mime_type in _SIGNATURES:
+        if data[offset:offset + len(signature)] == signature:
+            return mime_type
+    raise ValueError("Unsupported document type: expected a PDF or an image")
+
+
+def encode_image(image: Image.Image, max_side: int = IMAGE_MAX_SIDE, quality: int = IMAGE_QUALITY,
+                 lossless: bool = False) -> bytes:
+    """
+    Downscale an image to max_side pixels on its longest side and encode it as JPEG, or PNG when lossless.
+    """
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    buffer = io.BytesIO()
+    if lossless:
+        if image.mode not in ("RGB", "RGBA", "L", "LA", "P", "1"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        image.save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue()
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def prepare_image(data: bytes, mime_type: str, max_side: int = IMAGE_MAX_SIDE,
+                  quality: int = IMAGE_QUALITY) -> Tuple[str, bytes]:
+    """
+    Return (MIME type, bytes) of an image ready for upload, recompressed only when that helps.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        if mime_type in _PASSTHROUGH and max(image.size) <= max_side:
+            return mime_type, data
+        image.load()
+        lossless = mime_type in _LOSSLESS
+        encoded = encode_image(image, max_side, quality, lossless)
+    if mime_type in _PASSTHROUGH and len(encoded) >= len(data):
+        return mime_type, data
+    return ("image/png" if lossless else "image/jpeg"), encoded
+
+
+def _render_pages(data: bytes, pages: List[int], dpi: int, max_side: int, quality: int) -> List[bytes]:
+    """
+    Render the given pages of a PDF as JPEG images. Runs in the worker processes.
+    """
+    document = pdfium.PdfDocument(data)
+    try:
+        images = []
+        for index in pages:
+            page = document[index]
+            width, height = page.get_size()
+            # Render directly at the target resolution instead of downscaling afterwards
+            scale = min(dpi / 72, max_side / max(width, height))
+            images.append(encode_image(page.render(scale=scale).to_pil(), max_side, quality))
+            page.close()
+        return images
+    finally:
+        document.close()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=RASTER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def rasterize_pdf(data: bytes, dpi: int = PDF_DPI, max_side: int = IMAGE_MAX_SIDE,
+                  quality: int = IMAGE_QUALITY, workers: int = RASTER_WORKERS) -> List[bytes]:
+    """
+    Rasterize every page of a PDF to JPEG, in page order.
+
+    Args:
+        data (bytes): PDF content.
+        dpi (int, optional): Render resolution. Defaults to os.getenv("PDF_DPI", "150").
+        max_side (int, optional): Longest side in pixels. Defaults to os.getenv("IMAGE_MAX_SIDE", "1600").
+        quality (int, optional): JPEG quality. Defaults to os.getenv("IMAGE_QUALITY", "85").
+        workers (int, optional): Worker processes for multi-page documents.
+                                Defaults to os.getenv("RASTER_WORKERS", min(4, cpu count)).
+
+    Returns:
+        List[bytes]: One JPEG per page.
+    """
+    with _pdfium_lock:
+        document = pdfium.PdfDocument(data)
+        page_count = len(document)
+        document.close()
+        if page_count < PARALLEL_MIN_PAGES or workers <= 1:
+            return _render_pages(data, list(range(page_count)), dpi, max_side, quality)
+    # One interleaved set of pages per worker, so each worker parses the document once
+    chunks = [list(range(page_count))[i::workers] for i in range(min(workers, page_count))]
+    pool = _get_pool()
+    futures = [pool.submit(_render_pages, data, pages, dpi, max_side, quality) for pages in chunks]
+    rendered = {}
+    for pages, future in zip(chunks, futures):
+        rendered.update(zip(pages, future.result()))
+    return [rendered[index] for index in range(page_count)]
+
+
+def image_parts(source, max_side: int = IMAGE_MAX_SIDE, quality: int = IMAGE_QUALITY) -> List[dict]:
+    """
+    Build the Gemini image parts of a document.
+
+    Args:
+        source: Path, bytes-like or file-like PDF or image.
+        max_side (int, optional): Longest side in pixels. Defaults to os.getenv("IMAGE_MAX_SIDE", "1600").
+        quality (int, optional): JPEG quality. Defaults to os.getenv("IMAGE_QUALITY", "85").
+
+    Returns:
+        List[dict]: {"mime_type": ..., "data": ...} per image, one per page for PDFs.
+    """
+    data = read_input(source)
+    mime_type = detect_mime(data)
+    if mime_type == "application/pdf":
+        parts = [{"mime_type": "image/jpeg", "data": image}
+                 for image in rasterize_pdf(data, max_side=max_side, quality=quality)]
+    else:
+        mime_type, image = prepare_image(data, mime_type, max_side, quality)
+        parts = [{"mime_type": mime_type, "data": image}]
+    _logger.info("Prepared %d image part(s): %d bytes in, %d bytes out",
+                 len(parts), len(data), sum(len(part["data"]) for part in parts))
+    return parts
@@ -0,0 +1,105 @@
+"""
+Module Docstring: This module provides a fake language model for load tests.
+
+With LLM_MODE=fake the API serves every request with FakeLLM instead of Mistral and flan-t5, so load
+tests measure the framework, database and vector store without the model cost. FakeLLM waits
+FAKE_LLM_LATENCY seconds (time to first token) plus one token per 1/FAKE_LLM_TOKENS_PER_SECOND
+seconds of its output, then answers with the response recorded for the question in the
+FAKE_LLM_RESPONSES corpus (JSONL lines with "text" and "response"), or with a default that the SQL
+and MongoDB paths can execute.
+
+Dependencies: langchain
+"""
+
+# Import dependencies
+import os
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.llms import LLM
+
+from .logger import create_logger
+_logger = create_logger("fake_llm")
+
+LLM_MODE = os.getenv("LLM_MODE", "real")
+
+DEFAULT_SQL = "SELECT invoice_id, invoice_date, total FROM invoice_info ORDER BY invoice_date DESC LIMIT 10"
+DEFAULT_PIPELINE = '[{"$sort": {"invoice_date": -1}}, {"$limit": 10}]'
+DEFAULT_ANSWER = "I don't know."
+
+
+class FakeLLM(LLM):
+    """
+    LangChain LLM returning recorded responses after a configurable latency and token rate.
+    """
+
+    responses: Dict[str, str] = {}
+    latency: float = 0.2
+    tokens_per_second: float = 20.0
+    default: Optional[str] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def respond(self, prompt: str) -> str:
+        """
+        Return the recorded response of the longest known question contained in the prompt.
+        """
+        lowered = prompt.lower()
+        matches = [question for question in self.responses if question in lowered]
+        if matches:
+            return self.responses[max(matches, key=len)]
+        if self.default is not None:
+            return self.default
+        # The MongoDB and SQL paths share a model; answer each in the format its parser expects
+        return DEFAULT_PIPELINE if "aggregation pipeline" in lowered else DEFAULT_SQL
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> str:
+        output = self.respond(prompt)
+        delay = self.latency
+        if self.tokens_per_second > 0:
+            delay += len(output.split()) / self.tokens_per_second
+        time.sleep(delay)
+        return output
+
+
+def load_responses(path: Optional[str]) -> Dict[str, str]:
+    """
+    Read {"text": ..., "response": ...} lines into a lowercase question -> response dict.
+    """
+    responses = {}
+    if not path:
+        return responses
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                if record.get("response"):
+                    responses[record["text"].strip().lower()] = record["response"]
+    return responses
+
+
+def fake_llm_from_env(default: Optional[str] = None,
+                      latency: float = float(os.getenv("FAKE_LLM_LATENCY", "0.2")),
+                      tokens_per_second: float = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "20")),
+                      responses_path: Optional[str] = os.getenv("FAKE_LLM_RESPONSES")) -> FakeLLM:
+    """
+    Create a FakeLLM configured from the environment.
+
+    Args:
+        default (str, optional): Response to unknown questions. Defaults to SQL or a pipeline by prompt.
+        latency (float, optional): Seconds before the first token. Defaults to os.getenv("FAKE_LLM_LATENCY", "0.2").
+        tokens_per_second (float, optional): Output rate, 0 for instant output.
+                                Defaults to os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "20").
+        responses_path (str, optional): JSONL corpus of recorded responses. Defaults to os.getenv("FAKE_LLM_RESPONSES").
+
+    Returns:
+        FakeLLM: The fake model.
+    """
+    llm = FakeLLM(responses=load_responses(responses_path), latency=latency,
+                  tokens_per_second=tokens_per_second, default=default)
+    _logger.info("Using a fake LLM (%.3f s latency, %.0f tokens/s, %d recorded responses)",
+                 latency, tokens_per_second, len(llm.responses))
+    return llm
@@ -0,0 +1,455 @@
+"""
+Module Docstring: This module provides a workload-driven index advisor for the invoice tables.
+
+query_database records every statement it executes, together with its runtime and its plan, through
+WorkloadRecorder. IndexAdvisor reads the recorded workload, finds the columns used in filters, joins
+and sorts, and evaluates candidate indexes with hypothetical indexes (HypoPG) before recommending,
+applying and measuring them.
+
+Postgres cannot build an index CONCURRENTLY on a partitioned table, so indexes on the partitioned
+invoice tables are created ON ONLY the parent, built concurrently on each partition and attached.
+
+Dependencies: json, re, threading, time, psycopg2, HypoPG (optional PostgreSQL extension)
+"""
+
+# Import dependencies
+import os
+import re
+import json
+import time
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .logger import create_logger
+_logger = create_logger("index_advisor")
+
+# Tables the advisor manages
+TABLES = ("invoice_info", "invoice_items")
+
+
+class WorkloadRecorder:
+    """
+    Appends executed statements with runtime and plan to a JSON lines file.
+    """
+
+    def __init__(self, path: Optional[str] = os.getenv("WORKLOAD_LOG")) -> None:
+        """
+        Initialize the WorkloadRecorder.
+
+        Args:
+            path (str, optional): Log file path. Recording is disabled when empty.
+                                Defaults to os.getenv("WORKLOAD_LOG").
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def record(self, cursor, query: str, runtime: float) -> None:
+        """
+        Record a statement executed on cursor. The plan is captured with EXPLAIN, which only plans.
+
+        Args:
+            cursor: Cursor the statement ran on.
+            query (str): The statement.
+            runtime (float): Execution time in seconds.
+        """
+        if not self.enabled:
+            return
+        plan = None
+        try:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + query)
+            plan = cursor.fetchone()[0][0]["Plan"]
+        except Exception as e:
+            _logger.warning("Unable to capture plan: %s", e)
+            cursor.connection.rollback()
+        self.append(query, runtime, plan)
+
+    def append(self, query: str, runtime: float, plan: Optional[dict]) -> None:
+        """
+        Append a statement with an already captured plan, e.g. from the async query path.
+
+        Args:
+            query (str): The statement.
+            runtime (float): Execution time in seconds.
+            plan (Optional[dict]): The "Plan" node of EXPLAIN (FORMAT JSON), or None.
+        """
+        if not self.enabled:
+            return
+        entry = json.dumps({"ts": time.time(), "query": query, "runtime": runtime, "plan": plan})
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(entry + "\n")
+
+    def read(self) -> Iterator[dict]:
+        """
+        Yield the recorded workload entries.
+        """
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Replace literals so statements that differ only in constants are grouped together.
+    """
+    query = re.sub(r"'(?:[^']|'')*'", "?", query)
+    query = re.sub(r"\b\d+(?:\.\d+)?\b", "?", query)
+    return " ".join(query.split()).rstrip(";").lower()
+
+
+@dataclass
+class ColumnUsage:
+    """
+    How often each (table, column) pair is used per clause across the workload.
+    """
+    filters: Counter = field(default_factory=Counter)
+    joins: Counter = field(default_factory=Counter)
+    sorts: Counter = field(default_factory=Counter)
+
+
+def _plan_nodes(plan: dict) -> Iterator[dict]:
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def _columns_in(expression: str, table_columns: Dict[str, set], aliases: Dict[str, str],
+                default_table: Optional[str]) -> List[Tuple[str, str]]:
+    """
+    Resolve the (table, column) pairs referenced in a plan expression.
+    """
+    found = []
+    for qualifier, column in re.findall(r"(?:(\w+)\.)?\b(\w+)\b", expression):
+        table = aliases.get(qualifier, qualifier) if qualifier else default_table
+        if table in table_columns and column in table_columns[table]:
+            found.append((table, column))
+        elif not qualifier:
+            # Unqualified column of another managed table, e.g. in a join condition
+            owners = [name for name, columns in table_columns.items() if column in columns]
+            if len(owners) == 1:
+                found.append((owners[0], column))
+    return found
+
+
+def analyze_plan(plan: dict, table_columns: Dict[str, set], usage: ColumnUsage, weight: int = 1) -> None:
+    """
+    Add the filter, join and sort columns of one plan to usage.
+
+    Args:
+        plan (dict): Root node of an EXPLAIN (FORMAT JSON) plan.
+        table_columns (Dict[str, set]): Columns of every managed table.
+        usage (ColumnUsage): Counters to update.
+        weight (int, optional): Number of executions the plan stands for. Defaults to 1.
+    """
+    nodes = list(_plan_nodes(plan))
+    aliases = {node["Alias"]: node["Relation Name"] for node in nodes if "Relation Name" in node and "Alias" in node}
+    for node in nodes:
+        relation = node.get("Relation Name")
+        for key in ("Filter", "Index Cond", "Recheck Cond"):
+            if key in node:
+                for pair in set(_columns_in(node[key], table_columns, aliases, relation)):
+                    usage.filters[pair] += weight
+        for key in ("Hash Cond", "Merge Cond", "Join Filter"):
+            if key in node:
+                for pair in set(_columns_in(node[key], table_columns, aliases, None)):
+                    usage.joins[pair] += weight
+        for sort_key in node.get("Sort Key", []):
+            for pair in set(_columns_in(sort_key, table_columns, aliases, None)):
+                usage.sorts[pair] += weight
+
+
+@dataclass
+class Recommendation:
+    """
+    A recommended index with its expected and (once applied) measured effect.
+    """
+    table: str
+    columns: Tuple[str, ...]
+    uses: int
+    expected_cost_before: Optional[float] = None
+    expected_cost_after: Optional[float] = None
+    measured_before: Optional[float] = None
+    measured_after: Optional[float] = None
+    partitions: Tuple[str, ...] = ()
+
+    @property
+    def name(self) -> str:
+        return f"idx_{self.table}_{'_'.join(self.columns)}"
+
+    @property
+    def statements(self) -> List[str]:
+        """
+        The statements creating the index, in order. Each one runs outside a transaction block.
+        """
+        columns = ", ".join(self.columns)
+        if not self.partitions:
+            return [f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {self.name} ON {self.table} ({columns})"]
+        # The parent index stays invalid until every partition's index is attached
+        statements = [f"CREATE INDEX IF NOT EXISTS {self.name} ON ONLY {self.table} ({columns})"]
+        for partition in self.partitions:
+            name = f"idx_{partition}_{'_'.join(self.columns)}"
+            statements.append(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {partition} ({columns})")
+            statements.append(f"ALTER INDEX {self.name} ATTACH PARTITION {name}")
+        return statements
+
+    @property
+    def ddl(self) -> str:
+        return ";\n".join(self.statements)
+
+    @property
+    def expected_speedup(self) -> Optional[float]:
+        if self.expected_cost_before and self.expected_cost_after:
+            return self.expected_cost_before / self.expected_cost_after
+        return None
+
+    @property
+    def measured_speedup(self) -> Optional[float]:
+        if self.measured_before and self.measured_after:
+            return self.measured_before / self.measured_after
+        return None
+
+    def to_dict(self) -> dict:
+        return {
+            "ddl": self.ddl,
+            "uses": self.uses,
+            "expected_speedup": round(self.expected_speedup, 2) if self.expected_speedup else None,
+            "measured_speedup": round(self.measured_speedup, 2) if self.measured_speedup else None,
+        }
+
+
+class IndexAdvisor:
+    """
+    This class recommends indexes for the recorded workload.
+    """
+
+    def __init__(self, connection, recorder: Optional[WorkloadRecorder] = None,
+                 max_indexes: int = 5, min_improvement: float = 0.05) -> None:
+        """
+        Initialize the IndexAdvisor.
+
+        Args:
+            connection: Open psycopg2 connection.
+            recorder (WorkloadRecorder, optional): Source of the workload. Defaults to WorkloadRecorder().
+            max_indexes (int, optional): Maximum number of indexes to recommend. Defaults to 5.
+            min_improvement (float, optional): Minimum relative workload cost reduction an index must bring.
+                                Defaults to 0.05.
+        """
+        self.connection = connection
+        self.recorder = recorder or WorkloadRecorder()
+        self.max_indexes = max_indexes
+        self.min_improvement = min_improvement
+
+    def table_columns(self) -> Dict[str, set]:
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT table_name, column_name FROM information_schema.columns "
+                "WHERE table_schema = 'public' AND table_name IN %s", (TABLES,)
+            )
+            columns = defaultdict(set)
+            for table, column in cursor.fetchall():
+                columns[table].add(column)
+        return dict(columns)
+
+    def partitions(self) -> Dict[str, Tuple[str, ...]]:
+        """
+        Return the partitions of each managed table that is partitioned.
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT p.relname, c.relname FROM pg_inherits i "
+                "JOIN pg_class p ON p.oid = i.inhparent JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE p.relname IN %s ORDER BY c.relname", (TABLES,)
+            )
+            partitions = defaultdict(list)
+            for table, partition in cursor.fetchall():
+                partitions[table].append(partition)
+        return {table: tuple(names) for table, names in partitions.items()}
+
+    def existing_indexes(self) -> set:
+        """
+        Return the leading column tuples of the indexes that already exist.
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT tablename, indexdef FROM pg_indexes WHERE schemaname = 'public' AND tablename IN %s",
+                (TABLES,)
+            )
+            existing = set()
+            for table, definition in cursor.fetchall():
+                match = re.search(r"\(([^)]*)\)", definition)
+                if match:
+                    existing.add((table, tuple(column.strip() for column in match.group(1).split(","))))
+        return existing
+
+    def workload(self) -> Dict[str, dict]:
+        """
+        Group the recorded statements by normalized text.
+
+        Returns:
+            Dict[str, dict]: normalized text -> {"query", "count", "runtime", "plan"}.
+        """
+        grouped: Dict[str, dict] = {}
+        for entry in self.recorder.read():
+            key = normalize_query(entry["query"])
+            group = grouped.setdefault(key, {"query": entry["query"], "count": 0, "runtime": 0.0, "plan": entry["plan"]})
+            group["count"] += 1
+            group["runtime"] += entry["runtime"]
+        for group in grouped.values():
+            group["runtime"] /= group["count"]
+        return grouped
+
+    def candidates(self, workload: Dict[str, dict]) -> List[Recommendation]:
+        """
+        Derive candidate indexes from the filter, join and sort columns of the workload.
+        """
+        table_columns = self.table_columns()
+        usage = ColumnUsage()
+        for group in workload.values():
+            if group["plan"]:
+                analyze_plan(group["plan"], table_columns, usage, weight=group["count"])
+
+        uses = usage.filters + usage.joins + usage.sorts
+        candidates = {(table, (column,)): count for (table, column), count in uses.items()}
+        # Filter column followed by sort column serves "WHERE a = ? ORDER BY b" without a sort step
+        for (table, filter_column), filter_count in usage.filters.items():
+            for (sort_table, sort_column), sort_count in usage.sorts.items():
+                if sort_table == table and sort_column != filter_column:
+                    candidates[(table, (filter_column, sort_column))] = min(filter_count, sort_count)
+
+        existing = self.existing_indexes()
+        partitions = self.partitions()
+        return [
+            Recommendation(table=table, columns=columns, uses=count, partitions=partitions.get(table, ()))
+            for (table, columns), count in sorted(candidates.items(), key=lambda item: -item[1])
+            if not any(index[0] == table and index[1][:len(columns)] == columns for index in existing)
+        ]
+
+    def hypopg_available(self) -> bool:
+        with self.connection.cursor() as cursor:
+            try:
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS hypopg")
+                self.connection.commit()
+                return True
+            except Exception as e:
+                _logger.warning("HypoPG unavailable, ranking candidates by usage only: %s", e)
+                self.connection.rollback()
+                return False
+
+    def workload_cost(self, workload: Dict[str, dict]) -> float:
+        """
+        Planner cost of the workload, weighted by execution count.
+        """
+        total = 0.0
+        with self.connection.cursor() as cursor:
+            for group in workload.values():
+                try:
+                    cursor.execute("EXPLAIN (FORMAT JSON) " + group["query"])
+                    total += cursor.fetchone()[0][0]["Plan"]["Total Cost"] * group["count"]
+                except Exception:
+                    self.connection.rollback()
+        return total
+
+    def recommend(self) -> List[Recommendation]:
+        """
+        Greedily pick the candidates that reduce the hypothetical workload cost the most.
+
+        Returns:
+            List[Recommendation]: The recommended indexes.
+        """
+        workload = self.workload()
+        candidates = self.candidates(workload)
+        if not candidates:
+            return []
+        if not self.hypopg_available():
+            return candidates[:self.max_indexes]
+
+        chosen: List[Recommendation] = []
+        with self.connection.cursor() as cursor:
+            baseline = self.workload_cost(workload)
+            current = baseline
+            while len(chosen) < self.max_indexes:
+                best, best_cost = None, current
+                for candidate in candidates:
+                    if candidate in chosen:
+                        continue
+                    # Evaluate the candidate on top of the indexes already chosen. HypoPG cannot index a
+                    # partitioned table, so the hypothetical index goes on each of its partitions.
+                    try:
+                        cursor.execute("SELECT hypopg_reset()")
+                        for index in chosen + [candidate]:
+                            for target in index.partitions or (index.table,):
+                                cursor.execute("SELECT * FROM hypopg_create_index(%s)",
+                                               (f"CREATE INDEX ON {target} ({', '.join(index.columns)})",))
+                    except Exception as e:
+                        _logger.warning("Unable to evaluate %s, skipping it: %s", candidate.name, e)
+                        self.connection.rollback()
+                        continue
+                    cost = self.workload_cost(workload)
+                    if cost < best_cost:
+                        best, best_cost = candidate, cost
+                if best is None or (current - best_cost) / current < self.min_improvement:
+                    break
+                best.expected_cost_before, best.expected_cost_after = current, best_cost
+                chosen.append(best)
+                current = best_cost
+            cursor.execute("SELECT hypopg_reset()")
+        _logger.info("Expected workload cost %.1f -> %.1f", baseline, current)
+        return chosen
+
+    def measure(self, workload: Dict[str, dict], limit: int = 20) -> float:
+        """
+        Execute the most frequent statements and return their frequency-weighted runtime in seconds.
+        """
+        top = sorted(workload.values(), key=lambda group: -group["count"])[:limit]
+        total = 0.0
+        with self.connection.cursor() as cursor:
+            for group in top:
+                start = time.perf_counter()
+                try:
+                    cursor.execute(group["query"])
+                    cursor.fetchall()
+                except Exception:
+                    self.connection.rollback()
+                    continue
+                total += (time.perf_counter() - start) * group["count"]
+        self.connection.rollback()
+        return total
+
+    def apply(self, recommendations: List[Recommendation]) -> List[Recommendation]:
+        """
+        Create the recommended indexes one by one and measure the workload runtime around each.
+
+        Args:
+            recommendations (List[Recommendation]): Indexes to create.
+
+        Returns:
+            List[Recommendation]: The same recommendations with measured runtimes filled in.
+        """
+        workload = self.workload()
+        autocommit = self.connection.autocommit
+        try:
+            for recommendation in recommendations:
+                recommendation.measured_before = self.measure(workload)
+                # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+                self.connection.autocommit = True
+                with self.connection.cursor() as cursor:
+                    for statement in recommendation.statements:
+                        cursor.execute(statement)
+                self.connection.autocommit = autocommit
+                with self.connection.cursor() as cursor:
+                    cursor.execute(f"ANALYZE {recommendation.table}")
+                self.connection.commit()
+                recommendation.measured_after = self.measure(workload)
+                _logger.info("Created %s", recommendation.name)
+        finally:
+            self.connection.autocommit = autocommit
+        return recommendations
@@ -0,0 +1,272 @@
+"""
+Module Docstring: This module loads the vector path models with a selectable inference backend.
+
+Backends for the flan-t5 answer model (SEQ2SEQ_BACKEND) and the MiniLM embedder (EMBEDDING_BACKEND):
+- torch: eager PyTorch in fp32 (default, the previous behaviour)
+- torch-int8: PyTorch with the Linear layers dynamically quantized to int8
+- onnx: ONNX Runtime on a model exported by export_models.py
+- onnx-int8: ONNX Runtime on the dynamically int8-quantized export
+
+ONNX models are read from ONNX_MODEL_DIR (default onnx_models/), one directory per model and
+backend. export_models.py exports and quantizes them and checks their outputs against the fp32
+model. Heavy libraries are imported when a backend is used, so importing this module is cheap.
+
+Dependencies: torch, transformers, optimum[onnxruntime], langchain
+"""
+
+# Import dependencies
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .logger import create_logger
+_logger = create_logger("inference")
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+SEQ2SEQ_MODEL = "google/flan-t5-large"
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "onnx_models")
+
+# File names written by ORTQuantizer for the dynamically quantized exports
+_QUANTIZED_SEQ2SEQ_FILES = {
+    "encoder_file_name": "encoder_model_quantized.onnx",
+    "decoder_file_name": "decoder_model_quantized.onnx",
+    "decoder_with_past_file_name": "decoder_with_past_model_quantized.onnx",
+}
+_QUANTIZED_EMBEDDING_FILE = "model_quantized.onnx"
+
+
+def _check_backend(backend: str) -> str:
+    backend = backend.lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}. Expected one of {', '.join(BACKENDS)}")
+    return backend
+
+
+def onnx_path(model_name: str, backend: str) -> str:
+    """
+    Directory of the ONNX export of a model for the onnx or onnx-int8 backend.
+    """
+    suffix = "-int8" if backend.endswith("int8") else ""
+    return os.path.join(ONNX_MODEL_DIR, model_name.split("/")[-1] + suffix)
+
+
+def _require_export(path: str) -> None:
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"No ONNX export in {path}. Run export_models.py first.")
+
+
+def _quantize_linear(model):
+    import torch
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def load_seq2seq(backend: str = os.getenv("SEQ2SEQ_BACKEND", "torch"),
+                 model_name: str = SEQ2SEQ_MODEL,
+                 model_dir: str = "vectorllm_model/",
+                 tokenizer_dir: str = "vectorllm_tokentizer/") -> Tuple[object, object]:
+    """
+    Load the tokenizer and the seq2seq answer model.
+
+    Args:
+        backend (str, optional): Inference backend. Defaults to os.getenv("SEQ2SEQ_BACKEND", "torch").
+        model_name (str, optional): Hugging Face model. Defaults to "google/flan-t5-large".
+        model_dir (str, optional): Local copy of the PyTorch model. Defaults to "vectorllm_model/".
+        tokenizer_dir (str, optional): Local copy of the tokenizer. Defaults to "vectorllm_tokentizer/".
+
+    Returns:
+        Tuple[object, object]: (tokenizer, model). The ONNX models expose the same generate() API.
+    """
+    backend = _check_backend(backend)
+    if backend.startswith("onnx"):
+        path = onnx_path(model_name, backend)
+        _require_export(path)
+        from transformers import AutoTokenizer
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        files = _QUANTIZED_SEQ2SEQ_FILES if backend == "onnx-int8" else {}
+        model = ORTModelForSeq2SeqLM.from_pretrained(path, **files)
+        tokenizer = AutoTokenizer.from_pretrained(path)
+        _logger.info("Loaded %s with the %s backend", model_name, backend)
+        return tokenizer, model
+
+    from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+    try:
+        tokenizer = AutoTokenizer.from_pretrained(tokenizer_dir)
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_dir)
+        _logger.info("Successfully initialized model from local directory")
+    except Exception:
+        # Load model from hub and save model locally if not available
+        _logger.info("Unable to load model locally. Fetching from hugging face...")
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+        model.save_pretrained(model_dir)
+        tokenizer.save_pretrained(tokenizer_dir)
+        _logger.info("Successfully initialized model from Huggingface and saved in local directory")
+    model.eval()
+    if backend == "torch-int8":
+        model = _quantize_linear(model)
+    _logger.info("Loaded %s with the %s backend", model_name, backend)
+    return tokenizer, model
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence embeddings from an ONNX export of a sentence-transformers model (mean pooling, L2 norm).
+    """
+
+    def __init__(self, path: str, file_name: Optional[str] = None, batch_size: int = 32,
+                 max_length: int = 256, normalize: bool = True) -> None:
+        """
+        Initialize the OnnxEmbeddings.
+
+        Args:
+            path (str): Directory of the export.
+            file_name (str, optional): ONNX file in path. Defaults to the unquantized model.
+            batch_size (int, optional): Texts per inference call. Defaults to 32.
+            max_length (int, optional): Maximum tokens per text. Defaults to 256 (MiniLM's limit).
+            normalize (bool, optional): L2-normalize the embeddings like the sentence-transformers
+                                pipeline of all-MiniLM-L6-v2. Defaults to True.
+        """
+        _require_export(path)
+        from transformers import AutoTokenizer
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        options = {"file_name": file_name} if file_name else {}
+        self.model = ORTModelForFeatureExtraction.from_pretrained(path, **options)
+        self.tokenizer = AutoTokenizer.from_pretrained(path)
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.normalize = normalize
+
+    def _embed(self, texts: Sequence[str]) -> np.ndarray:
+        batches = []
+        for start in range(0, len(texts), self.batch_size):
+            inputs = self.tokenizer(list(texts[start:start + self.batch_size]), padding=True, truncation=True,
+                                    max_length=self.max_length, return_tensors="np")
+            hidden = np.asarray(self.model(**inputs).last_hidden_state)
+            mask = inputs["attention_mask"][..., None].astype(hidden.dtype)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            if self.normalize:
+                pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            batches.append(pooled)
+        return np.concatenate(batches) if batches else np.zeros((0, 0), dtype=np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+
+def create_embeddings(model_name: str = EMBEDDING_MODEL, model_kwargs: Optional[dict] = None,
+                      backend: str = os.getenv("EMBEDDING_BACKEND", "torch")) -> Embeddings:
+    """
+    Create the sentence embedding model with the given backend.
+
+    Args:
+        model_name (str, optional): Embedding model. Defaults to "sentence-transformers/all-MiniLM-L6-v2".
+        model_kwargs (dict, optional): Keyword arguments of the PyTorch model.
+        backend (str, optional): Inference backend. Defaults to os.getenv("EMBEDDING_BACKEND", "torch").
+
+    Returns:
+        Embeddings: LangChain embeddings.
+    """
+    backend = _check_backend(backend)
+    if backend.startswith("onnx"):
+        file_name = _QUANTIZED_EMBEDDING_FILE if backend == "onnx-int8" else None
+        return OnnxEmbeddings(onnx_path(model_name, backend), file_name=file_name)
+
+    from langchain.embeddings import HuggingFaceEmbeddings
+    embeddings = HuggingFaceEmbeddings(model_name=model_name, model_kwargs=model_kwargs or {})
+    if backend == "torch-int8":
+        embeddings.client = _quantize_linear(embeddings.client)
+    return embeddings
+
+
+def export_onnx(kind: str, model_name: str, quantize: bool = False, arch: str = "avx2") -> str:
+    """
+    Export a model to ONNX and, optionally, quantize it dynamically to int8.
+
+    Dynamic quantization computes activation ranges at run time, so it needs no calibration data;
+    parity_check validates the result on sample texts instead.
+
+    Args:
+        kind (str): "seq2seq" or "embeddings".
+        model_name (str): Hugging Face model.
+        quantize (bool, optional): Also write the int8 export. Defaults to False.
+        arch (str, optional): Target instruction set of the int8 kernels ("avx2", "avx512",
+                                "avx512_vnni" or "arm64"). Defaults to "avx2".
+
+    Returns:
+        str: Directory of the export (the int8 one when quantize is set).
+    """
+    from transformers import AutoTokenizer
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTModelForSeq2SeqLM, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    model_class = ORTModelForSeq2SeqLM if kind == "seq2seq" else ORTModelForFeatureExtraction
+    path = onnx_path(model_name, "onnx")
+    model_class.from_pretrained(model_name, export=True).save_pretrained(path)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(path)
+    _logger.info("Exported %s to %s", model_name, path)
+    if not quantize:
+        return path
+
+    int8_path = onnx_path(model_name, "onnx-int8")
+    config = getattr(AutoQuantizationConfig, arch)(is_static=False, per_channel=False)
+    files = ["encoder_model.onnx", "decoder_model.onnx", "decoder_with_past_model.onnx"] \
+        if kind == "seq2seq" else ["model.onnx"]
+    for file_name in files:
+        quantizer = ORTQuantizer.from_pretrained(path, file_name=file_name)
+        quantizer.quantize(save_dir=int8_path, quantization_config=config)
+    AutoTokenizer.from_pretrained(path).save_pretrained(int8_path)
+    _logger.info("Quantized %s to %s", model_name, int8_path)
+    return int8_path
+
+
+def generate(tokenizer, model, texts: Sequence[str], max_new_tokens: int = 32) -> List[str]:
+    """
+    Greedy generation with any backend of load_seq2seq.
+    """
+    inputs = tokenizer(list(texts), return_tensors="pt", padding=True, truncation=True, max_length=512)
+    outputs = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False)
+    return tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+
+def parity_check(kind: str, backend: str, texts: Sequence[str], model_name: Optional[str] = None,
+                 min_cosine: float = 0.98, min_match: float = 0.8) -> dict:
+    """
+    Compare the outputs of a backend with the fp32 PyTorch model.
+
+    Embeddings pass when every cosine similarity reaches min_cosine; the seq2seq model passes when
+    at least min_match of the greedy answers are identical.
+
+    Args:
+        kind (str): "seq2seq" or "embeddings".
+        backend (str): Backend to check.
+        texts (Sequence[str]): Sample inputs.
+        model_name (str, optional): Model. Defaults to the model of kind.
+        min_cosine (float, optional): Minimum cosine similarity of the embeddings. Defaults to 0.98.
+        min_match (float, optional): Minimum share of identical answers. Defaults to 0.8.
+
+    Returns:
+        dict: The parity metrics and "passed".
+    """
+    texts = list(texts)
+    if kind == "embeddings":
+        model_name = model_name or EMBEDDING_MODEL
+        reference = np.asarray(create_embeddings(model_name, backend="torch").embed_documents(texts))
+        candidate = np.asarray(create_embeddings(model_name, backend=backend).embed_documents(texts))
+        cosine = (reference * candidate).sum(axis=1) / (
+            np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1))
+        result = {"min_cosine": float(cosine.min()), "mean_cosine": float(cosine.mean()),
+                  "passed": bool(cosine.min() >= min_cosine)}
+    else:
+        model_name = model_name or SEQ2SEQ_MODEL
+        reference = generate(*load_seq2seq("torch", model_name), texts)
+        candidate = generate(*load_seq2seq(backend, model_name), texts)
+        match = float(np.mean([a.strip() == b.strip() for a, b in zip(reference, candidate)]))
+        result = {"exact_match": match, "passed": match >= min_match}
+    result.update({"kind": kind, "backend": backend, "model": model_name, "samples": len(texts)})
+    return result
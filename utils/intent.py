@@ -0,0 +1,219 @@
+"""
+Module Docstring: This module classifies questions into the answer path that can serve them.
+
+IntentClassifier embeds a question with the sentence embedding model already used by the vector
+path and scores it with a linear softmax head trained on labeled examples, so routing costs one
+small embedding instead of a call to the 7B model. Questions are routed to "sql" (invoice
+figures in PostgreSQL), "vector" (document content in the vector DB) or "both". Predictions below
+min_confidence are routed to "both" so an uncertain question is never answered by the wrong path
+alone.
+
+The head is trained at start-up on SEED_EXAMPLES plus the JSONL file in INTENT_EXAMPLES (one
+{"text": ..., "route": ...} object per line). RouteStats tracks classifier latency, route counts
+and accuracy on requests that carry their expected route.
+
+Dependencies: numpy
+"""
+
+# Import dependencies
+import os
+import json
+import time
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .logger import create_logger
+_logger = create_logger("intent")
+
+ROUTES = ("sql", "vector", "both")
+
+SEED_EXAMPLES: List[Tuple[str, str]] = [
+    ("What is the total sales amount for each seller?", "sql"),
+    ("How many invoices were issued in 2021?", "sql"),
+    ("Which client has the highest total invoice value?", "sql"),
+    ("List the top 5 items by quantity sold", "sql"),
+    ("What is the average tax per invoice?", "sql"),
+    ("Show the monthly revenue for the last year", "sql"),
+    ("Sum of net worth of all items sold by ACME", "sql"),
+    ("How many distinct clients do we have?", "sql"),
+    ("Which invoices have a total greater than 1000?", "sql"),
+    ("Count the invoice items per unit of measure", "sql"),
+    ("What was the total VAT collected in March?", "sql"),
+    ("Give me the invoice count by seller and month", "sql"),
+    ("What do the payment terms in the documents say?", "vector"),
+    ("Summarize the document about the refund policy", "vector"),
+    ("Explain the warranty conditions described in the contract", "vector"),
+    ("What does the agreement say about late delivery?", "vector"),
+    ("Describe the product mentioned in the brochure", "vector"),
+    ("Who is responsible for shipping according to the terms?", "vector"),
+    ("What are the cancellation rules in the policy document?", "vector"),
+    ("Find the passage that mentions data protection", "vector"),
+    ("What is the company's return policy?", "vector"),
+    ("According to the manual, how should the device be installed?", "vector"),
+    ("What notice period does the contract require?", "vector"),
+    ("Tell me what the document says about penalties", "vector"),
+    ("What is the total billed to ACME and what do their contract terms say about discounts?", "both"),
+    ("How many invoices did Globex receive and what does their agreement say about payment?", "both"),
+    ("Which seller sold the most and what does the policy say about that seller's warranty?", "both"),
+    ("Show the total tax per client and explain the tax rules in the documents", "both"),
+    ("What was our revenue last month and what do the terms say about late fees?", "both"),
+    ("List the top items sold and describe them from the product documents", "both"),
+    ("How much did we invoice Initech, and what are the delivery terms in their contract?", "both"),
+    ("Compare the invoiced totals with the prices stated in the contract", "both"),
+]
+
+
+class IntentClassifier:
+    """
+    This class routes questions with an embedding model and a linear softmax head.
+    """
+
+    def __init__(self, embed: Callable[[List[str]], Sequence[Sequence[float]]],
+                 min_confidence: float = float(os.getenv("INTENT_MIN_CONFIDENCE", "0.5")),
+                 l2: float = 1e-3, epochs: int = 300, learning_rate: float = 0.5) -> None:
+        """
+        Initialize the IntentClassifier.
+
+        Args:
+            embed (Callable): Embeds a list of texts, e.g. HuggingFaceEmbeddings.embed_documents.
+            min_confidence (float, optional): Predictions below this probability are routed to "both".
+                                Defaults to os.getenv("INTENT_MIN_CONFIDENCE", "0.5").
+            l2 (float, optional): L2 regularization of the head. Defaults to 1e-3.
+            epochs (int, optional): Gradient descent steps. Defaults to 300.
+            learning_rate (float, optional): Gradient descent step size. Defaults to 0.5.
+        """
+        self.embed = embed
+        self.min_confidence = min_confidence
+        self.l2 = l2
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.weights: Optional[np.ndarray] = None
+        self.bias: Optional[np.ndarray] = None
+        self.validation_accuracy: Optional[float] = None
+
+    def _features(self, texts: List[str]) -> np.ndarray:
+        vectors = np.asarray(self.embed(list(texts)), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _train(self, features: np.ndarray, labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        weights = np.zeros((features.shape[1], len(ROUTES)), dtype=np.float32)
+        bias = np.zeros(len(ROUTES), dtype=np.float32)
+        targets = np.eye(len(ROUTES), dtype=np.float32)[labels]
+        for _ in range(self.epochs):
+            probabilities = _softmax(features @ weights + bias)
+            error = (probabilities - targets) / len(features)
+            weights -= self.learning_rate * (features.T @ error + self.l2 * weights)
+            bias -= self.learning_rate * error.sum(axis=0)
+        return weights, bias
+
+    def fit(self, examples: List[Tuple[str, str]], folds: int = 5) -> "IntentClassifier":
+        """
+        Train the head on (text, route) examples and measure its k-fold validation accuracy.
+
+        Args:
+            examples (List[Tuple[str, str]]): Labeled questions.
+            folds (int, optional): Cross-validation folds. Defaults to 5.
+
+        Returns:
+            IntentClassifier: self
+        """
+        texts = [text for text, _ in examples]
+        labels = np.array([ROUTES.index(route) for _, route in examples])
+        features = self._features(texts)
+
+        # Interleaved folds keep every route in every fold
+        correct = 0
+        for fold in range(folds):
+            test = np.arange(len(examples)) % folds == fold
+            weights, bias = self._train(features[~test], labels[~test])
+            correct += int(((features[test] @ weights + bias).argmax(axis=1) == labels[test]).sum())
+        self.validation_accuracy = correct / len(examples)
+
+        self.weights, self.bias = self._train(features, labels)
+        _logger.info("Intent classifier trained on %d examples, validation accuracy %.3f",
+                     len(examples), self.validation_accuracy)
+        return self
+
+    def predict(self, text: str) -> Tuple[str, Dict[str, float]]:
+        """
+        Route a question.
+
+        Args:
+            text (str): The question.
+
+        Returns:
+            Tuple[str, Dict[str, float]]: The route and the probability of every route.
+        """
+        probabilities = _softmax(self._features([text]) @ self.weights + self.bias)[0]
+        scores = {route: float(p) for route, p in zip(ROUTES, probabilities)}
+        route = ROUTES[int(probabilities.argmax())]
+        if scores[route] < self.min_confidence:
+            route = "both"
+        return route, scores
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def load_examples(path: Optional[str] = os.getenv("INTENT_EXAMPLES")) -> List[Tuple[str, str]]:
+    """
+    Return SEED_EXAMPLES plus the labeled examples of a JSONL file, if given.
+    """
+    examples = list(SEED_EXAMPLES)
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    if entry.get("route") in ROUTES:
+                        examples.append((entry["text"], entry["route"]))
+    return examples
+
+
+class RouteStats:
+    """
+    Thread-safe counters of classifier latency, routes taken and accuracy on labeled requests.
+    """
+
+    def __init__(self, window: int = 1000) -> None:
+        self._lock = threading.Lock()
+        self._latencies: List[float] = []
+        self._window = window
+        self._routes = {route: 0 for route in ROUTES}
+        self._labeled = 0
+        self._correct = 0
+
+    def record(self, route: str, elapsed: float, expected: Optional[str] = None) -> None:
+        with self._lock:
+            self._latencies.append(elapsed * 1000)
+            del self._latencies[:-self._window]
+            self._routes[route] += 1
+            if expected is not None:
+                self._labeled += 1
+                self._correct += int(expected == route)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            latencies = np.array(self._latencies) if self._latencies else np.zeros(1)
+            return {
+                "routes": dict(self._routes),
+                "classifier_p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                "classifier_p95_ms": round(float(np.percentile(latencies, 95)), 3),
+                "labeled_requests": self._labeled,
+                "accuracy": self._correct / self._labeled if self._labeled else None,
+            }
+
+
+def timed_predict(classifier: IntentClassifier, text: str) -> Tuple[str, Dict[str, float], float]:
+    """
+    Predict a route and return (route, scores, seconds).
+    """
+    start = time.perf_counter()
+    route, scores = classifier.predict(text)
+    return route, scores, time.perf_counter() - start
@@ -32,12 +32,14 @@ def invoke_llm(text: str, llm: any) -> str:
     template = """
     You are a Senior Data Engineer. Your main role is to generate postgresSQL query based on User response.
     we are having two tables first table name is invoice_info which contains columns name which is given in triple backticks.
-    '''invoice_id(datatype : int)which is primary_key of table,invoice_date(datatype : date),seller_name(datatype : varchar), seller_address(datatype : varchar), seller_taxid(datatype : varchar),
+    '''invoice_id(datatype : varchar) which together with invoice_date is the unique key of the table,invoice_date(datatype : date),seller_name(datatype : varchar), seller_address(datatype : varchar), seller_taxid(datatype : varchar),
     seller_iban(datatype : varchar), client_name(datatype : varchar), client_address(datatype : varchar), client_taxid(datatype : varchar),
-    total(datatype : int)'''
+    total_tax(datatype : numeric), total(datatype : numeric)'''
     Second table name is invoice_items which contains columns name which is given in triple backticks.
-    '''item_id(datatype : int) which is primary key of table, invoice_id(datatype : int) which is forigen key in this table,quantity(datatype : int), unit_measure(datatype : varchar),net_price(datatype : float),net_worth(datatype : float),vat(datatype : float),
-    sales(datatype : float)'''
+    '''item_id(datatype : bigint) which is primary key of table, invoice_id(datatype : varchar) which is forigen key in this table,invoice_date(datatype : date) which is the date of the invoice,
+    item_name(datatype : varchar),quantity(datatype : numeric), unit_measure(datatype : varchar),net_price(datatype : numeric),net_worth(datatype : numeric),vat(datatype : numeric),
+    sales(datatype : numeric)'''
+    Both tables are partitioned by invoice_date, so always filter on invoice_date for date ranges and join on both invoice_id and invoice_date.
     If customers ask question related to invoice try to make correct postgresSQL query and if there is question which includes both the table information try 
     to use joins using both the tables.
     For date time question make use of appropriate date functions used in postgresSQL for queries related to date or time.
@@ -50,9 +52,7 @@ def invoke_llm(text: str, llm: any) -> str:
     
     # Create a PromptTemplate instance
     prompt = PromptTemplate(template=template, input_variables=["text"])
-    _logger.info("================================")
-    _logger.info("Created PromptTemplate: %s" % prompt)
-    _logger.info("================================")
+    _logger.debug("Created PromptTemplate: %s", prompt)
     
     # Create the LLMChain
     llm_chain = LLMChain(prompt=prompt, llm=llm)
@@ -62,7 +62,7 @@ def invoke_llm(text: str, llm: any) -> str:
     sql_query = llm_chain.invoke(text)
     try:
         sql_query_str = re.search(r'SELECT.*', sql_query['text'], re.DOTALL).group(0).strip('```').strip()
-        _logger.info("Generated SQL query: %s" % sql_query_str)
+        _logger.info("Generated SQL query: %s", sql_query_str)
     except AttributeError:
         _logger.error("No SELECT statement found in the SQL query.")
 
@@ -0,0 +1,255 @@
+"""
+Module Docstring: This module replays recorded questions against the API and reports on SLOs.
+
+A scenario sets the traffic mix over endpoints, the arrival pattern, the share of repeated
+questions (to exercise the caches) and the SLO thresholds. Arrivals are open loop: requests are
+sent at their scheduled time whether or not earlier ones have completed, and latency is measured
+from the scheduled time, so a slow server cannot hide its queueing by slowing the client down.
+
+Arrival patterns:
+- constant: `rate` requests per second, evenly spaced.
+- poisson: exponential gaps with a mean rate of `rate`.
+- burst: `burst_size` requests at once every `burst_interval` seconds, on top of `rate`.
+
+Dependencies: aiohttp, numpy
+"""
+
+# Import dependencies
+import json
+import time
+import random
+import asyncio
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+import numpy as np
+
+from .logger import create_logger
+_logger = create_logger("load_harness")
+
+
+@dataclass
+class Scenario:
+    """
+    A replayable load-test scenario.
+    """
+    name: str
+    duration: float = 60.0
+    mix: Dict[str, float] = field(default_factory=lambda: {"/sqlQuery": 1.0})
+    arrival: Dict[str, float] = field(default_factory=lambda: {"type": "constant", "rate": 1.0})
+    repeat: float = 0.0
+    hot_questions: int = 5
+    timeout: float = 60.0
+    slo: Dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class Result:
+    """
+    The outcome of one request.
+    """
+    endpoint: str
+    scheduled: float
+    latency: float
+    service_time: float
+    status: int
+    bytes: int = 0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and 200 <= self.status < 400
+
+
+def load_corpus(path: str) -> List[dict]:
+    """
+    Read recorded questions: JSONL lines with "text" and optionally "endpoint", "route" and "response".
+    """
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def load_scenarios(path: str) -> Dict[str, Scenario]:
+    """
+    Read a JSON object of scenario name -> scenario settings.
+    """
+    with open(path, encoding="utf-8") as file:
+        return {name: Scenario(name=name, **settings) for name, settings in json.load(file).items()}
+
+
+def arrival_times(arrival: Dict[str, float], duration: float, seed: int = 0) -> List[float]:
+    """
+    Return the send offsets in seconds of an arrival pattern over duration.
+    """
+    kind = arrival.get("type", "constant")
+    rate = float(arrival.get("rate", 0.0))
+    rng = random.Random(seed)
+    times: List[float] = []
+    if kind == "constant" and rate > 0:
+        times = [i / rate for i in range(int(duration * rate))]
+    elif kind == "poisson" and rate > 0:
+        t = rng.expovariate(rate)
+        while t < duration:
+            times.append(t)
+            t += rng.expovariate(rate)
+    elif kind == "burst":
+        times = [i / rate for i in range(int(duration * rate))] if rate > 0 else []
+        interval = float(arrival.get("burst_interval", 10.0))
+        size = int(arrival.get("burst_size", 10))
+        times += [burst * interval for burst in range(int(np.ceil(duration / interval))) for _ in range(size)]
+    elif kind not in ("constant", "poisson"):
+        raise ValueError(f"Unknown arrival type: {kind}")
+    return sorted(times)
+
+
+def plan_requests(scenario: Scenario, corpus: List[dict], seed: int = 0) -> List[Tuple[float, str, dict]]:
+    """
+    Schedule (offset, endpoint, body) requests following the scenario's arrivals, mix and repeat share.
+    """
+    rng = random.Random(seed)
+    endpoints = list(scenario.mix)
+    weights = [scenario.mix[endpoint] for endpoint in endpoints]
+    # Questions recorded for an endpoint, else any question without an endpoint
+    pools = {
+        endpoint: [record for record in corpus if record.get("endpoint") == endpoint]
+                  or [record for record in corpus if not record.get("endpoint")]
+        for endpoint in endpoints
+    }
+    for endpoint, pool in pools.items():
+        if not pool:
+            raise ValueError(f"The corpus has no question for {endpoint}")
+    hot = {endpoint: pool[:scenario.hot_questions] for endpoint, pool in pools.items()}
+
+    plan = []
+    for offset in arrival_times(scenario.arrival, scenario.duration, seed):
+        endpoint = rng.choices(endpoints, weights)[0]
+        pool = hot[endpoint] if rng.random() < scenario.repeat else pools[endpoint]
+        record = rng.choice(pool)
+        body = {"text": record["text"]}
+        if endpoint == "/ask" and record.get("route"):
+            body["route"] = record["route"]
+        plan.append((offset, endpoint, body))
+    return plan
+
+
+Send = Callable[[str, dict], Awaitable[Tuple[int, int]]]
+
+
+def http_sender(session: aiohttp.ClientSession, host: str, timeout: float) -> Send:
+    """
+    Return a send(endpoint, body) -> (status, response bytes) function posting with aiohttp.
+    """
+    async def send(endpoint: str, body: dict) -> Tuple[int, int]:
+        async with session.post(host.rstrip("/") + endpoint, json=body,
+                                timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            content = await response.read()
+            return response.status, len(content)
+    return send
+
+
+async def run_plan(plan: List[Tuple[float, str, dict]], send: Send) -> Tuple[List[Result], float]:
+    """
+    Send every planned request at its offset from now, without waiting for earlier responses.
+
+    Returns:
+        Tuple[List[Result], float]: The results and the wall-clock seconds of the run.
+    """
+    start = time.perf_counter()
+
+    async def one(offset: float, endpoint: str, body: dict) -> Result:
+        await asyncio.sleep(max(0.0, start + offset - time.perf_counter()))
+        sent = time.perf_counter()
+        status, size, error = 0, 0, None
+        try:
+            status, size = await send(endpoint, body)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        done = time.perf_counter()
+        return Result(endpoint=endpoint, scheduled=offset, latency=done - (start + offset),
+                      service_time=done - sent, status=status, bytes=size, error=error)
+
+    results = await asyncio.gather(*(one(*request) for request in plan))
+    return list(results), time.perf_counter() - start
+
+
+async def run_scenario(scenario: Scenario, corpus: List[dict], host: str, seed: int = 0) -> dict:
+    """
+    Run a scenario against a live API and return its summary.
+    """
+    plan = plan_requests(scenario, corpus, seed)
+    _logger.info("Scenario %s: %d requests over %.0f seconds", scenario.name, len(plan), scenario.duration)
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        results, wall = await run_plan(plan, http_sender(session, host, scenario.timeout))
+    return summarize(scenario, results, wall)
+
+
+def _stats(results: List[Result], wall: float) -> dict:
+    latencies = np.array([result.latency for result in results if result.ok]) * 1000
+    errors = sum(not result.ok for result in results)
+    stats = {
+        "requests": len(results),
+        "errors": errors,
+        "error_rate": round(errors / len(results), 4) if results else 0.0,
+        "throughput": round((len(results) - errors) / wall, 2) if wall else 0.0,
+        "mean_bytes": round(float(np.mean([result.bytes for result in results])), 1) if results else 0.0,
+    }
+    for name, q in (("p50_ms", 50), ("p95_ms", 95), ("p99_ms", 99)):
+        stats[name] = round(float(np.percentile(latencies, q)), 1) if len(latencies) else None
+    stats["max_service_ms"] = round(max((r.service_time for r in results), default=0.0) * 1000, 1)
+    return stats
+
+
+def summarize(scenario: Scenario, results: List[Result], wall: float) -> dict:
+    """
+    Compute latency percentiles, throughput and error rates overall and per endpoint, and check the SLOs.
+    """
+    overall = _stats(results, wall)
+    endpoints = {endpoint: _stats([r for r in results if r.endpoint == endpoint], wall)
+                 for endpoint in sorted({r.endpoint for r in results})}
+    errors: Dict[str, int] = {}
+    for result in results:
+        if not result.ok:
+            key = result.error.split(":")[0] if result.error else f"HTTP {result.status}"
+            errors[key] = errors.get(key, 0) + 1
+    return {
+        "scenario": scenario.name,
+        "seconds": round(wall, 2),
+        "offered_rate": round(len(results) / scenario.duration, 2) if scenario.duration else None,
+        "overall": overall,
+        "endpoints": endpoints,
+        "error_kinds": errors,
+        "violations": check_slo(overall, scenario.slo),
+    }
+
+
+def check_slo(stats: dict, slo: Dict[str, float]) -> List[str]:
+    """
+    Compare stats against SLO thresholds: *_ms and error_rate are maxima, min_throughput a minimum.
+    """
+    violations = []
+    for key, limit in slo.items():
+        if key == "min_throughput":
+            if stats["throughput"] < limit:
+                violations.append(f"throughput {stats['throughput']}/s < {limit}/s")
+        elif stats.get(key) is None:
+            violations.append(f"{key} not measured (no successful request)")
+        elif stats[key] > limit:
+            violations.append(f"{key} {stats[key]} > {limit}")
+    return violations
+
+
+def format_report(summary: dict) -> str:
+    """
+    Render a summary as a text table followed by the SLO verdict.
+    """
+    columns = ["requests", "error_rate", "throughput", "p50_ms", "p95_ms", "p99_ms", "mean_bytes"]
+    lines = [f"Scenario {summary['scenario']} ({summary['seconds']} s, offered {summary['offered_rate']} req/s)",
+             f"{'endpoint':<14}" + "".join(f"{column:>12}" for column in columns)]
+    for name, stats in [("all", summary["overall"]), *summary["endpoints"].items()]:
+        lines.append(f"{name:<14}" + "".join(f"{str(stats[column]):>12}" for column in columns))
+    if summary["error_kinds"]:
+        lines.append("Errors: " + ", ".join(f"{kind} x{count}" for kind, count in summary["error_kinds"].items()))
+    lines.append("SLO: " + ("PASS" if not summary["violations"] else "FAIL - " + "; ".join(summary["violations"])))
+    return "\n".join(lines)
@@ -1,49 +1,232 @@
 """
 This module provides a utility function to create a logger with a specified name and log level.
 
+Records are not written by the calling thread. Every logger created here shares one QueueHandler
+that only puts the record on a bounded queue; a QueueListener thread formats and writes them.
+When the queue is full, records are dropped and counted instead of blocking the request. Once
+shutdown_logging has drained the queue and stopped the thread, records are written directly by the
+calling thread, so nothing logged during or after shutdown is lost.
+
+Records are written as one JSON object per line (LOG_FORMAT=json, the default) with the request ID
+of the current request, or in the classic text format (LOG_FORMAT=text). Messages longer than
+LOG_MAX_CHARS (default 2000) are truncated, and records below WARNING can be sampled per logger with
+LOG_SAMPLE_RATES, e.g. "llm_invoke=0.1,Gemini=0.5".
+
 Dependencies:
 - logging: Standard library module for logging.
 
 Usage:
 1. Call the create_logger function with the desired logger name and log level.
 2. The function returns a logger object that can be used for logging messages.
+3. Set the request ID of the current request with request_id_var (app.py does this per request).
 
 Example:
     logger = create_logger(logger_name="my_logger", log_level=logging.INFO)
     logger.info("This is an info message.")
+    logger.info("Query done", extra={"rows": 12})
 """
 
+import os
+import sys
+import json
+import queue
+import atexit
+import random
 import logging
+import threading
+import contextvars
+import logging.handlers
+from typing import Dict, Optional, TextIO
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_MAX_CHARS = int(os.getenv("LOG_MAX_CHARS", "2000"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+request_id_var: contextvars.ContextVar = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed with extra= and goes into the JSON record
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """
+    Parse "logger=rate,logger=rate" into a dict.
+    """
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+LOG_SAMPLE_RATES = parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format a record as a single line of JSON.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                payload[key] = value
+        if record.exc_text:
+            payload["exc_info"] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self) -> None:
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(request_id)s - %(message)s')
+
+
+class PayloadFilter(logging.Filter):
+    """
+    Per-logger sampling of records below WARNING and truncation of long messages.
+
+    Runs in the calling thread before the record is queued, so dropped records cost no formatting.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, max_chars: int = LOG_MAX_CHARS) -> None:
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.max_chars = max_chars
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return False
+        message = record.getMessage()
+        if self.max_chars and len(message) > self.max_chars:
+            message = f"{message[:self.max_chars]}... [{len(message) - self.max_chars} chars truncated]"
+        # Merge the arguments now: they may be mutated or unpicklable by the time the writer runs
+        record.msg, record.args = message, None
+        return True
+
 
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks: records are dropped and counted when the queue is full.
+    """
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+        # Set while the background writer is stopped: records are then written by the calling thread
+        self.direct: Optional[logging.Handler] = None
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # This handler is the only one on our loggers, so the record is updated in place instead of copied
+        record.request_id = request_id_var.get()
+        if record.exc_info:
+            # Tracebacks reference frames of the calling thread; render them before queuing
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        direct = self.direct
+        if direct is not None:
+            direct.handle(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+_handler = NonBlockingQueueHandler(_queue)
+_listener: Optional[logging.handlers.QueueListener] = None
+_listener_lock = threading.Lock()
+
+
+def configure_logging(stream: Optional[TextIO] = None, log_format: str = LOG_FORMAT) -> None:
+    """
+    Start (or restart) the background writer.
+
+    Args:
+        stream (TextIO, optional): Where records are written. Defaults to sys.stderr.
+        log_format (str, optional): "json" or "text". Defaults to os.getenv("LOG_FORMAT", "json").
+    """
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter())
+        _listener = logging.handlers.QueueListener(_queue, output, respect_handler_level=True)
+        _listener.start()
+        _handler.direct = None
 
-def create_logger(logger_name: str, log_level=logging.INFO):
+
+def shutdown_logging() -> None:
+    """
+    Write the queued records and stop the background writer. Later records are written directly.
+    """
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            # Switch first, so records logged while the queue drains do not land in a queue nobody reads
+            _handler.direct = _listener.handlers[0]
+            _listener.stop()
+            _listener = None
+    if _handler.dropped:
+        sys.stderr.write(f"logging: dropped {_handler.dropped} records on a full queue\n")
+        _handler.dropped = 0
+
+
+atexit.register(shutdown_logging)
+
+
+def dropped_records() -> int:
+    return _handler.dropped
+
+
+def create_logger(logger_name: str, log_level=logging.INFO, sample_rate: Optional[float] = None,
+                  max_chars: int = LOG_MAX_CHARS):
     """
     Creates a logger with the specified logger_name at the given log_level.
 
+    Calling it again for the same name reconfigures the logger instead of adding another handler.
+
     Args:
         logger_name (str): Name of the logger.
         log_level (int, optional): Logging configuration level. Defaults to logging.INFO.
+        sample_rate (float, optional): Share of records below WARNING that are kept.
+                                Defaults to the logger's entry in LOG_SAMPLE_RATES, else 1.0.
+        max_chars (int, optional): Messages are truncated to this length, 0 to keep them whole.
+                                Defaults to os.getenv("LOG_MAX_CHARS", "2000").
 
     Returns:
         logger: Python logger object.
     """
+    if _listener is None:
+        configure_logging()
+
     # create logger
     logger = logging.getLogger(logger_name)
 
     # set logging level
     logger.setLevel(log_level)
 
-    # create console handler and set level
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(log_level)
-
-    # create formatter
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-
-    # add formatter to console handler
-    console_handler.setFormatter(formatter)
+    # attach the shared queue handler once; the root logger's handlers would duplicate the output
+    if _handler not in logger.handlers:
+        logger.addHandler(_handler)
+    logger.propagate = False
 
-    # add console handler to logger
-    logger.addHandler(console_handler)
+    # replace the sampling and truncation policy
+    for existing in [f for f in logger.filters if isinstance(f, PayloadFilter)]:
+        logger.removeFilter(existing)
+    if sample_rate is None:
+        sample_rate = LOG_SAMPLE_RATES.get(logger_name, 1.0)
+    logger.addFilter(PayloadFilter(sample_rate, max_chars))
 
     return logger
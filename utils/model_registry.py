@@ -0,0 +1,276 @@
+"""
+Module Docstring: This module keeps the process's models within a memory budget.
+
+ModelRegistry loads every registered model on first use and records the resident memory (RSS)
+and time each load added. When the loaded models exceed MODEL_MEMORY_BUDGET_MB, the least recently
+used models that are neither pinned nor in use by a request are evicted. Models idle for longer
+than MODEL_IDLE_TTL seconds are evicted as well. Load and evict events are kept for inspection.
+
+Models are used inside `with registry.use(name) as model:` so they cannot be evicted while a
+request holds them. Loading can take seconds, so call use() from a worker thread, not the event loop.
+A model is used by one thread at a time: a ggml context (CTransformers) is not safe to drive from
+several threads, so use() waits for the current holder. Background work such as cache prewarming
+passes background=True and only takes a model when no request is waiting for it.
+
+Dependencies: ctypes, gc, psutil, threading
+"""
+
+# Import dependencies
+import os
+import gc
+import time
+import ctypes
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import psutil
+
+from .logger import create_logger
+_logger = create_logger("model_registry")
+
+
+def rss_mb() -> float:
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def _release_memory() -> None:
+    """
+    Collect garbage and return freed heap pages to the OS where glibc allows it.
+    """
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+@dataclass
+class ModelEntry:
+    """
+    A registered model and its bookkeeping.
+    """
+    name: str
+    loader: Callable[[], Any]
+    pinned: bool = False
+    model: Any = None
+    rss_mb: Optional[float] = None
+    load_seconds: Optional[float] = None
+    last_used: float = 0.0
+    in_use: int = 0
+    loads: int = 0
+    evictions: int = 0
+    # Exclusive use of the model: held by one thread, foreground callers go first
+    held: bool = False
+    waiting: int = 0
+    turn: threading.Condition = field(default_factory=threading.Condition, repr=False)
+
+    @property
+    def loaded(self) -> bool:
+        return self.model is not None
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "loaded": self.loaded,
+            "pinned": self.pinned,
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "rss_mb": None if self.rss_mb is None else round(self.rss_mb, 1),
+            "load_seconds": None if self.load_seconds is None else round(self.load_seconds, 3),
+            "idle_seconds": round(time.time() - self.last_used, 1) if self.loaded else None,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
+
+
+class ModelRegistry:
+    """
+    This class loads models lazily and evicts idle ones to stay within a memory budget.
+    """
+
+    def __init__(self, budget_mb: float = float(os.getenv("MODEL_MEMORY_BUDGET_MB", "0")),
+                 idle_ttl: float = float(os.getenv("MODEL_IDLE_TTL", "0")),
+                 max_events: int = 200) -> None:
+        """
+        Initialize the ModelRegistry.
+
+        Args:
+            budget_mb (float, optional): Memory budget of the loaded models in MB, 0 for no budget.
+                                Defaults to os.getenv("MODEL_MEMORY_BUDGET_MB", "0").
+            idle_ttl (float, optional): Evict unpinned models unused for this many seconds, 0 to keep them.
+                                Defaults to os.getenv("MODEL_IDLE_TTL", "0").
+            max_events (int, optional): Load and evict events kept. Defaults to 200.
+        """
+        self.budget_mb = budget_mb
+        self.idle_ttl = idle_ttl
+        self._entries: Dict[str, ModelEntry] = {}
+        self._events = deque(maxlen=max_events)
+        self._lock = threading.RLock()
+        # Loads are serialized so the RSS delta of a load belongs to a single model
+        self._load_lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any], pinned: bool = False) -> None:
+        """
+        Register a model. Nothing is loaded until the first use.
+
+        Args:
+            name (str): Model name.
+            loader (Callable[[], Any]): Zero-argument function returning the model.
+            pinned (bool, optional): Never evict the model once loaded. Defaults to False.
+        """
+        with self._lock:
+            self._entries[name] = ModelEntry(name=name, loader=loader, pinned=pinned)
+
+    def pin(self, name: str, pinned: bool = True) -> None:
+        with self._lock:
+            self._entries[name].pinned = pinned
+
+    def loaded_mb(self) -> float:
+        with self._lock:
+            return sum(entry.rss_mb or 0.0 for entry in self._entries.values() if entry.loaded)
+
+    def _record(self, event: str, entry: ModelEntry, seconds: float, reason: str = "") -> None:
+        self._events.append({
+            "ts": time.time(), "event": event, "model": entry.name,
+            "seconds": round(seconds, 3), "rss_mb": None if entry.rss_mb is None else round(entry.rss_mb, 1),
+            "reason": reason,
+        })
+
+    def _evictable(self, exclude: Optional[str] = None) -> List[ModelEntry]:
+        candidates = [entry for entry in self._entries.values()
+                      if entry.loaded and not entry.pinned and entry.in_use == 0 and entry.name != exclude]
+        return sorted(candidates, key=lambda entry: entry.last_used)
+
+    def _evict(self, entry: ModelEntry, reason: str) -> None:
+        start = time.perf_counter()
+        entry.model = None
+        entry.evictions += 1
+        _release_memory()
+        seconds = time.perf_counter() - start
+        self._record("evict", entry, seconds, reason)
+        _logger.info("Evicted model %s (%s, %.0f MB)", entry.name, reason, entry.rss_mb or 0)
+
+    def _make_room(self, needed_mb: float, exclude: Optional[str] = None) -> None:
+        """
+        Evict least recently used idle models until needed_mb more fits in the budget.
+        """
+        if self.budget_mb <= 0:
+            return
+        with self._lock:
+            for entry in self._evictable(exclude):
+                if self.loaded_mb() + needed_mb <= self.budget_mb:
+                    return
+                self._evict(entry, "budget")
+            if self.loaded_mb() + needed_mb > self.budget_mb:
+                _logger.warning("Models use %.0f MB, over the %.0f MB budget; the rest is pinned or in use",
+                                self.loaded_mb() + needed_mb, self.budget_mb)
+
+    def evict_idle(self) -> None:
+        """
+        Evict unpinned models unused for longer than idle_ttl.
+        """
+        if self.idle_ttl <= 0:
+            return
+        now = time.time()
+        with self._lock:
+            for entry in self._evictable():
+                if now - entry.last_used > self.idle_ttl:
+                    self._evict(entry, "idle")
+
+    def evict(self, name: str) -> bool:
+        """
+        Evict a model now unless it is in use. Returns True if it was evicted.
+        """
+        with self._lock:
+            entry = self._entries[name]
+            if not entry.loaded or entry.in_use:
+                return False
+            self._evict(entry, "manual")
+            return True
+
+    def _load(self, entry: ModelEntry) -> None:
+        with self._load_lock:
+            if entry.loaded:
+                return
+            # The size of the previous load, if any, is the best estimate of the space needed
+            self._make_room(entry.rss_mb or 0.0, exclude=entry.name)
+            before = rss_mb()
+            start = time.perf_counter()
+            model = entry.loader()
+            seconds = time.perf_counter() - start
+            with self._lock:
+                entry.model = model
+                entry.rss_mb = max(0.0, rss_mb() - before)
+                entry.load_seconds = seconds
+                entry.loads += 1
+                entry.last_used = time.time()
+                self._record("load", entry, seconds)
+            _logger.info("Loaded model %s in %.2f seconds (%.0f MB)", entry.name, seconds, entry.rss_mb)
+            self._make_room(0.0, exclude=entry.name)
+
+    @staticmethod
+    def _acquire(entry: ModelEntry, background: bool) -> None:
+        with entry.turn:
+            if not background:
+                entry.waiting += 1
+            try:
+                # Background callers also wait for every queued foreground caller
+                while entry.held or (background and entry.waiting):
+                    entry.turn.wait()
+            finally:
+                if not background:
+                    entry.waiting -= 1
+            entry.held = True
+
+    @staticmethod
+    def _release(entry: ModelEntry) -> None:
+        with entry.turn:
+            entry.held = False
+            entry.turn.notify_all()
+
+    @contextmanager
+    def use(self, name: str, background: bool = False) -> Iterator[Any]:
+        """
+        Load the model if needed and hold it, exclusively, for the duration of the with block.
+
+        Args:
+            name (str): Model name.
+            background (bool, optional): Wait until no foreground caller is waiting for the model. Defaults to False.
+
+        Yields:
+            Any: The model.
+        """
+        self.evict_idle()
+        with self._lock:
+            entry = self._entries[name]
+            entry.in_use += 1
+        try:
+            if not entry.loaded:
+                self._load(entry)
+            self._acquire(entry, background)
+            try:
+                with self._lock:
+                    entry.last_used = time.time()
+                    model = entry.model
+                yield model
+            finally:
+                self._release(entry)
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+                entry.last_used = time.time()
+
+    def status(self) -> dict:
+        """
+        Return the per-model state, the memory in use and the recent load and evict events.
+        """
+        with self._lock:
+            return {
+                "budget_mb": self.budget_mb,
+                "loaded_mb": round(self.loaded_mb(), 1),
+                "models": [entry.to_dict() for entry in self._entries.values()],
+                "events": list(self._events),
+            }
@@ -1,18 +1,36 @@
 """
+Module Docstring: This module provides the MongoDB query path. It generates aggregation pipelines
+from natural language questions with a Language Learning Model (LLM), validates and caches them,
+and executes them with batched cursor streaming.
 
+Dependencies:
+    - langchain: A library for building and interacting with language-based AI models.
+    - pymongo: MongoDB driver used to execute the aggregation pipelines.
+
+Usage:
+1. Create a MongoQueryBuilder with the shared LLM instance and a MongoConnector.
+2. Call the run method with the user question.
 """
 
-from typing import List
+# Import dependencies
+import os
+import re
+import json
+import time
+import threading
+import datetime
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional
 
+from dotenv import load_dotenv, find_dotenv
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
-from langchain.chains.query_constructor import parser
-from langchain_community.llms import CTransformers
-from abc import ABC, abstractmethod
-from langchain_core.output_parsers import StrOutputParser
 
-from langchain.output_parsers import PydanticOutputParser
-from pydantic import BaseModel, Field
+from .logger import create_logger
+_logger = create_logger("mongo_query")
+
+load_dotenv(find_dotenv())
 
 
 table_schema = """
@@ -83,109 +101,361 @@ Here is the description to determine what each key represents:
       - **vat_total**: VAT total amount.
       - **gross_total**: Gross total amount.
 """
-            
+
 template = """
-    Create a MongoDB raw query for the following user question: 
+    Create a MongoDB aggregation pipeline for the following user question:
     ###{user_message}###
-    
+
     This is table schema : "{table_schema}"
     This is schema  description : {schema_description}
+
+    **Only answer with the pipeline as a JSON array of stages**, for example:
+    [{{"$match": {{"seller.name": "ACME"}}}}, {{"$project": {{"_id": 0, "invoice_no": 1}}}}]
+    Pipeline:
     """
 
-# Initialize the language model for SQL queries.
-llm = CTransformers(
-    model = "model/mistral-7b-instruct-v0.1.Q3_K_L.gguf",
-    model_type="llama",
-    config={
-        'max_new_tokens': 2048,  # Set the maximum number of tokens here
-        'temperature': 0
-    }
-)
-
-    
-# class BaseChain(ABC):
-
-#     def __init__(self, llm, **kwargs) -> None:
-#         self.llm = llm
-
-#     @property
-#     @abstractmethod
-#     def template(self) -> str:
-#         """Template String that is required to build PromptTemplate"""
-#         pass
-
-#     @property
-#     @abstractmethod
-#     def input_variables(self) -> List[str]:
-#         """Array of strings that are required as variable inputs for placeholders in template"""
-#         pass
-
-#     @staticmethod
-#     @abstractmethod
-#     def populate_input_variables(payload) -> dict:
-#         """Populate the input variables by using the provided payload"""
-#         pass
-
-#     @abstractmethod
-#     def partial_variables(self) -> dict:
-#         """Populate partial variables while creating the chain"""
-#         pass
-
-#     @abstractmethod
-#     def chain(self) -> LLMChain:
-#         """Create and return LLM Chain"""
-#         pass
-    
-class Response(BaseModel):
-  query: list = Field(description="It must be a list")
-
-  def to_dict(self):
-    return self.query
-
-parser = PydanticOutputParser(pydantic_object=Response)
+# Stages a generated pipeline may use. Writing stages such as $out and $merge are rejected.
+ALLOWED_STAGES = {
+    "$match", "$project", "$group", "$sort", "$limit", "$skip", "$unwind", "$count",
+    "$addFields", "$set", "$unset", "$lookup", "$facet", "$bucket", "$sortByCount", "$replaceRoot",
+    "$unionWith"
+}
+
+# Operators running server-side JavaScript, rejected at any depth
+FORBIDDEN_OPERATORS = {"$where", "$function", "$accumulator"}
+
+# Collections $lookup and $unionWith may read from
+LOOKUP_COLLECTIONS = set(filter(None, os.getenv(
+    "MONGO_LOOKUP_COLLECTIONS", os.getenv("MONGO_COLLECTION", "invoices")).split(",")))
+
+
+class PipelineValidationError(ValueError):
+    """
+    Raised when the LLM output is not a valid read-only aggregation pipeline.
+    """
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalize a question so trivially different phrasings share a cache entry.
+
+    Only case, whitespace and trailing sentence punctuation are normalized: operators, signs and
+    digits change the answer ("total > 100" and "total < 100" are different questions).
+
+    Args:
+        question (str): The user question.
+
+    Returns:
+        str: Lower-cased question with single spaces and without trailing "?", "!" or ".".
+    """
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+
+def extract_pipeline(text: str) -> List[Dict]:
+    """
+    Extract and validate the aggregation pipeline from the LLM output.
+
+    Args:
+        text (str): Raw LLM output.
+
+    Raises:
+        PipelineValidationError: If no valid pipeline is found.
+
+    Returns:
+        List[Dict]: The aggregation pipeline.
+    """
+    match = re.search(r"\[.*\]", text.replace("```json", "").replace("```", ""), re.DOTALL)
+    if match is None:
+        raise PipelineValidationError("No pipeline found in LLM output")
+    try:
+        pipeline = json.loads(match.group(0))
+    except json.JSONDecodeError as e:
+        raise PipelineValidationError(f"Pipeline is not valid JSON: {e}")
+    return validate_pipeline(pipeline)
+
+
+def validate_pipeline(pipeline: Any) -> List[Dict]:
+    """
+    Check that a pipeline is a list of single-stage documents using allowed stages only.
+
+    Sub-pipelines of $facet and $lookup are checked the same way. JavaScript operators are rejected
+    at any depth, and $lookup/$unionWith may only read from LOOKUP_COLLECTIONS.
+
+    Args:
+        pipeline (Any): The candidate pipeline.
+
+    Raises:
+        PipelineValidationError: If the pipeline is malformed or uses a forbidden stage or operator.
+
+    Returns:
+        List[Dict]: The validated pipeline.
+    """
+    if not isinstance(pipeline, list) or not pipeline:
+        raise PipelineValidationError("Pipeline must be a non-empty list")
+    for stage in pipeline:
+        if not isinstance(stage, dict) or len(stage) != 1:
+            raise PipelineValidationError(f"Invalid stage: {stage}")
+        name, body = next(iter(stage.items()))
+        if name not in ALLOWED_STAGES:
+            raise PipelineValidationError(f"Stage {name} is not allowed")
+        if name == "$lookup":
+            if not isinstance(body, dict):
+                raise PipelineValidationError(f"Invalid stage: {stage}")
+            _check_collection(body.get("from"))
+            if "pipeline" in body:
+                validate_pipeline(body["pipeline"])
+            _check_operators({key: value for key, value in body.items() if key != "pipeline"})
+        elif name == "$unionWith":
+            body = {"coll": body} if isinstance(body, str) else body
+            if not isinstance(body, dict):
+                raise PipelineValidationError(f"Invalid stage: {stage}")
+            _check_collection(body.get("coll"))
+            if "pipeline" in body:
+                validate_pipeline(body["pipeline"])
+        elif name == "$facet":
+            if not isinstance(body, dict):
+                raise PipelineValidationError(f"Invalid stage: {stage}")
+            for sub_pipeline in body.values():
+                validate_pipeline(sub_pipeline)
+        else:
+            _check_operators(body)
+    return pipeline
+
+
+def _check_collection(name: Any) -> None:
+    if name not in LOOKUP_COLLECTIONS:
+        raise PipelineValidationError(f"Reading collection {name} is not allowed")
+
+
+def _check_operators(value: Any) -> None:
+    # Walks the filters and expressions of a stage; reading stages only appear at stage level
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key in FORBIDDEN_OPERATORS:
+                raise PipelineValidationError(f"Operator {key} is not allowed")
+            if key in ("$lookup", "$unionWith"):
+                raise PipelineValidationError(f"Stage {key} is not allowed here")
+            _check_operators(item)
+    elif isinstance(value, list):
+        for item in value:
+            _check_operators(item)
+
+
+def to_json_value(value: Any) -> Any:
+    """
+    Convert BSON values into JSON serializable values.
+    """
+    if isinstance(value, dict):
+        return {key: to_json_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_json_value(item) for item in value]
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    # ObjectId, Decimal128 and other BSON types
+    return str(value)
+
+
+class PipelineCache:
+    """
+    Thread-safe LRU cache of validated pipelines keyed by normalized question.
+    """
+
+    def __init__(self, maxsize: int = 512) -> None:
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, List[Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, question: str) -> Optional[List[Dict]]:
+        key = normalize_question(question)
+        with self._lock:
+            pipeline = self._entries.get(key)
+            if pipeline is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return pipeline
+
+    def put(self, question: str, pipeline: List[Dict]) -> None:
+        key = normalize_question(question)
+        with self._lock:
+            self._entries[key] = pipeline
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+class MongoConnector:
+    """
+    This class provides a shared, pooled connection to the invoice collection in MongoDB.
+    """
+
+    def __init__(
+        self,
+        uri: str = os.getenv("MONGO_URI", "mongodb://localhost:27017"),
+        database: str = os.getenv("MONGO_DATABASE", "invoice_agent"),
+        collection: str = os.getenv("MONGO_COLLECTION", "invoices"),
+        client: Any = None
+    ) -> None:
+        """
+        Initialize the MongoConnector.
+
+        Args:
+            uri (str, optional): MongoDB connection string. Defaults to os.getenv("MONGO_URI").
+            database (str, optional): Database name. Defaults to os.getenv("MONGO_DATABASE").
+            collection (str, optional): Collection name. Defaults to os.getenv("MONGO_COLLECTION").
+            client (Any, optional): Existing client, e.g. mongomock.MongoClient() in tests.
+        """
+        if client is None:
+            from pymongo import MongoClient
+            client = MongoClient(uri, maxPoolSize=int(os.getenv("MONGO_POOL_SIZE", "20")))
+        self.client = client
+        self.collection = client[database][collection]
+
+    def aggregate(self, pipeline: List[Dict], max_time_ms: int = 5000,
+                  batch_size: int = 500) -> Iterator[List[Dict]]:
+        """
+        Execute a pipeline and stream the results in batches.
+
+        Args:
+            pipeline (List[Dict]): The aggregation pipeline.
+            max_time_ms (int, optional): Server-side execution limit in milliseconds. Defaults to 5000.
+            batch_size (int, optional): Documents fetched per round trip. Defaults to 500.
+
+        Yields:
+            List[Dict]: Batches of JSON serializable documents.
+        """
+        cursor = self.collection.aggregate(
+            pipeline, maxTimeMS=max_time_ms, batchSize=batch_size, allowDiskUse=False
+        )
+        try:
+            batch = []
+            for document in cursor:
+                batch.append(to_json_value(document))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        finally:
+            cursor.close()
+
 
 class MongoQueryBuilder:
-    def __init__(self, llm, payload) -> None:
+    """
+    This class generates, caches and executes MongoDB aggregation pipelines for user questions.
+    """
+
+    def __init__(self, llm: Any = None, connector: Optional[MongoConnector] = None,
+                 cache: Optional[PipelineCache] = None,
+                 max_time_ms: int = int(os.getenv("MONGO_MAX_TIME_MS", "5000")),
+                 max_rows: int = int(os.getenv("MONGO_MAX_ROWS", "10000"))) -> None:
+        """
+        Initialize the MongoQueryBuilder.
+
+        Args:
+            llm (Any): The shared Language Learning Model instance.
+            connector (MongoConnector, optional): Connection to MongoDB. Defaults to MongoConnector().
+            cache (PipelineCache, optional): Cache of validated pipelines. Defaults to PipelineCache().
+            max_time_ms (int, optional): Server-side time limit per query. Defaults to os.getenv("MONGO_MAX_TIME_MS").
+            max_rows (int, optional): Maximum number of documents returned. Defaults to os.getenv("MONGO_MAX_ROWS").
+        """
         self.llm = llm
-        self.payload = payload
+        self._connector = connector
+        self.cache = cache or PipelineCache()
+        self.max_time_ms = max_time_ms
+        self.max_rows = max_rows
+        self._chain = None
+        self._chain_llm = None
+
+    @property
+    def connector(self) -> MongoConnector:
+        if self._connector is None:
+            self._connector = MongoConnector()
+        return self._connector
 
     def template(self) -> str:
         return template
 
     def input_variables(self) -> List[str]:
-        return [
-            "user_message",
-            "schema_description",
-            "table_schema"
-        ]
-        
-    def populate_partial_variables(self, payload: dict) -> dict:
+        return ["user_message"]
+
+    def populate_partial_variables(self) -> dict:
         return {
-            "user_message": payload["user_message"],
             "schema_description": schema_description,
-            "table_schema" : table_schema
+            "table_schema": table_schema
         }
 
-    def chain(self):
-        chain_prompt = PromptTemplate(
-            input_variables=input_variable,
-            template=template,
-            partial_variables=self.populate_partial_variables(),
-        )
-        
-        query_builder_agent = LLMChain(
-            llm=self.llm,
-            prompt=chain_prompt,
-        )
-        
-        mongo_query = query_builder_agent.invoke(payload["user_message"])
-        return parser.parse(mongo_query).to_dict()
+    def chain(self, llm: Any = None) -> LLMChain:
+        """
+        Create the LLMChain once and reuse it for every question with the same model.
 
-# Example payload for query generation
-payload = {
-    "user_message": "What are the top-selling items by quantity?",
-}
+        Args:
+            llm (Any, optional): Model to use, e.g. from a ModelRegistry. Defaults to self.llm.
+
+        Returns:
+            LLMChain: The pipeline generation chain.
+        """
+        if self._chain is None or (llm is not None and llm is not self._chain_llm):
+            llm = llm if llm is not None else self.llm
+            chain_prompt = PromptTemplate(
+                input_variables=self.input_variables(),
+                template=self.template(),
+                partial_variables=self.populate_partial_variables(),
+            )
+            self._chain = LLMChain(llm=llm, prompt=chain_prompt)
+            self._chain_llm = llm
+        return self._chain
+
+    def build_pipeline(self, question: str, llm: Any = None) -> List[Dict]:
+        """
+        Return the validated pipeline for a question, generating it only on a cache miss.
+
+        Args:
+            question (str): The user question.
+            llm (Any, optional): Model to use on a cache miss. Defaults to self.llm.
+
+        Raises:
+            PipelineValidationError: If the LLM output is not a valid pipeline.
+
+        Returns:
+            List[Dict]: The aggregation pipeline.
+        """
+        pipeline = self.cache.get(question)
+        if pipeline is not None:
+            _logger.info("Pipeline cache hit")
+            return pipeline
+        output = self.chain(llm).invoke({"user_message": question})
+        pipeline = extract_pipeline(output["text"])
+        _logger.info("Generated pipeline: %s", json.dumps(pipeline))
+        self.cache.put(question, pipeline)
+        return pipeline
+
+    def run(self, question: str, llm: Any = None) -> List[Dict]:
+        """
+        Generate (or reuse) the pipeline for a question and execute it.
+
+        Args:
+            question (str): The user question.
+            llm (Any, optional): Model to use on a cache miss. Defaults to self.llm.
 
-# Generate and run the query
-query = MongoQueryBuilder(llm=llm, payload=payload)
-print(query)
\ No newline at end of file
+        Returns:
+            List[Dict]: Up to max_rows result documents.
+        """
+        pipeline = self.build_pipeline(question, llm)
+        # Bound the result size on the server instead of discarding documents on the client
+        if "$limit" not in pipeline[-1]:
+            pipeline = pipeline + [{"$limit": self.max_rows}]
+        start = time.perf_counter()
+        rows = []
+        for batch in self.connector.aggregate(pipeline, max_time_ms=self.max_time_ms):
+            rows.extend(batch)
+        _logger.info("Mongo query returned %d documents in %.3f seconds",
+                     len(rows), time.perf_counter() - start)
+        return rows[:self.max_rows]
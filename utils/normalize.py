@@ -0,0 +1,104 @@
+"""
+This module provides fast normalizers for the raw values returned by the extraction model.
+
+Amounts arrive as strings such as "1 234,50", "$ 12.00" or "10%" and dates in several formats.
+Both are converted once at ingestion time so the database stores typed NUMERIC and DATE values and
+aggregate queries never cast per row.
+
+Dependencies:
+- decimal: Provides exact decimal amounts.
+- datetime: Provides the parsed dates.
+- re: Provides the precompiled patterns.
+"""
+
+import re
+import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Optional
+
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y", "%d.%m.%Y", "%d-%m-%Y", "%Y/%m/%d", "%B %d, %Y", "%d %B %Y")
+
+_PLAIN_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_NON_NUMERIC = re.compile(r"[^\d,.\-]")
+_HAS_DIGIT = re.compile(r"\d")
+# Accounting notation for negative amounts, e.g. "(5.00)" or "($ 5.00)"
+_PARENTHESISED = re.compile(r"[^\d]*\(.*\d.*\)[^\d]*")
+_ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def parse_amount(value) -> Optional[Decimal]:
+    """
+    Parse an amount as returned by the extraction model, e.g. "1 234,50", "$ 12.00", "10%" or "(5.00)".
+
+    A separator that occurs once is the decimal separator, with or without a currency symbol, so
+    "1.234" and "1.234 €" are both 1.234. When both "," and "." occur the right-most one is, and a
+    separator repeated on its own groups thousands ("1,234,567").
+
+    Args:
+        value: Raw value.
+
+    Returns:
+        Optional[Decimal]: The parsed amount, or None if the value holds no number.
+    """
+    if value is None:
+        return None
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, (int, float)):
+        return Decimal(str(value))
+    text = str(value).strip()
+    # Fast path for values that are already plain numbers
+    if _PLAIN_NUMBER.fullmatch(text):
+        return Decimal(text)
+    negative = _PARENTHESISED.fullmatch(text) is not None
+    text = _NON_NUMERIC.sub("", text)
+    if not _HAS_DIGIT.search(text):
+        return None
+    commas, dots = text.count(","), text.count(".")
+    if commas and dots:
+        separator = text[max(text.rfind(","), text.rfind("."))]
+    elif commas == 1 or dots == 1:
+        separator = "," if commas else "."
+    else:
+        separator = None
+    if separator is not None:
+        whole, _, fraction = text.rpartition(separator)
+        text = whole.replace(",", "").replace(".", "") + "." + fraction
+    else:
+        text = text.replace(",", "").replace(".", "")
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        return None
+    return -amount if negative else amount
+
+
+def parse_date(value) -> Optional[datetime.date]:
+    """
+    Parse an invoice date in one of the formats returned by the extraction model.
+
+    Args:
+        value: Raw value.
+
+    Returns:
+        Optional[datetime.date]: The parsed date, or None if the format is unknown.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    text = str(value).strip()
+    if _ISO_DATE.fullmatch(text):
+        # Fast path without strptime for ISO dates
+        try:
+            return datetime.date(int(text[:4]), int(text[5:7]), int(text[8:10]))
+        except ValueError:
+            return None
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    return None
@@ -0,0 +1,365 @@
+"""
+Module Docstring: This module adds admin-only CPU and memory profiling to a running API worker.
+
+Nothing here is installed unless ADMIN_TOKEN is set: without it the app has no profiling routes,
+no middleware and the worker-thread functions are not wrapped, so profiling costs nothing when it
+is disabled. With it, every /admin route requires the X-Admin-Token header.
+
+- SamplingProfiler samples the stacks of all threads every few milliseconds for N seconds and
+  returns them in the collapsed format read by flamegraph.pl and speedscope.
+- A request sent with "X-Profile: 1" (and the admin token) is profiled with cProfile on the event
+  loop thread and in the worker threads it calls; the merged pstats can be downloaded by the
+  X-Profile-Id returned with the response. Other coroutines running on the loop at the same time
+  are included, and only one request is profiled at a time.
+- While tracemalloc is started, the net memory allocated per request is recorded per endpoint and
+  snapshots show the top allocation sites and the growth since the previous snapshot.
+
+Dependencies: cProfile, pstats, tracemalloc, fastapi
+"""
+
+# Import dependencies
+import io
+import os
+import sys
+import time
+import pstats
+import marshal
+import cProfile
+import secrets
+import functools
+import threading
+import tracemalloc
+import contextvars
+from collections import Counter, OrderedDict, defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response
+
+from .logger import create_logger
+_logger = create_logger("profiling")
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILING_ENABLED = bool(ADMIN_TOKEN)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """
+    This class samples the Python stacks of every thread of the process at a fixed interval.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64) -> None:
+        """
+        Initialize the SamplingProfiler.
+
+        Args:
+            interval (float, optional): Seconds between samples. Defaults to 0.005.
+            max_depth (int, optional): Frames kept per stack, innermost first. Defaults to 64.
+        """
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started: Optional[float] = None
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float) -> None:
+        """
+        Start sampling in a background thread for at most `seconds`. Earlier samples are discarded.
+        """
+        if self.running:
+            raise RuntimeError("The sampling profiler is already running")
+        self.stacks, self.samples, self.elapsed = Counter(), 0, 0.0
+        self.started = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(seconds,), name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self, seconds: float) -> None:
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        start = time.perf_counter()
+        while not self._stop.wait(self.interval) and time.perf_counter() - start < seconds:
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+        self.elapsed = time.perf_counter() - start
+        _logger.info("Sampling profiler took %d samples in %.1f seconds", self.samples, self.elapsed)
+
+    def collapsed(self) -> str:
+        """
+        Return the samples as collapsed stacks ("thread;outer;...;inner count" per line).
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self, limit: int = 20) -> dict:
+        """
+        Return the functions seen most often at the top of a stack.
+        """
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return {
+            "running": self.running,
+            "samples": self.samples,
+            "seconds": round(self.elapsed, 2),
+            "top": [{"function": name, "share": round(count / total, 4)} for name, count in leaves.most_common(limit)],
+        }
+
+
+class RequestProfile:
+    """
+    cProfile profiles of one request, one per thread that took part in it.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.id = secrets.token_hex(8)
+        self.profiles: List[cProfile.Profile] = []
+        self.seconds = 0.0
+
+    def new_profile(self) -> cProfile.Profile:
+        profile = cProfile.Profile()
+        self.profiles.append(profile)
+        return profile
+
+    def stats(self) -> pstats.Stats:
+        stats = pstats.Stats(self.profiles[0])
+        for profile in self.profiles[1:]:
+            stats.add(profile)
+        return stats
+
+    def dumps(self) -> bytes:
+        # The format written by pstats.Stats.dump_stats, readable with pstats.Stats(path) or snakeviz
+        return marshal.dumps(self.stats().stats)
+
+    def text(self, sort: str = "cumulative", limit: int = 40) -> str:
+        stream = io.StringIO()
+        stats = self.stats()
+        stats.stream = stream
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+_active_profile: contextvars.ContextVar = contextvars.ContextVar("active_profile", default=None)
+
+
+def profiled_in_thread(func: Callable) -> Callable:
+    """
+    Decorate a function run with run_in_threadpool so a profiled request also profiles it in the
+    worker thread. Returns the function unchanged when profiling is disabled.
+    """
+    if not PROFILING_ENABLED:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        request_profile = _active_profile.get()
+        if request_profile is None:
+            return func(*args, **kwargs)
+        profile = request_profile.new_profile()
+        profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+    return wrapper
+
+
+class Profiler:
+    """
+    This class holds the profiling state of a worker and serves it on /admin routes.
+    """
+
+    def __init__(self, admin_token: str = ADMIN_TOKEN, keep: int = 20, top: int = 25) -> None:
+        """
+        Initialize the Profiler.
+
+        Args:
+            admin_token (str, optional): Value required in the X-Admin-Token header.
+                                Defaults to os.getenv("ADMIN_TOKEN").
+            keep (int, optional): Request profiles kept for download. Defaults to 20.
+            top (int, optional): Allocation sites returned per snapshot. Defaults to 25.
+        """
+        self.admin_token = admin_token
+        self.sampler = SamplingProfiler()
+        self.requests: "OrderedDict[str, RequestProfile]" = OrderedDict()
+        self.keep = keep
+        self.top = top
+        self.allocations: Dict[str, Dict[str, float]] = defaultdict(lambda: {"requests": 0, "net_bytes": 0, "max_net_bytes": 0})
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._request_lock = threading.Lock()
+
+    def is_admin(self, token: Optional[str]) -> bool:
+        return bool(token) and secrets.compare_digest(token, self.admin_token)
+
+    async def middleware(self, request: Request, call_next):
+        """
+        Profile requests sent with X-Profile and track allocations per endpoint while tracemalloc runs.
+        """
+        profile_request = request.headers.get("X-Profile") and self.is_admin(request.headers.get("X-Admin-Token"))
+        tracing = tracemalloc.is_tracing()
+        before = tracemalloc.get_traced_memory()[0] if tracing else 0
+
+        if profile_request and self._request_lock.acquire(blocking=False):
+            request_profile = RequestProfile(request.url.path)
+            token = _active_profile.set(request_profile)
+            profile = request_profile.new_profile()
+            start = time.perf_counter()
+            profile.enable()
+            try:
+                response = await call_next(request)
+            finally:
+                profile.disable()
+                request_profile.seconds = time.perf_counter() - start
+                _active_profile.reset(token)
+                self._request_lock.release()
+            self.requests[request_profile.id] = request_profile
+            while len(self.requests) > self.keep:
+                self.requests.popitem(last=False)
+            response.headers["X-Profile-Id"] = request_profile.id
+        else:
+            response = await call_next(request)
+            if profile_request:
+                response.headers["X-Profile-Status"] = "busy"
+
+        if tracing and tracemalloc.is_tracing():
+            net = tracemalloc.get_traced_memory()[0] - before
+            endpoint = self.allocations[f"{request.method} {request.url.path}"]
+            endpoint["requests"] += 1
+            endpoint["net_bytes"] += net
+            endpoint["max_net_bytes"] = max(endpoint["max_net_bytes"], net)
+        return response
+
+    def snapshot(self) -> dict:
+        """
+        Take a tracemalloc snapshot and return the top allocation sites and the growth since the previous one.
+        """
+        if not tracemalloc.is_tracing():
+            raise HTTPException(status_code=409, detail="tracemalloc is not started")
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+        top = [{"site": str(stat.traceback), "size_bytes": stat.size, "count": stat.count}
+               for stat in snapshot.statistics("lineno")[:self.top]]
+        growth = []
+        if self._snapshot is not None:
+            growth = [{"site": str(stat.traceback), "size_diff_bytes": stat.size_diff, "count_diff": stat.count_diff}
+                      for stat in snapshot.compare_to(self._snapshot, "lineno")[:self.top]]
+        self._snapshot = snapshot
+        current, peak = tracemalloc.get_traced_memory()
+        return {"current_bytes": current, "peak_bytes": peak, "top": top, "growth": growth}
+
+    def router(self) -> APIRouter:
+        """
+        Build the /admin routes, all requiring the admin token.
+        """
+        def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+            if not self.is_admin(x_admin_token):
+                raise HTTPException(status_code=401, detail="Invalid admin token")
+
+        router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+        @router.post("/profile/start")
+        def start_profile(seconds: float = 30.0, interval: float = 0.005) -> dict:
+            if self.sampler.running:
+                raise HTTPException(status_code=409, detail="The sampling profiler is already running")
+            self.sampler.interval = interval
+            self.sampler.start(min(seconds, 600.0))
+            return {"running": True, "seconds": seconds, "interval": interval}
+
+        @router.post("/profile/stop")
+        def stop_profile() -> dict:
+            self.sampler.stop()
+            return self.sampler.summary()
+
+        @router.get("/profile")
+        def profile_summary() -> dict:
+            return self.sampler.summary()
+
+        @router.get("/profile/flamegraph")
+        def flamegraph() -> PlainTextResponse:
+            return PlainTextResponse(self.sampler.collapsed())
+
+        @router.get("/profile/requests")
+        def request_profiles() -> List[dict]:
+            return [{"id": p.id, "path": p.path, "seconds": round(p.seconds, 4), "threads": len(p.profiles)}
+                    for p in self.requests.values()]
+
+        @router.get("/profile/requests/{profile_id}")
+        def request_profile(profile_id: str, format: str = "text", sort: str = "cumulative") -> Response:
+            profile = self.requests.get(profile_id)
+            if profile is None:
+                raise HTTPException(status_code=404, detail="Unknown profile id")
+            if format == "pstats":
+                return Response(profile.dumps(), media_type="application/octet-stream",
+                                headers={"Content-Disposition": f'attachment; filename="{profile_id}.pstats"'})
+            return PlainTextResponse(profile.text(sort))
+
+        @router.post("/tracemalloc/start")
+        def start_tracemalloc(frames: int = 10) -> dict:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self.allocations.clear()
+            self._snapshot = None
+            return {"tracing": True, "frames": tracemalloc.get_traceback_limit()}
+
+        @router.post("/tracemalloc/stop")
+        def stop_tracemalloc() -> dict:
+            tracemalloc.stop()
+            self._snapshot = None
+            return {"tracing": False}
+
+        @router.get("/tracemalloc/snapshot")
+        def snapshot() -> dict:
+            return self.snapshot()
+
+        @router.get("/tracemalloc/endpoints")
+        def endpoint_allocations() -> Dict[str, Any]:
+            return {name: dict(values, mean_net_bytes=values["net_bytes"] / max(1, values["requests"]))
+                    for name, values in self.allocations.items()}
+
+        return router
+
+
+def install_profiling(app: FastAPI, admin_token: str = ADMIN_TOKEN) -> Optional[Profiler]:
+    """
+    Add the profiling middleware and /admin routes to the app when an admin token is configured.
+
+    Returns:
+        Optional[Profiler]: The profiler, or None when profiling is disabled.
+    """
+    if not admin_token:
+        return None
+    profiler = Profiler(admin_token)
+    app.middleware("http")(profiler.middleware)
+    app.include_router(profiler.router())
+    _logger.info("Profiling routes enabled under /admin")
+    return profiler
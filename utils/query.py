@@ -1,25 +1,36 @@
 """
 Module Docstring: This module provides a function to query a PostgreSQL 
-database using DatabaseConnector.
+database using DatabaseConnector, and its asyncio counterpart using AsyncDatabase.
 """
 # Import dependencies
+import json
+import time
+from typing import Optional
 from .database_connector import DatabaseConnector
+from .async_database import AsyncDatabase, get_database, records_to_dicts
+from .rollups import RollupRouter, USE_ROLLUPS
+from .index_advisor import WorkloadRecorder
 from .logger import create_logger
 
 _logger = create_logger("query")
 
-def query_database(query:str) -> list:
+_router = RollupRouter()
+_recorder = WorkloadRecorder()
+
+def query_database(query:str, use_rollups: bool = USE_ROLLUPS) -> list:
     """
     Function to query the database using DatabaseConnector and close the connection after the query.
 
     Args:
         query (str): query string that will be executed
+        use_rollups (bool, optional): Answer matching aggregate queries from the rollup tables.
+                                Defaults to os.getenv("USE_ROLLUPS") == "true".
 
     Returns:
         list: A list of query results.
     """
-    # Create a DatabaseConnector instance
-    db_connector = DatabaseConnector()
+    # Create a read-only DatabaseConnector instance, served by a read replica when available
+    db_connector = DatabaseConnector(readonly=True)
 
     try:
         # Create a database connection
@@ -27,9 +38,25 @@ def query_database(query:str) -> list:
 
         # Perform database query
         cursor = db_connector.connection.cursor()
-        cursor.execute(query)
+        rewritten = _router.rewrite(query) if use_rollups else None
+        start = time.perf_counter()
+        if rewritten is not None:
+            try:
+                cursor.execute(rewritten)
+                query = rewritten
+            except Exception as e:
+                # Fall back to the base tables, e.g. when the rollups have not been created
+                _logger.warning("Rollup query failed, using base tables: %s", e)
+                db_connector.connection.rollback()
+                start = time.perf_counter()
+                cursor.execute(query)
+        else:
+            cursor.execute(query)
         r = [dict((cursor.description[i][0], value) \
                for i, value in enumerate(row)) for row in cursor.fetchall()]
+
+        # Record the statement for the index advisor (no-op unless WORKLOAD_LOG is set)
+        _recorder.record(cursor, query, time.perf_counter() - start)
         
         # Close cursor
         cursor.close()
@@ -39,3 +66,52 @@ def query_database(query:str) -> list:
     finally:
         # Close connection
         db_connector.close_connection()
+
+
+async def query_database_async(query: str, use_rollups: bool = USE_ROLLUPS,
+                               database: Optional[AsyncDatabase] = None) -> list:
+    """
+    Query the database without blocking the event loop. Returns the same rows as query_database.
+
+    Args:
+        query (str): query string that will be executed
+        use_rollups (bool, optional): Answer matching aggregate queries from the rollup tables.
+                                Defaults to os.getenv("USE_ROLLUPS") == "true".
+        database (AsyncDatabase, optional): Pools to use. Defaults to the process-wide AsyncDatabase.
+
+    Returns:
+        list: A list of query results.
+    """
+    database = database or get_database()
+    rewritten = _router.rewrite(query) if use_rollups else None
+
+    async def work(connection):
+        executed = query
+        start = time.perf_counter()
+        records = None
+        if rewritten is not None:
+            try:
+                # Savepoint, so a failing rollup query does not abort the transaction
+                async with connection.transaction():
+                    records = await connection.fetch(rewritten)
+                executed = rewritten
+            except Exception as e:
+                # Fall back to the base tables, e.g. when the rollups have not been created
+                _logger.warning("Rollup query failed, using base tables: %s", e)
+                start = time.perf_counter()
+        if records is None:
+            records = await connection.fetch(query)
+        runtime = time.perf_counter() - start
+
+        # Record the statement for the index advisor (no-op unless WORKLOAD_LOG is set)
+        if _recorder.enabled:
+            plan = None
+            try:
+                async with connection.transaction():
+                    plan = json.loads(await connection.fetchval("EXPLAIN (FORMAT JSON) " + executed))[0]["Plan"]
+            except Exception as e:
+                _logger.warning("Unable to capture plan: %s", e)
+            _recorder.append(executed, runtime, plan)
+        return records_to_dicts(records)
+
+    return await database.run(work, readonly=True)
@@ -0,0 +1,439 @@
+"""
+Module Docstring: This module records the questions asked to the API and prewarms the answer caches with them.
+
+QueryHistory keeps every /sqlQuery and /vectorQuery request (question, generated SQL, latency,
+whether it was served from cache) in a SQLite file. It also keeps a recency-weighted frequency per
+normalized question. Every request adds 1 to the question's score, and scores halve every
+QUERY_HISTORY_HALF_LIFE hours, so a question asked often last week ranks below one asked often
+today. Requests are queued and written by a background thread, so recording never blocks a request.
+
+Prewarmer replays the top-N questions of each endpoint through the same functions the endpoints
+use, which fills their caches. The API replays the recorded SQL of SQL questions and only generates
+it again when it fails. It runs at startup and after each ingestion run: ingestion commands call
+QueryHistory.mark_ingestion, and the prewarmer polls for new marks. It runs in a background thread
+at a raised nice value and waits while user requests are in flight. Its model calls use the models
+in background mode, so a request arriving during a generation waits for that generation at most and
+is served before the next one. Each run records its
+cost (wall and CPU seconds) and its coverage: the share of recent request volume it warmed, and
+afterwards the share of requests that hit a warmed question.
+
+Dependencies: sqlite3, threading
+"""
+
+# Import dependencies
+import os
+import json
+import time
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .mongo_client import normalize_question
+from .logger import create_logger
+_logger = create_logger("query_history")
+
+QUERY_HISTORY_DB = os.getenv("QUERY_HISTORY_DB", "query_history.sqlite")
+PREWARM_TOP_N = int(os.getenv("PREWARM_TOP_N", "50"))
+
+
+class AnswerCache:
+    """
+    Thread-safe LRU cache of answers keyed by normalized question.
+    """
+
+    def __init__(self, maxsize: int = int(os.getenv("ANSWER_CACHE_SIZE", "256"))) -> None:
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, question: str) -> bool:
+        return normalize_question(question) in self._entries
+
+    def get(self, question: str) -> Optional[Any]:
+        key = normalize_question(question)
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, question: str, answer: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        key = normalize_question(question)
+        with self._lock:
+            self._entries[key] = answer
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class QueryHistory:
+    """
+    This class stores the request history and the recency-weighted frequency of every question.
+    """
+
+    def __init__(self, path: str = QUERY_HISTORY_DB,
+                 half_life: float = float(os.getenv("QUERY_HISTORY_HALF_LIFE", "72")) * 3600,
+                 retention: float = float(os.getenv("QUERY_HISTORY_RETENTION_DAYS", "30")) * 86400,
+                 background: bool = True, queue_size: int = 10000,
+                 clock: Callable[[], float] = time.time) -> None:
+        """
+        Initialize the QueryHistory and create its tables if needed.
+
+        Args:
+            path (str, optional): SQLite file. Defaults to os.getenv("QUERY_HISTORY_DB", "query_history.sqlite").
+            half_life (float, optional): Seconds after which a request counts half.
+                                Defaults to os.getenv("QUERY_HISTORY_HALF_LIFE", "72") hours.
+            retention (float, optional): Seconds requests are kept. Defaults to os.getenv("QUERY_HISTORY_RETENTION_DAYS", "30") days.
+            background (bool, optional): Write recorded requests from a background thread. Defaults to True.
+            queue_size (int, optional): Requests waiting to be written; more are dropped. Defaults to 10000.
+            clock (Callable[[], float], optional): Time source. Defaults to time.time.
+        """
+        self.path = path
+        self.half_life = half_life
+        self.retention = retention
+        self.clock = clock
+        self.dropped = 0
+        self._queue: "queue.Queue[Tuple]" = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS requests (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                endpoint TEXT NOT NULL,
+                normalized TEXT NOT NULL,
+                question TEXT NOT NULL,
+                sql TEXT,
+                latency_ms REAL NOT NULL,
+                cached INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS requests_created ON requests (created_at);
+            CREATE TABLE IF NOT EXISTS questions (
+                endpoint TEXT NOT NULL,
+                normalized TEXT NOT NULL,
+                question TEXT NOT NULL,
+                sql TEXT,
+                count INTEGER NOT NULL,
+                score REAL NOT NULL,
+                scored_at REAL NOT NULL,
+                latency_ms REAL NOT NULL,
+                PRIMARY KEY (endpoint, normalized)
+            );
+            CREATE TABLE IF NOT EXISTS ingestions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS prewarm_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                trigger TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                finished_at REAL NOT NULL,
+                report TEXT NOT NULL
+            );
+            """
+        )
+        self._stop = threading.Event()
+        self._writer = None
+        if background:
+            self._writer = threading.Thread(target=self._write_loop, name="query-history", daemon=True)
+            self._writer.start()
+
+    def _decayed(self, score: float, scored_at: float, now: float) -> float:
+        return score * 0.5 ** ((now - scored_at) / self.half_life)
+
+    def record(self, endpoint: str, question: str, latency: float, sql: Optional[str] = None,
+               cached: bool = False, status: str = "ok") -> None:
+        """
+        Queue a request for writing. Never blocks: when the queue is full the request is dropped.
+
+        Args:
+            endpoint (str): "sql" or "vector".
+            question (str): The question as asked.
+            latency (float): Seconds taken to answer.
+            sql (str, optional): The generated SQL.
+            cached (bool, optional): Whether the answer came from a cache. Defaults to False.
+            status (str, optional): "ok" or "error". Only successful questions are ranked. Defaults to "ok".
+        """
+        try:
+            self._queue.put_nowait((endpoint, question, latency, sql, cached, status, self.clock()))
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self) -> None:
+        while not self._stop.wait(1.0):
+            try:
+                self.flush()
+            except Exception as e:
+                _logger.error("Failed to write query history: %s", e)
+        self.flush()
+
+    def flush(self) -> int:
+        """
+        Write the queued requests and update the question scores. Returns the number written.
+        """
+        records = []
+        while True:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if not records:
+            return 0
+        with self._lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                for endpoint, question, latency, sql, cached, status, now in records:
+                    normalized = normalize_question(question)
+                    self.connection.execute(
+                        "INSERT INTO requests (endpoint, normalized, question, sql, latency_ms, cached, status, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (endpoint, normalized, question, sql, latency * 1000, int(cached), status, now)
+                    )
+                    if status != "ok":
+                        continue
+                    row = self.connection.execute(
+                        "SELECT count, score, scored_at, latency_ms FROM questions WHERE endpoint = ? AND normalized = ?",
+                        (endpoint, normalized)).fetchone()
+                    if row is None:
+                        count, score, latency_ms = 1, 1.0, latency * 1000
+                    else:
+                        count = row[0] + 1
+                        score = self._decayed(row[1], row[2], now) + 1
+                        # Generation latency only: cache hits would hide what prewarming saves
+                        latency_ms = row[3] if cached else (row[3] * row[0] + latency * 1000) / count
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO questions (endpoint, normalized, question, sql, count, score, scored_at, latency_ms) "
+                        "VALUES (?, ?, ?, COALESCE(?, (SELECT sql FROM questions WHERE endpoint = ? AND normalized = ?)), ?, ?, ?, ?)",
+                        (endpoint, normalized, question, sql, endpoint, normalized, count, score, now, latency_ms)
+                    )
+                self.connection.execute("DELETE FROM requests WHERE created_at < ?", (self.clock() - self.retention,))
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+        return len(records)
+
+    def top(self, endpoint: str, n: int = PREWARM_TOP_N) -> List[Dict]:
+        """
+        Return the n questions of an endpoint with the highest recency-weighted frequency.
+        """
+        now = self.clock()
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT normalized, question, sql, count, score, scored_at, latency_ms FROM questions WHERE endpoint = ?",
+                (endpoint,)).fetchall()
+        ranked = sorted(({"normalized": row[0], "question": row[1], "sql": row[2], "count": row[3],
+                          "score": self._decayed(row[4], row[5], now), "latency_ms": row[6]} for row in rows),
+                        key=lambda question: question["score"], reverse=True)
+        return ranked[:n]
+
+    def total_score(self, endpoint: str) -> float:
+        """
+        Sum of the current scores of every question of an endpoint.
+        """
+        now = self.clock()
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT score, scored_at FROM questions WHERE endpoint = ?", (endpoint,)).fetchall()
+        return sum(self._decayed(score, scored_at, now) for score, scored_at in rows)
+
+    def mark_ingestion(self, kind: str) -> None:
+        """
+        Record that an ingestion run finished, e.g. "vectors", so running APIs prewarm again.
+        """
+        with self._lock:
+            self.connection.execute("INSERT INTO ingestions (kind, created_at) VALUES (?, ?)", (kind, self.clock()))
+
+    def ingestions_since(self, last_id: int) -> List[Tuple[int, str]]:
+        """
+        Return the (id, kind) of the ingestion runs recorded after last_id.
+        """
+        with self._lock:
+            return self.connection.execute(
+                "SELECT id, kind FROM ingestions WHERE id > ? ORDER BY id", (last_id,)).fetchall()
+
+    def save_run(self, trigger: str, started_at: float, finished_at: float, report: Dict) -> None:
+        with self._lock:
+            self.connection.execute(
+                "INSERT INTO prewarm_runs (trigger, started_at, finished_at, report) VALUES (?, ?, ?, ?)",
+                (trigger, started_at, finished_at, json.dumps(report)))
+
+    def coverage_since(self, since: float, warmed: Dict[str, Iterable[str]]) -> Dict[str, Dict]:
+        """
+        Per endpoint, the requests since a time, the share that asked a warmed question and the cache hit rate.
+
+        Args:
+            since (float): Start of the window (the end of the prewarm run).
+            warmed (Dict[str, Iterable[str]]): Normalized questions warmed per endpoint.
+        """
+        coverage = {}
+        with self._lock:
+            for endpoint, questions in warmed.items():
+                questions = set(questions)
+                rows = self.connection.execute(
+                    "SELECT normalized, cached FROM requests WHERE endpoint = ? AND created_at >= ?",
+                    (endpoint, since)).fetchall()
+                coverage[endpoint] = {
+                    "requests": len(rows),
+                    "warmed_share": round(sum(row[0] in questions for row in rows) / len(rows), 3) if rows else None,
+                    "cache_hit_rate": round(sum(row[1] for row in rows) / len(rows), 3) if rows else None,
+                }
+        return coverage
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join()
+        else:
+            self.flush()
+        self.connection.close()
+
+
+class Prewarmer:
+    """
+    This class replays the most frequent recent questions of each endpoint to fill their caches.
+    """
+
+    def __init__(self, history: QueryHistory,
+                 warmers: Dict[str, Tuple[Callable[[str], bool], Callable[[Dict], Any]]],
+                 top_n: int = PREWARM_TOP_N,
+                 busy: Callable[[], bool] = lambda: False,
+                 invalidate: Optional[Dict[str, Callable[[], None]]] = None,
+                 poll_interval: float = float(os.getenv("PREWARM_POLL_INTERVAL", "60")),
+                 nice: int = int(os.getenv("PREWARM_NICE", "10"))) -> None:
+        """
+        Initialize the Prewarmer.
+
+        Args:
+            history (QueryHistory): Source of the questions, and where runs are recorded.
+            warmers (Dict[str, Tuple[Callable[[str], bool], Callable[[Dict], Any]]]): Per endpoint, a function
+                                telling whether a question is cached and a blocking function answering a
+                                question record of top() (question, recorded SQL). It should use models
+                                in background mode so requests go first.
+            top_n (int, optional): Questions warmed per endpoint. Defaults to os.getenv("PREWARM_TOP_N", "50").
+            busy (Callable[[], bool], optional): True while user requests are in flight; warming waits.
+            invalidate (Dict[str, Callable[[], None]], optional): Per ingestion kind, clears the caches it makes stale.
+            poll_interval (float, optional): Seconds between checks for new ingestion runs.
+                                Defaults to os.getenv("PREWARM_POLL_INTERVAL", "60").
+            nice (int, optional): Nice increment of the prewarm thread (Linux). Defaults to os.getenv("PREWARM_NICE", "10").
+        """
+        self.history = history
+        self.warmers = warmers
+        self.top_n = top_n
+        self.busy = busy
+        self.invalidate = invalidate or {}
+        self.poll_interval = poll_interval
+        self.nice = nice
+        self.last_run: Optional[Dict] = None
+        self._warmed: Dict[str, List[str]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _wait_idle(self) -> bool:
+        # Yield to user requests; returns False when stopping
+        while self.busy():
+            if self._stop.wait(0.05):
+                return False
+        return not self._stop.is_set()
+
+    def run(self, trigger: str = "manual") -> Dict:
+        """
+        Warm the top_n questions of every endpoint that are not cached yet.
+
+        Returns:
+            Dict: Per endpoint, the questions considered, already cached, warmed and failed, the share of
+                recent request volume they cover and the wall and CPU seconds spent.
+        """
+        started_at, start_cpu = time.time(), time.thread_time()
+        report = {"trigger": trigger, "endpoints": {}}
+        warmed_keys = {}
+        for endpoint, (is_cached, warm) in self.warmers.items():
+            questions = self.history.top(endpoint, self.top_n)
+            total = self.history.total_score(endpoint)
+            stats = {"questions": len(questions), "already_cached": 0, "warmed": 0, "failed": 0, "seconds": 0.0,
+                     "predicted_coverage": round(sum(q["score"] for q in questions) / total, 3) if total else None}
+            endpoint_start = time.perf_counter()
+            warmed_keys[endpoint] = []
+            for question in questions:
+                if is_cached(question["question"]):
+                    stats["already_cached"] += 1
+                    warmed_keys[endpoint].append(question["normalized"])
+                    continue
+                if not self._wait_idle():
+                    break
+                try:
+                    warm(question)
+                    stats["warmed"] += 1
+                    warmed_keys[endpoint].append(question["normalized"])
+                except Exception as e:
+                    stats["failed"] += 1
+                    _logger.warning("Prewarming %s question failed: %s", endpoint, e)
+            stats["seconds"] = round(time.perf_counter() - endpoint_start, 2)
+            report["endpoints"][endpoint] = stats
+        report["cpu_seconds"] = round(time.thread_time() - start_cpu, 2)
+        report["seconds"] = round(time.time() - started_at, 2)
+        finished_at = time.time()
+        report["finished_at"] = finished_at
+        self.history.save_run(trigger, started_at, finished_at, report)
+        self.last_run, self._warmed = report, warmed_keys
+        _logger.info("Prewarm (%s) finished in %.1f seconds: %s", trigger, report["seconds"],
+                     {endpoint: stats["warmed"] for endpoint, stats in report["endpoints"].items()})
+        return report
+
+    def status(self) -> Dict:
+        """
+        Return the last run and the coverage of the requests served since it finished.
+        """
+        if self.last_run is None:
+            return {"last_run": None, "coverage": None}
+        return {"last_run": self.last_run,
+                "coverage": self.history.coverage_since(self.last_run["finished_at"], self._warmed)}
+
+    def _loop(self) -> None:
+        try:
+            # Linux applies nice values per thread; the model's worker threads inherit it
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self.nice)
+        except (AttributeError, OSError) as e:
+            _logger.warning("Unable to lower the prewarm thread priority: %s", e)
+        last_ingestion = max([row[0] for row in self.history.ingestions_since(0)], default=0)
+        trigger = "startup"
+        while True:
+            try:
+                self.run(trigger)
+            except Exception as e:
+                _logger.error("Prewarm (%s) failed: %s", trigger, e)
+            ingestions = []
+            while not ingestions:
+                if self._stop.wait(self.poll_interval):
+                    return
+                ingestions = self.history.ingestions_since(last_ingestion)
+            last_ingestion = ingestions[-1][0]
+            kinds = sorted({kind for _, kind in ingestions})
+            for kind in kinds:
+                if kind in self.invalidate:
+                    self.invalidate[kind]()
+            trigger = "ingestion:" + ",".join(kinds)
+
+    def start(self) -> None:
+        """
+        Prewarm now in a background thread, then again after every ingestion run.
+        """
+        self._thread = threading.Thread(target=self._loop, name="prewarm", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
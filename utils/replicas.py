@@ -0,0 +1,171 @@
+"""
+Module Docstring: This module routes read-only connections to PostgreSQL read replicas.
+
+ReplicaRouter keeps the health and replication lag of every reader DSN, refreshed by a background
+thread. pick() returns the healthy reader with the fewest connections in use (round-robin between
+equally loaded readers), or None when no reader is healthy so callers fail back to the primary.
+
+Dependencies: itertools, threading, time, psycopg2
+"""
+
+# Import dependencies
+import os
+import time
+import itertools
+import threading
+from typing import Dict, List, Optional
+
+import psycopg2
+
+from .logger import create_logger
+_logger = create_logger("replicas")
+
+# Seconds of replay lag behind the primary; 0 when the replica has replayed everything it received
+LAG_QUERY = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+
+class ReplicaRouter:
+    """
+    This class tracks reader health and load and picks the reader for each read-only connection.
+    """
+
+    def __init__(self, reader_dsns: List[str],
+                 max_lag: float = float(os.getenv("REPLICA_MAX_LAG", "5")),
+                 check_interval: float = float(os.getenv("REPLICA_CHECK_INTERVAL", "5")),
+                 connect_timeout: int = 2) -> None:
+        """
+        Initialize the ReplicaRouter.
+
+        Args:
+            reader_dsns (List[str]): libpq connection strings of the readers.
+            max_lag (float, optional): Maximum replication lag in seconds for a reader to receive reads.
+                                Defaults to os.getenv("REPLICA_MAX_LAG", "5").
+            check_interval (float, optional): Seconds between health checks.
+                                Defaults to os.getenv("REPLICA_CHECK_INTERVAL", "5").
+            connect_timeout (int, optional): Connect timeout of the health check in seconds. Defaults to 2.
+        """
+        self.reader_dsns = list(reader_dsns)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.connect_timeout = connect_timeout
+        self._healthy: Dict[str, bool] = {dsn: True for dsn in self.reader_dsns}
+        self._lag: Dict[str, Optional[float]] = {dsn: None for dsn in self.reader_dsns}
+        self._in_use: Dict[str, int] = {dsn: 0 for dsn in self.reader_dsns}
+        self._order = itertools.cycle(range(max(1, len(self.reader_dsns))))
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def check(self, dsn: str) -> bool:
+        """
+        Connect to a reader and compare its replication lag with max_lag.
+
+        Args:
+            dsn (str): Reader connection string.
+
+        Returns:
+            bool: True if the reader may receive reads.
+        """
+        try:
+            connection = psycopg2.connect(dsn, connect_timeout=self.connect_timeout)
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(LAG_QUERY)
+                    lag = float(cursor.fetchone()[0])
+            finally:
+                connection.close()
+        except Exception as e:
+            lag, healthy = None, False
+            _logger.warning("Reader health check failed: %s", e)
+        else:
+            healthy = lag <= self.max_lag
+            if not healthy:
+                _logger.warning("Reader lags %.1fs behind the primary", lag)
+        with self._lock:
+            if healthy and not self._healthy[dsn]:
+                _logger.info("Reader is healthy again")
+            self._healthy[dsn] = healthy
+            self._lag[dsn] = lag
+        return healthy
+
+    def check_all(self) -> None:
+        for dsn in self.reader_dsns:
+            self.check(dsn)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.check_interval):
+            self.check_all()
+
+    def start(self) -> None:
+        """
+        Run an initial health check and start the background checker.
+        """
+        if self._thread is None and self.reader_dsns:
+            self.check_all()
+            self._thread = threading.Thread(target=self._run, name="replica-health", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def pick(self) -> Optional[str]:
+        """
+        Reserve the least loaded healthy reader.
+
+        Returns:
+            Optional[str]: Reader DSN, or None if no reader is healthy. Call release() when done.
+        """
+        with self._lock:
+            healthy = [dsn for dsn in self.reader_dsns if self._healthy[dsn]]
+            if not healthy:
+                return None
+            least = min(self._in_use[dsn] for dsn in healthy)
+            candidates = [dsn for dsn in healthy if self._in_use[dsn] == least]
+            dsn = candidates[next(self._order) % len(candidates)]
+            self._in_use[dsn] += 1
+            return dsn
+
+    def release(self, dsn: str) -> None:
+        with self._lock:
+            self._in_use[dsn] = max(0, self._in_use[dsn] - 1)
+
+    def mark_failed(self, dsn: str) -> None:
+        """
+        Take a reader out of rotation until the next successful health check.
+        """
+        with self._lock:
+            self._healthy[dsn] = False
+        self.release(dsn)
+
+    def status(self) -> List[dict]:
+        with self._lock:
+            return [
+                {"reader": index, "healthy": self._healthy[dsn], "lag": self._lag[dsn], "in_use": self._in_use[dsn]}
+                for index, dsn in enumerate(self.reader_dsns)
+            ]
+
+
+_router: Optional[ReplicaRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> Optional[ReplicaRouter]:
+    """
+    Return the process-wide router for the readers in DATABASE_READER_DSNS, or None if none are set.
+
+    DATABASE_READER_DSNS holds the reader connection strings separated by ";".
+    """
+    global _router
+    dsns = [dsn.strip() for dsn in os.getenv("DATABASE_READER_DSNS", "").split(";") if dsn.strip()]
+    if not dsns:
+        return None
+    with _router_lock:
+        if _router is None:
+            _router = ReplicaRouter(dsns)
+            _router.start()
+        return _router
@@ -0,0 +1,311 @@
+"""
+This module provides retry, circuit breaker and metrics helpers for calls to external services.
+
+Dependencies:
+- random: Provides the jitter for the exponential backoff.
+- threading: Protects the shared breaker and metrics state.
+- asyncio: Provides the non-blocking sleep used by the async retry helper.
+
+Usage:
+1. Create a RetryPolicy, a CircuitBreaker and an OperationMetrics instance per service.
+2. Wrap every call with call_with_retry (or acall_with_retry in async code).
+
+Only transient errors (connection errors, timeouts and 5xx responses, see is_transient) are retried
+and count towards the circuit breaker. Other errors, such as an invalid argument, are raised at once:
+they would fail the same way on every attempt and say nothing about the health of the service.
+
+Example:
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+    metrics = OperationMetrics()
+    result = call_with_retry(client.heartbeat, "heartbeat", RetryPolicy(), breaker, metrics)
+"""
+
+import time
+import random
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, Optional
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from .logger import create_logger
+_logger = create_logger("resilience")
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised when a call is rejected because the circuit breaker is open.
+    """
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None) or getattr(error, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Return True for errors worth retrying: connection errors, timeouts and 5xx responses.
+
+    Args:
+        error (BaseException): The error raised by the call.
+    """
+    status = _status_code(error)
+    if status is not None:
+        return status >= 500
+    if isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    if requests is not None and isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    return httpx is not None and isinstance(error, httpx.TransportError)
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter.
+
+    Attributes:
+        max_attempts (int): Total number of attempts including the first one.
+        base_delay (float): Delay cap in seconds before the first retry.
+        max_delay (float): Upper bound of any single delay in seconds.
+        multiplier (float): Growth factor of the delay cap per attempt.
+    """
+    max_attempts: int = 5
+    base_delay: float = 0.2
+    max_delay: float = 10.0
+    multiplier: float = 2.0
+
+    def delays(self) -> Iterator[float]:
+        """
+        Yield the sleep before every retry.
+        """
+        for attempt in range(self.max_attempts - 1):
+            cap = min(self.max_delay, self.base_delay * (self.multiplier ** attempt))
+            yield random.uniform(0, cap)
+
+
+class CircuitBreaker:
+    """
+    Rejects calls for reset_timeout seconds after failure_threshold consecutive failures.
+
+    After the timeout a single trial call is let through (half open). Its success closes the
+    circuit again, its failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        """
+        Initialize the CircuitBreaker.
+
+        Args:
+            failure_threshold (int, optional): Consecutive failures that open the circuit. Defaults to 5.
+            reset_timeout (float, optional): Seconds the circuit stays open. Defaults to 30.0.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = 0.0
+        self._state = self.CLOSED
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """
+        Return True if a call may be attempted now.
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                # Let exactly one trial call through
+                self._state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._state = self.CLOSED
+
+    def release_trial(self) -> None:
+        """
+        Give back a half-open trial whose call failed for a reason unrelated to the service's health,
+        so the next call becomes the trial. Does nothing in the other states.
+        """
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._state = self.OPEN
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    _logger.warning("Circuit opened after %d consecutive failures", self._failures)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class OperationMetrics:
+    """
+    Thread-safe per-operation call, error, retry and latency counters.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def _entry(self, operation: str) -> Dict[str, float]:
+        return self._stats.setdefault(operation, {
+            "calls": 0, "errors": 0, "retries": 0, "rejected": 0,
+            "total_ms": 0.0, "max_ms": 0.0
+        })
+
+    def record(self, operation: str, elapsed: float, error: bool = False) -> None:
+        with self._lock:
+            entry = self._entry(operation)
+            entry["calls"] += 1
+            entry["errors"] += int(error)
+            entry["total_ms"] += elapsed * 1000
+            entry["max_ms"] = max(entry["max_ms"], elapsed * 1000)
+
+    def record_retry(self, operation: str) -> None:
+        with self._lock:
+            self._entry(operation)["retries"] += 1
+
+    def record_rejected(self, operation: str) -> None:
+        with self._lock:
+            self._entry(operation)["rejected"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """
+        Return a copy of the counters with the average latency per operation.
+        """
+        with self._lock:
+            result = {}
+            for operation, entry in self._stats.items():
+                result[operation] = dict(entry)
+                result[operation]["avg_ms"] = entry["total_ms"] / entry["calls"] if entry["calls"] else 0.0
+            return result
+
+
+def call_with_retry(func: Callable[[], Any],
+                    operation: str,
+                    policy: RetryPolicy,
+                    breaker: Optional[CircuitBreaker] = None,
+                    metrics: Optional[OperationMetrics] = None,
+                    retry_on: Callable[[BaseException], bool] = is_transient) -> Any:
+    """
+    Call func, retrying transient failures with backoff while the circuit breaker allows it.
+
+    Args:
+        func (Callable[[], Any]): Zero-argument callable performing the operation.
+        operation (str): Operation name used for logs and metrics.
+        policy (RetryPolicy): Retry policy.
+        breaker (CircuitBreaker, optional): Circuit breaker guarding the service.
+        metrics (OperationMetrics, optional): Metrics collector.
+        retry_on (Callable[[BaseException], bool], optional): Whether an error is retried and counted by
+                                the breaker. Other errors are raised at once. Defaults to is_transient.
+
+    Raises:
+        CircuitOpenError: If the circuit is open.
+        Exception: The first error that is not transient, or the last one once all attempts failed.
+
+    Returns:
+        Any: The return value of func.
+    """
+    delays = policy.delays()
+    while True:
+        if breaker is not None and not breaker.allow():
+            if metrics is not None:
+                metrics.record_rejected(operation)
+            raise CircuitOpenError(f"Circuit open, {operation} rejected")
+        start = time.perf_counter()
+        try:
+            result = func()
+        except Exception as e:
+            if metrics is not None:
+                metrics.record(operation, time.perf_counter() - start, error=True)
+            if not retry_on(e):
+                if breaker is not None:
+                    breaker.release_trial()
+                raise
+            if breaker is not None:
+                breaker.record_failure()
+            delay = next(delays, None)
+            if delay is None:
+                _logger.error("%s failed after %d attempts: %s", operation, policy.max_attempts, e)
+                raise
+            if metrics is not None:
+                metrics.record_retry(operation)
+            _logger.warning("%s failed (%s), retrying in %.2fs", operation, e, delay)
+            time.sleep(delay)
+            continue
+        if metrics is not None:
+            metrics.record(operation, time.perf_counter() - start)
+        if breaker is not None:
+            breaker.record_success()
+        return result
+
+
+async def acall_with_retry(func: Callable[[], Any],
+                           operation: str,
+                           policy: RetryPolicy,
+                           breaker: Optional[CircuitBreaker] = None,
+                           metrics: Optional[OperationMetrics] = None,
+                           retry_on: Callable[[BaseException], bool] = is_transient) -> Any:
+    """
+    Async counterpart of call_with_retry. func must return an awaitable.
+    """
+    delays = policy.delays()
+    while True:
+        if breaker is not None and not breaker.allow():
+            if metrics is not None:
+                metrics.record_rejected(operation)
+            raise CircuitOpenError(f"Circuit open, {operation} rejected")
+        start = time.perf_counter()
+        try:
+            result = await func()
+        except Exception as e:
+            if metrics is not None:
+                metrics.record(operation, time.perf_counter() - start, error=True)
+            if not retry_on(e):
+                if breaker is not None:
+                    breaker.release_trial()
+                raise
+            if breaker is not None:
+                breaker.record_failure()
+            delay = next(delays, None)
+            if delay is None:
+                _logger.error("%s failed after %d attempts: %s", operation, policy.max_attempts, e)
+                raise
+            if metrics is not None:
+                metrics.record_retry(operation)
+            _logger.warning("%s failed (%s), retrying in %.2fs", operation, e, delay)
+            await asyncio.sleep(delay)
+            continue
+        if metrics is not None:
+            metrics.record(operation, time.perf_counter() - start)
+        if breaker is not None:
+            breaker.record_success()
+        return result
@@ -0,0 +1,328 @@
+"""
+Module Docstring: This module maintains aggregate (rollup) tables for the common invoice analytics
+questions and routes matching generated SQL to them.
+
+Rollup tables:
+    - rollup_seller: Invoice count, total and tax per seller.
+    - rollup_client: Invoice count, total and tax per client.
+    - rollup_month: Invoice count, total and tax per invoice month.
+    - rollup_item: Line count, quantity, net worth and sales per item name.
+
+The rollups are updated incrementally inside the DBWriter transaction that inserts the base rows,
+so they never drift from invoice_info and invoice_items. A NULL key is rolled up as its own group,
+as GROUP BY returns it. Undated invoices, which the schema parks outside the base tables, are not
+rolled up. check_consistency recomputes the aggregates from the base tables in a single snapshot and
+reports (or repairs, while holding off writers) any difference.
+
+Dependencies: re, decimal, psycopg2
+"""
+
+# Import dependencies
+import os
+import re
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .normalize import parse_amount, parse_date
+from .logger import create_logger
+_logger = create_logger("rollups")
+
+# Maintain the rollups on insert and route matching queries to them
+USE_ROLLUPS = os.getenv("USE_ROLLUPS", "false").lower() == "true"
+
+ROLLUP_DDL = """
+CREATE TABLE IF NOT EXISTS rollup_seller (
+    seller_name TEXT,
+    invoice_count BIGINT NOT NULL DEFAULT 0,
+    total_sum NUMERIC NOT NULL DEFAULT 0,
+    tax_sum NUMERIC NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS rollup_client (
+    client_name TEXT,
+    invoice_count BIGINT NOT NULL DEFAULT 0,
+    total_sum NUMERIC NOT NULL DEFAULT 0,
+    tax_sum NUMERIC NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS rollup_month (
+    month DATE,
+    invoice_count BIGINT NOT NULL DEFAULT 0,
+    total_sum NUMERIC NOT NULL DEFAULT 0,
+    tax_sum NUMERIC NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS rollup_item (
+    item_name TEXT,
+    line_count BIGINT NOT NULL DEFAULT 0,
+    quantity_sum NUMERIC NOT NULL DEFAULT 0,
+    net_worth_sum NUMERIC NOT NULL DEFAULT 0,
+    sales_sum NUMERIC NOT NULL DEFAULT 0
+);
+"""
+
+# rollup table -> (key column, value columns)
+ROLLUP_TABLES: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "rollup_seller": ("seller_name", ("invoice_count", "total_sum", "tax_sum")),
+    "rollup_client": ("client_name", ("invoice_count", "total_sum", "tax_sum")),
+    "rollup_month": ("month", ("invoice_count", "total_sum", "tax_sum")),
+    "rollup_item": ("item_name", ("line_count", "quantity_sum", "net_worth_sum", "sales_sum")),
+}
+
+# Unique key of each rollup table. A primary key cannot hold the NULL group, and a plain unique
+# index treats NULLs as distinct, so the index is on (key IS NULL, key with NULL replaced).
+ROLLUP_KEYS: Dict[str, str] = {
+    "rollup_seller": "(seller_name IS NULL), (COALESCE(seller_name, ''))",
+    "rollup_client": "(client_name IS NULL), (COALESCE(client_name, ''))",
+    "rollup_month": "(month IS NULL), (COALESCE(month, 'epoch'::date))",
+    "rollup_item": "(item_name IS NULL), (COALESCE(item_name, ''))",
+}
+
+def parse_insert(query: str) -> Tuple[str, Tuple[str, ...]]:
+    """
+    Extract the target table and column list from an INSERT statement.
+
+    Args:
+        query (str): INSERT query as built by SQLQueryBuilder.
+
+    Returns:
+        Tuple[str, Tuple[str, ...]]: Unqualified table name and column names.
+    """
+    match = re.match(r"\s*INSERT\s+INTO\s+([\w.]+)\s*\(([^)]*)\)", query, re.IGNORECASE)
+    if match is None:
+        return "", ()
+    table = match.group(1).split(".")[-1].lower()
+    columns = tuple(column.strip().lower() for column in match.group(2).split(","))
+    return table, columns
+
+
+class RollupManager:
+    """
+    This class keeps the rollup tables in sync with the base tables.
+    """
+
+    def create_tables(self, cursor) -> None:
+        """
+        Create the rollup tables if they do not exist, and key them so the NULL group can be stored.
+        """
+        cursor.execute(ROLLUP_DDL)
+        for rollup, (key, _) in ROLLUP_TABLES.items():
+            # Tables created before NULL keys were rolled up have a primary key on the key column
+            cursor.execute(f"ALTER TABLE {rollup} DROP CONSTRAINT IF EXISTS {rollup}_pkey")
+            cursor.execute(f"ALTER TABLE {rollup} ALTER COLUMN {key} DROP NOT NULL")
+            cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {rollup}_key ON {rollup} ({ROLLUP_KEYS[rollup]})")
+
+    @staticmethod
+    def _accumulate(totals: Dict[str, Dict], table: str, columns: Sequence[str],
+                    data: Sequence) -> None:
+        row = dict(zip(columns, data))
+        if "invoice_date" in row and parse_date(row["invoice_date"]) is None:
+            # Undated rows are diverted to the *_undated parking tables, not the base tables
+            return
+        if table == "invoice_info":
+            total = parse_amount(row.get("total")) or Decimal(0)
+            tax = parse_amount(row.get("total_tax")) or Decimal(0)
+            date = parse_date(row.get("invoice_date"))
+            keys = (
+                ("rollup_seller", row.get("seller_name")),
+                ("rollup_client", row.get("client_name")),
+                ("rollup_month", date.replace(day=1) if date else None),
+            )
+            for rollup, key in keys:
+                entry = totals[rollup][key]
+                entry[0] += 1
+                entry[1] += total
+                entry[2] += tax
+        elif table == "invoice_items":
+            entry = totals["rollup_item"][row.get("item_name")]
+            entry[0] += 1
+            entry[1] += parse_amount(row.get("quantity")) or Decimal(0)
+            entry[2] += parse_amount(row.get("net_worth")) or Decimal(0)
+            entry[3] += parse_amount(row.get("sales")) or Decimal(0)
+
+    @staticmethod
+    def _new_totals() -> Dict[str, Dict]:
+        return {
+            rollup: defaultdict(lambda size=len(values): [Decimal(0)] * size)
+            for rollup, (_, values) in ROLLUP_TABLES.items()
+        }
+
+    def compute_deltas(self, queries_data: List[Tuple[str, Tuple]]) -> Dict[str, Dict]:
+        """
+        Aggregate a batch of inserted rows into per-rollup deltas.
+
+        Args:
+            queries_data (List[Tuple[str, Tuple]]): (query, data) pairs inserted by DBWriter.
+
+        Returns:
+            Dict[str, Dict]: rollup table -> key -> list of value deltas.
+        """
+        totals = self._new_totals()
+        for query, data in queries_data:
+            table, columns = parse_insert(query)
+            self._accumulate(totals, table, columns, data)
+        return totals
+
+    def apply(self, cursor, queries_data: List[Tuple[str, Tuple]]) -> None:
+        """
+        Add the aggregates of an inserted batch to the rollup tables.
+
+        Must run on the cursor of the inserting transaction so rollups and base rows commit together.
+
+        Args:
+            cursor: Cursor of the inserting transaction.
+            queries_data (List[Tuple[str, Tuple]]): (query, data) pairs inserted in this transaction.
+        """
+        for rollup, deltas in self.compute_deltas(queries_data).items():
+            if not deltas:
+                continue
+            key, values = ROLLUP_TABLES[rollup]
+            updates = ", ".join(f"{value} = {rollup}.{value} + EXCLUDED.{value}" for value in values)
+            query = (
+                f"INSERT INTO {rollup} ({key}, {', '.join(values)}) "
+                f"VALUES ({', '.join(['%s'] * (len(values) + 1))}) "
+                f"ON CONFLICT ({ROLLUP_KEYS[rollup]}) DO UPDATE SET {updates}"
+            )
+            # Sorted keys keep the row lock order stable across concurrent writers
+            cursor.executemany(query, [(k,) + tuple(v) for k, v in sorted(deltas.items(), key=lambda item: str(item[0]))])
+
+    def compute_from_base(self, connection, itersize: int = 10000) -> Dict[str, Dict]:
+        """
+        Recompute every rollup from the base tables with streaming server-side cursors.
+
+        Args:
+            connection: Open psycopg2 connection.
+            itersize (int, optional): Rows fetched per round trip. Defaults to 10000.
+
+        Returns:
+            Dict[str, Dict]: rollup table -> key -> list of values.
+        """
+        totals = self._new_totals()
+        sources = (
+            ("invoice_info", ("seller_name", "client_name", "invoice_date", "total", "total_tax")),
+            ("invoice_items", ("item_name", "quantity", "net_worth", "sales")),
+        )
+        for table, columns in sources:
+            with connection.cursor(name=f"rollup_scan_{table}") as cursor:
+                cursor.itersize = itersize
+                cursor.execute(f"SELECT {', '.join(columns)} FROM {table}")
+                for row in cursor:
+                    self._accumulate(totals, table, columns, row)
+        return totals
+
+    def check_consistency(self, connection, repair: bool = False) -> Dict[str, int]:
+        """
+        Compare the rollup tables against the base tables.
+
+        Base tables and rollups are read in one REPEATABLE READ snapshot, so concurrent inserts,
+        which update both in the same transaction, do not show up as mismatches. A repair locks the
+        rollup tables first, so writers wait and add their increments on top of the rewritten rows.
+
+        Args:
+            connection: Open psycopg2 connection.
+            repair (bool, optional): Rewrite the rollups from the base tables on mismatch. Defaults to False.
+
+        Returns:
+            Dict[str, int]: Number of mismatching keys per rollup table.
+        """
+        connection.rollback()
+        mismatches = {}
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                if repair:
+                    # Taken before the first query, so the snapshot includes every writer that got a rollup row first
+                    cursor.execute(f"LOCK TABLE {', '.join(ROLLUP_TABLES)} IN EXCLUSIVE MODE")
+            expected = self.compute_from_base(connection)
+            with connection.cursor() as cursor:
+                for rollup, (key, values) in ROLLUP_TABLES.items():
+                    cursor.execute(f"SELECT {key}, {', '.join(values)} FROM {rollup}")
+                    actual = {row[0]: [Decimal(v) for v in row[1:]] for row in cursor.fetchall()}
+                    wanted = {k: list(v) for k, v in expected[rollup].items()}
+                    diff = {k for k in set(actual) | set(wanted) if actual.get(k) != wanted.get(k)}
+                    mismatches[rollup] = len(diff)
+                    if diff:
+                        _logger.warning("%s: %d keys differ from the base tables", rollup, len(diff))
+                    if diff and repair:
+                        cursor.execute(f"DELETE FROM {rollup}")
+                        query = (
+                            f"INSERT INTO {rollup} ({key}, {', '.join(values)}) "
+                            f"VALUES ({', '.join(['%s'] * (len(values) + 1))})"
+                        )
+                        cursor.executemany(query, [(k,) + tuple(v) for k, v in wanted.items()])
+            if repair:
+                connection.commit()
+        finally:
+            connection.rollback()
+        return mismatches
+
+
+class RollupRouter:
+    """
+    This class rewrites generated single-table aggregate queries to read from the rollup tables.
+    """
+
+    # (base table, group key, aggregate, column) -> (rollup table, rollup key, rollup column)
+    ROUTES = {
+        ("invoice_info", "seller_name", "sum", "total"): ("rollup_seller", "seller_name", "total_sum"),
+        ("invoice_info", "seller_name", "sum", "total_tax"): ("rollup_seller", "seller_name", "tax_sum"),
+        ("invoice_info", "seller_name", "count", "*"): ("rollup_seller", "seller_name", "invoice_count"),
+        ("invoice_info", "client_name", "sum", "total"): ("rollup_client", "client_name", "total_sum"),
+        ("invoice_info", "client_name", "sum", "total_tax"): ("rollup_client", "client_name", "tax_sum"),
+        ("invoice_info", "client_name", "count", "*"): ("rollup_client", "client_name", "invoice_count"),
+        ("invoice_info", "month", "sum", "total"): ("rollup_month", "month", "total_sum"),
+        ("invoice_info", "month", "sum", "total_tax"): ("rollup_month", "month", "tax_sum"),
+        ("invoice_info", "month", "count", "*"): ("rollup_month", "month", "invoice_count"),
+        ("invoice_items", "item_name", "sum", "quantity"): ("rollup_item", "item_name", "quantity_sum"),
+        ("invoice_items", "item_name", "sum", "sales"): ("rollup_item", "item_name", "sales_sum"),
+        ("invoice_items", "item_name", "sum", "net_worth"): ("rollup_item", "item_name", "net_worth_sum"),
+        ("invoice_items", "item_name", "count", "*"): ("rollup_item", "item_name", "line_count"),
+    }
+
+    PATTERN = re.compile(
+        r"^select\s+(?P<key>\w+|date_trunc\s*\(\s*'month'\s*,\s*invoice_date\s*\))(?:\s+as\s+(?P<key_alias>\w+))?\s*,\s*"
+        r"(?P<agg>sum|count)\s*\(\s*(?P<col>\*|\w+)\s*\)(?:\s+as\s+(?P<alias>\w+))?\s+"
+        r"from\s+(?:public\.)?(?P<table>invoice_info|invoice_items)\s+"
+        r"group\s+by\s+(?P<group>[^;]+?)"
+        r"(?P<tail>\s+order\s+by\s+[^;]+?)?(?P<limit>\s+limit\s+\d+)?\s*;?\s*$",
+        re.IGNORECASE | re.DOTALL
+    )
+
+    def rewrite(self, query: str) -> Optional[str]:
+        """
+        Return an equivalent query against a rollup table, or None if the query does not match.
+
+        Args:
+            query (str): Generated SQL query.
+
+        Returns:
+            Optional[str]: The rewritten query.
+        """
+        match = self.PATTERN.match(" ".join(query.split()))
+        if match is None:
+            return None
+        key_expr = match.group("key").lower()
+        key = "month" if key_expr.startswith("date_trunc") else key_expr
+        group = match.group("group").strip().lower()
+        if group not in (key_expr, "1", (match.group("key_alias") or "").lower()):
+            return None
+        col = match.group("col").lower()
+        agg = match.group("agg").lower()
+        if agg == "count" and col == "invoice_id":
+            col = "*"
+        route = self.ROUTES.get((match.group("table").lower(), key, agg, col))
+        if route is None:
+            return None
+        rollup, rollup_key, rollup_col = route
+
+        key_alias = match.group("key_alias") or (key_expr if key != "month" else "month")
+        alias = match.group("alias") or agg
+        agg_text = re.compile(rf"{agg}\s*\(\s*{re.escape(match.group('col'))}\s*\)", re.IGNORECASE)
+        tail = match.group("tail") or ""
+        tail = agg_text.sub(alias, tail)
+        if key == "month":
+            tail = re.sub(r"date_trunc\s*\(\s*'month'\s*,\s*invoice_date\s*\)", key_alias, tail, flags=re.IGNORECASE)
+            key_select = f"{rollup_key}::timestamp AS {key_alias}"
+        else:
+            key_select = f"{rollup_key} AS {key_alias}"
+        rewritten = f"SELECT {key_select}, {rollup_col} AS {alias} FROM {rollup}{tail}{match.group('limit') or ''}"
+        _logger.info("Routed aggregate query to %s", rollup)
+        return rewritten
@@ -0,0 +1,302 @@
+"""
+Module Docstring: This module manages the PostgreSQL schema of the invoice tables.
+
+The schema is versioned: every migration runs once, inside a transaction, and is recorded in the
+schema_migrations table. The managed tables store typed NUMERIC and DATE values, are range
+partitioned by invoice_date (one partition per year plus a default partition), carry BRIN indexes on
+invoice_date and a B-tree index on the invoice_items foreign key.
+
+invoice_date is NOT NULL, since it is part of the invoice key and of the foreign key. Invoices whose
+date could not be parsed are diverted by a trigger to the invoice_info_undated and
+invoice_items_undated parking tables, where they can be reviewed and re-inserted with a date.
+
+Tables created outside the repo (with raw string values) are renamed to *_legacy and their rows are
+normalized with the DataParser normalizers and copied into the managed tables.
+
+Dependencies: datetime, psycopg2
+"""
+
+# Import dependencies
+import os
+import datetime
+from typing import Callable, List, Tuple
+
+from psycopg2.extras import execute_values
+
+from .normalize import parse_amount, parse_date
+from .logger import create_logger
+_logger = create_logger("schema")
+
+# Years covered by dedicated partitions. Other dates land in the default partition.
+PARTITION_START_YEAR = int(os.getenv("PARTITION_START_YEAR", "2000"))
+PARTITION_END_YEAR = int(os.getenv("PARTITION_END_YEAR", str(datetime.date.today().year + 1)))
+
+# Rows read from a legacy table and inserted per round trip
+LEGACY_BATCH_SIZE = int(os.getenv("LEGACY_BATCH_SIZE", "10000"))
+
+
+def _table_exists(cursor, table: str) -> bool:
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (f"public.{table}",))
+    return cursor.fetchone()[0]
+
+
+def _is_partitioned(cursor, table: str) -> bool:
+    cursor.execute(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p "
+        "JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s)", (table,)
+    )
+    return cursor.fetchone()[0]
+
+
+def _legacy_tables(cursor) -> None:
+    """
+    Rename unmanaged, unpartitioned invoice tables so their data can be migrated.
+    """
+    for table in ("invoice_items", "invoice_info"):
+        if _table_exists(cursor, table) and not _is_partitioned(cursor, table):
+            _logger.info("Renaming unmanaged table %s to %s_legacy", table, table)
+            cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+
+
+def _create_tables(cursor) -> None:
+    cursor.execute(
+        """
+        CREATE TABLE invoice_info (
+            invoice_id TEXT NOT NULL,
+            invoice_date DATE,
+            seller_name TEXT,
+            seller_address TEXT,
+            seller_taxid TEXT,
+            seller_iban TEXT,
+            client_name TEXT,
+            client_address TEXT,
+            client_taxid TEXT,
+            total_tax NUMERIC(14, 2),
+            total NUMERIC(14, 2),
+            UNIQUE (invoice_id, invoice_date)
+        ) PARTITION BY RANGE (invoice_date);
+
+        CREATE TABLE invoice_items (
+            item_id BIGSERIAL,
+            invoice_id TEXT NOT NULL,
+            invoice_date DATE,
+            item_name TEXT,
+            quantity NUMERIC(14, 3),
+            unit_measure TEXT,
+            net_price NUMERIC(14, 2),
+            net_worth NUMERIC(14, 2),
+            vat NUMERIC(14, 2),
+            sales NUMERIC(14, 2),
+            UNIQUE (item_id, invoice_date),
+            FOREIGN KEY (invoice_id, invoice_date) REFERENCES invoice_info (invoice_id, invoice_date)
+        ) PARTITION BY RANGE (invoice_date);
+        """
+    )
+    for table in ("invoice_info", "invoice_items"):
+        cursor.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+    ensure_partitions(cursor, PARTITION_START_YEAR, PARTITION_END_YEAR)
+
+
+def _create_indexes(cursor) -> None:
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS invoice_info_date_brin ON invoice_info USING BRIN (invoice_date);
+        CREATE INDEX IF NOT EXISTS invoice_items_date_brin ON invoice_items USING BRIN (invoice_date);
+        CREATE INDEX IF NOT EXISTS invoice_items_invoice_fk ON invoice_items (invoice_id, invoice_date);
+        """
+    )
+
+
+def _copy_rows(cursor, name: str, select: str, insert: str, convert: Callable) -> int:
+    """
+    Stream the rows of a SELECT through a server-side cursor and insert them in batches.
+    """
+    count = 0
+    with cursor.connection.cursor(name=name) as source:
+        source.itersize = LEGACY_BATCH_SIZE
+        source.execute(select)
+        while True:
+            rows = source.fetchmany(LEGACY_BATCH_SIZE)
+            if not rows:
+                break
+            execute_values(cursor, insert, [convert(row) for row in rows], page_size=LEGACY_BATCH_SIZE)
+            count += len(rows)
+    return count
+
+
+def _copy_legacy_data(cursor) -> None:
+    """
+    Normalize the rows of the legacy tables into the typed, partitioned tables.
+    """
+    if _table_exists(cursor, "invoice_info_legacy"):
+        count = _copy_rows(
+            cursor, "legacy_invoice_info",
+            "SELECT invoice_id, invoice_date, seller_name, seller_address, seller_taxid, seller_iban, "
+            "client_name, client_address, client_taxid, total_tax, total FROM invoice_info_legacy",
+            "INSERT INTO invoice_info VALUES %s ON CONFLICT DO NOTHING",
+            lambda row: (str(row[0]), parse_date(row[1])) + tuple(row[2:9]) + (parse_amount(row[9]), parse_amount(row[10]))
+        )
+        _logger.info("Migrated %d invoice_info rows", count)
+    if _table_exists(cursor, "invoice_items_legacy"):
+        # Legacy items only carry invoice_id: attach each to a single invoice (the latest one with
+        # that id), so an id shared by several invoices does not duplicate the items
+        count = _copy_rows(
+            cursor, "legacy_invoice_items",
+            "SELECT l.invoice_id, i.invoice_date, l.item_name, l.quantity, l.unit_measure, l.net_price, "
+            "l.net_worth, l.vat, l.sales FROM invoice_items_legacy l "
+            "LEFT JOIN LATERAL (SELECT invoice_date FROM invoice_info WHERE invoice_id = l.invoice_id::text "
+            "ORDER BY invoice_date DESC NULLS LAST LIMIT 1) i ON true",
+            "INSERT INTO invoice_items (invoice_id, invoice_date, item_name, quantity, unit_measure, "
+            "net_price, net_worth, vat, sales) VALUES %s",
+            lambda row: (str(row[0]), row[1], row[2], parse_amount(row[3]), row[4],
+                         parse_amount(row[5]), parse_amount(row[6]), parse_amount(row[7]), parse_amount(row[8]))
+        )
+        _logger.info("Migrated %d invoice_items rows", count)
+
+
+def _managed_tables(cursor) -> None:
+    _legacy_tables(cursor)
+    _create_tables(cursor)
+    _create_indexes(cursor)
+    _copy_legacy_data(cursor)
+
+
+def _park_undated(cursor) -> None:
+    """
+    Move undated invoices to parking tables, make invoice_date NOT NULL and divert new undated rows.
+    """
+    cursor.execute(
+        """
+        CREATE TABLE invoice_info_undated (
+            LIKE invoice_info INCLUDING DEFAULTS,
+            UNIQUE (invoice_id)
+        );
+        CREATE TABLE invoice_items_undated (LIKE invoice_items INCLUDING DEFAULTS);
+        CREATE INDEX invoice_items_undated_invoice ON invoice_items_undated (invoice_id);
+
+        INSERT INTO invoice_info_undated
+            SELECT DISTINCT ON (invoice_id) * FROM invoice_info WHERE invoice_date IS NULL ORDER BY invoice_id;
+        INSERT INTO invoice_items_undated SELECT * FROM invoice_items WHERE invoice_date IS NULL;
+        DELETE FROM invoice_items WHERE invoice_date IS NULL;
+        DELETE FROM invoice_info WHERE invoice_date IS NULL;
+
+        ALTER TABLE invoice_info ALTER COLUMN invoice_date SET NOT NULL;
+        ALTER TABLE invoice_items ALTER COLUMN invoice_date SET NOT NULL;
+
+        CREATE FUNCTION park_undated_invoice() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF NEW.invoice_date IS NULL THEN
+                EXECUTE format('INSERT INTO %I SELECT ($1).*', TG_ARGV[0]) USING NEW;
+                RETURN NULL;
+            END IF;
+            RETURN NEW;
+        END
+        $$;
+        CREATE TRIGGER invoice_info_park_undated BEFORE INSERT ON invoice_info
+            FOR EACH ROW EXECUTE FUNCTION park_undated_invoice('invoice_info_undated');
+        CREATE TRIGGER invoice_items_park_undated BEFORE INSERT ON invoice_items
+            FOR EACH ROW EXECUTE FUNCTION park_undated_invoice('invoice_items_undated');
+        """
+    )
+    cursor.execute("SELECT (SELECT COUNT(*) FROM invoice_info_undated), (SELECT COUNT(*) FROM invoice_items_undated)")
+    _logger.info("Parked %d undated invoices and %d items", *cursor.fetchone())
+
+
+# Ordered list of (version, description, migration). Never edit an applied migration, add a new one.
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "typed, partitioned invoice tables with BRIN and foreign key indexes", _managed_tables),
+    (2, "NOT NULL invoice_date, undated invoices parked in *_undated tables", _park_undated),
+]
+
+
+def ensure_partitions(cursor, start_year: int, end_year: int) -> None:
+    """
+    Create the yearly partitions of both invoice tables for [start_year, end_year].
+
+    Postgres refuses to attach a range the default partition holds rows for, so a year that already
+    has rows there gets a standalone table, the rows are moved into it and it is attached afterwards.
+
+    Args:
+        cursor: Open cursor.
+        start_year (int): First year.
+        end_year (int): Last year.
+    """
+    for year in range(start_year, end_year + 1):
+        missing = [table for table in ("invoice_info", "invoice_items") if not _table_exists(cursor, f"{table}_{year}")]
+        if not missing:
+            continue
+        bounds = f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+        dates = (datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1))
+        defaults = [f"{table}_default" for table in missing if _table_exists(cursor, f"{table}_default")]
+        moving = []
+        if defaults:
+            # Keep writers out of the default partitions until the rows have moved
+            cursor.execute(f"LOCK TABLE {', '.join(defaults)} IN EXCLUSIVE MODE")
+            for default in defaults:
+                cursor.execute(
+                    f"SELECT EXISTS (SELECT 1 FROM {default} WHERE invoice_date >= %s AND invoice_date < %s)", dates
+                )
+                if cursor.fetchone()[0]:
+                    moving.append(default[:-len("_default")])
+        if not moving:
+            for table in missing:
+                cursor.execute(f"CREATE TABLE {table}_{year} PARTITION OF {table} {bounds}")
+            continue
+        # invoice_info before invoice_items, so the items' foreign key finds its invoices when attached
+        for table in missing:
+            cursor.execute(f"CREATE TABLE {table}_{year} (LIKE {table} INCLUDING DEFAULTS)")
+            if table in moving:
+                cursor.execute(
+                    f"INSERT INTO {table}_{year} SELECT * FROM {table}_default "
+                    f"WHERE invoice_date >= %s AND invoice_date < %s", dates
+                )
+        for table in reversed(moving):
+            cursor.execute(f"DELETE FROM {table}_default WHERE invoice_date >= %s AND invoice_date < %s", dates)
+        for table in missing:
+            cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {table}_{year} {bounds}")
+        _logger.info("Moved the %d rows of %s out of the default partitions", year, ", ".join(moving))
+
+
+def migrate(connection) -> List[int]:
+    """
+    Apply every pending migration, each in its own transaction.
+
+    Args:
+        connection: Open psycopg2 connection.
+
+    Returns:
+        List[int]: Versions applied by this call.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INT PRIMARY KEY, description TEXT, applied_at TIMESTAMPTZ DEFAULT now())"
+        )
+        # Serialize concurrent migration runs
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext('schema_migrations'))")
+        cursor.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in cursor.fetchall()}
+    connection.commit()
+
+    done = []
+    for version, description, migration in MIGRATIONS:
+        if version in applied:
+            continue
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext('schema_migrations'))")
+                cursor.execute("SELECT 1 FROM schema_migrations WHERE version = %s", (version,))
+                if cursor.fetchone() is None:
+                    migration(cursor)
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                        (version, description)
+                    )
+                    done.append(version)
+            connection.commit()
+            _logger.info("Applied migration %d: %s", version, description)
+        except Exception as e:
+            connection.rollback()
+            _logger.error("Migration %d failed: %s", version, e)
+            raise
+    return done
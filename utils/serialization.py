@@ -0,0 +1,207 @@
+"""
+Module Docstring: This module encodes query results for the API responses.
+
+Rows are encoded with orjson instead of FastAPI's jsonable_encoder, either row-wise (the default
+{"answer": [{...}, ...]} format) or column-wise ({"answer": {"columns": [...], "rows": [[...]]}})
+so column names are not repeated in every row. Arrow IPC streams and Parquet files can be requested
+with the Accept header. JSON and Arrow bodies are compressed with zstd or gzip when the client
+accepts it.
+
+Media types:
+- application/json: row-wise JSON (default)
+- application/vnd.columnar+json: column-wise JSON
+- application/vnd.apache.arrow.stream: Arrow IPC stream
+- application/vnd.apache.parquet: Parquet file (compressed internally with zstd)
+
+Dependencies: decimal, gzip, orjson, pyarrow, zstandard (optional)
+"""
+
+# Import dependencies
+import io
+import gzip
+import base64
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi import Response
+from fastapi.encoders import ENCODERS_BY_TYPE
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.columnar+json"
+ARROW = "application/vnd.apache.arrow.stream"
+PARQUET = "application/vnd.apache.parquet"
+MEDIA_TYPES = (JSON, COLUMNAR_JSON, ARROW, PARQUET)
+_ALIASES = {"application/x-parquet": PARQUET, "application/vnd.apache.arrow.file": ARROW}
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+
+
+def _default(value):
+    # Same conversion as FastAPI's decimal encoder: integral values become int, others float
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    # psycopg2 returns bytea columns as memoryview
+    if isinstance(value, memoryview):
+        value = value.tobytes()
+    if isinstance(value, bytes):
+        # FastAPI decodes bytes as UTF-8; binary values it cannot decode are sent as base64
+        try:
+            return value.decode()
+        except UnicodeDecodeError:
+            return base64.b64encode(value).decode("ascii")
+    # The rest as jsonable_encoder does: timedelta as seconds, UUID and IP addresses as str, sets as lists...
+    for base in type(value).__mro__[:-1]:
+        if base in ENCODERS_BY_TYPE:
+            return ENCODERS_BY_TYPE[base](value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value) -> bytes:
+    """
+    Encode a value with orjson. Dates are ISO formatted, Decimals become numbers and other types are
+    encoded as FastAPI's jsonable_encoder does.
+    """
+    return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def to_columnar(rows: List[dict]) -> dict:
+    """
+    Convert rows to the column-wise format.
+
+    Args:
+        rows (List[dict]): Rows as returned by query_database.
+
+    Returns:
+        dict: {"columns": [...], "rows": [[...], ...]}
+    """
+    columns = list(rows[0]) if rows else []
+    return {"columns": columns, "rows": [list(row.values()) for row in rows]}
+
+
+def to_arrow(rows: List[dict]) -> pa.Table:
+    """
+    Convert rows to an Arrow table. Column types are inferred from the values.
+    """
+    columns = list(rows[0]) if rows else []
+    return pa.table({name: _arrow_column([row[name] for row in rows]) for name in columns})
+
+
+def _arrow_column(values: list) -> pa.Array:
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Types Arrow cannot infer (UUID, IP addresses, ...) are sent as their JSON encoding
+        return pa.array([None if value is None else orjson.loads(dumps(value)) for value in values])
+
+
+def _parse_header(header: Optional[str]) -> List[Tuple[str, float]]:
+    """
+    Parse an Accept or Accept-Encoding header into (value, q) pairs sorted by preference.
+    """
+    entries = []
+    for index, part in enumerate((header or "").split(",")):
+        fields = [field.strip() for field in part.split(";")]
+        if not fields[0]:
+            continue
+        q = 1.0
+        for field in fields[1:]:
+            if field.startswith("q="):
+                try:
+                    q = float(field[2:])
+                except ValueError:
+                    q = 0.0
+        entries.append((fields[0].lower(), q, index))
+    entries.sort(key=lambda entry: (-entry[1], entry[2]))
+    return [(value, q) for value, q, _ in entries if q > 0]
+
+
+def negotiate_media_type(accept: Optional[str]) -> str:
+    """
+    Pick the response media type for an Accept header. Defaults to row-wise JSON.
+    """
+    for value, _ in _parse_header(accept):
+        value = _ALIASES.get(value, value)
+        if value in MEDIA_TYPES:
+            return value
+        if value in ("*/*", "application/*"):
+            return JSON
+    return JSON
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Pick the content encoding for an Accept-Encoding header, preferring zstd over gzip at equal q.
+    """
+    available = ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+    accepted = _parse_header(accept_encoding)
+    best, best_q = None, 0.0
+    for encoding in available:
+        for value, q in accepted:
+            if (value == encoding or value == "*") and q > best_q:
+                best, best_q = encoding, q
+    return best
+
+
+def compress(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=5)
+    return body
+
+
+def encode_rows(rows: List[dict], media_type: str) -> bytes:
+    """
+    Encode rows in the given media type.
+
+    Args:
+        rows (List[dict]): Rows as returned by query_database.
+        media_type (str): One of MEDIA_TYPES.
+
+    Returns:
+        bytes: The encoded body.
+    """
+    if media_type == COLUMNAR_JSON:
+        return dumps({"answer": to_columnar(rows)})
+    if media_type == ARROW:
+        table = to_arrow(rows)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    if media_type == PARQUET:
+        buffer = io.BytesIO()
+        pq.write_table(to_arrow(rows), buffer, compression="zstd")
+        return buffer.getvalue()
+    return dumps({"answer": rows})
+
+
+def rows_response(rows: List[dict], headers: Dict[str, str]) -> Response:
+    """
+    Build the response for query rows, negotiated from the request headers.
+
+    Args:
+        rows (List[dict]): Rows as returned by query_database.
+        headers: Request headers (Accept and Accept-Encoding are used).
+
+    Returns:
+        Response: The encoded, possibly compressed response.
+    """
+    media_type = negotiate_media_type(headers.get("accept"))
+    body = encode_rows(rows, media_type)
+    response_headers = {"Vary": "Accept, Accept-Encoding"}
+    # Parquet pages are already compressed
+    encoding = negotiate_encoding(headers.get("accept-encoding")) if media_type != PARQUET else None
+    if encoding is not None and len(body) >= MIN_COMPRESS_BYTES:
+        body = compress(body, encoding)
+        response_headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=response_headers)
@@ -0,0 +1,411 @@
+"""
+Module Docstring: This module decouples invoice extraction from loading with staging files.
+
+Extraction appends the normalized rows from DataParser to staging segments instead of inserting
+them. A segment is written as JSONL while it is open (one invoice per line, flushed per record, so
+a crash loses at most the line being written) and sealed once it holds segment_rows invoices. Sealing
+renames it from .jsonl.part to .jsonl and writes the same rows as two typed Parquet files
+(<segment>.info.parquet and <segment>.items.parquet). Sealed segments are never modified.
+
+StagingLoader bulk-loads sealed segments with COPY into temporary tables and inserts them into the
+invoice tables in batches of segments, one transaction per batch. Invoices already in the
+database are skipped (ON CONFLICT DO NOTHING), together with their items. Undated invoices go to the
+invoice_info_undated and invoice_items_undated parking tables, deduplicated by invoice_id, so
+reloading a segment does not insert them twice. Every loaded segment is
+recorded in the staging_loads table in the same transaction, so a segment is loaded exactly once.
+Loaders working in parallel skip the segments another loader holds. Use reload to load every
+segment again, e.g. into new tables after a schema change.
+
+Dependencies: csv, json, psycopg2, pyarrow
+"""
+
+# Import dependencies
+import io
+import os
+import glob
+import json
+import time
+import socket
+import datetime
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .data_pipeline import SQLQueryBuilder, INVOICE_INFO_COLUMNS, INVOICE_ITEMS_COLUMNS
+from .database_connector import DatabaseConnector
+from .rollups import RollupManager
+from .logger import create_logger
+_logger = create_logger("staging")
+
+STAGING_DIR = os.getenv("STAGING_DIR", "staging")
+
+INFO_SCHEMA = pa.schema([
+    ("invoice_id", pa.string()), ("invoice_date", pa.date32()), ("seller_name", pa.string()),
+    ("seller_address", pa.string()), ("seller_taxid", pa.string()), ("seller_iban", pa.string()),
+    ("client_name", pa.string()), ("client_address", pa.string()), ("client_taxid", pa.string()),
+    ("total_tax", pa.decimal128(14, 2)), ("total", pa.decimal128(14, 2)),
+    ("record_no", pa.int64()),
+])
+ITEMS_SCHEMA = pa.schema([
+    ("invoice_id", pa.string()), ("invoice_date", pa.date32()), ("item_name", pa.string()),
+    ("quantity", pa.decimal128(14, 3)), ("unit_measure", pa.string()), ("net_price", pa.decimal128(14, 2)),
+    ("net_worth", pa.decimal128(14, 2)), ("vat", pa.decimal128(14, 2)), ("sales", pa.decimal128(14, 2)),
+    ("record_no", pa.int64()),
+])
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot stage {type(value).__name__}")
+
+
+def _typed(value, field: pa.Field):
+    # JSONL keeps decimals and dates as strings; Parquet stores them typed
+    if value is None or pa.types.is_integer(field.type):
+        return value
+    if pa.types.is_decimal(field.type):
+        return Decimal(value).quantize(Decimal(1).scaleb(-field.type.scale))
+    if pa.types.is_date(field.type):
+        return datetime.date.fromisoformat(value)
+    return value
+
+
+class StagingWriter:
+    """
+    This class appends normalized invoice records to staging segments.
+    """
+
+    def __init__(self, directory: str = STAGING_DIR,
+                 segment_rows: int = int(os.getenv("STAGING_SEGMENT_ROWS", "1000")),
+                 parquet: bool = True) -> None:
+        """
+        Initialize the StagingWriter.
+
+        Args:
+            directory (str, optional): Staging directory. Defaults to os.getenv("STAGING_DIR", "staging").
+            segment_rows (int, optional): Invoices per segment. Defaults to os.getenv("STAGING_SEGMENT_ROWS", "1000").
+            parquet (bool, optional): Also write Parquet files when a segment is sealed. Defaults to True.
+        """
+        self.directory = directory
+        self.segment_rows = segment_rows
+        self.parquet = parquet
+        self._file = None
+        self._segment: Optional[str] = None
+        self._rows = 0
+        self._sequence = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _open(self) -> None:
+        # Unique across hosts and processes writing to the same directory; sorts by creation time
+        stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        self._sequence += 1
+        self._segment = f"{stamp}-{socket.gethostname()}-{os.getpid()}-{self._sequence:04d}"
+        self._file = open(os.path.join(self.directory, f"{self._segment}.jsonl.part"), "a", encoding="utf-8")
+        self._rows = 0
+
+    def write(self, info: Sequence, items: Iterable[Sequence], source: Optional[str] = None) -> None:
+        """
+        Append one invoice (its invoice_info row and invoice_items rows, as returned by DataParser.ParseData).
+
+        Args:
+            info (Sequence): invoice_info row in INVOICE_INFO_COLUMNS order.
+            items (Iterable[Sequence]): invoice_items rows in INVOICE_ITEMS_COLUMNS order.
+            source (str, optional): The extracted file.
+        """
+        if self._file is None:
+            self._open()
+        record = {"source": source, "staged_at": time.time(),
+                  "invoice_info": list(info), "invoice_items": [list(item) for item in items]}
+        self._file.write(json.dumps(record, default=_json_default) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._rows += 1
+        if self._rows >= self.segment_rows:
+            self.seal()
+
+    def seal(self) -> Optional[str]:
+        """
+        Close the open segment and make it visible to loaders. Returns its id, if one was open.
+        """
+        if self._file is None:
+            return None
+        self._file.close()
+        segment, self._file, self._segment = self._segment, None, None
+        seal_segment(self.directory, segment, parquet=self.parquet)
+        return segment
+
+    close = seal
+
+    def __enter__(self) -> "StagingWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.seal()
+
+
+def _read_jsonl(path: str) -> List[dict]:
+    records = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Only the last line of a crashed writer can be incomplete
+                _logger.warning("Skipping an incomplete line in %s", path)
+    return records
+
+
+def _to_rows(records: List[dict]) -> Tuple[List[tuple], List[tuple]]:
+    # record_no ties the items to their invoice within a load batch
+    info_rows, item_rows = [], []
+    for record_no, record in enumerate(records):
+        info_rows.append(tuple(_typed(value, field) for value, field in zip(record["invoice_info"], INFO_SCHEMA))
+                         + (record_no,))
+        item_rows += [tuple(_typed(value, field) for value, field in zip(item, ITEMS_SCHEMA)) + (record_no,)
+                      for item in record["invoice_items"]]
+    return info_rows, item_rows
+
+
+def seal_segment(directory: str, segment: str, parquet: bool = True) -> None:
+    """
+    Seal a .jsonl.part segment: write its Parquet files, then rename it to .jsonl.
+    """
+    part = os.path.join(directory, f"{segment}.jsonl.part")
+    if parquet:
+        info_rows, item_rows = _to_rows(_read_jsonl(part))
+        for suffix, schema, rows in (("info", INFO_SCHEMA, info_rows), ("items", ITEMS_SCHEMA, item_rows)):
+            columns = {field.name: [row[i] for row in rows] for i, field in enumerate(schema)}
+            table = pa.Table.from_pydict(columns, schema=schema)
+            path = os.path.join(directory, f"{segment}.{suffix}.parquet")
+            pq.write_table(table, path + ".tmp", compression="zstd")
+            os.replace(path + ".tmp", path)
+    # The rename is the commit point: loaders only see sealed .jsonl segments
+    os.replace(part, os.path.join(directory, f"{segment}.jsonl"))
+    _logger.info("Sealed staging segment %s", segment)
+
+
+def seal_stale_parts(directory: str = STAGING_DIR, older_than: float = 3600.0) -> List[str]:
+    """
+    Seal the open segments of writers that stopped (not modified for older_than seconds).
+    """
+    sealed = []
+    for path in glob.glob(os.path.join(directory, "*.jsonl.part")):
+        if time.time() - os.path.getmtime(path) > older_than:
+            segment = os.path.basename(path)[:-len(".jsonl.part")]
+            seal_segment(directory, segment)
+            sealed.append(segment)
+    return sealed
+
+
+def staged_segments(directory: str = STAGING_DIR) -> List[str]:
+    """
+    Return the ids of the sealed segments, oldest first.
+    """
+    return sorted(os.path.basename(path)[:-len(".jsonl")] for path in glob.glob(os.path.join(directory, "*.jsonl")))
+
+
+def read_segment(directory: str, segment: str) -> Tuple[List[tuple], List[tuple]]:
+    """
+    Read a sealed segment, from Parquet when available, else from JSONL.
+
+    Returns:
+        Tuple[List[tuple], List[tuple]]: invoice_info and invoice_items rows, each ending with the record number.
+    """
+    info_path = os.path.join(directory, f"{segment}.info.parquet")
+    items_path = os.path.join(directory, f"{segment}.items.parquet")
+    if os.path.exists(info_path) and os.path.exists(items_path):
+        return ([tuple(row.values()) for row in pq.read_table(info_path).to_pylist()],
+                [tuple(row.values()) for row in pq.read_table(items_path).to_pylist()])
+    return _to_rows(_read_jsonl(os.path.join(directory, f"{segment}.jsonl")))
+
+
+def _csv(rows: Iterable[Sequence]) -> io.StringIO:
+    # Quoted values are strings (an empty string stays empty), unquoted empty fields are NULL
+    def field(value) -> str:
+        if value is None:
+            return ""
+        text = value.isoformat() if isinstance(value, (datetime.date, datetime.datetime)) else str(value)
+        return '"' + text.replace('"', '""') + '"'
+    return io.StringIO("".join(",".join(field(value) for value in row) + "\n" for row in rows))
+
+
+TRACKING_DDL = """
+CREATE TABLE IF NOT EXISTS staging_loads (
+    segment TEXT PRIMARY KEY,
+    invoices INT NOT NULL,
+    inserted INT NOT NULL,
+    items INT NOT NULL,
+    loaded_at TIMESTAMPTZ NOT NULL DEFAULT now()
+)
+"""
+
+
+class StagingLoader:
+    """
+    This class bulk-loads sealed staging segments into the invoice tables with COPY.
+    """
+
+    def __init__(self, directory: str = STAGING_DIR,
+                 batch_segments: int = int(os.getenv("STAGING_BATCH_SEGMENTS", "10")),
+                 rollups: Optional[RollupManager] = None,
+                 connector_factory: Callable[[], DatabaseConnector] = DatabaseConnector) -> None:
+        """
+        Initialize the StagingLoader.
+
+        Args:
+            directory (str, optional): Staging directory. Defaults to os.getenv("STAGING_DIR", "staging").
+            batch_segments (int, optional): Segments loaded per transaction. Defaults to os.getenv("STAGING_BATCH_SEGMENTS", "10").
+            rollups (RollupManager, optional): Rollup tables updated in the loading transaction.
+            connector_factory (Callable[[], DatabaseConnector], optional): Creates the primary connection.
+        """
+        self.directory = directory
+        self.batch_segments = batch_segments
+        self.rollups = rollups
+        self.connector_factory = connector_factory
+
+    def pending(self, connection, reload: bool = False) -> List[str]:
+        """
+        Return the sealed segments not loaded yet (every sealed segment with reload).
+        """
+        segments = staged_segments(self.directory)
+        if reload:
+            return segments
+        with connection.cursor() as cursor:
+            cursor.execute(TRACKING_DDL)
+            cursor.execute("SELECT segment FROM staging_loads WHERE segment = ANY(%s)", (segments,))
+            loaded = {row[0] for row in cursor.fetchall()}
+        connection.commit()
+        return [segment for segment in segments if segment not in loaded]
+
+    def _load_batch(self, cursor, segments: List[str], reload: bool) -> Dict[str, int]:
+        # Skip segments another loader is loading or has just loaded
+        claimed = []
+        for segment in segments:
+            cursor.execute("SELECT pg_try_advisory_xact_lock(hashtext('staging:' || %s))", (segment,))
+            if not cursor.fetchone()[0]:
+                continue
+            cursor.execute("SELECT 1 FROM staging_loads WHERE segment = %s", (segment,))
+            if reload or cursor.fetchone() is None:
+                claimed.append(segment)
+        if not claimed:
+            return {"segments": 0, "invoices": 0, "inserted": 0, "items": 0}
+
+        info_rows, item_rows, counts, offset = [], [], {}, 0
+        for segment in claimed:
+            # Renumber the records so they are unique across the segments of the batch
+            segment_info, segment_items = read_segment(self.directory, segment)
+            info_rows += [row[:-1] + (row[-1] + offset,) for row in segment_info]
+            item_rows += [row[:-1] + (row[-1] + offset,) for row in segment_items]
+            counts[segment] = (offset, len(segment_info))
+            offset += len(segment_info)
+
+        info_columns, items_columns = ", ".join(INVOICE_INFO_COLUMNS), ", ".join(INVOICE_ITEMS_COLUMNS)
+        cursor.execute(f"CREATE TEMP TABLE staged_info ON COMMIT DROP AS "
+                       f"SELECT {info_columns}, 0::bigint AS record_no FROM invoice_info WITH NO DATA")
+        cursor.execute(f"CREATE TEMP TABLE staged_items ON COMMIT DROP AS "
+                       f"SELECT {items_columns}, 0::bigint AS record_no FROM invoice_items WITH NO DATA")
+        cursor.copy_expert(f"COPY staged_info ({info_columns}, record_no) FROM STDIN WITH (FORMAT csv)", _csv(info_rows))
+        cursor.copy_expert(f"COPY staged_items ({items_columns}, record_no) FROM STDIN WITH (FORMAT csv)", _csv(item_rows))
+
+        # The first staged copy of each invoice not already in the table is inserted, with its items.
+        # Undated invoices are written to the parking table directly: diverted by the schema trigger,
+        # they would be missing from RETURNING. ON CONFLICT never fires on a NULL date, so they are
+        # deduplicated by invoice_id alone.
+        cursor.execute(
+            f"""
+            WITH chosen AS (
+                SELECT DISTINCT ON (invoice_id, invoice_date) * FROM staged_info
+                ORDER BY invoice_id, invoice_date, record_no
+            ), dated AS (
+                INSERT INTO invoice_info ({info_columns}) SELECT {info_columns} FROM chosen
+                WHERE invoice_date IS NOT NULL
+                ON CONFLICT (invoice_id, invoice_date) DO NOTHING
+                RETURNING invoice_id, invoice_date
+            ), undated AS (
+                INSERT INTO invoice_info_undated ({info_columns}) SELECT {info_columns} FROM chosen
+                WHERE invoice_date IS NULL
+                ON CONFLICT (invoice_id) DO NOTHING
+                RETURNING invoice_id
+            )
+            SELECT chosen.record_no FROM chosen JOIN dated
+              ON dated.invoice_id = chosen.invoice_id AND dated.invoice_date = chosen.invoice_date
+            UNION ALL
+            SELECT chosen.record_no FROM chosen JOIN undated
+              ON undated.invoice_id = chosen.invoice_id AND chosen.invoice_date IS NULL
+            """
+        )
+        inserted = sorted(row[0] for row in cursor.fetchall())
+        items = 0
+        for table, condition in (("invoice_items", "IS NOT NULL"), ("invoice_items_undated", "IS NULL")):
+            cursor.execute(
+                f"INSERT INTO {table} ({items_columns}) SELECT {items_columns} FROM staged_items "
+                f"WHERE record_no = ANY(%s) AND invoice_date {condition} ORDER BY record_no",
+                (inserted,)
+            )
+            items += cursor.rowcount
+
+        if self.rollups is not None and inserted:
+            new = set(inserted)
+            info_query = SQLQueryBuilder.build_insert_query("invoice_info", INVOICE_INFO_COLUMNS)
+            items_query = SQLQueryBuilder.build_insert_query("invoice_items", INVOICE_ITEMS_COLUMNS)
+            self.rollups.apply(cursor, [(info_query, row[:-1]) for row in info_rows if row[-1] in new] +
+                                       [(items_query, row[:-1]) for row in item_rows if row[-1] in new])
+
+        new = set(inserted)
+        for segment, (start, size) in counts.items():
+            segment_inserted = sum(start <= record_no < start + size for record_no in inserted)
+            segment_items = sum(start <= row[-1] < start + size and row[-1] in new for row in item_rows)
+            cursor.execute(
+                "INSERT INTO staging_loads (segment, invoices, inserted, items) VALUES (%s, %s, %s, %s) "
+                "ON CONFLICT (segment) DO UPDATE SET invoices = EXCLUDED.invoices, inserted = EXCLUDED.inserted, "
+                "items = EXCLUDED.items, loaded_at = now()",
+                (segment, size, segment_inserted, segment_items)
+            )
+        return {"segments": len(claimed), "invoices": len(info_rows), "inserted": len(inserted), "items": items}
+
+    def load(self, segments: Optional[List[str]] = None, reload: bool = False) -> Dict[str, float]:
+        """
+        Load segments (default: every pending one) in transactions of batch_segments segments.
+
+        Args:
+            segments (List[str], optional): Segment ids to load. Defaults to the pending segments.
+            reload (bool, optional): Load segments even if staging_loads has them. Defaults to False.
+
+        Returns:
+            Dict[str, float]: Segments, invoices read, invoices inserted, items inserted and seconds.
+        """
+        start = time.perf_counter()
+        totals = {"segments": 0, "invoices": 0, "inserted": 0, "items": 0}
+        connector = self.connector_factory()
+        connector.create_connection()
+        connection = connector.connection
+        try:
+            if segments is None:
+                segments = self.pending(connection, reload)
+            else:
+                with connection.cursor() as cursor:
+                    cursor.execute(TRACKING_DDL)
+                connection.commit()
+            for i in range(0, len(segments), self.batch_segments):
+                batch = segments[i:i + self.batch_segments]
+                try:
+                    with connection.cursor() as cursor:
+                        stats = self._load_batch(cursor, batch, reload)
+                    connection.commit()
+                except Exception:
+                    connection.rollback()
+                    _logger.error("Failed to load staging segments %s", batch)
+                    raise
+                for key in totals:
+                    totals[key] += stats[key]
+                _logger.info("Loaded %d segments: %d of %d invoices inserted, %d items",
+                             stats["segments"], stats["inserted"], stats["invoices"], stats["items"])
+        finally:
+            connector.close_connection()
+        totals["seconds"] = round(time.perf_counter() - start, 2)
+        return totals
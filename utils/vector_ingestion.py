@@ -0,0 +1,495 @@
+"""
+This module provides a streaming ingestion pipeline that loads documents from a directory into the
+vector store read by the /vectorQuery endpoint.
+
+Documents are read lazily, split with VectorQueryFromDirectory.text_splitter, embedded in large
+batches across a process pool and upserted into the configured vector store backend in batches.
+Chunks are identified by the hash of their content, so identical chunks are embedded and stored
+once. A SQLite manifest next to the vector store records which document owns which chunks, which
+makes re-runs incremental and allows documents to be deleted.
+
+Dependencies:
+- vector_store: Provides the configured backend used to upsert and delete chunks.
+- utils.inference: Creates the embedding model of the workers with the configured backend.
+- sqlite3: Stores the ingestion manifest.
+- concurrent.futures: Provides the process pool used for embedding.
+
+Usage:
+1. Instantiate VectorIngestionPipeline with a VectorQueryFromDirectory instance.
+2. Call the ingest_directory method with the folder to index.
+"""
+
+# Import dependencies
+import os
+import time
+import sqlite3
+import hashlib
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor, Future, FIRST_COMPLETED, wait
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from .vector_search import VectorQueryFromDirectory
+from .vector_store import VectorStoreBackend, create_backend
+from .logger import create_logger
+
+_logger = create_logger("VectorIngestion")
+
+# File extensions that are read as plain text
+TEXT_EXTENSIONS = (".txt", ".md", ".csv", ".json", ".html", ".xml")
+
+# Embedding model held by each worker process
+_worker_embeddings = None
+
+
+def _init_worker(model_name: str, model_kwargs: dict, backend: str = "torch") -> None:
+    """
+    Load the embedding model once per worker process.
+
+    Args:
+        model_name (str): Name of the embedding model.
+        model_kwargs (dict): Keyword arguments for the embedding model.
+        backend (str, optional): Inference backend of the embedding model. Defaults to "torch".
+    """
+    global _worker_embeddings
+    from .inference import create_embeddings
+    _worker_embeddings = create_embeddings(
+        model_name=model_name,
+        model_kwargs=model_kwargs,
+        backend=backend
+    )
+
+
+def _embed_batch(texts: List[str]) -> List[List[float]]:
+    """
+    Embed a batch of texts in a worker process.
+
+    Args:
+        texts (List[str]): Texts to embed.
+
+    Returns:
+        List[List[float]]: One embedding per text.
+    """
+    return _worker_embeddings.embed_documents(texts)
+
+
+def content_hash(text: str) -> str:
+    """
+    Compute the content hash used as document fingerprint and chunk ID.
+
+    Args:
+        text (str): Text to hash.
+
+    Returns:
+        str: Hex encoded SHA-1 digest of the text.
+    """
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def iter_documents(folder_path: str,
+                   extensions: Tuple[str, ...] = TEXT_EXTENSIONS) -> Iterator[str]:
+    """
+    Lazily walk a folder and yield the paths of documents to ingest.
+
+    Args:
+        folder_path (str): Root folder to walk.
+        extensions (Tuple[str, ...], optional): File extensions to include. Defaults to TEXT_EXTENSIONS.
+
+    Yields:
+        str: Path of each document.
+    """
+    for root, _, file_names in os.walk(folder_path):
+        for file_name in sorted(file_names):
+            if file_name.lower().endswith(extensions):
+                yield os.path.join(root, file_name)
+
+
+@dataclass
+class IngestionStats:
+    """
+    Counters reported at the end of an ingestion run.
+    """
+    docs_seen: int = 0
+    docs_indexed: int = 0
+    docs_skipped: int = 0
+    docs_deleted: int = 0
+    chunks_embedded: int = 0
+    chunks_deduplicated: int = 0
+    chunks_deleted: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+    elapsed: float = 0.0
+
+    @property
+    def docs_per_sec(self) -> float:
+        return self.docs_seen / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def chunks_per_sec(self) -> float:
+        return self.chunks_embedded / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "docs_seen": self.docs_seen,
+            "docs_indexed": self.docs_indexed,
+            "docs_skipped": self.docs_skipped,
+            "docs_deleted": self.docs_deleted,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_deduplicated": self.chunks_deduplicated,
+            "chunks_deleted": self.chunks_deleted,
+            "elapsed": round(self.elapsed, 3),
+            "docs_per_sec": round(self.docs_per_sec, 2),
+            "chunks_per_sec": round(self.chunks_per_sec, 2),
+        }
+
+
+class IngestionManifest:
+    """
+    SQLite backed record of ingested documents and the chunks they reference.
+
+    Changes stay in an open transaction until commit(). Commit only after the vector store has
+    persisted the matching chunks, so a crash never leaves documents recorded whose chunks were lost.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Open (or create) the manifest database.
+
+        Args:
+            path (str): Path of the SQLite file.
+        """
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                path TEXT PRIMARY KEY,
+                doc_hash TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chunk_refs (
+                chunk_id TEXT NOT NULL,
+                path TEXT NOT NULL,
+                PRIMARY KEY (chunk_id, path)
+            );
+            CREATE INDEX IF NOT EXISTS chunk_refs_path ON chunk_refs(path);
+            """
+        )
+
+    def document_hash(self, path: str) -> Optional[str]:
+        row = self.connection.execute(
+            "SELECT doc_hash FROM documents WHERE path = ?", (path,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def document_chunks(self, path: str) -> Set[str]:
+        rows = self.connection.execute(
+            "SELECT chunk_id FROM chunk_refs WHERE path = ?", (path,)
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def known_chunks(self, chunk_ids: List[str]) -> Set[str]:
+        """
+        Return the subset of chunk IDs already stored for any document.
+        """
+        known = set()
+        for start in range(0, len(chunk_ids), 500):
+            batch = chunk_ids[start:start + 500]
+            rows = self.connection.execute(
+                "SELECT DISTINCT chunk_id FROM chunk_refs WHERE chunk_id IN (%s)"
+                % ",".join("?" * len(batch)), batch
+            ).fetchall()
+            known.update(row[0] for row in rows)
+        return known
+
+    def paths(self) -> Iterator[str]:
+        for row in self.connection.execute("SELECT path FROM documents").fetchall():
+            yield row[0]
+
+    def normalize_paths(self) -> int:
+        """
+        Rewrite relative document paths recorded by earlier versions as absolute paths, resolved
+        against the current directory. When both forms were recorded, their chunk references are merged
+        and the absolute entry is kept. Returns the number of paths rewritten.
+        """
+        renamed = 0
+        for path in list(self.paths()):
+            absolute = os.path.abspath(path)
+            if absolute == path:
+                continue
+            self.connection.execute("UPDATE OR IGNORE chunk_refs SET path = ? WHERE path = ?", (absolute, path))
+            self.connection.execute("DELETE FROM chunk_refs WHERE path = ?", (path,))
+            self.connection.execute("UPDATE OR IGNORE documents SET path = ? WHERE path = ?", (absolute, path))
+            self.connection.execute("DELETE FROM documents WHERE path = ?", (path,))
+            renamed += 1
+        return renamed
+
+    def record_document(self, path: str, doc_hash: str, chunk_ids: Set[str]) -> None:
+        """
+        Store a document together with the full set of chunks it references.
+        """
+        self.connection.execute("DELETE FROM chunk_refs WHERE path = ?", (path,))
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO chunk_refs (chunk_id, path) VALUES (?, ?)",
+            [(chunk_id, path) for chunk_id in chunk_ids]
+        )
+        self.connection.execute(
+            "INSERT OR REPLACE INTO documents (path, doc_hash) VALUES (?, ?)",
+            (path, doc_hash)
+        )
+
+    def remove_document(self, path: str) -> Set[str]:
+        """
+        Remove a document and return the chunk IDs no longer referenced by any document.
+        """
+        chunk_ids = self.document_chunks(path)
+        self.connection.execute("DELETE FROM chunk_refs WHERE path = ?", (path,))
+        self.connection.execute("DELETE FROM documents WHERE path = ?", (path,))
+        return chunk_ids - self.known_chunks(list(chunk_ids))
+
+    def orphaned(self, chunk_ids: Set[str]) -> Set[str]:
+        """
+        Return the chunk IDs from the given set that no document references anymore.
+        """
+        return chunk_ids - self.known_chunks(list(chunk_ids))
+
+    def commit(self) -> None:
+        self.connection.commit()
+
+    def close(self) -> None:
+        # Uncommitted changes are discarded
+        self.connection.close()
+
+
+class VectorIngestionPipeline:
+    """
+    A class to stream documents from a directory into the configured vector store.
+    """
+
+    def __init__(self,
+                 vector_query: VectorQueryFromDirectory,
+                 embed_batch_size: int = 256,
+                 upsert_batch_size: int = 1000,
+                 workers: int = os.cpu_count() or 1,
+                 manifest_path: Optional[str] = None) -> None:
+        """
+        Initializes the VectorIngestionPipeline.
+
+        Args:
+            vector_query (VectorQueryFromDirectory): Provides the splitter, embedding model and store directory.
+            embed_batch_size (int, optional): Number of chunks sent to a worker at once. Defaults to 256.
+            upsert_batch_size (int, optional): Maximum number of chunks per backend upsert. Defaults to 1000.
+            workers (int, optional): Number of embedding processes. Defaults to the CPU count.
+            manifest_path (str, optional): Path of the manifest database.
+                                Defaults to ingest_manifest.sqlite inside the vector store directory.
+        """
+        self._vector_query = vector_query
+        self._embed_batch_size = embed_batch_size
+        self._upsert_batch_size = upsert_batch_size
+        self._workers = max(1, workers)
+        os.makedirs(vector_query.vectorDB_directory, exist_ok=True)
+        self._manifest_path = manifest_path or os.path.join(
+            vector_query.vectorDB_directory, "ingest_manifest.sqlite"
+        )
+        self._backend = None
+
+    @property
+    def backend(self) -> VectorStoreBackend:
+        """
+        Vector store backend configured for the store directory, created on first use.
+        """
+        if self._backend is None:
+            self._backend = create_backend(
+                self._vector_query.vectorDB_directory,
+                backend=self._vector_query.vector_backend
+            )
+        return self._backend
+
+    def _delete_chunks(self, chunk_ids: Set[str], stats: IngestionStats) -> None:
+        ids = sorted(chunk_ids)
+        for start in range(0, len(ids), self._upsert_batch_size):
+            self.backend.delete(ids=ids[start:start + self._upsert_batch_size])
+        stats.chunks_deleted += len(ids)
+
+    def _upsert(self, ids: List[str], texts: List[str], metadatas: List[dict],
+                embeddings: List[List[float]]) -> None:
+        for start in range(0, len(ids), self._upsert_batch_size):
+            end = start + self._upsert_batch_size
+            self.backend.upsert(
+                ids=ids[start:end],
+                documents=texts[start:end],
+                metadatas=metadatas[start:end],
+                embeddings=embeddings[start:end]
+            )
+
+    def _checkpoint(self, manifest: IngestionManifest) -> None:
+        """
+        Persist the vector store, then commit the manifest changes that describe it.
+        """
+        self.backend.save()
+        manifest.commit()
+
+    def delete_documents(self, paths: List[str], manifest: Optional[IngestionManifest] = None,
+                         stats: Optional[IngestionStats] = None) -> IngestionStats:
+        """
+        Remove documents and any chunks only they referenced from the vector store.
+
+        Args:
+            paths (List[str]): Paths of the documents to remove, relative to the current directory or absolute.
+
+        Returns:
+            IngestionStats: Counters for the run.
+        """
+        own_manifest = manifest is None
+        if own_manifest:
+            manifest = IngestionManifest(self._manifest_path)
+            manifest.normalize_paths()
+        stats = stats or IngestionStats()
+        try:
+            for path in map(os.path.abspath, paths):
+                orphaned = manifest.remove_document(path)
+                if orphaned:
+                    self._delete_chunks(orphaned, stats)
+                stats.docs_deleted += 1
+                _logger.info("Deleted document %s (%d chunks)", path, len(orphaned))
+        finally:
+            if own_manifest:
+                self._checkpoint(manifest)
+                manifest.close()
+        stats.elapsed = time.perf_counter() - stats.started_at
+        return stats
+
+    def ingest_directory(self, folder_path: str, prune: bool = True) -> IngestionStats:
+        """
+        Index every document in a folder, skipping unchanged documents.
+
+        Args:
+            folder_path (str): Folder containing the documents.
+            prune (bool, optional): Delete documents that are in the manifest but no longer on disk.
+                                Defaults to True.
+
+        Returns:
+            IngestionStats: Counters and throughput for the run.
+        """
+        stats = IngestionStats()
+        # Documents are recorded by absolute path, so "docs" and "./docs" name the same documents
+        folder_path = os.path.abspath(folder_path)
+        manifest = IngestionManifest(self._manifest_path)
+        manifest.normalize_paths()
+        seen: Set[str] = set()
+
+        # Per document bookkeeping while its chunks are in flight. pending_docs counts the chunks a
+        # document waits for, including chunks queued by another document (listed in waiting), so it
+        # is only recorded in the manifest once every one of its chunks is in the store.
+        pending_docs: Dict[str, int] = {}
+        waiting: Dict[str, List[str]] = {}
+        doc_records: Dict[str, Tuple[str, Set[str], Set[str]]] = {}
+        in_flight: Dict[Future, Tuple[List[str], List[str], List[dict]]] = {}
+        batch_ids: List[str] = []
+        batch_texts: List[str] = []
+        batch_meta: List[dict] = []
+
+        def finish_document(path: str) -> None:
+            doc_hash, chunk_ids, stale = doc_records.pop(path)
+            pending_docs.pop(path, None)
+            manifest.record_document(path, doc_hash, chunk_ids)
+            orphaned = manifest.orphaned(stale)
+            if orphaned:
+                self._delete_chunks(orphaned, stats)
+            stats.docs_indexed += 1
+            # Write-through backends are persisted after every document; buffered ones once they flushed
+            if not self.backend.dirty:
+                manifest.commit()
+
+        def drain(block_until: int) -> None:
+            while len(in_flight) > block_until:
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                for future in done:
+                    ids, texts, metadatas = in_flight.pop(future)
+                    self._upsert(ids, texts, metadatas, future.result())
+                    stats.chunks_embedded += len(ids)
+                    for chunk_id, meta in zip(ids, metadatas):
+                        for path in [meta["source"]] + waiting.pop(chunk_id, []):
+                            pending_docs[path] -= 1
+                            if pending_docs[path] == 0:
+                                finish_document(path)
+
+        def submit(pool: ProcessPoolExecutor) -> None:
+            if not batch_ids:
+                return
+            future = pool.submit(_embed_batch, list(batch_texts))
+            in_flight[future] = (list(batch_ids), list(batch_texts), list(batch_meta))
+            batch_ids.clear()
+            batch_texts.clear()
+            batch_meta.clear()
+            # Keep memory bounded by limiting the number of batches in flight
+            drain(block_until=self._workers * 2)
+
+        with ProcessPoolExecutor(
+            max_workers=self._workers,
+            initializer=_init_worker,
+            initargs=(
+                self._vector_query.embedding_model_name,
+                self._vector_query.embedding_model_kwargs,
+                self._vector_query.embedding_backend
+            )
+        ) as pool:
+            try:
+                for path in iter_documents(folder_path):
+                    seen.add(path)
+                    stats.docs_seen += 1
+                    try:
+                        with open(path, encoding="utf-8", errors="ignore") as f:
+                            text = f.read()
+                    except OSError as e:
+                        _logger.error("Unable to read %s: %s", path, e)
+                        continue
+
+                    doc_hash = content_hash(text)
+                    if manifest.document_hash(path) == doc_hash or path in doc_records:
+                        stats.docs_skipped += 1
+                        continue
+
+                    chunks: Dict[str, str] = {}
+                    for chunk in self._vector_query.text_splitter(text):
+                        chunks.setdefault(content_hash(chunk), chunk)
+                    previous = manifest.document_chunks(path)
+                    known = manifest.known_chunks(list(chunks))
+                    # Chunks already being embedded for another document are not sent twice
+                    queued = set(batch_ids)
+                    for ids, _, _ in in_flight.values():
+                        queued.update(ids)
+                    new_chunks = {
+                        chunk_id: chunk for chunk_id, chunk in chunks.items()
+                        if chunk_id not in known and chunk_id not in queued
+                    }
+                    shared = [chunk_id for chunk_id in chunks if chunk_id not in known and chunk_id in queued]
+                    stats.chunks_deduplicated += len(chunks) - len(new_chunks)
+                    doc_records[path] = (doc_hash, set(chunks), previous - set(chunks))
+
+                    if not new_chunks and not shared:
+                        finish_document(path)
+                        continue
+
+                    pending_docs[path] = len(new_chunks) + len(shared)
+                    for chunk_id in shared:
+                        waiting.setdefault(chunk_id, []).append(path)
+                    for chunk_id, chunk in new_chunks.items():
+                        batch_ids.append(chunk_id)
+                        batch_texts.append(chunk)
+                        batch_meta.append({"source": path})
+                        if len(batch_ids) >= self._embed_batch_size:
+                            submit(pool)
+
+                submit(pool)
+                drain(block_until=0)
+
+                if prune:
+                    removed = [path for path in manifest.paths()
+                               if path not in seen and os.path.commonpath([path, folder_path]) == folder_path]
+                    self.delete_documents(removed, manifest=manifest, stats=stats)
+            finally:
+                # Only finished documents, whose chunks are all upserted, are in the manifest: documents
+                # still waiting when an embedding or upsert failed are not recorded and are retried
+                self._checkpoint(manifest)
+                manifest.close()
+
+        stats.elapsed = time.perf_counter() - stats.started_at
+        _logger.info("Ingestion finished: %s", stats.to_dict())
+        return stats
@@ -0,0 +1,261 @@
+"""
+Module Docstring: This module provides maintenance operations for the persisted Chroma vector store.
+
+Chroma (0.4) fixes the HNSW parameters of a collection when the collection is created. Deleted
+chunks stay in the HNSW graph as tombstones, and every write stays in the embeddings queue of
+chroma.sqlite3. Re-ingestion therefore makes queries slower and the store larger over time.
+
+- index_report: chunks, effective HNSW parameters, tombstones and disk usage per collection.
+- rebuild_collection: copy a collection into a new one with the same name and the given HNSW
+  parameters, then drop the old one with its graph and queue entries. Changing parameters and
+  compacting are the same operation.
+- remove_orphans and vacuum: delete segment folders no collection refers to, and reclaim the free
+  pages of chroma.sqlite3.
+- measure_recall: recall@k and latency of a collection against exact brute-force search.
+
+A rebuild replaces the collection the running API has open: restart the API afterwards.
+
+Dependencies: chromadb, numpy, sqlite3
+"""
+
+# Import dependencies
+import os
+import time
+import pickle
+import shutil
+import sqlite3
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .vector_store import DEFAULT_COLLECTION
+from .logger import create_logger
+_logger = create_logger("vector_maintenance")
+
+# Chroma's defaults for the parameters of hnswlib
+HNSW_DEFAULTS = {"hnsw:space": "l2", "hnsw:M": 16, "hnsw:construction_ef": 100, "hnsw:search_ef": 10}
+
+
+def hnsw_params(metadata: Optional[dict]) -> Dict[str, Any]:
+    """
+    Return the effective HNSW parameters of a collection from its metadata.
+    """
+    metadata = metadata or {}
+    return {key: metadata.get(key, default) for key, default in HNSW_DEFAULTS.items()}
+
+
+def directory_bytes(path: str) -> int:
+    """
+    Total size of the files below a directory.
+    """
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+def _client(directory: str):
+    import chromadb
+    return chromadb.PersistentClient(path=directory)
+
+
+def _vector_segments(directory: str) -> Dict[str, str]:
+    # Maps the id of every collection to the folder of its HNSW segment
+    with sqlite3.connect(os.path.join(directory, "chroma.sqlite3")) as connection:
+        return {collection: segment for segment, collection in connection.execute(
+            "SELECT id, collection FROM segments WHERE scope = 'VECTOR'")}
+
+
+def _tombstones(segment_dir: str) -> Optional[int]:
+    # Elements ever added to the graph minus the live ones, from the segment's persisted state
+    path = os.path.join(segment_dir, "index_metadata.pickle")
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as file:
+        data = pickle.load(file)
+    return data.total_elements_added - len(data.id_to_label)
+
+
+def index_report(directory: str) -> Dict:
+    """
+    Report the collections of a store: chunks, HNSW parameters, tombstones and index size.
+
+    Args:
+        directory (str): Directory of the persisted Chroma store.
+
+    Returns:
+        Dict: Per collection details, the sizes of chroma.sqlite3 and of its embeddings queue, and
+            the orphaned segment folders.
+    """
+    client = _client(directory)
+    segments = _vector_segments(directory)
+    collections = []
+    for collection in client.list_collections():
+        segment_dir = os.path.join(directory, segments.get(str(collection.id), ""))
+        has_segment = str(collection.id) in segments and os.path.isdir(segment_dir)
+        collections.append({
+            "name": collection.name,
+            "chunks": collection.count(),
+            "hnsw": hnsw_params(collection.metadata),
+            "tombstones": _tombstones(segment_dir) if has_segment else None,
+            "index_bytes": directory_bytes(segment_dir) if has_segment else 0,
+        })
+    sqlite_path = os.path.join(directory, "chroma.sqlite3")
+    with sqlite3.connect(sqlite_path) as connection:
+        queue_rows = connection.execute("SELECT COUNT(*) FROM embeddings_queue").fetchone()[0]
+        free_pages, page_size = (connection.execute(f"PRAGMA {pragma}").fetchone()[0]
+                                 for pragma in ("freelist_count", "page_size"))
+    orphans = orphan_segments(directory)
+    return {
+        "collections": collections,
+        "sqlite_bytes": os.path.getsize(sqlite_path),
+        "sqlite_free_bytes": free_pages * page_size,
+        "queue_rows": queue_rows,
+        "orphans": orphans,
+        "orphan_bytes": sum(directory_bytes(os.path.join(directory, name)) for name in orphans),
+        "total_bytes": directory_bytes(directory),
+    }
+
+
+def orphan_segments(directory: str) -> List[str]:
+    """
+    Return the segment folders of the store that no collection refers to.
+    """
+    live = set(_vector_segments(directory).values())
+    return sorted(name for name in os.listdir(directory)
+                  if os.path.isdir(os.path.join(directory, name)) and name not in live
+                  and os.path.exists(os.path.join(directory, name, "header.bin")))
+
+
+def remove_orphans(directory: str) -> int:
+    """
+    Delete the orphaned segment folders. Returns the bytes freed.
+    """
+    freed = 0
+    for name in orphan_segments(directory):
+        path = os.path.join(directory, name)
+        freed += directory_bytes(path)
+        shutil.rmtree(path)
+        _logger.info("Removed orphaned segment %s", name)
+    return freed
+
+
+def vacuum(directory: str) -> int:
+    """
+    Rewrite chroma.sqlite3 without its free pages. Returns the bytes freed.
+    """
+    path = os.path.join(directory, "chroma.sqlite3")
+    before = os.path.getsize(path)
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute("VACUUM")
+    finally:
+        connection.close()
+    return before - os.path.getsize(path)
+
+
+def rebuild_collection(directory: str, name: str = DEFAULT_COLLECTION, params: Optional[Dict[str, Any]] = None,
+                       batch_size: int = 5000) -> Dict:
+    """
+    Rebuild a collection, optionally with new HNSW parameters. Tombstones are dropped.
+
+    The chunks are copied into a temporary collection created with the parameters. The old collection
+    is deleted only when the copy is complete, and the new one takes its name. Deleting and renaming
+    are two steps: a rebuild interrupted between them left only the complete temporary collection,
+    which is renamed first.
+
+    Args:
+        directory (str): Directory of the persisted Chroma store.
+        name (str, optional): Collection to rebuild. Defaults to DEFAULT_COLLECTION.
+        params (Dict[str, Any], optional): HNSW parameters to change, e.g. {"hnsw:M": 32}. Others are kept.
+        batch_size (int, optional): Chunks copied per call. Defaults to 5000.
+
+    Returns:
+        Dict: Chunks copied, parameters, index size before and after, and seconds taken.
+    """
+    start = time.perf_counter()
+    client = _client(directory)
+    temporary = f"{name}-rebuild"
+    names = [collection.name for collection in client.list_collections()]
+    if name not in names and temporary in names:
+        _logger.warning("Finishing the interrupted rebuild of %s: renaming %s", name, temporary)
+        client.get_collection(temporary).modify(name=name)
+        names = [name]
+    old = client.get_collection(name)
+    before = index_report(directory)
+    metadata = dict(old.metadata or {})
+    metadata.update(params or {})
+
+    if temporary in names:
+        # Left over from a rebuild interrupted before the old collection was deleted, which is still complete
+        client.delete_collection(temporary)
+    new = client.create_collection(temporary, metadata=metadata or None)
+    copied, offset = 0, 0
+    while True:
+        batch = old.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+        if not batch["ids"]:
+            break
+        new.add(ids=batch["ids"], embeddings=batch["embeddings"], documents=batch["documents"],
+                metadatas=[chunk_metadata or None for chunk_metadata in batch["metadatas"]])
+        copied += len(batch["ids"])
+        offset += batch_size
+    if copied != old.count():
+        client.delete_collection(temporary)
+        raise RuntimeError(f"Collection {name} changed during the rebuild ({copied} of {old.count()} chunks copied)")
+
+    client.delete_collection(name)
+    new.modify(name=name)
+    _logger.info("Rebuilt collection %s: %d chunks with %s", name, copied, hnsw_params(metadata))
+    after = index_report(directory)
+    size = lambda report: next(c["index_bytes"] for c in report["collections"] if c["name"] == name)
+    return {
+        "collection": name,
+        "chunks": copied,
+        "hnsw": hnsw_params(metadata),
+        "index_bytes_before": size(before),
+        "index_bytes_after": size(after),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def exact_neighbors(vectors: np.ndarray, queries: np.ndarray, k: int, space: str = "l2") -> np.ndarray:
+    """
+    Brute-force k nearest neighbors (row numbers of vectors) of every query, in Chroma's distance.
+    """
+    vectors, queries = np.asarray(vectors, dtype=np.float32), np.asarray(queries, dtype=np.float32)
+    if space == "cosine":
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    if space == "l2":
+        scores = 2 * queries @ vectors.T - (vectors ** 2).sum(axis=1)
+    else:
+        scores = queries @ vectors.T
+    top = np.argpartition(-scores, min(k, scores.shape[1] - 1), axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def measure_recall(collection, vectors: np.ndarray, ids: List[str], queries: np.ndarray, k: int = 3) -> Dict:
+    """
+    Measure recall@k and query latency of a collection against exact search over the same vectors.
+
+    Args:
+        collection: Chroma collection holding vectors under ids.
+        vectors (np.ndarray): Every vector of the collection.
+        ids (List[str]): Chunk ID of every row of vectors.
+        queries (np.ndarray): Query embeddings.
+        k (int, optional): Neighbors per query. Defaults to 3.
+
+    Returns:
+        Dict: recall@k and the p50/p95 latency in milliseconds.
+    """
+    exact = exact_neighbors(vectors, queries, k, hnsw_params(collection.metadata)["hnsw:space"])
+    latencies, hits = [], 0
+    for query, expected in zip(queries, exact):
+        start = time.perf_counter()
+        found = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])["ids"][0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len({ids[row] for row in expected} & set(found))
+    return {
+        "recall": round(hits / (k * len(queries)), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+    }
@@ -3,7 +3,7 @@ This module provides a document loader class that loads documents from a directo
 creates embeddings using a specified model, and stores the embeddings in a vector store.
 
 Dependencies:
-- langchain.embeddings: Provides the HuggingFaceEmbeddings class for creating embeddings.
+- utils.inference: Creates the embedding model with the configured inference backend.
 - langchain.text_splitter: Provides the RecursiveCharacterTextSplitter class for splitting text into chunks.
 - langchain.vectorstores: Provides the FAISS class for creating the vector store.
 - typing.List: Used for type hinting the return value of the text_splitter function.
@@ -13,13 +13,18 @@ Usage:
 2. Call the query_vectorDB method to query the vector DB (ChromaDB in this case) using the provided query.
 """
 
+import os
 import logging
-from typing import List
-from langchain.embeddings import HuggingFaceEmbeddings
+from typing import List, Optional
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.vectorstores import Chroma
 from langchain.prompts import PromptTemplate
 from langchain.chains import RetrievalQA
+from langchain_core.embeddings import Embeddings
+
+from .vector_store import BackendRetriever, create_backend
+from .context_packing import ContextPacker, PackedRetriever
+from .inference import create_embeddings
 
 
 # Configure logging
@@ -38,7 +43,13 @@ class VectorQueryFromDirectory:
                  vectorDB_directory: str,
                  llm: any,
                  query: str, 
-                 chunk_size: int = 1000) -> None:
+                 chunk_size: int = 1000,
+                 chunk_overlap: int = 100,
+                 vector_backend: str = os.getenv("VECTOR_BACKEND", "chroma"),
+                 tokenizer: any = None,
+                 max_input_tokens: int = 512,
+                 fetch_k: int = 12,
+                 embedding_backend: str = os.getenv("EMBEDDING_BACKEND", "torch")) -> None:
         """
         Initializes the VectorQueryFromDirectory object with the specified parameters.
 
@@ -49,53 +60,127 @@ class VectorQueryFromDirectory:
             llm (any): The Language Learning Model.
             query (str): The query string.
             chunk_size (int, optional): Size of the document chunks to be processed. Defaults to 1000.
+            chunk_overlap (int, optional): Overlap between consecutive chunks. Defaults to 100.
+            vector_backend (str, optional): Vector store backend, "chroma" or "mmap".
+                                Defaults to os.getenv("VECTOR_BACKEND", "chroma").
+            tokenizer (any, optional): Tokenizer of the llm. When given, fetch_k chunks are retrieved,
+                                reranked and packed into max_input_tokens. Defaults to None (3 chunks).
+            max_input_tokens (int, optional): Input size of the llm. Defaults to 512.
+            fetch_k (int, optional): Candidate chunks retrieved for packing. Defaults to 12.
+            embedding_backend (str, optional): Inference backend of the embedding model, "torch",
+                                "torch-int8", "onnx" or "onnx-int8". Defaults to os.getenv("EMBEDDING_BACKEND", "torch").
         """
         self._chunk_size = chunk_size
+        self._chunk_overlap = chunk_overlap
         self._embedding_model_name = embedding_model_name
         self._embedding_model_kwargs = embedding_model_kwargs
         self._llm = llm
         self._query = None
         self._vectorDB_directory = vectorDB_directory
+        self._splitter = None
+        self._vector_backend = vector_backend
+        self._backend = None
+        self._tokenizer = tokenizer
+        self._max_input_tokens = max_input_tokens
+        self._fetch_k = fetch_k
+        self._embedding_backend = embedding_backend
+
+    @property
+    def embedding_model_name(self) -> str:
+        """Name of the embedding model used for the vector store."""
+        return self._embedding_model_name
+
+    @property
+    def embedding_model_kwargs(self) -> dict:
+        """Keyword arguments for the embedding model."""
+        return self._embedding_model_kwargs
+
+    @property
+    def embedding_backend(self) -> str:
+        """Inference backend of the embedding model."""
+        return self._embedding_backend
+
+    @property
+    def vectorDB_directory(self) -> str:
+        """Directory path of the persisted vector store."""
+        return self._vectorDB_directory
+
+    @property
+    def vector_backend(self) -> str:
+        """Name of the configured vector store backend."""
+        return self._vector_backend
     
-    def create_embedding(self) -> HuggingFaceEmbeddings:
+    def create_embedding(self) -> Embeddings:
         """
-        Creates embeddings using the specified model and model_kwargs.
+        Creates embeddings using the specified model, model_kwargs and inference backend.
 
         Returns:
-            HuggingFaceEmbeddings: Embeddings created by the specified model.
+            Embeddings: Embeddings created by the specified model.
         """
-        embeddings = HuggingFaceEmbeddings(
+        embeddings = create_embeddings(
             model_name=self._embedding_model_name, 
-            model_kwargs=self._embedding_model_kwargs
+            model_kwargs=self._embedding_model_kwargs,
+            backend=self._embedding_backend
         )
         return embeddings
     
-    def text_splitter(self) -> List[str]:
+    def text_splitter(self, text: Optional[str] = None) -> List[str]:
         """
-        Splits the input query into chunks of text.
+        Splits the input text (or the stored query) into chunks of text.
+
+        Args:
+            text (str, optional): Text to split. Defaults to the stored query.
 
         Returns:
             List[str]: A list of strings representing the split text chunks.
         """
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self._chunk_size,
-            chunk_overlap=100
-        )
-        chunks = splitter.split_text(self._query)
+        if self._splitter is None:
+            self._splitter = RecursiveCharacterTextSplitter(
+                chunk_size=self._chunk_size,
+                chunk_overlap=self._chunk_overlap
+            )
+        chunks = self._splitter.split_text(self._query if text is None else text)
         return chunks
 
-    def query_vectorDB(self):
+    def get_retriever(self, k: int = 3, embeddings: Optional[Embeddings] = None):
+        """
+        Create a retriever over the configured vector store backend.
+
+        Args:
+            k (int, optional): Number of chunks to retrieve. Defaults to 3.
+            embeddings (Embeddings, optional): Loaded embedding model. Defaults to a new create_embedding().
+
+        Returns:
+            BaseRetriever: Retriever used by the RetrievalQA chain.
+        """
+        embeddings = embeddings or self.create_embedding()
+        if self._vector_backend == "chroma":
+            vectordb = Chroma(
+                persist_directory=self._vectorDB_directory, 
+                embedding_function=embeddings
+            )
+            return vectordb.as_retriever(search_kwargs={'k': k})
+
+        # In-process backends are loaded once and kept for the lifetime of the object
+        if self._backend is None:
+            self._backend = create_backend(self._vectorDB_directory, backend=self._vector_backend)
+        return BackendRetriever(backend=self._backend, embeddings=embeddings, k=k)
+
+    def query_vectorDB(self, llm: any = None, embeddings: Optional[Embeddings] = None, tokenizer: any = None):
         """
         Query the vector DB (ChromaDB) using embeddings created from text chunks.
 
+        Args:
+            llm (any, optional): Answer model for this chain, e.g. from a ModelRegistry. Defaults to the llm
+                                given at construction.
+            embeddings (Embeddings, optional): Loaded embedding model. Defaults to a new create_embedding().
+            tokenizer (any, optional): Tokenizer of llm. Defaults to the tokenizer given at construction.
+
         Returns:
             any: The response from the Language Learning Model.
         """
-        vectordb = Chroma(
-            persist_directory=self._vectorDB_directory, 
-            embedding_function=self.create_embedding()
-        )
-        
+        llm = llm if llm is not None else self._llm
+        tokenizer = tokenizer if tokenizer is not None else self._tokenizer
         prompt_template="""
         Use the following pieces of information to answer the user's question.
         If you don't know the answer, just say that you don't know, don't try to make up an answer.
@@ -115,10 +200,23 @@ class VectorQueryFromDirectory:
         chain_type_kwargs={"prompt": prompt}
         
         try:
+            if tokenizer is not None:
+                # Over-fetch, rerank and pack the chunks into the model's input size
+                retriever = PackedRetriever(
+                    base_retriever=self.get_retriever(k=self._fetch_k, embeddings=embeddings),
+                    packer=ContextPacker(
+                        tokenizer=tokenizer,
+                        render=lambda context, question: prompt.format(context=context, question=question),
+                        max_input_tokens=self._max_input_tokens,
+                        chunk_overlap=self._chunk_overlap
+                    )
+                )
+            else:
+                retriever = self.get_retriever(k=3, embeddings=embeddings)
             return RetrievalQA.from_chain_type(
-                llm=self._llm, 
+                llm=llm, 
                 chain_type="stuff", 
-                retriever=vectordb.as_retriever(search_kwargs={'k': 3}),
+                retriever=retriever,
                 return_source_documents=True, 
                 chain_type_kwargs=chain_type_kwargs
             )
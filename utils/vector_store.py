@@ -0,0 +1,428 @@
+"""
+This module provides pluggable vector store backends used for retrieval and ingestion.
+
+Two backends are available:
+- ChromaBackend: The persisted Chroma collection used so far.
+- MmapIndexBackend: An in-process IVF index over memory-mapped float32 arrays. Vectors are grouped by
+  inverted list so a search only scans the contiguous slices of the probed lists, and the arrays are
+  opened with numpy's mmap mode so loading the index does not copy the vectors into memory.
+
+The backend is selected with the VECTOR_BACKEND environment variable ("chroma" or "mmap").
+
+Dependencies:
+- numpy: Provides the memory-mapped arrays and the distance computations.
+- chromadb: Provides the PersistentClient used by the Chroma backend.
+- langchain_core: Provides the BaseRetriever and Document classes used by the RetrievalQA chain.
+
+Usage:
+1. Call create_backend with the vector store directory.
+2. Use upsert/delete/search directly, or wrap the backend with BackendRetriever for a RetrievalQA chain.
+"""
+
+# Import dependencies
+import os
+import re
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from .logger import create_logger
+_logger = create_logger("VectorStore")
+
+# Collection used by langchain.vectorstores.Chroma when no name is given
+DEFAULT_COLLECTION = "langchain"
+
+# (id, document, metadata, score)
+SearchResult = Tuple[str, str, dict, float]
+
+
+def matches_filter(metadata: dict, where: Optional[Dict[str, Any]]) -> bool:
+    """
+    Check metadata against an equality filter.
+
+    Args:
+        metadata (dict): Metadata of a chunk.
+        where (Dict[str, Any], optional): Required key/value pairs. A list value matches any of its items.
+
+    Returns:
+        bool: True if every filter condition holds.
+    """
+    if not where:
+        return True
+    for key, expected in where.items():
+        value = metadata.get(key)
+        if isinstance(expected, (list, tuple, set)):
+            if value not in expected:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+class VectorStoreBackend(ABC):
+    """
+    Interface implemented by every vector store backend.
+    """
+
+    @abstractmethod
+    def upsert(self, ids: List[str], documents: List[str], metadatas: List[dict],
+               embeddings: List[List[float]]) -> None:
+        """Insert or replace chunks together with their embeddings."""
+
+    @abstractmethod
+    def delete(self, ids: List[str]) -> None:
+        """Delete chunks by ID."""
+
+    @abstractmethod
+    def search(self, embedding: List[float], k: int = 3,
+               where: Optional[Dict[str, Any]] = None) -> List[SearchResult]:
+        """Return the k nearest chunks to an embedding, optionally filtered on metadata."""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of live chunks in the store."""
+
+    @property
+    def dirty(self) -> bool:
+        """True while changes are only in memory, until save() persists them."""
+        return False
+
+    def save(self) -> None:
+        """Persist pending changes. Backends that write through do nothing."""
+
+    def compact(self) -> None:
+        """Reclaim space used by deleted chunks. Backends that manage this themselves do nothing."""
+
+
+class ChromaBackend(VectorStoreBackend):
+    """
+    Backend storing chunks in a persisted Chroma collection.
+    """
+
+    def __init__(self, directory: str, collection_name: str = DEFAULT_COLLECTION,
+                 hnsw: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Open (or create) the Chroma collection.
+
+        Args:
+            directory (str): Directory of the persisted Chroma store.
+            collection_name (str, optional): Collection name. Defaults to DEFAULT_COLLECTION.
+            hnsw (Dict[str, Any], optional): HNSW parameters of a new collection, e.g. {"hnsw:M": 32}.
+                                An existing collection keeps its parameters until it is rebuilt.
+        """
+        import chromadb
+        self.client = chromadb.PersistentClient(path=directory)
+        self.collection = self.client.get_or_create_collection(name=collection_name, metadata=hnsw or None)
+
+    def upsert(self, ids, documents, metadatas, embeddings) -> None:
+        self.collection.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    def delete(self, ids) -> None:
+        self.collection.delete(ids=ids)
+
+    def search(self, embedding, k=3, where=None) -> List[SearchResult]:
+        result = self.collection.query(
+            query_embeddings=[np.asarray(embedding, dtype=float).tolist()],
+            n_results=k,
+            where=where or None,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            (chunk_id, document, metadata or {}, -distance)
+            for chunk_id, document, metadata, distance in zip(
+                result["ids"][0], result["documents"][0],
+                result["metadatas"][0], result["distances"][0]
+            )
+        ]
+
+    def count(self) -> int:
+        return self.collection.count()
+
+
+INDEX_FILES = ("vectors.npy", "centroids.npy", "offsets.npy", "records.jsonl", "tombstones.json")
+# Index files of any generation (or unsuffixed), including the temporary files of older versions
+INDEX_FILE_PATTERN = r"(vectors|centroids|offsets|records|tombstones)(-\d+)?(\.tmp)?\.(npy|jsonl|json)(\.tmp)?"
+
+
+class MmapIndexBackend(VectorStoreBackend):
+    """
+    In-process IVF index over memory-mapped float32 arrays.
+
+    The on-disk layout in the index directory is, for the generation N named in current.json:
+    - vectors-N.npy: Normalized vectors ordered by inverted list.
+    - centroids-N.npy: One centroid per inverted list.
+    - offsets-N.npy: Start offset of every list in vectors-N.npy (n_lists + 1 entries).
+    - records-N.jsonl: ID, document and metadata for every row of vectors-N.npy.
+    - tombstones-N.json: IDs deleted since the last compaction.
+
+    A compaction writes generation N + 1 next to N and switches current.json to it with one atomic
+    rename, so a crash leaves either index complete. Indexes written before generations existed
+    (unsuffixed names, no current.json) are read as they are and replaced at the next compaction.
+
+    New chunks are kept in an in-memory delta that is searched exhaustively until save() or compact()
+    folds it into the index files.
+    """
+
+    def __init__(self, directory: str, nprobe: int = 8, delta_limit: int = 50000) -> None:
+        """
+        Load the index from disk without copying the vectors.
+
+        Args:
+            directory (str): Directory of the index files.
+            nprobe (int, optional): Number of inverted lists scanned per query. Defaults to 8.
+            delta_limit (int, optional): Number of pending chunks that triggers a compaction. Defaults to 50000.
+        """
+        self.directory = directory
+        self.nprobe = nprobe
+        self.delta_limit = delta_limit
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _file(self, name: str, generation: Optional[int] = -1) -> str:
+        """
+        Path of an index file of a generation, by default the loaded one.
+        """
+        generation = self.generation if generation == -1 else generation
+        if generation is None:
+            return self._path(name)
+        stem, extension = os.path.splitext(name)
+        return self._path(f"{stem}-{generation}{extension}")
+
+    @staticmethod
+    def _write(path: str, write: Callable[[Any], None], mode: str = "wb") -> None:
+        # Durable write: the data is on disk before current.json can point to it
+        with open(path, mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _remove_stale(self) -> None:
+        """
+        Delete the index files of every generation but the loaded one, and leftover temporary files.
+        """
+        live = {os.path.basename(self._file(name)) for name in INDEX_FILES}
+        for name in os.listdir(self.directory):
+            if re.fullmatch(INDEX_FILE_PATTERN, name) and name not in live:
+                os.remove(self._path(name))
+
+    def _load(self) -> None:
+        """
+        Memory-map the index files and reset the in-memory delta.
+        """
+        self.vectors: Optional[np.ndarray] = None
+        self.centroids: Optional[np.ndarray] = None
+        self.offsets: Optional[np.ndarray] = None
+        self.records: List[Tuple[str, str, dict]] = []
+        self.tombstones = set()
+        # None: the unsuffixed layout of indexes written before generations
+        self.generation: Optional[int] = None
+        if os.path.exists(self._path("current.json")):
+            with open(self._path("current.json"), encoding="utf-8") as f:
+                self.generation = json.load(f)["generation"]
+        if os.path.exists(self._file("vectors.npy")):
+            self.vectors = np.load(self._file("vectors.npy"), mmap_mode="r")
+            self.centroids = np.load(self._file("centroids.npy"))
+            self.offsets = np.load(self._file("offsets.npy"))
+            with open(self._file("records.jsonl"), encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    self.records.append((record["id"], record["document"], record["metadata"]))
+        if os.path.exists(self._file("tombstones.json")):
+            with open(self._file("tombstones.json"), encoding="utf-8") as f:
+                self.tombstones = set(json.load(f))
+        self.row_of = {record[0]: row for row, record in enumerate(self.records)}
+        self.delta_ids: List[str] = []
+        self.delta_records: Dict[str, Tuple[str, dict]] = {}
+        self.delta_vectors: List[np.ndarray] = []
+        self.delta_row: Dict[str, int] = {}
+        self._dirty = False
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).astype(np.float32)
+
+    def upsert(self, ids, documents, metadatas, embeddings) -> None:
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        for chunk_id, document, metadata, vector in zip(ids, documents, metadatas, vectors):
+            if chunk_id in self.row_of:
+                self.tombstones.add(chunk_id)
+            if chunk_id in self.delta_row:
+                self.delta_vectors[self.delta_row[chunk_id]] = vector
+            else:
+                self.delta_row[chunk_id] = len(self.delta_ids)
+                self.delta_ids.append(chunk_id)
+                self.delta_vectors.append(vector)
+            self.delta_records[chunk_id] = (document, metadata or {})
+        self._dirty = True
+        if len(self.delta_ids) >= self.delta_limit:
+            self.compact()
+
+    def delete(self, ids) -> None:
+        for chunk_id in ids:
+            if chunk_id in self.row_of:
+                self.tombstones.add(chunk_id)
+            self.delta_records.pop(chunk_id, None)
+        self._dirty = True
+
+    def count(self) -> int:
+        live_base = sum(1 for chunk_id in self.row_of if chunk_id not in self.tombstones)
+        return live_base + len(self.delta_records)
+
+    def _scan_rows(self, rows: np.ndarray, query: np.ndarray, where) -> List[Tuple[float, int]]:
+        if where:
+            rows = np.array([row for row in rows if matches_filter(self.records[row][2], where)], dtype=np.int64)
+        if rows.size == 0:
+            return []
+        scores = self.vectors[rows] @ query
+        return list(zip(scores.tolist(), rows.tolist()))
+
+    def search(self, embedding, k=3, where=None) -> List[SearchResult]:
+        query = self._normalize(np.asarray(embedding, dtype=np.float32))
+        candidates: List[Tuple[float, str, str, dict]] = []
+
+        if self.vectors is not None and len(self.records):
+            nprobe = min(self.nprobe, len(self.centroids))
+            probe = np.argsort(self.centroids @ query)[::-1][:nprobe]
+            for list_id in probe:
+                start, end = int(self.offsets[list_id]), int(self.offsets[list_id + 1])
+                if start == end:
+                    continue
+                if where:
+                    scored = self._scan_rows(np.arange(start, end), query, where)
+                else:
+                    # Contiguous slice of the memory map, no row gather required
+                    scores = self.vectors[start:end] @ query
+                    scored = list(zip(scores.tolist(), range(start, end)))
+                for score, row in scored:
+                    chunk_id, document, metadata = self.records[row]
+                    if chunk_id not in self.tombstones:
+                        candidates.append((score, chunk_id, document, metadata))
+
+        for chunk_id, (document, metadata) in self.delta_records.items():
+            if matches_filter(metadata, where):
+                score = float(self.delta_vectors[self.delta_row[chunk_id]] @ query)
+                candidates.append((score, chunk_id, document, metadata))
+
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        return [(chunk_id, document, metadata, score)
+                for score, chunk_id, document, metadata in candidates[:k]]
+
+    @staticmethod
+    def _kmeans(vectors: np.ndarray, n_lists: int, iterations: int = 10,
+                sample_size: int = 100000) -> np.ndarray:
+        """
+        Train IVF centroids with spherical k-means on a sample of the vectors.
+        """
+        rng = np.random.default_rng(0)
+        sample = vectors
+        if len(vectors) > sample_size:
+            sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for list_id in range(n_lists):
+                members = sample[assignment == list_id]
+                if len(members):
+                    centroids[list_id] = members.mean(axis=0)
+            centroids = MmapIndexBackend._normalize(centroids)
+        return centroids
+
+    def compact(self) -> None:
+        """
+        Rebuild the index files from the live base rows and the delta, dropping tombstones.
+        """
+        live_rows = [row for row, record in enumerate(self.records)
+                     if record[0] not in self.tombstones and record[0] not in self.delta_records]
+        records = [self.records[row] for row in live_rows]
+        parts = []
+        if live_rows:
+            parts.append(np.asarray(self.vectors[np.asarray(live_rows)], dtype=np.float32))
+        delta_ids = [chunk_id for chunk_id in self.delta_ids if chunk_id in self.delta_records]
+        if delta_ids:
+            parts.append(np.stack([self.delta_vectors[self.delta_row[chunk_id]] for chunk_id in delta_ids]))
+            records.extend((chunk_id,) + self.delta_records[chunk_id] for chunk_id in delta_ids)
+
+        generation = (self.generation or 0) + 1
+        if parts:
+            vectors = np.concatenate(parts)
+            n_lists = max(1, min(int(np.sqrt(len(vectors))), 4096))
+            centroids = self._kmeans(vectors, n_lists)
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            order = np.argsort(assignment, kind="stable")
+            offsets = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+
+            # The new generation is written next to the live one, which stays complete until the switch
+            self._write(self._file("vectors.npy", generation), lambda f: np.save(f, vectors[order]))
+            self._write(self._file("centroids.npy", generation), lambda f: np.save(f, centroids))
+            self._write(self._file("offsets.npy", generation), lambda f: np.save(f, offsets))
+            self._write(self._file("records.jsonl", generation), lambda f: f.writelines(
+                json.dumps({"id": records[row][0], "document": records[row][1], "metadata": records[row][2]}) + "\n"
+                for row in order), mode="w")
+        self._write(self._path("current.tmp.json"), lambda f: json.dump({"generation": generation}, f), mode="w")
+        os.replace(self._path("current.tmp.json"), self._path("current.json"))
+        if parts:
+            _logger.info("Compacted index: %d vectors in %d lists", len(vectors), n_lists)
+        self._load()
+        self._remove_stale()
+
+    def save(self) -> None:
+        """
+        Persist pending changes. Pending chunks require a rebuild, deletes only a tombstone file.
+        """
+        if self.delta_ids:
+            self.compact()
+            return
+        path = self._file("tombstones.json")
+        self._write(path + ".tmp", lambda f: json.dump(sorted(self.tombstones), f), mode="w")
+        os.replace(path + ".tmp", path)
+        self._dirty = False
+
+
+class BackendRetriever(BaseRetriever):
+    """
+    LangChain retriever that embeds the question and searches a VectorStoreBackend.
+    """
+
+    backend: Any
+    embeddings: Any
+    k: int = 3
+    where: Optional[Dict[str, Any]] = None
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        results = self.backend.search(self.embeddings.embed_query(query), k=self.k, where=self.where)
+        return [Document(page_content=document, metadata=metadata)
+                for _, document, metadata, _ in results]
+
+
+def create_backend(directory: str, backend: Optional[str] = None, **kwargs) -> VectorStoreBackend:
+    """
+    Create the configured vector store backend.
+
+    Args:
+        directory (str): Directory of the vector store.
+        backend (str, optional): "chroma" or "mmap". Defaults to os.getenv("VECTOR_BACKEND", "chroma").
+
+    Returns:
+        VectorStoreBackend: The backend instance.
+    """
+    backend = (backend or os.getenv("VECTOR_BACKEND", "chroma")).lower()
+    if backend == "chroma":
+        return ChromaBackend(directory, **kwargs)
+    if backend == "mmap":
+        return MmapIndexBackend(os.path.join(directory, "mmap_index"), **kwargs)
+    raise ValueError(f"Unknown vector backend: {backend}")
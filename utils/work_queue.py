@@ -0,0 +1,248 @@
+"""
+Module Docstring: This module provides a durable work queue backed by a SQLite file.
+
+Producers enqueue payloads (file references for ingestion). Any number of worker processes, on one
+host or on hosts sharing the file, lease jobs for a visibility timeout. A worker acks a job when it
+succeeds, or fails it to have it retried after a backoff. A job that fails (or whose lease expires)
+max_attempts times moves to the dead-letter state. A worker that dies without acking loses its lease
+when the timeout passes and the job is leased again, so delivery is at least once and the job
+itself must be idempotent.
+
+Leasing runs in an IMMEDIATE transaction, so two workers never hold the same job. The database
+uses WAL journaling. SQLite locking is unreliable on network filesystems such as NFS, so share the
+file only on a filesystem with working POSIX locks.
+
+Dependencies: sqlite3
+"""
+
+# Import dependencies
+import os
+import time
+import sqlite3
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from .logger import create_logger
+_logger = create_logger("work_queue")
+
+READY, LEASED, DONE, DEAD = "ready", "leased", "done", "dead"
+
+
+@dataclass
+class Job:
+    """
+    A leased job.
+    """
+    id: int
+    payload: str
+    attempts: int
+    lease_expires: float
+
+
+class WorkQueue:
+    """
+    This class manages jobs in a SQLite-backed queue with leases, retries and a dead-letter state.
+    """
+
+    def __init__(self, path: str = os.getenv("INGEST_QUEUE_DB", "ingest_queue.sqlite"),
+                 visibility_timeout: float = float(os.getenv("INGEST_VISIBILITY_TIMEOUT", "300")),
+                 max_attempts: int = int(os.getenv("INGEST_MAX_ATTEMPTS", "3")),
+                 retry_delay: float = float(os.getenv("INGEST_RETRY_DELAY", "30")),
+                 clock: Callable[[], float] = time.time) -> None:
+        """
+        Initialize the WorkQueue and create its table if needed.
+
+        Args:
+            path (str, optional): SQLite file of the queue. Defaults to os.getenv("INGEST_QUEUE_DB", "ingest_queue.sqlite").
+            visibility_timeout (float, optional): Seconds a lease lasts unless extended.
+                                Defaults to os.getenv("INGEST_VISIBILITY_TIMEOUT", "300").
+            max_attempts (int, optional): Attempts before a job is dead-lettered. Defaults to os.getenv("INGEST_MAX_ATTEMPTS", "3").
+            retry_delay (float, optional): Seconds before a failed job is retried, doubled per attempt.
+                                Defaults to os.getenv("INGEST_RETRY_DELAY", "30").
+            clock (Callable[[], float], optional): Time source. Defaults to time.time.
+        """
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.clock = clock
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA busy_timeout=30000")
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL UNIQUE,
+                state TEXT NOT NULL DEFAULT 'ready',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                lease_owner TEXT,
+                lease_expires REAL,
+                enqueued_at REAL NOT NULL,
+                finished_at REAL,
+                finished_by TEXT,
+                last_error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS jobs_state_available ON jobs (state, available_at);
+            CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at);
+            """
+        )
+
+    def close(self) -> None:
+        self.connection.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # IMMEDIATE takes the write lock up front, so concurrent workers queue up instead of deadlocking
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.connection
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+
+    def __enter__(self) -> "WorkQueue":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def enqueue(self, payloads: Iterable[str]) -> int:
+        """
+        Add payloads to the queue. Payloads already queued (in any state) are skipped.
+
+        Returns:
+            int: Number of jobs added.
+        """
+        now = self.clock()
+        with self._transaction():
+            cursor = self.connection.executemany(
+                "INSERT OR IGNORE INTO jobs (payload, available_at, enqueued_at) VALUES (?, ?, ?)",
+                [(payload, now, now) for payload in payloads]
+            )
+        return cursor.rowcount
+
+    def lease(self, worker: str, count: int = 1) -> List[Job]:
+        """
+        Lease up to count jobs that are ready, or whose lease has expired, for visibility_timeout seconds.
+
+        Args:
+            worker (str): Worker identity, e.g. "host:pid".
+            count (int, optional): Maximum number of jobs. Defaults to 1.
+
+        Returns:
+            List[Job]: The leased jobs, oldest first.
+        """
+        now = self.clock()
+        with self._transaction():
+            # Expired leases count as failed attempts: the worker died or hung
+            self.connection.execute(
+                "UPDATE jobs SET state = ?, finished_at = ?, last_error = 'lease expired' "
+                "WHERE state = ? AND lease_expires <= ? AND attempts >= ?",
+                (DEAD, now, LEASED, now, self.max_attempts)
+            )
+            rows = self.connection.execute(
+                "SELECT id, payload, attempts FROM jobs "
+                "WHERE (state = ? AND available_at <= ?) OR (state = ? AND lease_expires <= ?) "
+                "ORDER BY id LIMIT ?",
+                (READY, now, LEASED, now, count)
+            ).fetchall()
+            expires = now + self.visibility_timeout
+            self.connection.executemany(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, lease_owner = ?, lease_expires = ? WHERE id = ?",
+                [(LEASED, worker, expires, row["id"]) for row in rows]
+            )
+        return [Job(id=row["id"], payload=row["payload"], attempts=row["attempts"] + 1, lease_expires=expires)
+                for row in rows]
+
+    def _update_leased(self, job_id: int, worker: str, sql: str, params: tuple) -> bool:
+        # Only the current lease holder may change a leased job; a stale worker's update is ignored
+        with self._transaction():
+            cursor = self.connection.execute(
+                f"UPDATE jobs SET {sql} WHERE id = ? AND state = ? AND lease_owner = ?",
+                params + (job_id, LEASED, worker)
+            )
+        return cursor.rowcount == 1
+
+    def extend(self, job_id: int, worker: str) -> bool:
+        """
+        Renew the lease of a job for another visibility_timeout. Returns False if the lease was lost.
+        """
+        return self._update_leased(job_id, worker, "lease_expires = ?", (self.clock() + self.visibility_timeout,))
+
+    def ack(self, job_id: int, worker: str) -> bool:
+        """
+        Mark a leased job done. Returns False if the lease was lost to another worker.
+        """
+        return self._update_leased(job_id, worker, "state = ?, finished_at = ?, finished_by = ?, last_error = NULL",
+                                   (DONE, self.clock(), worker))
+
+    def fail(self, job_id: int, worker: str, error: str) -> Optional[str]:
+        """
+        Record a failed attempt: retry the job after a backoff, or dead-letter it after max_attempts.
+
+        Returns:
+            Optional[str]: The new state, or None if the lease was lost.
+        """
+        row = self.connection.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        now = self.clock()
+        if row["attempts"] >= self.max_attempts:
+            updated = self._update_leased(job_id, worker, "state = ?, finished_at = ?, last_error = ?",
+                                          (DEAD, now, error[:1000]))
+            state = DEAD
+        else:
+            delay = self.retry_delay * 2 ** (row["attempts"] - 1)
+            updated = self._update_leased(job_id, worker, "state = ?, available_at = ?, lease_owner = NULL, last_error = ?",
+                                          (READY, now + delay, error[:1000]))
+            state = READY
+        if updated and state == DEAD:
+            _logger.warning("Job %d dead-lettered after %d attempts: %s", job_id, row["attempts"], error)
+        return state if updated else None
+
+    def requeue_dead(self) -> int:
+        """
+        Move every dead-lettered job back to ready with its attempts reset.
+        """
+        with self._transaction():
+            cursor = self.connection.execute(
+                "UPDATE jobs SET state = ?, attempts = 0, available_at = ?, finished_at = NULL WHERE state = ?",
+                (READY, self.clock(), DEAD)
+            )
+        return cursor.rowcount
+
+    def status(self, window: float = 300.0) -> Dict:
+        """
+        Return the queue depth per state, the throughput over the last window seconds and the dead letters.
+
+        Args:
+            window (float, optional): Seconds over which throughput is measured. Defaults to 300.
+        """
+        now = self.clock()
+        counts = {state: 0 for state in (READY, LEASED, DONE, DEAD)}
+        counts.update({row["state"]: row["count"] for row in self.connection.execute(
+            "SELECT state, COUNT(*) AS count FROM jobs GROUP BY state")})
+        oldest = self.connection.execute(
+            "SELECT MIN(enqueued_at) AS oldest FROM jobs WHERE state = ?", (READY,)).fetchone()["oldest"]
+        workers = {row["finished_by"]: row["count"] for row in self.connection.execute(
+            "SELECT finished_by, COUNT(*) AS count FROM jobs WHERE state = ? AND finished_at > ? GROUP BY finished_by",
+            (DONE, now - window))}
+        done_recently = sum(workers.values())
+        throughput = done_recently / window
+        dead = [dict(row) for row in self.connection.execute(
+            "SELECT id, payload, attempts, last_error FROM jobs WHERE state = ? ORDER BY finished_at DESC LIMIT 20",
+            (DEAD,))]
+        return {
+            "depth": counts[READY] + counts[LEASED],
+            "states": counts,
+            "oldest_ready_seconds": round(now - oldest, 1) if oldest is not None else None,
+            "throughput_per_minute": round(throughput * 60, 2),
+            "eta_seconds": round((counts[READY] + counts[LEASED]) / throughput) if throughput else None,
+            "workers": workers,
+            "dead_letters": dead,
+        }
@@ -0,0 +1,85 @@
+"""Command line entry point for maintaining the Chroma vector store read by /vectorQuery.
+
+    python vector_index.py report
+    python vector_index.py rebuild --M 32 --construction-ef 200 --search-ef 50
+    python vector_index.py compact
+    python vector_index.py recall --k 3
+"""
+
+import os
+import json
+import argparse
+
+import numpy as np
+from dotenv import load_dotenv, find_dotenv
+
+from utils.vector_maintenance import (
+    index_report, rebuild_collection, remove_orphans, vacuum, measure_recall
+)
+
+load_dotenv(find_dotenv())
+
+
+def report(args):
+    print(json.dumps(index_report(args.vectordb), indent=2))
+
+
+def rebuild(args):
+    params = {key: value for key, value in (("hnsw:space", args.space), ("hnsw:M", args.M),
+                                            ("hnsw:construction_ef", args.construction_ef),
+                                            ("hnsw:search_ef", args.search_ef)) if value is not None}
+    print(json.dumps(rebuild_collection(args.vectordb, args.collection, params)))
+
+
+def compact(args):
+    before = index_report(args.vectordb)["total_bytes"]
+    names = args.collection or [collection["name"] for collection in index_report(args.vectordb)["collections"]]
+    for name in names:
+        # Same parameters: the rebuild only drops the tombstones and the queued writes
+        print(json.dumps(rebuild_collection(args.vectordb, name)))
+    freed = remove_orphans(args.vectordb) + vacuum(args.vectordb)
+    after = index_report(args.vectordb)["total_bytes"]
+    print(json.dumps({"bytes_before": before, "bytes_after": after, "orphans_and_vacuum_freed": freed}))
+
+
+def recall(args):
+    import chromadb
+    collection = chromadb.PersistentClient(path=args.vectordb).get_collection(args.collection)
+    data = collection.get(include=["embeddings"])
+    vectors = np.asarray(data["embeddings"], dtype=np.float32)
+    # Stored chunks as queries: each finds itself, the other k - 1 neighbors measure the index
+    rng = np.random.default_rng(0)
+    queries = vectors[rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)]
+    print(json.dumps(measure_recall(collection, vectors, data["ids"], queries, k=args.k)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report, tune and compact the Chroma vector store.")
+    parser.add_argument("--vectordb", default=os.getenv("VECTORDB"), help="Vector DB directory.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    report_parser = subparsers.add_parser("report", help="Chunks, HNSW parameters, tombstones and sizes.")
+    report_parser.set_defaults(func=report)
+
+    rebuild_parser = subparsers.add_parser("rebuild", help="Rebuild a collection with new HNSW parameters.")
+    rebuild_parser.add_argument("--collection", default="langchain")
+    rebuild_parser.add_argument("--space", choices=("l2", "cosine", "ip"))
+    rebuild_parser.add_argument("--M", type=int, help="Graph links per node (memory and recall).")
+    rebuild_parser.add_argument("--construction-ef", type=int, help="Candidates while building (build time and recall).")
+    rebuild_parser.add_argument("--search-ef", type=int, help="Candidates per query (latency and recall).")
+    rebuild_parser.set_defaults(func=rebuild)
+
+    compact_parser = subparsers.add_parser("compact", help="Rebuild collections, drop orphaned segments, vacuum.")
+    compact_parser.add_argument("--collection", nargs="+", help="Collections to rebuild. Defaults to all.")
+    compact_parser.set_defaults(func=compact)
+
+    recall_parser = subparsers.add_parser("recall", help="Recall@k and latency of a collection against exact search.")
+    recall_parser.add_argument("--collection", default="langchain")
+    recall_parser.add_argument("--queries", type=int, default=200)
+    recall_parser.add_argument("--k", type=int, default=3)
+    recall_parser.set_defaults(func=recall)
+
+    args = parser.parse_args()
+    if not args.vectordb:
+        parser.error("--vectordb (or VECTORDB) is required")
+    args.func(args)